@@ -64,6 +64,31 @@ def create_app(config_name='default'):
         RateLimiter(app, requests_per_minute=app.config.get('RATE_LIMIT_PER_MINUTE', 100))
     PermissionMiddleware(app)
     
+    # Permission decision cache (request memo + process-wide LRU)
+    from app.utils.permission_cache import permission_cache
+    permission_cache.init_app(app)
+    
+    # Background audit writer (queue + journal + batched inserts)
+    from app.utils.audit_writer import audit_writer
+    audit_writer.init_app(app)
+    
+    # Coalescing of repeated view/download audit events
+    from app.utils.audit_coalescer import audit_coalescer
+    audit_coalescer.init_app(app)
+    
+    # Admin dashboard snapshot (per-widget TTL + background refresh)
+    from app.utils.dashboard_snapshot import dashboard_snapshot
+    from app.services.admin_service import DASHBOARD_WIDGETS
+    dashboard_snapshot.init_app(app, DASHBOARD_WIDGETS)
+    
+    # Initialize report job runner
+    from app.utils.report_jobs import report_job_runner
+    report_job_runner.init_app(app)
+    
+    # Category tree cache (version stamp shared by the workers)
+    from app.utils.category_tree import category_tree
+    category_tree.init_app(app)
+    
     # Register blueprints
     from app.auth import auth_bp
     from app.documents import document_bp
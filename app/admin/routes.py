@@ -3,14 +3,13 @@ Administration routes
 """
 from flask import (
     render_template, request, jsonify, send_file, Response,
-    flash, redirect, url_for, send_from_directory, current_app
+    flash, redirect, url_for, send_from_directory, current_app, stream_with_context
 )
 from flask_login import login_required, current_user
 from datetime import datetime
 from functools import wraps
-import io
 from app.admin import admin_bp
-from app.services.audit_service import AuditService
+from app.services.audit_service import AuditService, EXPORT_FORMATS
 from app.services.admin_service import AdminService
 
 
@@ -30,24 +29,11 @@ def admin_required(f):
 @admin_bp.route('/dashboard')
 @admin_required
 def dashboard():
-    """Admin dashboard with system statistics"""
-    admin_service = AdminService()
+    """Admin dashboard with system statistics (rendered from the dashboard snapshot)"""
+    from app.utils.dashboard_snapshot import dashboard_snapshot
     
-    # Get dashboard statistics
-    stats = admin_service.get_dashboard_statistics()
-    upload_stats = admin_service.get_upload_statistics(days=30)
-    storage_by_user = admin_service.get_storage_by_user(limit=10)
-    recent_activity = admin_service.get_recent_activity(limit=20)
-    user_stats = admin_service.get_user_statistics()
-    
-    return render_template(
-        'admin/dashboard.html',
-        stats=stats,
-        upload_stats=upload_stats,
-        storage_by_user=storage_by_user,
-        recent_activity=recent_activity,
-        user_stats=user_stats
-    )
+    # stats, upload_stats, storage_by_user, recent_activity and user_stats
+    return render_template('admin/dashboard.html', **dashboard_snapshot.get_all())
 
 
 @admin_bp.route('/users')
@@ -562,6 +548,88 @@ def report_storage():
     return render_template('admin/report_storage.html', report=report_data)
 
 
+@admin_bp.route('/reports/jobs', methods=['POST'])
+@admin_required
+def submit_report_job():
+    """
+    Queue a report for background generation
+    
+    Identical requests (same type and parameters) share one job while it
+    runs and until its result expires.
+    
+    Body (JSON or form):
+        - tipo: usage, access, storage, audit_summary, audit_user_activity,
+          audit_document_activity or audit_security
+        - data_inicio, data_fim: Period (ISO format)
+        - usuario_id, documento_id: Filters, where the report type takes them
+    """
+    from app.services.report_job_service import ReportJobService, ReportJobError
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        job, reused = ReportJobService().submit(data.get('tipo'), data, usuario_id=current_user.id)
+    except ReportJobError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(_report_job_json(job, reused=reused)), 202
+
+
+@admin_bp.route('/reports/jobs/<job_id>')
+@admin_required
+def report_job_status(job_id):
+    """Get the status and progress of a report job"""
+    from app.services.report_job_service import ReportJobService
+    
+    job = ReportJobService().get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Report job not found'}), 404
+    return jsonify(_report_job_json(job))
+
+
+@admin_bp.route('/reports/jobs/<job_id>/download')
+@admin_required
+def download_report_job(job_id):
+    """
+    Download the result of a finished report job
+    
+    Query Parameters:
+        - format: json (default) or csv (usage, access and storage reports)
+    """
+    from app.services.report_job_service import ReportJobService, ReportJobError, RESULT_MIMETYPES
+    
+    service = ReportJobService()
+    job = service.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Report job not found'}), 404
+    
+    formato = request.args.get('format', 'json')
+    if formato not in RESULT_MIMETYPES:
+        return jsonify({'error': f'Invalid format: {formato}'}), 400
+    try:
+        path = service.result_path(job, formato)
+    except ReportJobError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    return send_file(
+        path,
+        mimetype=RESULT_MIMETYPES[formato],
+        as_attachment=True,
+        download_name=f'relatorio_{job.tipo}_{job.data_conclusao.strftime("%Y%m%d_%H%M%S")}.{formato}'
+    )
+
+
+def _report_job_json(job, **extra):
+    """Serialize a report job with its status and download URLs"""
+    data = job.to_dict()
+    data['status_url'] = url_for('admin.report_job_status', job_id=job.id)
+    data['download_urls'] = {
+        formato: url_for('admin.download_report_job', job_id=job.id, format=formato)
+        for formato in data['formatos']
+    }
+    data.update(extra)
+    return data
+
+
 # Audit Log Routes
 
 @admin_bp.route('/audit/logs')
@@ -618,24 +686,8 @@ def audit_logs():
         per_page=per_page
     )
     
-    # Convert logs to dictionaries for JSON response
-    logs_data = []
-    for log in result['items']:
-        logs_data.append({
-            'id': log.id,
-            'usuario_id': log.usuario_id,
-            'usuario_nome': log.usuario.nome if log.usuario else None,
-            'acao': log.acao,
-            'tabela': log.tabela,
-            'registro_id': log.registro_id,
-            'dados': log.dados,
-            'ip_address': log.ip_address,
-            'user_agent': log.user_agent,
-            'data_hora': log.data_hora.isoformat() if log.data_hora else None
-        })
-    
     return jsonify({
-        'logs': logs_data,
+        'logs': [_audit_log_json(log) for log in result['items']],
         'pagination': {
             'total': result['total'],
             'page': result['page'],
@@ -647,6 +699,79 @@ def audit_logs():
     })
 
 
+@admin_bp.route('/audit/logs/scroll')
+@admin_required
+def audit_logs_scroll():
+    """
+    Audit logs for infinite scrolling, newest first
+    
+    Each response carries the cursor of the next one, so browsing months of
+    logs costs the same per page as the first screen (no offsets, no totals).
+    
+    Query Parameters:
+        - usuario_id, acao, tabela, ip_address: Filters (as in /audit/logs)
+        - data_inicio: Start date (ISO format)
+        - data_fim: End date (ISO format)
+        - antes_de, antes_id: Cursor returned as next_cursor by the previous page
+        - limit: Items per page (default: 50, max: 200)
+    """
+    audit_service = AuditService()
+    
+    usuario_id = request.args.get('usuario_id', type=int)
+    acao = request.args.get('acao')
+    tabela = request.args.get('tabela')
+    ip_address = request.args.get('ip_address')
+    antes_id = request.args.get('antes_id', type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    # Parse date parameters
+    dates = {}
+    for name in ('data_inicio', 'data_fim', 'antes_de'):
+        if request.args.get(name):
+            try:
+                dates[name] = datetime.fromisoformat(request.args.get(name))
+            except ValueError:
+                return jsonify({'error': f'Parâmetro {name} inválido'}), 400
+    
+    result = audit_service.scroll_logs(
+        usuario_id=usuario_id,
+        acao=acao,
+        tabela=tabela,
+        ip_address=ip_address,
+        antes_id=antes_id,
+        limit=limit,
+        **dates
+    )
+    
+    next_cursor = result['next_cursor']
+    return jsonify({
+        'logs': [_audit_log_json(log) for log in result['items']],
+        'has_more': result['has_more'],
+        'next_cursor': {
+            'antes_de': next_cursor['antes_de'].isoformat(),
+            'antes_id': next_cursor['antes_id']
+        } if next_cursor else None
+    })
+
+
+def _audit_log_json(log):
+    """Audit log list entry (live or archived) as a JSON-ready dictionary"""
+    return {
+        'id': log.id,
+        'usuario_id': log.usuario_id,
+        'usuario_nome': log.usuario.nome if log.usuario else None,
+        'acao': log.acao,
+        'tabela': log.tabela,
+        'registro_id': log.registro_id,
+        'dados': log.dados,
+        'ip_address': log.ip_address,
+        'user_agent': log.user_agent,
+        'data_hora': log.data_hora.isoformat() if log.data_hora else None,
+        'ocorrencias': log.ocorrencias or 1,
+        'data_hora_fim': log.data_hora_fim.isoformat() if log.data_hora_fim else None
+    }
+
+
 @admin_bp.route('/audit/logs/<int:log_id>')
 @admin_required
 def audit_log_detail(log_id):
@@ -798,27 +923,68 @@ def audit_statistics():
     })
 
 
+@admin_bp.route('/permissions/cache-stats')
+@admin_required
+def permission_cache_stats():
+    """Get permission decision cache statistics (hit rate, latency, size)"""
+    from app.utils.permission_cache import permission_cache
+    
+    return jsonify(permission_cache.stats())
+
+
+@admin_bp.route('/dashboard/snapshot-stats')
+@admin_required
+def dashboard_snapshot_stats():
+    """Get dashboard widget statistics (computation time, age, hits)"""
+    from app.utils.dashboard_snapshot import dashboard_snapshot
+    
+    return jsonify(dashboard_snapshot.stats())
+
+
+@admin_bp.route('/audit/writer-stats')
+@admin_required
+def audit_writer_stats():
+    """Get background audit writer statistics (pending, written, fallbacks)"""
+    from app.utils.audit_writer import audit_writer
+    
+    return jsonify(audit_writer.stats())
+
+
 @admin_bp.route('/audit/export')
 @admin_required
 def audit_export():
     """
-    Export audit logs
+    Export audit logs as a streamed download
+    
+    Rows are written as they are read, newest first, so exports of any size
+    use constant memory.
     
     Query Parameters:
         - usuario_id: Filter by user ID
+        - acao: Filter by action type
         - data_inicio: Start date (ISO format)
         - data_fim: End date (ISO format)
-        - format: Export format ('json' or 'csv', default: 'json')
+        - format: Export format ('json', 'jsonl' or 'csv', default: 'json')
+        - gzip: Compress the download ('true'/'1')
+        - antes_de, antes_id: Resume after the row with this data_hora (ISO
+          format) and id, i.e. the last row of an interrupted download
     """
     audit_service = AuditService()
     
     # Get filter parameters
     usuario_id = request.args.get('usuario_id', type=int)
+    acao = request.args.get('acao')
     export_format = request.args.get('format', 'json')
+    compress = request.args.get('gzip', 'false').lower() in ('true', '1')
+    antes_id = request.args.get('antes_id', type=int)
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Formato de exportação inválido: {export_format}'}), 400
     
     # Parse date parameters
     data_inicio = None
     data_fim = None
+    antes_de = None
     
     if request.args.get('data_inicio'):
         try:
@@ -832,38 +998,38 @@ def audit_export():
         except ValueError:
             pass
     
-    # Export logs
-    exported_data = audit_service.export_logs(
+    if request.args.get('antes_de'):
+        try:
+            antes_de = datetime.fromisoformat(request.args.get('antes_de'))
+        except ValueError:
+            return jsonify({'error': 'Parâmetro antes_de inválido'}), 400
+    
+    # Stream logs
+    chunks = audit_service.stream_export(
+        format=export_format,
+        compress=compress,
         usuario_id=usuario_id,
+        acao=acao,
         data_inicio=data_inicio,
         data_fim=data_fim,
-        format=export_format
+        antes_de=antes_de,
+        antes_id=antes_id
     )
     
-    # Prepare response based on format
-    if export_format == 'csv':
-        # Create CSV response
-        output = io.BytesIO()
-        output.write(exported_data.encode('utf-8'))
-        output.seek(0)
-        
-        filename = f"audit_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-        
-        return send_file(
-            output,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=filename
-        )
-    
-    else:  # JSON format
-        return Response(
-            exported_data,
-            mimetype='application/json',
-            headers={
-                'Content-Disposition': f'attachment; filename=audit_logs_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.json'
-            }
-        )
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"audit_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if compress:
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
 
 @admin_bp.route('/audit/reports/<report_type>')
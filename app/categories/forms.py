@@ -5,6 +5,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SelectField, HiddenField, IntegerField
 from wtforms.validators import DataRequired, Length, Optional, ValidationError
 from app.models.document import Categoria, Pasta
+from app.models.hierarchy import subtree_prefix
 from app.repositories.category_repository import CategoryRepository, FolderRepository
 
 
@@ -62,19 +63,20 @@ class CategoryForm(FlaskForm):
         categories = category_repo.get_active_categories()
         
         # Build choices excluding current category and its descendants
+        current = category_repo.get_by_id(categoria_id) if categoria_id else None
+        excluded_prefix = subtree_prefix(current.caminho_ids, current.id) if current else None
         choices = [('', 'Nenhuma (Raiz)')]
         for cat in categories:
             # Skip current category and its descendants to prevent circular references
-            if categoria_id:
-                if cat.id == categoria_id:
+            if current:
+                if cat.id == current.id:
                     continue
-                if not category_repo.can_move_to_parent(categoria_id, cat.id):
+                if cat.caminho_ids and cat.caminho_ids.startswith(excluded_prefix):
                     continue
             
             # Add indentation based on depth
-            depth = category_repo.get_depth(cat.id)
-            indent = '—' * depth
-            label = f"{indent} {cat.nome}" if depth > 0 else cat.nome
+            indent = '—' * cat.nivel
+            label = f"{indent} {cat.nome}" if cat.nivel > 0 else cat.nome
             choices.append((cat.id, label))
         
         self.categoria_pai_id.choices = choices
@@ -1,19 +1,20 @@
 """
 Category management routes
 """
+from datetime import datetime, timedelta
 from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app.categories import category_bp
 from app.categories.forms import CategoryForm, FolderForm
 from app.services.category_service import CategoryService, FolderService
-from app.repositories.category_repository import CategoryRepository, FolderRepository
+from app.services.permission_service import PermissionService, PermissionServiceError, PermissionDeniedError
+from app.repositories.category_repository import CategoryRepository
 
 
 # Initialize services
 category_service = CategoryService()
 folder_service = FolderService()
 category_repo = CategoryRepository()
-folder_repo = FolderRepository()
 
 
 # ============================================================================
@@ -28,10 +29,8 @@ def list_categories():
         categories = category_service.get_all_categories()
         hierarchy = category_service.get_category_hierarchy()
         
-        # Get document counts for each category
-        category_stats = {}
-        for cat in categories:
-            category_stats[cat.id] = category_repo.get_document_count(cat.id, include_subcategories=True)
+        # Subtree document counts are maintained on each category
+        category_stats = {cat.id: cat.total_documentos_subarvore for cat in categories}
         
         return render_template(
             'categories/list.html',
@@ -157,6 +156,7 @@ def view_category(id):
             categoria=stats['categoria'],
             document_count=stats['document_count'],
             document_count_total=stats['document_count_total'],
+            total_bytes_total=stats['total_bytes_total'],
             subcategories=stats['subcategories'],
             breadcrumb=breadcrumb
         )
@@ -177,10 +177,8 @@ def list_folders():
         folders = folder_service.get_user_folders(current_user.id)
         hierarchy = folder_service.get_folder_hierarchy(current_user.id)
         
-        # Get document counts for each folder
-        folder_stats = {}
-        for folder in folders:
-            folder_stats[folder.id] = folder_repo.get_document_count(folder.id)
+        # Subtree document counts are maintained on each folder
+        folder_stats = {folder.id: folder.total_documentos_subarvore for folder in folders}
         
         return render_template(
             'categories/folders.html',
@@ -299,6 +297,8 @@ def view_folder(id):
             'categories/folder_view.html',
             pasta=stats['pasta'],
             document_count=stats['document_count'],
+            document_count_total=stats['document_count_total'],
+            total_bytes_total=stats['total_bytes_total'],
             subfolders=stats['subfolders'],
             breadcrumb=breadcrumb
         )
@@ -331,3 +331,76 @@ def api_folder_hierarchy():
         return jsonify({'success': True, 'data': hierarchy})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@category_bp.route('/api/folders/<int:id>/permissions', methods=['POST'])
+@login_required
+def api_share_folder(id):
+    """API endpoint to grant or revoke a folder permission inherited by its documents"""
+    pasta = folder_service.get_folder_by_id(id)
+    if not pasta:
+        return jsonify({'success': False, 'error': 'Pasta não encontrada'}), 404
+    
+    permission_service = PermissionService()
+    return _change_container_permission(
+        permission_service.grant_folder_permission,
+        permission_service.revoke_folder_permission,
+        pasta
+    )
+
+
+@category_bp.route('/api/categories/<int:id>/permissions', methods=['POST'])
+@login_required
+def api_share_category(id):
+    """API endpoint to grant or revoke a category permission inherited by its documents"""
+    categoria = category_service.get_category_by_id(id)
+    if not categoria:
+        return jsonify({'success': False, 'error': 'Categoria não encontrada'}), 404
+    
+    permission_service = PermissionService()
+    return _change_container_permission(
+        permission_service.grant_category_permission,
+        permission_service.revoke_category_permission,
+        categoria
+    )
+
+
+def _change_container_permission(grant, revoke, container):
+    """
+    Grant or revoke a folder/category permission from request data
+    
+    Request data: usuario_id, tipo_permissao, acao (conceder or revogar),
+    and optionally expiration_days when granting.
+    """
+    data = request.get_json(silent=True) or request.form
+    try:
+        usuario_id = int(data.get('usuario_id') or 0)
+    except (TypeError, ValueError):
+        usuario_id = 0
+    tipo_permissao = data.get('tipo_permissao')
+    acao = data.get('acao', 'conceder')
+    try:
+        expiration_days = int(data.get('expiration_days') or 0)
+    except (TypeError, ValueError):
+        expiration_days = -1
+    
+    if not usuario_id or not tipo_permissao:
+        return jsonify({'success': False, 'error': 'Missing parameters'}), 400
+    if expiration_days < 0:
+        return jsonify({'success': False, 'error': 'Invalid expiration_days'}), 400
+    
+    try:
+        if acao == 'revogar':
+            revoked = revoke(container, usuario_id, tipo_permissao, current_user.id)
+            return jsonify({'success': True, 'revoked': revoked})
+        
+        expiration_date = None
+        if expiration_days:
+            expiration_date = datetime.utcnow() + timedelta(days=expiration_days)
+        
+        grant(container, usuario_id, tipo_permissao, current_user.id, expiration_date)
+        return jsonify({'success': True})
+    except PermissionDeniedError as e:
+        return jsonify({'success': False, 'error': str(e)}), 403
+    except PermissionServiceError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
@@ -1,17 +1,19 @@
 """
 Document management routes
 """
-from flask import render_template, request, redirect, url_for, flash, send_file, jsonify, abort
+from flask import render_template, request, redirect, url_for, flash, send_file, jsonify, abort, current_app
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from app.documents import document_bp
 from app.documents.forms import DocumentUploadForm, DocumentEditForm, DocumentVersionForm, DocumentSearchForm
 from app.services.document_service import DocumentService, DocumentServiceError, PermissionDeniedError, DocumentNotFoundError
 from app.services.storage_service import StorageService
+from app.services.permission_service import PermissionService
 from app.utils.file_handler import FileHandler
+from app.utils.category_tree import category_tree
 from app.repositories.document_repository import DocumentRepository
 from app.repositories.category_repository import CategoryRepository
-from app.models.document import Categoria, Pasta
+from app.models.document import Pasta
 from app import db
 import os
 
@@ -42,7 +44,8 @@ def list_documents():
     """List documents with filtering and pagination"""
     _init_services()
     from app.models.document import Documento, Favorito
-    from app.models.permission import Permissao
+    from app.models.permission import Permissao, PermissaoEfetiva, PermissaoGrupo
+    from app.utils.permission_cache import permission_cache, group_grant_filter
     from datetime import datetime, timedelta
     from sqlalchemy import or_, and_
     
@@ -85,11 +88,30 @@ def list_documents():
             Documento.status == 'excluido'
         )
     else:
-        # All accessible documents (owned or shared)
+        # All accessible documents (owned, shared, inherited from a folder/category
+        # or shared with one of the user's groups or profile)
+        now = datetime.utcnow()
+        inherited = db.session.query(PermissaoEfetiva.documento_id).filter(
+            PermissaoEfetiva.usuario_id == current_user.id,
+            or_(
+                PermissaoEfetiva.data_expiracao.is_(None),
+                PermissaoEfetiva.data_expiracao > now
+            )
+        )
+        grupo_ids, perfil_id = permission_cache.get_memberships(current_user.id)
+        shared = db.session.query(PermissaoGrupo.documento_id).filter(
+            group_grant_filter(grupo_ids, perfil_id),
+            or_(
+                PermissaoGrupo.data_expiracao.is_(None),
+                PermissaoGrupo.data_expiracao > now
+            )
+        )
         documentos_query = Documento.query.outerjoin(Permissao).filter(
             or_(
                 Documento.usuario_id == current_user.id,
-                Permissao.usuario_id == current_user.id
+                Permissao.usuario_id == current_user.id,
+                Documento.id.in_(inherited),
+                Documento.id.in_(shared)
             ),
             Documento.status == 'ativo'
         ).distinct()
@@ -115,12 +137,19 @@ def list_documents():
     pagination = documentos_query.paginate(page=page, per_page=per_page, error_out=False)
     documentos = pagination.items
     
+    # Permissions and favorites for every row, one query each
+    doc_ids = [doc.id for doc in documentos]
+    doc_permissions = PermissionService().bulk_effective_permissions(current_user.id, doc_ids)
+    favoritos = document_repository.get_favorited_ids(current_user.id, doc_ids)
+    
     # Get categories for filter dropdown
-    categorias = Categoria.query.filter_by(ativo=True).order_by(Categoria.nome).all()
+    categorias = category_tree.get().ativas
     
     return render_template(
         'documents/list.html',
         documentos=documentos,
+        doc_permissions=doc_permissions,
+        favoritos=favoritos,
         pagination=pagination,
         view_mode=view_mode,
         filter_type=filter_type,
@@ -140,7 +169,7 @@ def upload():
     form = DocumentUploadForm()
     
     # Populate category choices
-    categorias = Categoria.query.filter_by(ativo=True).order_by(Categoria.nome).all()
+    categorias = category_tree.get().ativas
     form.categoria_id.choices = [(0, 'Selecione uma categoria')] + [(c.id, c.nome) for c in categorias]
     
     # Populate folder choices for current user
@@ -164,6 +193,26 @@ def upload():
             uploaded_count = 0
             errors = []
             
+            # Multiple files share the form metadata, so use the batch path
+            if len([f for f in files if f and f.filename]) > 1:
+                tags = []
+                if form.tags.data:
+                    tags = [tag.strip() for tag in form.tags.data.split(',') if tag.strip()]
+                
+                result = document_service.upload_documents_batch(
+                    files=files,
+                    user_id=current_user.id,
+                    descricao=form.descricao.data,
+                    categoria_id=form.categoria_id.data if form.categoria_id.data != 0 else None,
+                    pasta_id=form.pasta_id.data if form.pasta_id.data != 0 else None,
+                    tags=tags,
+                    check_duplicates=True,
+                    max_workers=current_app.config.get('BATCH_UPLOAD_MAX_WORKERS', 4)
+                )
+                uploaded_count = len(result['documents'])
+                errors = [f"{e['filename']}: {e['error']}" for e in result['errors']]
+                files = []
+            
             for file in files:
                 if file and file.filename:
                     try:
@@ -216,6 +265,60 @@ except Exception:
     pass
 
 
+@document_bp.route('/batch-upload', methods=['POST'])
+@login_required
+def batch_upload():
+    """
+    Upload many files at once with shared metadata (JSON API)
+    
+    Form fields:
+        files: Files to upload (multiple)
+        descricao: Description applied to all documents
+        categoria_id: Category ID applied to all documents
+        pasta_id: Folder ID applied to all documents
+        tags: Comma-separated tag names applied to all documents
+    """
+    _init_services()
+    try:
+        files = [f for f in request.files.getlist('files') if f and f.filename]
+        
+        if not files:
+            return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado'}), 400
+        
+        max_files = current_app.config.get('BATCH_UPLOAD_MAX_FILES', 500)
+        if len(files) > max_files:
+            return jsonify({
+                'success': False,
+                'message': f'Máximo de {max_files} arquivos por envio'
+            }), 400
+        
+        tags_str = request.form.get('tags', '')
+        tags = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
+        
+        result = document_service.upload_documents_batch(
+            files=files,
+            user_id=current_user.id,
+            descricao=request.form.get('descricao'),
+            categoria_id=request.form.get('categoria_id', type=int) or None,
+            pasta_id=request.form.get('pasta_id', type=int) or None,
+            tags=tags,
+            check_duplicates=request.form.get('check_duplicates', 'true').lower() != 'false',
+            max_workers=current_app.config.get('BATCH_UPLOAD_MAX_WORKERS', 4)
+        )
+        
+        uploaded = [{'id': doc.id, 'nome': doc.nome} for doc in result['documents']]
+        status_code = 207 if result['errors'] and uploaded else (400 if result['errors'] else 200)
+        
+        return jsonify({
+            'success': not result['errors'],
+            'message': f'{len(uploaded)} documento(s) enviado(s) com sucesso',
+            'uploaded': uploaded,
+            'errors': result['errors']
+        }), status_code
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @document_bp.route('/<int:id>')
 @login_required
 def view_document(id):
@@ -392,21 +495,36 @@ def preview_document(id):
 @document_bp.route('/<int:id>/share', methods=['POST'])
 @login_required
 def share_document(id):
-    """Share a document with another user (simple endpoint used by UI/tests)"""
+    """Share a document with another user, a group or a profile (simple endpoint used by UI/tests)"""
     _init_services()
     try:
         from app.services.permission_service import PermissionService
         documento = document_service.get_document(id, current_user.id)
 
         usuario_id = request.form.get('usuario_id', type=int)
+        grupo_id = request.form.get('grupo_id', type=int)
+        perfil_id = request.form.get('perfil_id', type=int)
         tipo_permissao = request.form.get('tipo_permissao')
 
-        if not usuario_id or not tipo_permissao:
+        if not (usuario_id or grupo_id or perfil_id) or not tipo_permissao:
             return jsonify({'success': False, 'message': 'Missing parameters'}), 400
 
         permission_types = [t.strip() for t in tipo_permissao.split(',') if t.strip()]
 
         perm_service = PermissionService()
+        if grupo_id or perfil_id:
+            # Group/profile grants: one row per type, expanded at check time
+            for permission_type in permission_types:
+                if grupo_id:
+                    perm_service.grant_group_permission(
+                        documento, grupo_id, permission_type, current_user.id
+                    )
+                else:
+                    perm_service.grant_profile_permission(
+                        documento, perfil_id, permission_type, current_user.id
+                    )
+            return jsonify({'success': True, 'created': len(permission_types)})
+        
         perms = perm_service.share_document(
             documento=documento,
             target_user_id=usuario_id,
@@ -424,6 +542,137 @@ def share_document(id):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@document_bp.route('/bulk-share', methods=['POST'])
+@login_required
+def bulk_share():
+    """
+    Grant or revoke permissions over documents x users x permission types (JSON API)
+    
+    JSON body:
+        documento_ids: Document IDs
+        usuario_ids: User IDs
+        tipos_permissao: Permission types (all types when revoking and omitted)
+        acao: 'conceder' (default) or 'revogar'
+        expiration_days: Optional number of days until granted permissions expire
+        notificar: Whether to notify recipients (default true)
+    """
+    from datetime import datetime, timedelta
+    from app.services.permission_service import InvalidPermissionTypeError
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        documento_ids = [int(i) for i in data.get('documento_ids') or []]
+        usuario_ids = [int(i) for i in data.get('usuario_ids') or []]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid IDs'}), 400
+    permission_types = data.get('tipos_permissao') or []
+    acao = data.get('acao', 'conceder')
+    try:
+        expiration_days = int(data['expiration_days']) if data.get('expiration_days') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid expiration_days'}), 400
+    if expiration_days is not None and expiration_days < 1:
+        return jsonify({'success': False, 'message': 'Invalid expiration_days'}), 400
+    
+    if not documento_ids or not usuario_ids or (acao == 'conceder' and not permission_types):
+        return jsonify({'success': False, 'message': 'Missing parameters'}), 400
+    if acao not in ('conceder', 'revogar'):
+        return jsonify({'success': False, 'message': 'Ação inválida'}), 400
+    
+    max_grants = current_app.config.get('BULK_SHARE_MAX_GRANTS', 100000)
+    if len(documento_ids) * len(usuario_ids) * max(1, len(permission_types)) > max_grants:
+        return jsonify({
+            'success': False,
+            'message': f'Máximo de {max_grants} permissões por operação'
+        }), 400
+    
+    perm_service = PermissionService()
+    try:
+        if acao == 'conceder':
+            expiration_date = None
+            if expiration_days:
+                expiration_date = datetime.utcnow() + timedelta(days=expiration_days)
+            result = perm_service.bulk_grant_permissions(
+                documento_ids=documento_ids,
+                target_user_ids=usuario_ids,
+                permission_types=permission_types,
+                granted_by_user_id=current_user.id,
+                expiration_date=expiration_date,
+                send_notification=bool(data.get('notificar', True))
+            )
+        else:
+            result = perm_service.bulk_revoke_permissions(
+                documento_ids=documento_ids,
+                target_user_ids=usuario_ids,
+                revoked_by_user_id=current_user.id,
+                permission_types=permission_types or None
+            )
+    except InvalidPermissionTypeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    skipped = result['denied'] or result['not_found'] or result.get('invalid_users')
+    return jsonify({'success': not skipped, **result}), 207 if skipped else 200
+
+
+@document_bp.route('/bulk-move', methods=['POST'])
+@login_required
+def bulk_move():
+    """
+    Move or reclassify many documents at once (JSON API)
+    
+    JSON body:
+        documento_ids: Document IDs (or a search instead:)
+        query: Search term selecting the documents
+        filters: Search filters selecting the documents
+        categoria_id: New category ID
+        pasta_id: New folder ID (0 takes the documents out of their folder)
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        documento_ids = [int(i) for i in data['documento_ids']] if data.get('documento_ids') else None
+        categoria_id = int(data['categoria_id']) if data.get('categoria_id') is not None else None
+        pasta_id = int(data['pasta_id']) if data.get('pasta_id') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid IDs'}), 400
+    query = data.get('query')
+    filters = data.get('filters') or None
+    
+    if documento_ids is None and not (query or filters):
+        return jsonify({'success': False, 'message': 'Missing parameters'}), 400
+    if categoria_id is None and pasta_id is None:
+        return jsonify({'success': False, 'message': 'Missing parameters'}), 400
+    
+    max_documents = current_app.config.get('BULK_MOVE_MAX_DOCUMENTS', 50000)
+    if documento_ids is None:
+        from app.services.search_service import SearchService
+        documento_ids = SearchService().search_ids(query, current_user.id, filters)
+    if len(documento_ids) > max_documents:
+        return jsonify({
+            'success': False,
+            'message': f'Máximo de {max_documents} documentos por operação'
+        }), 400
+    
+    _init_services()
+    try:
+        result = document_service.bulk_move_documents(
+            user_id=current_user.id,
+            documento_ids=documento_ids,
+            categoria_id=categoria_id,
+            pasta_id=pasta_id
+        )
+    except DocumentServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    skipped = result['denied'] or result['not_found']
+    return jsonify({'success': not skipped, **result}), 207 if skipped else 200
+
+
 @document_bp.route('/<int:id>/upload-version', methods=['POST'])
 @login_required
 def upload_version(id):
@@ -482,7 +731,7 @@ def edit_document(id):
         form = DocumentEditForm(obj=documento)
         
         # Populate category choices
-        categorias = Categoria.query.filter_by(ativo=True).order_by(Categoria.nome).all()
+        categorias = category_tree.get().ativas
         form.categoria_id.choices = [(0, 'Selecione uma categoria')] + [(c.id, c.nome) for c in categorias]
         
         # Populate folder choices for current user
@@ -4,10 +4,14 @@ Domain models for SGDI
 from app.models.user import User, Perfil, PasswordReset
 from app.models.document import Documento, Categoria, Pasta, Tag, DocumentoTag
 from app.models.version import Versao
-from app.models.permission import Permissao
-from app.models.workflow import Workflow, AprovacaoDocumento, HistoricoAprovacao
-from app.models.audit import LogAuditoria
+from app.models.permission import Permissao, PermissaoPasta, PermissaoCategoria, PermissaoEfetiva, PermissaoGrupo
+from app.models.group import Grupo, GrupoUsuario
+from app.models.workflow import Workflow, WorkflowEstagioAprovador, AprovacaoDocumento, HistoricoAprovacao
+from app.models.audit import (
+    LogAuditoria, ArquivoAuditoria, ResumoAuditoriaHora, ResumoAuditoriaDia, MarcadorResumoAuditoria
+)
 from app.models.settings import SystemSettings
+from app.models.report import RelatorioJob
 
 __all__ = [
     'User',
@@ -20,9 +24,21 @@ __all__ = [
     'DocumentoTag',
     'Versao',
     'Permissao',
+    'PermissaoPasta',
+    'PermissaoCategoria',
+    'PermissaoEfetiva',
+    'PermissaoGrupo',
+    'Grupo',
+    'GrupoUsuario',
     'Workflow',
+    'WorkflowEstagioAprovador',
     'AprovacaoDocumento',
     'HistoricoAprovacao',
     'LogAuditoria',
-    'SystemSettings'
+    'ArquivoAuditoria',
+    'ResumoAuditoriaHora',
+    'ResumoAuditoriaDia',
+    'MarcadorResumoAuditoria',
+    'SystemSettings',
+    'RelatorioJob'
 ]
@@ -23,6 +23,8 @@ class LogAuditoria(db.Model):
     ip_address = db.Column(db.String(45))  # IPv4 or IPv6
     user_agent = db.Column(db.String(255))  # Browser/client info
     data_hora = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    ocorrencias = db.Column(db.Integer, default=1, server_default='1', nullable=False)  # Coalesced repeats (see AuditCoalescer)
+    data_hora_fim = db.Column(db.DateTime)  # Last coalesced occurrence
     
     # Relationships
     usuario = db.relationship('User', backref='logs_auditoria')
@@ -30,6 +32,10 @@ class LogAuditoria(db.Model):
     __table_args__ = (
         db.Index('idx_audit_usuario_data', 'usuario_id', 'data_hora'),
         db.Index('idx_audit_tabela_registro', 'tabela', 'registro_id'),
+        # Keyset browsing per filter (see AuditRepository.scroll_logs)
+        db.Index('idx_audit_ip_data', 'ip_address', 'data_hora'),
+        db.Index('idx_audit_acao_data', 'acao', 'data_hora'),
+        db.Index('idx_audit_tabela_data', 'tabela', 'data_hora'),
     )
     
     @property
@@ -42,22 +48,107 @@ class LogAuditoria(db.Model):
         """Set additional data from dict"""
         self.dados_json = json.dumps(data_dict) if data_dict else None
     
+    def to_row(self):
+        """Column values for a bulk insert (without the primary key)"""
+        row = {}
+        for column in self.__table__.columns:
+            if column.key == 'id':
+                continue
+            value = getattr(self, column.key)
+            if value is None and column.default is not None and column.default.is_scalar:
+                value = column.default.arg
+            row[column.key] = value
+        return row
+    
     @staticmethod
     def log(usuario_id, acao, tabela=None, registro_id=None, dados=None, ip_address=None, user_agent=None):
-        """Create audit log entry"""
+        """Create audit log entry (queued for the background writer when enabled)"""
+        from app.utils.audit_coalescer import audit_coalescer
+        from app.utils.audit_writer import audit_writer
         log_entry = LogAuditoria(
             usuario_id=usuario_id,
             acao=acao,
             tabela=tabela,
             registro_id=registro_id,
             ip_address=ip_address,
-            user_agent=user_agent
+            user_agent=user_agent,
+            data_hora=datetime.utcnow()
         )
         if dados:
             log_entry.dados = dados
+        row = log_entry.to_row()
+        if audit_coalescer.submit(row) or audit_writer.submit(row):
+            return log_entry
         db.session.add(log_entry)
         db.session.commit()
         return log_entry
     
     def __repr__(self):
         return f'<LogAuditoria {self.acao} by user:{self.usuario_id} at {self.data_hora}>'
+
+
+class ArquivoAuditoria(db.Model):
+    """Catalog of audit log months moved out of log_auditoria into compressed JSONL files"""
+    __tablename__ = 'log_auditoria_arquivos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.Date, nullable=False, index=True)  # First day of the archived month
+    caminho = db.Column(db.String(255), nullable=False, unique=True)  # Relative to AUDIT_ARCHIVE_DIR
+    total_registros = db.Column(db.Integer, nullable=False, default=0)
+    id_min = db.Column(db.BigInteger)
+    id_max = db.Column(db.BigInteger)
+    data_inicio = db.Column(db.DateTime)  # Oldest data_hora in the file
+    data_fim = db.Column(db.DateTime)  # Newest data_hora in the file
+    tamanho_bytes = db.Column(db.BigInteger)
+    hash_arquivo = db.Column(db.String(64))  # SHA-256 of the compressed file
+    data_arquivamento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('idx_audit_arquivo_periodo', 'data_inicio', 'data_fim'),
+    )
+    
+    def __repr__(self):
+        return f'<ArquivoAuditoria {self.mes:%Y-%m} ({self.total_registros} registros)>'
+
+
+class ResumoAuditoriaHora(db.Model):
+    """Hourly count of audit log entries per action, user and table"""
+    __tablename__ = 'log_auditoria_resumo_hora'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    periodo = db.Column(db.DateTime, nullable=False)  # Start of the hour
+    acao = db.Column(db.String(50), nullable=False)
+    usuario_id = db.Column(db.Integer)
+    tabela = db.Column(db.String(50))
+    total = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('idx_resumo_hora_periodo', 'periodo', 'acao'),
+    )
+
+
+class ResumoAuditoriaDia(db.Model):
+    """Daily count of audit log entries per action, user and table"""
+    __tablename__ = 'log_auditoria_resumo_dia'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    periodo = db.Column(db.DateTime, nullable=False)  # Start of the day
+    acao = db.Column(db.String(50), nullable=False)
+    usuario_id = db.Column(db.Integer)
+    tabela = db.Column(db.String(50))
+    total = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('idx_resumo_dia_periodo', 'periodo', 'acao'),
+    )
+
+
+class MarcadorResumoAuditoria(db.Model):
+    """Watermark of the audit rollups (single row)"""
+    __tablename__ = 'log_auditoria_resumo_marcador'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    inicio = db.Column(db.DateTime, nullable=False)  # First hour covered by the rollups
+    hora_fechada = db.Column(db.DateTime, nullable=False)  # Rollups are complete before this hour
+    ultimo_id = db.Column(db.BigInteger, nullable=False, default=0)  # Last log id rolled up
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
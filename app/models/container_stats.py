@@ -0,0 +1,210 @@
+"""
+Document counters of categories and folders
+
+Each category and folder stores the number and total size of its active
+documents (total_documentos, total_bytes) and of the active documents in
+its whole subtree (total_documentos_subarvore, total_bytes_subarvore).
+Session events turn every flush that inserts, moves, deletes or restores
+documents, or moves a category or folder, into one batched UPDATE per
+table in the same transaction. Bulk statements bypass them and apply
+their own deltas (see DocumentService.bulk_move_documents);
+ContainerStatsService.reconcile() repairs any drift.
+"""
+from sqlalchemy import event, select, update, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.orm.util import identity_key
+from app.models.hierarchy import ancestor_ids
+
+STATS_COLUMNS = ('total_documentos', 'total_bytes', 'total_documentos_subarvore', 'total_bytes_subarvore')
+DOCUMENT_ATTRIBUTES = ('status', 'tamanho_bytes')
+
+
+def _old_value(instance, attribute):
+    """Value an attribute had before the flush"""
+    history = get_history(instance, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return getattr(instance, attribute)
+
+
+def apply_stats_deltas(connection, model, deltas):
+    """
+    Add counter deltas to categories or folders and their ancestors.
+    
+    Args:
+        connection: Connection of the running transaction
+        model: Categoria or Pasta
+        deltas: {node_id: [documentos, bytes]} changes of direct counts
+        
+    Returns:
+        IDs of the rows updated
+    """
+    table = model.__table__
+    deltas = {node_id: delta for node_id, delta in deltas.items() if node_id is not None and any(delta)}
+    if not deltas:
+        return []
+    
+    paths = dict(connection.execute(
+        select(table.c.id, table.c.caminho_ids).where(table.c.id.in_(list(deltas)))
+    ).all())
+    
+    changes = {}
+    for node_id, (documentos, tamanho) in deltas.items():
+        if node_id not in paths:
+            continue
+        change = changes.setdefault(node_id, [0, 0, 0, 0])
+        change[0] += documentos
+        change[1] += tamanho
+        for subtree_id in ancestor_ids(paths[node_id]) + [node_id]:
+            change = changes.setdefault(subtree_id, [0, 0, 0, 0])
+            change[2] += documentos
+            change[3] += tamanho
+    
+    add_to_counters(connection, table, changes)
+    return list(changes)
+
+
+def add_to_counters(connection, table, changes):
+    """
+    Add increments to the counters of several rows in one executemany UPDATE.
+    
+    Args:
+        connection: Connection of the running transaction
+        table: categorias or pastas table
+        changes: {node_id: [documentos, bytes, documentos subarvore, bytes subarvore]}
+    """
+    if not changes:
+        return
+    connection.execute(
+        update(table).where(table.c.id == bindparam('node_id')).values({
+            column: table.c[column] + bindparam(f'delta_{column}')
+            for column in STATS_COLUMNS
+        }),
+        [
+            dict({'node_id': node_id}, **{f'delta_{column}': value for column, value in zip(STATS_COLUMNS, change)})
+            for node_id, change in changes.items()
+        ]
+    )
+
+
+def expire_counters(session, touched):
+    """
+    Make loaded categories/folders reload their counters on next access.
+    
+    Args:
+        session: Session holding the nodes
+        touched: Iterable of (model, node_id) whose counters changed
+    """
+    for model, node_id in touched:
+        node = session.identity_map.get(identity_key(model, node_id))
+        if node is not None:
+            session.expire(node, list(STATS_COLUMNS))
+
+
+def register_container_stats(document_model, containers):
+    """
+    Maintain the document counters of the containers of a document model.
+    
+    Args:
+        document_model: Mapped document class with status and tamanho_bytes
+        containers: {foreign key attribute: container model}, e.g.
+            {'categoria_id': Categoria, 'pasta_id': Pasta}
+    """
+    attributes = DOCUMENT_ATTRIBUTES + tuple(containers)
+    
+    # The previous value must be known when an expired attribute is
+    # assigned, otherwise the old container cannot be decremented
+    for attribute in attributes:
+        event.listen(getattr(document_model, attribute), 'set', lambda *args: None, active_history=True)
+    
+    def contribution(categoria_or_pasta_id, status, tamanho):
+        if categoria_or_pasta_id is None or status != 'ativo':
+            return None
+        return categoria_or_pasta_id, tamanho or 0
+    
+    @event.listens_for(Session, 'before_flush')
+    def load_deleted_documents(session, flush_context, instances):
+        # Deleted rows cannot be read once flushed; load their columns now
+        for instance in session.deleted:
+            if isinstance(instance, document_model):
+                getattr(instance, 'status')
+    
+    @event.listens_for(Session, 'after_flush')
+    def update_counters(session, flush_context):
+        connection = session.connection()
+        touched = []
+        
+        # Moved categories/folders carry their subtree totals to their new ancestors
+        for model in set(containers.values()):
+            moves = [
+                (node, get_history(node, 'caminho_ids'))
+                for node in session.dirty
+                if isinstance(node, model)
+            ]
+            moves = [(node, history) for node, history in moves if history.deleted and history.deleted[0] is not None]
+            if not moves:
+                continue
+            table = model.__table__
+            totals = {
+                row.id: row for row in connection.execute(
+                    select(table.c.id, table.c.total_documentos_subarvore, table.c.total_bytes_subarvore).where(
+                        table.c.id.in_([node.id for node, _ in moves])
+                    )
+                )
+            }
+            changes = {}
+            for node, history in moves:
+                old_ancestors = set(ancestor_ids(history.deleted[0]))
+                new_ancestors = set(ancestor_ids(node.caminho_ids))
+                row = totals.get(node.id)
+                if row is None or not (row.total_documentos_subarvore or row.total_bytes_subarvore):
+                    continue
+                for sign, ancestors in ((-1, old_ancestors - new_ancestors), (1, new_ancestors - old_ancestors)):
+                    for ancestor_id in ancestors:
+                        change = changes.setdefault(ancestor_id, [0, 0, 0, 0])
+                        change[2] += sign * row.total_documentos_subarvore
+                        change[3] += sign * row.total_bytes_subarvore
+            add_to_counters(connection, table, changes)
+            touched.extend((model, node_id) for node_id in changes)
+        
+        # Documents added, changed or removed in this flush
+        deltas = {model: {} for model in containers.values()}
+        
+        def add(attribute, state, sign):
+            if state is None:
+                return
+            node_id, tamanho = state
+            delta = deltas[containers[attribute]].setdefault(node_id, [0, 0])
+            delta[0] += sign
+            delta[1] += sign * tamanho
+        
+        for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+            if not isinstance(instance, document_model):
+                continue
+            is_new = instance in session.new
+            is_deleted = instance in session.deleted
+            if not (is_new or is_deleted or any(get_history(instance, a).has_changes() for a in attributes)):
+                continue
+            for attribute in containers:
+                if not is_new:
+                    add(attribute, contribution(
+                        _old_value(instance, attribute), _old_value(instance, 'status'), _old_value(instance, 'tamanho_bytes')
+                    ), -1)
+                if not is_deleted:
+                    add(attribute, contribution(
+                        getattr(instance, attribute), instance.status, instance.tamanho_bytes
+                    ), 1)
+        
+        for model, model_deltas in deltas.items():
+            touched.extend((model, node_id) for node_id in apply_stats_deltas(connection, model, model_deltas))
+        
+        if touched:
+            session.info.setdefault('container_stats_touched', set()).update(touched)
+    
+    @event.listens_for(Session, 'after_flush_postexec')
+    def expire_touched_counters(session, flush_context):
+        # Loaded categories/folders reload their counters on next access
+        expire_counters(session, session.info.pop('container_stats_touched', ()))
@@ -3,6 +3,8 @@ Document-related models
 """
 from datetime import datetime
 from app import db
+from app.models.hierarchy import ancestor_ids, register_hierarchy
+from app.models.container_stats import register_container_stats
 
 
 # Association table for many-to-many relationship between documents and tags
@@ -58,6 +60,22 @@ class Favorito(db.Model):
         return f'<Favorito user:{self.usuario_id} doc:{self.documento_id}>'
 
 
+def _ancestor_names(model, node, parent_relationship):
+    """Names of a category's or folder's ancestors, root first"""
+    if node.caminho_ids is None:
+        # Not flushed yet: follow the parent relationship
+        parent = getattr(node, parent_relationship)
+        if parent is None:
+            return []
+        return _ancestor_names(model, parent, parent_relationship) + [parent.nome]
+    
+    ids = ancestor_ids(node.caminho_ids)
+    if not ids:
+        return []
+    names = dict(db.session.query(model.id, model.nome).filter(model.id.in_(ids)))
+    return [names[ancestor_id] for ancestor_id in ids if ancestor_id in names]
+
+
 class Categoria(db.Model):
     """Category model with hierarchical structure"""
     __tablename__ = 'categorias'
@@ -70,6 +88,14 @@ class Categoria(db.Model):
     cor = db.Column(db.String(7))  # Hex color code
     ordem = db.Column(db.Integer, default=0)
     ativo = db.Column(db.Boolean, default=True, nullable=False)
+    caminho_ids = db.Column(db.String(450), index=True)  # Ancestor IDs, '/1/5/' (see app.models.hierarchy)
+    nivel = db.Column(db.Integer, default=0, nullable=False)  # Depth, 0 = root
+    
+    # Active documents, directly and in the whole subtree (see app.models.container_stats)
+    total_documentos = db.Column(db.Integer, default=0, nullable=False)
+    total_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+    total_documentos_subarvore = db.Column(db.Integer, default=0, nullable=False)
+    total_bytes_subarvore = db.Column(db.BigInteger, default=0, nullable=False)
     
     # Self-referential relationship for hierarchy
     subcategorias = db.relationship('Categoria', backref=db.backref('categoria_pai', remote_side=[id]), lazy='dynamic')
@@ -79,10 +105,8 @@ class Categoria(db.Model):
     
     @property
     def caminho_completo(self):
-        """Get full hierarchical path of category"""
-        if self.categoria_pai:
-            return f"{self.categoria_pai.caminho_completo} > {self.nome}"
-        return self.nome
+        """Get full hierarchical path of category (one query for all ancestors)"""
+        return ' > '.join(_ancestor_names(Categoria, self, 'categoria_pai') + [self.nome])
     
     def __repr__(self):
         return f'<Categoria {self.nome}>'
@@ -100,6 +124,14 @@ class Pasta(db.Model):
     cor = db.Column(db.String(7))  # Hex color code
     ordem = db.Column(db.Integer, default=0)
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    caminho_ids = db.Column(db.String(450), index=True)  # Ancestor IDs, '/1/5/' (see app.models.hierarchy)
+    nivel = db.Column(db.Integer, default=0, nullable=False)  # Depth, 0 = root
+    
+    # Active documents, directly and in the whole subtree (see app.models.container_stats)
+    total_documentos = db.Column(db.Integer, default=0, nullable=False)
+    total_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+    total_documentos_subarvore = db.Column(db.Integer, default=0, nullable=False)
+    total_bytes_subarvore = db.Column(db.BigInteger, default=0, nullable=False)
     
     # Self-referential relationship for hierarchy
     subpastas = db.relationship('Pasta', backref=db.backref('pasta_pai', remote_side=[id]), lazy='dynamic')
@@ -109,17 +141,8 @@ class Pasta(db.Model):
     
     @property
     def caminho_completo(self):
-        """Get full hierarchical path of folder"""
-        if self.pasta_pai:
-            return f"{self.pasta_pai.caminho_completo}/{self.nome}"
-        return self.nome
-    
-    @property
-    def nivel(self):
-        """Get depth level in hierarchy"""
-        if self.pasta_pai:
-            return self.pasta_pai.nivel + 1
-        return 0
+        """Get full hierarchical path of folder (one query for all ancestors)"""
+        return '/'.join(_ancestor_names(Pasta, self, 'pasta_pai') + [self.nome])
     
     def __repr__(self):
         return f'<Pasta {self.nome}>'
@@ -207,3 +230,11 @@ class Documento(db.Model):
     
     def __repr__(self):
         return f'<Documento {self.nome}>'
+
+
+# Keep caminho_ids and nivel in sync with the parent columns
+register_hierarchy(Categoria, 'categoria_pai_id')
+register_hierarchy(Pasta, 'pasta_pai_id')
+
+# Keep the document counters of categories and folders in sync
+register_container_stats(Documento, {'categoria_id': Categoria, 'pasta_id': Pasta})
@@ -0,0 +1,40 @@
+"""
+User group models
+"""
+from datetime import datetime
+from app import db
+
+
+class Grupo(db.Model):
+    """User group, used as a grantee for document sharing"""
+    __tablename__ = 'grupos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), unique=True, nullable=False)
+    descricao = db.Column(db.Text)
+    ativo = db.Column(db.Boolean, default=True, nullable=False)
+    criado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Relationships
+    membros = db.relationship('GrupoUsuario', backref='grupo', lazy='dynamic', cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<Grupo {self.nome}>'
+
+
+class GrupoUsuario(db.Model):
+    """Group membership"""
+    __tablename__ = 'grupo_usuarios'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    grupo_id = db.Column(db.Integer, db.ForeignKey('grupos.id', ondelete='CASCADE'), nullable=False, index=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    data_adicao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('grupo_id', 'usuario_id', name='uq_grupo_usuario'),
+    )
+    
+    def __repr__(self):
+        return f'<GrupoUsuario grupo:{self.grupo_id} user:{self.usuario_id}>'
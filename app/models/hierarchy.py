@@ -0,0 +1,130 @@
+"""
+Materialized path for self-referential hierarchies (categorias and pastas)
+
+Each node stores in caminho_ids the IDs of its ancestors from the root, as
+'/1/5/' (a root node stores '/'), and its depth in nivel. The subtree of a
+node is every row whose caminho_ids starts with its subtree_prefix, which
+the index on caminho_ids serves as a range scan; its ancestors are parsed
+from the path. The columns are maintained by mapper events on insert and
+on parent change, so every write through the ORM keeps them right (bulk
+UPDATEs of the parent column bypass them).
+"""
+from typing import List, Optional
+from sqlalchemy import event, select, update, bindparam
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import get_history, set_committed_value
+
+ROOT_PATH = '/'
+
+
+def subtree_prefix(caminho_ids: str, node_id: int) -> str:
+    """
+    Path prefix shared by all descendants of a node.
+    
+    Args:
+        caminho_ids: The node's own caminho_ids
+        node_id: The node's ID
+        
+    Returns:
+        Prefix to match with LIKE 'prefix%'
+    """
+    return f'{caminho_ids}{node_id}/'
+
+
+def ancestor_ids(caminho_ids: Optional[str]) -> List[int]:
+    """
+    Ancestor IDs encoded in a path, root first.
+    
+    Args:
+        caminho_ids: Path such as '/1/5/'
+        
+    Returns:
+        List of IDs (empty for a root node)
+    """
+    return [int(part) for part in (caminho_ids or '').split('/') if part]
+
+
+def register_hierarchy(model, parent_attr: str):
+    """
+    Maintain caminho_ids and nivel of a self-referential model.
+    
+    Args:
+        model: Mapped class with caminho_ids and nivel columns
+        parent_attr: Name of the column holding the parent ID
+    """
+    table = model.__table__
+    
+    def parent_path(connection, target) -> tuple:
+        """(caminho_ids, nivel) a node gets under its current parent"""
+        parent_id = getattr(target, parent_attr)
+        if parent_id is None:
+            return ROOT_PATH, 0
+        
+        # Prefer the parent object in the session (it may have been
+        # inserted in this same flush); otherwise read its path
+        session = object_session(target)
+        parent = session.identity_map.get(identity_key(model, parent_id)) if session else None
+        if parent is not None and parent.caminho_ids is not None:
+            return subtree_prefix(parent.caminho_ids, parent_id), parent.nivel + 1
+        
+        row = connection.execute(
+            select(table.c.caminho_ids, table.c.nivel).where(table.c.id == parent_id)
+        ).first()
+        if row is None or row.caminho_ids is None:
+            return ROOT_PATH, 0
+        return subtree_prefix(row.caminho_ids, parent_id), row.nivel + 1
+    
+    @event.listens_for(model, 'before_insert')
+    def set_path(mapper, connection, target):
+        target.caminho_ids, target.nivel = parent_path(connection, target)
+    
+    @event.listens_for(model, 'before_update')
+    def move_subtree(mapper, connection, target):
+        if not get_history(target, parent_attr).has_changes() and target.caminho_ids is not None:
+            return
+        
+        old_prefix = subtree_prefix(target.caminho_ids, target.id) if target.caminho_ids is not None else None
+        caminho_ids, nivel = parent_path(connection, target)
+        if old_prefix is not None and caminho_ids.startswith(old_prefix):
+            # The services reject moves below a descendant; never write a cycle
+            raise ValueError(f'{model.__name__} {target.id} cannot be moved below its own descendant')
+        delta = nivel - (target.nivel or 0)
+        target.caminho_ids, target.nivel = caminho_ids, nivel
+        if old_prefix is None:
+            return
+        
+        # Rewrite the paths of the whole subtree (one read, one batched update)
+        new_prefix = subtree_prefix(caminho_ids, target.id)
+        descendants = connection.execute(
+            select(table.c.id, table.c.caminho_ids, table.c.nivel).where(
+                table.c.caminho_ids.like(f'{old_prefix}%')
+            )
+        ).all()
+        if not descendants:
+            return
+        
+        changes = [
+            {
+                'node_id': row.id,
+                'novo_caminho': new_prefix + row.caminho_ids[len(old_prefix):],
+                'novo_nivel': row.nivel + delta
+            }
+            for row in descendants
+        ]
+        connection.execute(
+            update(table).where(table.c.id == bindparam('node_id')).values(
+                caminho_ids=bindparam('novo_caminho'),
+                nivel=bindparam('novo_nivel')
+            ),
+            changes
+        )
+        
+        # Loaded descendants would keep their old path until expired
+        session = object_session(target)
+        if session is not None:
+            for change in changes:
+                node = session.identity_map.get(identity_key(model, change['node_id']))
+                if node is not None:
+                    set_committed_value(node, 'caminho_ids', change['novo_caminho'])
+                    set_committed_value(node, 'nivel', change['novo_nivel'])
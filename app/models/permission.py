@@ -23,6 +23,7 @@ class Permissao(db.Model):
     __table_args__ = (
         db.UniqueConstraint('documento_id', 'usuario_id', 'tipo_permissao', name='uq_documento_usuario_permissao'),
         db.Index('idx_permissao_documento_usuario', 'documento_id', 'usuario_id'),
+        db.Index('idx_permissao_expiracao', 'data_expiracao'),
     )
     
     def is_expired(self):
@@ -33,3 +34,125 @@ class Permissao(db.Model):
     
     def __repr__(self):
         return f'<Permissao doc:{self.documento_id} user:{self.usuario_id} tipo:{self.tipo_permissao}>'
+
+
+class PermissaoPasta(db.Model):
+    """Folder permission model, inherited by documents in the folder and its subfolders"""
+    __tablename__ = 'permissoes_pastas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    pasta_id = db.Column(db.Integer, db.ForeignKey('pastas.id', ondelete='CASCADE'), nullable=False, index=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    tipo_permissao = db.Column(db.String(20), nullable=False)  # visualizar, editar, excluir, compartilhar
+    data_concessao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    concedido_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    data_expiracao = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.UniqueConstraint('pasta_id', 'usuario_id', 'tipo_permissao', name='uq_pasta_usuario_permissao'),
+        db.Index('idx_permissao_pasta_expiracao', 'data_expiracao'),
+    )
+    
+    def is_expired(self):
+        """Check if permission has expired"""
+        if self.data_expiracao:
+            return self.data_expiracao < datetime.utcnow()
+        return False
+    
+    def __repr__(self):
+        return f'<PermissaoPasta pasta:{self.pasta_id} user:{self.usuario_id} tipo:{self.tipo_permissao}>'
+
+
+class PermissaoCategoria(db.Model):
+    """Category permission model, inherited by documents in the category and its subcategories"""
+    __tablename__ = 'permissoes_categorias'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categorias.id', ondelete='CASCADE'), nullable=False, index=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    tipo_permissao = db.Column(db.String(20), nullable=False)  # visualizar, editar, excluir, compartilhar
+    data_concessao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    concedido_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    data_expiracao = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.UniqueConstraint('categoria_id', 'usuario_id', 'tipo_permissao', name='uq_categoria_usuario_permissao'),
+        db.Index('idx_permissao_categoria_expiracao', 'data_expiracao'),
+    )
+    
+    def is_expired(self):
+        """Check if permission has expired"""
+        if self.data_expiracao:
+            return self.data_expiracao < datetime.utcnow()
+        return False
+    
+    def __repr__(self):
+        return f'<PermissaoCategoria categoria:{self.categoria_id} user:{self.usuario_id} tipo:{self.tipo_permissao}>'
+
+
+class PermissaoEfetiva(db.Model):
+    """
+    Materialized inherited permission of a user on a document.
+    
+    One row per document for every folder/category grant that reaches it
+    (origem/origem_id identify the grant's container). Rows are maintained
+    by PermissionService when grants change or documents/folders/categories
+    move, so permission checks never walk the folder or category tree.
+    """
+    __tablename__ = 'permissoes_efetivas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey('documentos.id', ondelete='CASCADE'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    tipo_permissao = db.Column(db.String(20), nullable=False)
+    data_expiracao = db.Column(db.DateTime)
+    origem = db.Column(db.String(20), nullable=False)  # pasta, categoria
+    origem_id = db.Column(db.Integer, nullable=False)
+    
+    __table_args__ = (
+        db.Index('idx_permissao_efetiva_documento_usuario', 'documento_id', 'usuario_id'),
+        db.Index('idx_permissao_efetiva_origem', 'origem', 'origem_id', 'usuario_id'),
+        db.Index('idx_permissao_efetiva_expiracao', 'data_expiracao'),
+    )
+    
+    def __repr__(self):
+        return f'<PermissaoEfetiva doc:{self.documento_id} user:{self.usuario_id} tipo:{self.tipo_permissao} via {self.origem}:{self.origem_id}>'
+
+
+class PermissaoGrupo(db.Model):
+    """
+    Document permission granted to a group or to every user of a profile.
+    
+    Exactly one of grupo_id and perfil_id is set. Grants are resolved against
+    the user's (cached) memberships, so adding someone to a group never
+    writes permission rows.
+    """
+    __tablename__ = 'permissoes_grupos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey('documentos.id', ondelete='CASCADE'), nullable=False, index=True)
+    grupo_id = db.Column(db.Integer, db.ForeignKey('grupos.id', ondelete='CASCADE'), index=True)
+    perfil_id = db.Column(db.Integer, db.ForeignKey('perfis.id'), index=True)
+    tipo_permissao = db.Column(db.String(20), nullable=False)  # visualizar, editar, excluir, compartilhar
+    data_concessao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    concedido_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    data_expiracao = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.CheckConstraint(
+            '(grupo_id IS NULL AND perfil_id IS NOT NULL) OR (grupo_id IS NOT NULL AND perfil_id IS NULL)',
+            name='ck_permissao_grupo_destinatario'
+        ),
+        db.UniqueConstraint('documento_id', 'grupo_id', 'perfil_id', 'tipo_permissao', name='uq_documento_grupo_perfil_permissao'),
+        db.Index('idx_permissao_grupo_expiracao', 'data_expiracao'),
+    )
+    
+    def is_expired(self):
+        """Check if permission has expired"""
+        if self.data_expiracao:
+            return self.data_expiracao < datetime.utcnow()
+        return False
+    
+    def __repr__(self):
+        grantee = f'grupo:{self.grupo_id}' if self.grupo_id else f'perfil:{self.perfil_id}'
+        return f'<PermissaoGrupo doc:{self.documento_id} {grantee} tipo:{self.tipo_permissao}>'
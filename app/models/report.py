@@ -0,0 +1,88 @@
+"""
+Report job model
+"""
+from datetime import datetime
+from app import db
+import json
+
+
+class RelatorioJob(db.Model):
+    """
+    Report generated in the background (see ReportJobService).
+    
+    Jobs with the same chave (hash of tipo and parametros) share one
+    result until it expires, so identical requests run a single
+    generation.
+    """
+    __tablename__ = 'relatorio_jobs'
+    
+    STATUS_PENDENTE = 'pendente'
+    STATUS_EXECUTANDO = 'executando'
+    STATUS_CONCLUIDO = 'concluido'
+    STATUS_ERRO = 'erro'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    tipo = db.Column(db.String(50), nullable=False)  # usage, access, storage, audit_*
+    chave = db.Column(db.String(64), nullable=False)  # sha256 of tipo + parametros
+    parametros_json = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDENTE)
+    progresso = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    etapa = db.Column(db.String(100))  # Step being executed
+    erro = db.Column(db.Text)
+    formatos = db.Column(db.String(50))  # Comma-separated result formats (json, csv)
+    solicitado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    data_inicio = db.Column(db.DateTime)
+    data_conclusao = db.Column(db.DateTime)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Last progress update
+    expira_em = db.Column(db.DateTime)  # Result is deleted after this
+    
+    # Relationships
+    usuario = db.relationship('User')
+    
+    __table_args__ = (
+        db.Index('idx_relatorio_jobs_chave', 'chave', 'status'),
+        # At most one queued or running job per chave, across processes
+        db.Index(
+            'uq_relatorio_jobs_chave_ativa', 'chave', unique=True,
+            mssql_where=db.text("status IN ('pendente', 'executando')"),
+            sqlite_where=db.text("status IN ('pendente', 'executando')")
+        ),
+        db.Index('idx_relatorio_jobs_expira', 'expira_em'),
+    )
+    
+    @property
+    def parametros(self):
+        """Get report parameters as dict"""
+        return json.loads(self.parametros_json) if self.parametros_json else {}
+    
+    @parametros.setter
+    def parametros(self, data_dict):
+        """Set report parameters from dict"""
+        self.parametros_json = json.dumps(data_dict, sort_keys=True) if data_dict else None
+    
+    @property
+    def ativo(self):
+        """True while the job is queued or running"""
+        return self.status in (self.STATUS_PENDENTE, self.STATUS_EXECUTANDO)
+    
+    def to_dict(self):
+        """Convert job status to dictionary"""
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'parametros': self.parametros,
+            'status': self.status,
+            'progresso': self.progresso,
+            'etapa': self.etapa,
+            'erro': self.erro,
+            'formatos': self.formatos.split(',') if self.formatos else [],
+            'solicitado_por': self.solicitado_por,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
+            'data_inicio': self.data_inicio.isoformat() if self.data_inicio else None,
+            'data_conclusao': self.data_conclusao.isoformat() if self.data_conclusao else None,
+            'expira_em': self.expira_em.isoformat() if self.expira_em else None
+        }
+    
+    def __repr__(self):
+        return f'<RelatorioJob {self.id} {self.tipo} {self.status}>'
@@ -14,6 +14,7 @@ class Versao(db.Model):
     numero_versao = db.Column(db.Integer, nullable=False)
     caminho_arquivo = db.Column(db.String(500), nullable=False)
     tamanho_bytes = db.Column(db.BigInteger, nullable=False)
+    hash_arquivo = db.Column(db.String(64), index=True)  # SHA256 of the referenced blob
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     comentario = db.Column(db.Text, nullable=False)
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
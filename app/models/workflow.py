@@ -2,6 +2,8 @@
 Workflow-related models
 """
 from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.orm.attributes import get_history
 from app import db
 import json
 
@@ -15,6 +17,7 @@ class Workflow(db.Model):
     descricao = db.Column(db.Text)
     configuracao_json = db.Column(db.Text, nullable=False)  # JSON with workflow stages and approvers
     ativo = db.Column(db.Boolean, default=True, nullable=False)
+    versao = db.Column(db.Integer, default=1, nullable=False)  # Bumped when configuracao_json changes
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     criado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
     
@@ -32,10 +35,62 @@ class Workflow(db.Model):
         """Set workflow configuration from dict"""
         self.configuracao_json = json.dumps(config_dict)
     
+    @property
+    def definicao(self):
+        """Compiled configuration (stages, approvers, flags), cached per version"""
+        from app.utils.workflow_definitions import workflow_definitions
+        return workflow_definitions.get(self)
+    
     def __repr__(self):
         return f'<Workflow {self.nome}>'
 
 
+class WorkflowEstagioAprovador(db.Model):
+    """
+    Approver of a workflow stage, normalized from Workflow.configuracao
+    
+    Rows are rewritten by mapper events whenever a workflow is inserted or
+    its configuration changes; joined on (workflow_id, estagio_atual) they
+    give the current approvers of pending approvals.
+    """
+    __tablename__ = 'workflow_stage_approvers'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    workflow_id = db.Column(db.Integer, db.ForeignKey('workflows.id', ondelete='CASCADE'), nullable=False)
+    estagio = db.Column(db.Integer, nullable=False)  # 1-based, like AprovacaoDocumento.estagio_atual
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('workflow_id', 'estagio', 'usuario_id', name='uq_workflow_estagio_aprovador'),
+        db.Index('idx_workflow_stage_approvers_usuario', 'usuario_id', 'workflow_id', 'estagio'),
+    )
+    
+    def __repr__(self):
+        return f'<WorkflowEstagioAprovador workflow:{self.workflow_id} estagio:{self.estagio} usuario:{self.usuario_id}>'
+
+
+def stage_approver_rows(workflow_id, configuracao):
+    """
+    Rows of workflow_stage_approvers for a workflow configuration
+    
+    Args:
+        workflow_id: Workflow ID
+        configuracao: Configuration dict ({'stages': [{'approvers': [...]}, ...]})
+        
+    Returns:
+        List of dicts with workflow_id, estagio and usuario_id
+    """
+    rows = []
+    stages = configuracao.get('stages') if isinstance(configuracao, dict) else None
+    for estagio, stage in enumerate(stages if isinstance(stages, list) else [], start=1):
+        approvers = stage.get('approvers') if isinstance(stage, dict) else None
+        for usuario_id in dict.fromkeys(approvers if isinstance(approvers, list) else []):
+            # Only integer IDs ever matched a user
+            if isinstance(usuario_id, int) and not isinstance(usuario_id, bool):
+                rows.append({'workflow_id': workflow_id, 'estagio': estagio, 'usuario_id': usuario_id})
+    return rows
+
+
 class AprovacaoDocumento(db.Model):
     """Document approval instance model"""
     __tablename__ = 'aprovacao_documentos'
@@ -49,6 +104,11 @@ class AprovacaoDocumento(db.Model):
     data_submissao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     data_conclusao = db.Column(db.DateTime)
     
+    __table_args__ = (
+        # Pending approvals by workflow stage, joined to workflow_stage_approvers
+        db.Index('idx_aprovacao_documentos_estagio', 'status', 'workflow_id', 'estagio_atual'),
+    )
+    
     # Relationships
     submissor = db.relationship('User', foreign_keys=[submetido_por], backref='aprovacoes_submetidas')
     historico = db.relationship('HistoricoAprovacao', backref='aprovacao', lazy='dynamic', cascade='all, delete-orphan', order_by='HistoricoAprovacao.data_acao')
@@ -80,3 +140,42 @@ class HistoricoAprovacao(db.Model):
     
     def __repr__(self):
         return f'<HistoricoAprovacao aprovacao:{self.aprovacao_id} acao:{self.acao}>'
+
+
+@event.listens_for(Workflow, 'before_update')
+def _bump_version(mapper, connection, target):
+    """
+    New configuration, new version (cached definitions are keyed by it).
+    
+    Incremented in SQL, so concurrent edits each get their own version
+    instead of both writing the one they read.
+    """
+    if get_history(target, 'configuracao_json').has_changes():
+        target.versao = Workflow.versao + 1
+
+
+@event.listens_for(Workflow, 'after_insert')
+@event.listens_for(Workflow, 'after_update')
+def _sync_stage_approvers(mapper, connection, target):
+    """Rewrite the normalized stage approvers when the configuration changes"""
+    if not get_history(target, 'configuracao_json').has_changes():
+        return
+    try:
+        configuracao = target.configuracao
+    except ValueError:
+        configuracao = {}
+    table = WorkflowEstagioAprovador.__table__
+    connection.execute(table.delete().where(table.c.workflow_id == target.id))
+    rows = stage_approver_rows(target.id, configuracao)
+    if not rows:
+        return
+    
+    # Approvers that are not users can never approve; skip them like the migration
+    from app.models.user import User
+    users = User.__table__
+    user_ids = {row[0] for row in connection.execute(
+        select(users.c.id).where(users.c.id.in_(sorted({row['usuario_id'] for row in rows})))
+    )}
+    rows = [row for row in rows if row['usuario_id'] in user_ids]
+    if rows:
+        connection.execute(table.insert(), rows)
@@ -4,8 +4,11 @@ Repository layer for data access
 from app.repositories.base_repository import BaseRepository
 from app.repositories.user_repository import UserRepository, PerfilRepository, PasswordResetRepository
 from app.repositories.document_repository import DocumentRepository, TagRepository
+from app.repositories.version_repository import VersionRepository
 from app.repositories.category_repository import CategoryRepository, FolderRepository
 from app.repositories.audit_repository import AuditRepository
+from app.repositories.audit_archive_repository import AuditArchiveRepository
+from app.repositories.report_job_repository import ReportJobRepository
 from app.repositories.permission_repository import PermissionRepository
 from app.repositories.workflow_repository import WorkflowRepository, AprovacaoDocumentoRepository, HistoricoAprovacaoRepository
 
@@ -16,9 +19,12 @@ __all__ = [
     'PasswordResetRepository',
     'DocumentRepository',
     'TagRepository',
+    'VersionRepository',
     'CategoryRepository',
     'FolderRepository',
     'AuditRepository',
+    'AuditArchiveRepository',
+    'ReportJobRepository',
     'PermissionRepository',
     'WorkflowRepository',
     'AprovacaoDocumentoRepository',
@@ -0,0 +1,261 @@
+"""
+Audit archive repository for reading archived audit log months
+"""
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from typing import Optional, List, Dict, Any, Iterator, Tuple, Sequence
+from flask import current_app
+from app import db
+from app.repositories.base_repository import BaseRepository
+from app.models.audit import ArquivoAuditoria
+from app.models.user import User
+
+
+class ArchivedLog:
+    """
+    Read-only audit entry loaded from an archive file.
+    
+    Exposes the same attributes as LogAuditoria so routes and reports can
+    render live and archived entries alike. It is never attached to the
+    session, so it can not be written back by an autoflush.
+    """
+    
+    __slots__ = ('id', 'usuario_id', 'acao', 'tabela', 'registro_id', 'dados_json',
+                 'ip_address', 'user_agent', 'data_hora', 'ocorrencias', 'data_hora_fim')
+    
+    arquivado = True
+    
+    def __init__(self, row: Dict[str, Any]):
+        for name in self.__slots__:
+            setattr(self, name, row.get(name))
+        # Archives written before coalescing have no count
+        self.ocorrencias = self.ocorrencias or 1
+    
+    @property
+    def dados(self):
+        """Get additional data as dict"""
+        return json.loads(self.dados_json) if self.dados_json else {}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Column values, as read from log_auditoria"""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    @property
+    def usuario(self) -> Optional[User]:
+        """User who performed the action (identity-map lookup)"""
+        return db.session.get(User, self.usuario_id) if self.usuario_id else None
+    
+    def __repr__(self):
+        return f'<ArchivedLog {self.acao} by user:{self.usuario_id} at {self.data_hora}>'
+
+
+class AuditArchiveRepository(BaseRepository[ArquivoAuditoria]):
+    """
+    Repository for the audit archive catalog and its files.
+    
+    Each archive file holds one month of log_auditoria rows as gzip-compressed
+    JSON lines, newest first, so readers can stream it in the same order the
+    live table is queried.
+    """
+    
+    def __init__(self):
+        """Initialize AuditArchiveRepository with ArquivoAuditoria model."""
+        super().__init__(ArquivoAuditoria)
+    
+    @staticmethod
+    def archive_dir() -> str:
+        """Directory holding the archive files"""
+        return current_app.config['AUDIT_ARCHIVE_DIR']
+    
+    def file_path(self, arquivo: ArquivoAuditoria) -> str:
+        """Absolute path of an archive file"""
+        return os.path.join(self.archive_dir(), arquivo.caminho)
+    
+    def get_for_range(
+        self,
+        data_inicio: datetime,
+        data_fim: Optional[datetime] = None
+    ) -> List[ArquivoAuditoria]:
+        """
+        Get archives holding entries inside a date range, newest first.
+        
+        Args:
+            data_inicio: Start of the range
+            data_fim: Optional end of the range
+            
+        Returns:
+            List of ArquivoAuditoria instances
+        """
+        query = self.get_query().filter(ArquivoAuditoria.data_fim >= data_inicio)
+        if data_fim:
+            query = query.filter(ArquivoAuditoria.data_inicio <= data_fim)
+        return query.order_by(ArquivoAuditoria.mes.desc(), ArquivoAuditoria.id.desc()).all()
+    
+    def get_by_month(self, mes) -> List[ArquivoAuditoria]:
+        """Get every archive file of a month"""
+        return self.get_query().filter(ArquivoAuditoria.mes == mes).order_by(ArquivoAuditoria.id).all()
+    
+    def iter_entries(
+        self,
+        arquivos: List[ArquivoAuditoria],
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[ArchivedLog]:
+        """
+        Stream archived entries matching a date range and column filters.
+        
+        Args:
+            arquivos: Archives to read, in the order they should be yielded
+            data_inicio: Optional start date (inclusive)
+            data_fim: Optional end date (inclusive)
+            filters: Column-value pairs; a list, tuple or set value matches any
+                of its items
+                
+        Yields:
+            ArchivedLog instances, newest first within each archive
+        """
+        checks = [
+            (column, set(value) if isinstance(value, (list, tuple, set, frozenset)) else {value})
+            for column, value in (filters or {}).items()
+        ]
+        
+        for arquivo in arquivos:
+            path = self.file_path(arquivo)
+            if not os.path.exists(path):
+                current_app.logger.warning(f"Audit archive missing: {path}")
+                continue
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                for line in archive:
+                    row = self._parse_line(line)
+                    if data_fim and row['data_hora'] > data_fim:
+                        continue
+                    if data_inicio and row['data_hora'] < data_inicio:
+                        # Files are ordered newest first: nothing older matches
+                        break
+                    if any(row.get(column) not in values for column, values in checks):
+                        continue
+                    yield ArchivedLog(row)
+    
+    def read_slice(self, arquivo: ArquivoAuditoria, start: int, stop: int) -> List[ArchivedLog]:
+        """
+        Read entries [start, stop) of an archive file.
+        
+        Lines before start are skipped without being parsed.
+        
+        Args:
+            arquivo: Archive to read
+            start: Position of the first entry, newest first
+            stop: Position after the last entry
+            
+        Returns:
+            List of ArchivedLog instances
+        """
+        with gzip.open(self.file_path(arquivo), 'rt', encoding='utf-8') as archive:
+            return [ArchivedLog(self._parse_line(line)) for line in islice(archive, start, stop)]
+    
+    def page_entries(
+        self,
+        arquivos: List[ArquivoAuditoria],
+        skip: int,
+        limit: int,
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[ArchivedLog], int]:
+        """
+        Get one page of archived entries and the total match count in a single pass.
+        
+        Without column filters, an archive inside the date range matches all
+        of its total_registros: it is counted from the catalog and only opened
+        when the page falls in it. Other archives are scanned.
+        
+        Args:
+            arquivos: Archives to read, newest first
+            skip: Matching entries to skip
+            limit: Maximum entries to return
+            data_inicio: Optional start date
+            data_fim: Optional end date
+            filters: Column-value pairs (see iter_entries)
+            
+        Returns:
+            Tuple of (entries, total matching entries)
+        """
+        entries = []
+        total = 0
+        for arquivo in arquivos:
+            if filters or not self._inside_range(arquivo, data_inicio, data_fim):
+                for entry in self.iter_entries([arquivo], data_inicio, data_fim, filters):
+                    if skip <= total < skip + limit:
+                        entries.append(entry)
+                    total += 1
+                continue
+            
+            path = self.file_path(arquivo)
+            if not os.path.exists(path):
+                current_app.logger.warning(f"Audit archive missing: {path}")
+                continue
+            start = max(0, skip + len(entries) - total)
+            stop = min(arquivo.total_registros, skip + limit - total)
+            if start < stop:
+                entries.extend(self.read_slice(arquivo, start, stop))
+            total += arquivo.total_registros
+        return entries, total
+    
+    def count_by(
+        self,
+        arquivos: List[ArquivoAuditoria],
+        group_by: Sequence[str],
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        fim_exclusivo: bool = False
+    ) -> Counter:
+        """
+        Count archived entries grouped by dimensions.
+        
+        Args:
+            arquivos: Archives to read
+            group_by: Dimensions among 'acao', 'usuario_id', 'tabela' and 'dia'
+            data_inicio: Optional start date
+            data_fim: Optional end date
+            filters: Column-value pairs (see iter_entries)
+            fim_exclusivo: Exclude entries at exactly data_fim
+            
+        Returns:
+            Counter keyed by tuples of dimension values
+        """
+        counts = Counter()
+        for entry in self.iter_entries(arquivos, data_inicio, data_fim, filters):
+            if fim_exclusivo and entry.data_hora == data_fim:
+                continue
+            counts[tuple(
+                entry.data_hora.date() if dimension == 'dia' else getattr(entry, dimension)
+                for dimension in group_by
+            )] += entry.ocorrencias
+        return counts
+    
+    @staticmethod
+    def _inside_range(
+        arquivo: ArquivoAuditoria,
+        data_inicio: Optional[datetime],
+        data_fim: Optional[datetime]
+    ) -> bool:
+        """Whether every entry of an archive falls inside a date range"""
+        if arquivo.data_inicio is None or arquivo.data_fim is None:
+            return False
+        return ((data_inicio is None or arquivo.data_inicio >= data_inicio)
+                and (data_fim is None or arquivo.data_fim <= data_fim))
+    
+    @staticmethod
+    def _parse_line(line: str) -> Dict[str, Any]:
+        """Row dictionary of an archive line, with dates parsed"""
+        row = json.loads(line)
+        row['data_hora'] = datetime.fromisoformat(row['data_hora'])
+        if row.get('data_hora_fim'):
+            row['data_hora_fim'] = datetime.fromisoformat(row['data_hora_fim'])
+        return row
@@ -1,23 +1,120 @@
 """
 Audit repository for log queries
 """
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+import heapq
+import json
+from collections import Counter
+from itertools import dropwhile, islice
+from typing import Optional, List, Dict, Any, Iterator, Sequence, Callable
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, and_, or_, select
 from sqlalchemy.types import Date
 from app.repositories.base_repository import BaseRepository
+from app.repositories.audit_archive_repository import AuditArchiveRepository
+from app.repositories.audit_rollup_repository import AuditRollupRepository, apply_filters, ROLLUP_DIMENSIONS
 from app.models.audit import LogAuditoria
+from app.utils.retention import RetentionExecutor
+
+
+# Equality filters with a (column, data_hora) index, most selective first.
+# Browsing walks the chosen index backwards from the keyset cursor and checks
+# the other filters as residual predicates.
+KEYSET_INDEXES = (
+    ('usuario_id', 'idx_audit_usuario_data'),
+    ('ip_address', 'idx_audit_ip_data'),
+    ('acao', 'idx_audit_acao_data'),
+    ('tabela', 'idx_audit_tabela_data'),
+)
+DEFAULT_KEYSET_INDEX = 'ix_log_auditoria_data_hora'
+
+BROWSE_FILTERS = ('usuario_id', 'acao', 'tabela', 'ip_address')
+
+
+def keyset_index(filters: Dict[str, Any]) -> str:
+    """
+    Pick the index serving a browse query.
+    
+    Args:
+        filters: Equality filters in use (column name to value)
+        
+    Returns:
+        Index name
+    """
+    for column, index_name in KEYSET_INDEXES:
+        if filters.get(column):
+            return index_name
+    return DEFAULT_KEYSET_INDEX
+
+
+def keyset_conditions(antes_de: Optional[datetime], antes_id: Optional[int]) -> list:
+    """
+    Conditions selecting the rows after a (data_hora, id) cursor, newest first.
+    
+    Args:
+        antes_de: data_hora of the last row received
+        antes_id: id of the last row received; without it, every row at
+            antes_de is skipped
+            
+    Returns:
+        List of filter expressions
+    """
+    if not antes_de:
+        return []
+    if antes_id is None:
+        return [LogAuditoria.data_hora < antes_de]
+    return [or_(
+        LogAuditoria.data_hora < antes_de,
+        and_(LogAuditoria.data_hora == antes_de, LogAuditoria.id < antes_id)
+    )]
+
+
+def _floor(value: datetime, step: timedelta) -> datetime:
+    """Round a datetime down to a multiple of step (hours or days)"""
+    return datetime.min + (value - datetime.min) // step * step
+
+
+def _ceil(value: datetime, step: timedelta) -> datetime:
+    """Round a datetime up to a multiple of step (hours or days)"""
+    floor = _floor(value, step)
+    return floor if floor == value else floor + step
 
 
 class AuditRepository(BaseRepository[LogAuditoria]):
     """
     Repository for LogAuditoria model with specialized audit queries.
     Handles audit log filtering, reporting, and analysis.
+    
+    Closed months are moved out of log_auditoria into archive files (see
+    AuditArchiveService). Queries with a start date reaching an archived
+    month read the matching archives as well; queries without a start date
+    only cover the live table. Statistics read the hourly/daily rollups
+    (see AuditRollupService) for every closed hour.
     """
     
     def __init__(self):
         """Initialize AuditRepository with LogAuditoria model."""
         super().__init__(LogAuditoria)
+        self.archive_repository = AuditArchiveRepository()
+        self.rollup_repository = AuditRollupRepository()
+    
+    def get_archives_for_range(
+        self,
+        data_inicio: Optional[datetime],
+        data_fim: Optional[datetime] = None
+    ) -> list:
+        """
+        Get the archives a date range needs besides the live table.
+        
+        Args:
+            data_inicio: Start date; no archives are read without one
+            data_fim: Optional end date
+            
+        Returns:
+            List of ArquivoAuditoria instances, newest first
+        """
+        if not data_inicio:
+            return []
+        return self.archive_repository.get_for_range(data_inicio, data_fim)
     
     def get_by_user(
         self,
@@ -122,35 +219,40 @@ class AuditRepository(BaseRepository[LogAuditoria]):
         Returns:
             Paginated results dictionary
         """
-        query = self.get_query()
+        archive_filters = {
+            column: value for column, value in zip(BROWSE_FILTERS, (usuario_id, acao, tabela, ip_address))
+            if value
+        }
+        query = self._browse_query(archive_filters, data_inicio, data_fim)
         
-        # Apply filters
-        if usuario_id:
-            query = query.filter(LogAuditoria.usuario_id == usuario_id)
-        if acao:
-            query = query.filter(LogAuditoria.acao == acao)
-        if tabela:
-            query = query.filter(LogAuditoria.tabela == tabela)
-        if data_inicio:
-            query = query.filter(LogAuditoria.data_hora >= data_inicio)
-        if data_fim:
-            query = query.filter(LogAuditoria.data_hora <= data_fim)
-        if ip_address:
-            query = query.filter(LogAuditoria.ip_address == ip_address)
+        # Get total count
+        live_total = query.order_by(None).count()
         
-        # Order by date descending
-        query = query.order_by(LogAuditoria.data_hora.desc())
+        # Archived months are older than every live row: they follow the live
+        # results, so the archive part of a page starts after live_total
+        arquivos = self.get_archives_for_range(data_inicio, data_fim)
         
-        # Get total count
-        total = query.count()
+        def archived_page(offset):
+            skip = max(0, offset - live_total)
+            limit = min(per_page, max(0, offset + per_page - live_total))
+            return self.archive_repository.page_entries(
+                arquivos, skip, limit, data_inicio, data_fim, archive_filters
+            )
+        
+        requested_page = max(1, page)
+        archived, archived_total = archived_page((requested_page - 1) * per_page) if arquivos else ([], 0)
+        total = live_total + archived_total
         
         # Calculate pagination
         pages = (total + per_page - 1) // per_page
         page = max(1, min(page, pages)) if pages > 0 else 1
         offset = (page - 1) * per_page
+        if arquivos and page != requested_page:
+            archived, _ = archived_page(offset)
         
         # Get paginated results
-        items = query.limit(per_page).offset(offset).all()
+        items = query.limit(per_page).offset(offset).all() if offset < live_total else []
+        items.extend(archived)
         
         return {
             'items': items,
@@ -162,6 +264,95 @@ class AuditRepository(BaseRepository[LogAuditoria]):
             'has_next': page < pages
         }
     
+    def scroll_logs(
+        self,
+        usuario_id: Optional[int] = None,
+        acao: Optional[str] = None,
+        tabela: Optional[str] = None,
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        ip_address: Optional[str] = None,
+        antes_de: Optional[datetime] = None,
+        antes_id: Optional[int] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Get the next audit logs after a keyset cursor, newest first.
+        
+        Unlike filter_logs, no total is counted and no rows are skipped: each
+        call reads at most limit + 1 rows from the index picked for the
+        filters (see keyset_index), so the cost of a page does not depend on
+        how far the user has scrolled. Archived months are merged in when the
+        date range reaches them.
+        
+        Args:
+            usuario_id: Optional user ID filter
+            acao: Optional action type filter
+            tabela: Optional table name filter
+            data_inicio: Optional start date filter
+            data_fim: Optional end date filter
+            ip_address: Optional IP address filter
+            antes_de: data_hora of the last row received (None for the first page)
+            antes_id: id of the last row received
+            limit: Maximum rows to return
+            
+        Returns:
+            Dictionary with items (LogAuditoria and ArchivedLog instances),
+            has_more, next_cursor ({'antes_de', 'antes_id'} or None) and the
+            index used
+        """
+        filters = {
+            column: value for column, value in zip(BROWSE_FILTERS, (usuario_id, acao, tabela, ip_address))
+            if value
+        }
+        live = self._browse_query(filters, data_inicio, data_fim).filter(
+            *keyset_conditions(antes_de, antes_id)
+        ).limit(limit + 1).all()
+        
+        limites = [d for d in (antes_de, data_fim) if d]
+        arquivos = self.get_archives_for_range(data_inicio, min(limites) if limites else None)
+        if arquivos and len(live) <= limit:
+            cursor = (antes_de, antes_id if antes_id is not None else float('-inf')) if antes_de else None
+            archived = self.archive_repository.iter_entries(arquivos, data_inicio, data_fim, filters)
+            if cursor:
+                archived = dropwhile(lambda entry: (entry.data_hora, entry.id) >= cursor, archived)
+            items = list(islice(heapq.merge(
+                live, archived, key=lambda entry: (entry.data_hora, entry.id), reverse=True
+            ), limit + 1))
+        else:
+            items = live
+        
+        has_more = len(items) > limit
+        items = items[:limit]
+        return {
+            'items': items,
+            'has_more': has_more,
+            'next_cursor': {
+                'antes_de': items[-1].data_hora,
+                'antes_id': items[-1].id
+            } if has_more else None,
+            'index': keyset_index(filters)
+        }
+    
+    def _browse_query(
+        self,
+        filters: Dict[str, Any],
+        data_inicio: Optional[datetime],
+        data_fim: Optional[datetime]
+    ):
+        """Live rows matching browse filters, newest first, on the index picked for them"""
+        query = self.get_query().filter(*[
+            getattr(LogAuditoria, column) == value for column, value in filters.items()
+        ])
+        if data_inicio:
+            query = query.filter(LogAuditoria.data_hora >= data_inicio)
+        if data_fim:
+            query = query.filter(LogAuditoria.data_hora <= data_fim)
+        # SQL Server tends to pick a single-column index and sort; the hint
+        # keeps the scan on the composite index, already in data_hora order
+        query = query.with_hint(LogAuditoria, f'WITH (INDEX({keyset_index(filters)}))', 'mssql')
+        return query.order_by(LogAuditoria.data_hora.desc(), LogAuditoria.id.desc())
+    
     def get_recent_activity(self, hours: int = 24, limit: int = 100) -> List[LogAuditoria]:
         """
         Get recent activity within specified hours.
@@ -228,6 +419,111 @@ class AuditRepository(BaseRepository[LogAuditoria]):
         ).count()
         return count
     
+    def count_activity(
+        self,
+        group_by: Sequence[str],
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Counter:
+        """
+        Count audit entries grouped by dimensions.
+        
+        Hours closed by the rollup watermark are read from the hourly and
+        daily rollups; only the partial hours at the edges of the range and
+        the hours still open are counted from raw rows (live table plus the
+        archives the range needs). Grouping or filtering on a column the
+        rollups do not keep (ip_address, registro_id, ...) counts raw rows
+        for the whole range.
+        
+        Args:
+            group_by: Dimensions among 'acao', 'usuario_id', 'tabela' and 'dia',
+                or other log columns
+            data_inicio: Optional start date
+            data_fim: Optional end date (inclusive)
+            filters: Column filters; a list, tuple or set value matches any
+                of its items
+                
+        Returns:
+            Counter keyed by tuples of dimension values
+        """
+        marcador = self.rollup_repository.get_marcador()
+        rolled_up = set(group_by) | set(filters or ()) <= set(ROLLUP_DIMENSIONS)
+        if not marcador or not rolled_up:
+            return self._count_raw(group_by, data_inicio, data_fim, filters)
+        
+        inicio = max(data_inicio, marcador.inicio) if data_inicio else marcador.inicio
+        fim = min(data_fim, marcador.hora_fechada) if data_fim else marcador.hora_fechada
+        primeira_hora = _ceil(inicio, timedelta(hours=1))
+        ultima_hora = _floor(fim, timedelta(hours=1))
+        if primeira_hora >= ultima_hora:
+            return self._count_raw(group_by, data_inicio, data_fim, filters)
+        
+        # Raw rows before and after the rolled up hours
+        counts = self._count_raw(group_by, data_inicio, primeira_hora, filters, fim_exclusivo=True)
+        counts.update(self._count_raw(group_by, ultima_hora, data_fim, filters))
+        
+        # Whole days from the daily rollup, the hours around them from the hourly one
+        primeiro_dia = _ceil(primeira_hora, timedelta(days=1))
+        ultimo_dia = _floor(ultima_hora, timedelta(days=1))
+        if primeiro_dia < ultimo_dia:
+            segments = [
+                (False, primeira_hora, primeiro_dia),
+                (True, primeiro_dia, ultimo_dia),
+                (False, ultimo_dia, ultima_hora)
+            ]
+        else:
+            segments = [(False, primeira_hora, ultima_hora)]
+        for diario, segment_start, segment_end in segments:
+            if segment_start < segment_end:
+                counts.update(self.rollup_repository.count(
+                    diario, group_by, segment_start, segment_end, filters
+                ))
+        return counts
+    
+    def _count_raw(
+        self,
+        group_by: Sequence[str],
+        data_inicio: Optional[datetime],
+        data_fim: Optional[datetime],
+        filters: Optional[Dict[str, Any]] = None,
+        fim_exclusivo: bool = False
+    ) -> Counter:
+        """Count raw live and archived entries grouped by dimensions"""
+        day_column = self._day_column()
+        columns = [day_column if dimension == 'dia' else getattr(LogAuditoria, dimension) for dimension in group_by]
+        
+        # Coalesced rows count once per occurrence
+        query = apply_filters(self.session.query(*columns, func.sum(LogAuditoria.ocorrencias)), LogAuditoria, filters)
+        if data_inicio:
+            query = query.filter(LogAuditoria.data_hora >= data_inicio)
+        if data_fim:
+            query = query.filter(LogAuditoria.data_hora < data_fim if fim_exclusivo else LogAuditoria.data_hora <= data_fim)
+        if columns:
+            query = query.group_by(*columns)
+        
+        counts = Counter()
+        for row in query:
+            key = tuple(
+                date.fromisoformat(value) if dimension == 'dia' and isinstance(value, str) else value
+                for dimension, value in zip(group_by, row[:-1])
+            )
+            counts[key] += row[-1] or 0
+        
+        arquivos = self.get_archives_for_range(data_inicio, data_fim)
+        if arquivos:
+            counts.update(self.archive_repository.count_by(
+                arquivos, group_by, data_inicio, data_fim, filters, fim_exclusivo
+            ))
+        return counts
+    
+    def _day_column(self):
+        """Date of data_hora (SQLite has no DATE type to CAST to)"""
+        if self.session.get_bind().dialect.name == 'sqlite':
+            return func.date(LogAuditoria.data_hora)
+        # Use CAST for SQL Server compatibility
+        return func.cast(LogAuditoria.data_hora, Date)
+    
     def get_action_statistics(
         self,
         data_inicio: Optional[datetime] = None,
@@ -243,21 +539,8 @@ class AuditRepository(BaseRepository[LogAuditoria]):
         Returns:
             List of dicts with action and count
         """
-        query = self.session.query(
-            LogAuditoria.acao,
-            func.count(LogAuditoria.id).label('count')
-        )
-        
-        if data_inicio:
-            query = query.filter(LogAuditoria.data_hora >= data_inicio)
-        if data_fim:
-            query = query.filter(LogAuditoria.data_hora <= data_fim)
-        
-        results = query.group_by(LogAuditoria.acao).order_by(
-            func.count(LogAuditoria.id).desc()
-        ).all()
-        
-        return [{'acao': r[0], 'count': r[1]} for r in results]
+        counts = self.count_activity(('acao',), data_inicio, data_fim)
+        return [{'acao': key[0], 'count': count} for key, count in counts.most_common()]
     
     def get_user_activity_statistics(
         self,
@@ -276,21 +559,9 @@ class AuditRepository(BaseRepository[LogAuditoria]):
         Returns:
             List of dicts with usuario_id and action count
         """
-        query = self.session.query(
-            LogAuditoria.usuario_id,
-            func.count(LogAuditoria.id).label('count')
-        ).filter(LogAuditoria.usuario_id.isnot(None))
-        
-        if data_inicio:
-            query = query.filter(LogAuditoria.data_hora >= data_inicio)
-        if data_fim:
-            query = query.filter(LogAuditoria.data_hora <= data_fim)
-        
-        results = query.group_by(LogAuditoria.usuario_id).order_by(
-            func.count(LogAuditoria.id).desc()
-        ).limit(limit).all()
-        
-        return [{'usuario_id': r[0], 'count': r[1]} for r in results]
+        counts = self.count_activity(('usuario_id',), data_inicio, data_fim)
+        del counts[(None,)]
+        return [{'usuario_id': key[0], 'count': count} for key, count in counts.most_common(limit)]
     
     def get_daily_activity(
         self,
@@ -308,80 +579,145 @@ class AuditRepository(BaseRepository[LogAuditoria]):
             List of dicts with date and count
         """
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Use CAST for SQL Server compatibility
-        query = self.session.query(
-            func.cast(LogAuditoria.data_hora, Date).label('date'),
-            func.count(LogAuditoria.id).label('count')
-        ).filter(LogAuditoria.data_hora >= cutoff_date)
-        
-        if acao:
-            query = query.filter(LogAuditoria.acao == acao)
-        
-        results = query.group_by(
-            func.cast(LogAuditoria.data_hora, Date)
-        ).order_by(
-            func.cast(LogAuditoria.data_hora, Date)
-        ).all()
+        counts = self.count_activity(('dia',), cutoff_date, filters={'acao': acao} if acao else None)
         
         return [
-            {'date': r[0].isoformat() if r[0] else None, 'count': r[1]}
-            for r in results
+            {'date': key[0].isoformat() if key[0] else None, 'count': count}
+            for key, count in sorted(counts.items())
         ]
     
-    def cleanup_old_logs(self, days: int = 365) -> int:
+    def cleanup_old_logs(
+        self,
+        days: int = 365,
+        max_chunks: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> int:
         """
         Delete audit logs older than specified days.
         
+        Rows are deleted in throttled primary key chunks (see
+        RetentionExecutor); an interrupted run resumes from its checkpoint.
+        
         Args:
             days: Delete logs older than this many days
+            max_chunks: Chunks per run, None or 0 for no limit
+            progress: Called with the executor metrics after every chunk
             
         Returns:
             Number of logs deleted
         """
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        count = self.get_query().filter(
-            LogAuditoria.data_hora < cutoff_date
-        ).delete(synchronize_session=False)
-        self.session.commit()
-        return count
+        executor = RetentionExecutor('audit_logs', LogAuditoria, max_chunks=max_chunks, progress=progress)
+        metrics = executor.run(
+            datetime.utcnow() - timedelta(days=days),
+            lambda cutoff: [LogAuditoria.data_hora < cutoff]
+        )
+        return metrics['deleted']
     
-    def export_logs(
+    def iter_export(
         self,
         usuario_id: Optional[int] = None,
+        acao: Optional[str] = None,
         data_inicio: Optional[datetime] = None,
-        data_fim: Optional[datetime] = None
-    ) -> List[Dict[str, Any]]:
+        data_fim: Optional[datetime] = None,
+        antes_de: Optional[datetime] = None,
+        antes_id: Optional[int] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
         """
-        Export audit logs as list of dictionaries for reporting.
+        Stream audit log rows for export, newest first.
+        
+        Live rows are read through a server-side cursor in batches of
+        batch_size and merged with the archives the date range needs, so
+        memory does not grow with the number of rows. Rows are ordered by
+        (data_hora, id) descending: an interrupted export resumes from the
+        last row received by passing its data_hora and id as antes_de and
+        antes_id.
         
         Args:
             usuario_id: Optional user ID filter
+            acao: Optional action type filter
             data_inicio: Optional start date
             data_fim: Optional end date
+            antes_de: Optional resume position, only rows before it are returned
+            antes_id: ID of the row at antes_de to resume after
+            batch_size: Rows fetched per round trip
             
-        Returns:
-            List of log dictionaries
+        Yields:
+            Dictionaries of LogAuditoria column values
         """
-        query = self.get_query()
+        table = LogAuditoria.__table__
+        query = select(table)
         
         if usuario_id:
-            query = query.filter(LogAuditoria.usuario_id == usuario_id)
+            query = query.where(table.c.usuario_id == usuario_id)
+        if acao:
+            query = query.where(table.c.acao == acao)
         if data_inicio:
-            query = query.filter(LogAuditoria.data_hora >= data_inicio)
+            query = query.where(table.c.data_hora >= data_inicio)
         if data_fim:
-            query = query.filter(LogAuditoria.data_hora <= data_fim)
+            query = query.where(table.c.data_hora <= data_fim)
+        query = query.where(*keyset_conditions(antes_de, antes_id))
+        
+        query = query.order_by(table.c.data_hora.desc(), table.c.id.desc()).execution_options(
+            stream_results=True, yield_per=batch_size
+        )
+        live = (dict(row) for row in self.session.execute(query).mappings())
+        
+        limites = [d for d in (antes_de, data_fim) if d]
+        arquivos = self.get_archives_for_range(data_inicio, min(limites) if limites else None)
+        if not arquivos:
+            yield from live
+            return
+        
+        filters = {
+            column: value for column, value in (('usuario_id', usuario_id), ('acao', acao)) if value
+        }
+        cursor = (antes_de, antes_id if antes_id is not None else float('-inf')) if antes_de else None
+        
+        def archived(arquivo):
+            # Each archive is sorted like the live query
+            rows = (entry.to_dict() for entry in self.archive_repository.iter_entries(
+                [arquivo], data_inicio, data_fim, filters
+            ))
+            if cursor:
+                rows = dropwhile(lambda row: (row['data_hora'], row['id']) >= cursor, rows)
+            return rows
+        
+        yield from heapq.merge(
+            live, *[archived(arquivo) for arquivo in arquivos],
+            key=lambda row: (row['data_hora'], row['id']),
+            reverse=True
+        )
+    
+    def export_logs(
+        self,
+        usuario_id: Optional[int] = None,
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Export audit logs as list of dictionaries for reporting.
         
-        logs = query.order_by(LogAuditoria.data_hora.desc()).all()
+        Loads every matching row; use iter_export for large ranges.
         
+        Args:
+            usuario_id: Optional user ID filter
+            data_inicio: Optional start date
+            data_fim: Optional end date
+            
+        Returns:
+            List of log dictionaries
+        """
         return [{
-            'id': log.id,
-            'usuario_id': log.usuario_id,
-            'acao': log.acao,
-            'tabela': log.tabela,
-            'registro_id': log.registro_id,
-            'dados': log.dados,
-            'ip_address': log.ip_address,
-            'user_agent': log.user_agent,
-            'data_hora': log.data_hora.isoformat() if log.data_hora else None
-        } for log in logs]
+            'id': row['id'],
+            'usuario_id': row['usuario_id'],
+            'acao': row['acao'],
+            'tabela': row['tabela'],
+            'registro_id': row['registro_id'],
+            'dados': json.loads(row['dados_json']) if row['dados_json'] else {},
+            'ip_address': row['ip_address'],
+            'user_agent': row['user_agent'],
+            'data_hora': row['data_hora'].isoformat() if row['data_hora'] else None,
+            'ocorrencias': row.get('ocorrencias') or 1,
+            'data_hora_fim': row['data_hora_fim'].isoformat() if row.get('data_hora_fim') else None
+        } for row in self.iter_export(usuario_id=usuario_id, data_inicio=data_inicio, data_fim=data_fim)]
@@ -2,15 +2,76 @@
 Category repository with hierarchy traversal
 """
 from typing import Optional, List, Dict, Any
-from sqlalchemy import func
+from sqlalchemy import func, or_
+from app import db
 from app.repositories.base_repository import BaseRepository
 from app.models.document import Categoria, Pasta
+from app.models.hierarchy import ancestor_ids, subtree_prefix
+
+
+def build_tree(nodes, parent_attr: str, to_dict) -> List[Dict[str, Any]]:
+    """
+    Nest nodes loaded in one query under their parents.
+    
+    Args:
+        nodes: Nodes ordered by nivel (then display order), so parents come
+            before their children
+        parent_attr: Name of the parent ID column
+        to_dict: Converts a node to its dict (without children)
+        
+    Returns:
+        Root dicts with nested 'children'; nodes whose parent is not among
+        the loaded nodes are left out, with their subtree
+    """
+    roots = []
+    by_id = {}
+    for node in nodes:
+        node_dict = to_dict(node)
+        node_dict['children'] = []
+        parent_id = getattr(node, parent_attr)
+        if parent_id is None:
+            roots.append(node_dict)
+        elif parent_id in by_id:
+            by_id[parent_id]['children'].append(node_dict)
+        else:
+            continue
+        by_id[node.id] = node_dict
+    return roots
+
+
+def is_in_subtree(model, parent_attr: str, node, candidate) -> bool:
+    """
+    Whether candidate is a descendant of node.
+    
+    Args:
+        model: Category or folder model
+        parent_attr: Name of the parent ID column
+        node: Root of the subtree
+        candidate: Node to look for
+        
+    Returns:
+        True if node is an ancestor of candidate
+    """
+    if node.caminho_ids is not None and candidate.caminho_ids is not None:
+        return candidate.caminho_ids.startswith(subtree_prefix(node.caminho_ids, node.id))
+    
+    # Path not backfilled or flushed yet: walk up the parent chain
+    parent_column = getattr(model, parent_attr)
+    seen = set()
+    parent_id = getattr(candidate, parent_attr)
+    while parent_id is not None and parent_id not in seen:
+        if parent_id == node.id:
+            return True
+        seen.add(parent_id)
+        parent_id = db.session.query(parent_column).filter(model.id == parent_id).scalar()
+    return False
 
 
 class CategoryRepository(BaseRepository[Categoria]):
     """
     Repository for Categoria model with hierarchical operations.
-    Handles category tree traversal and hierarchy management.
+    Handles category tree traversal and hierarchy management; subtrees and
+    ancestors are read through the materialized path (caminho_ids).
     """
     
     def __init__(self):
@@ -63,35 +124,22 @@ class CategoryRepository(BaseRepository[Categoria]):
         Returns:
             List of category dicts with nested children
         """
-        def build_tree(parent_id: Optional[int] = None) -> List[Dict[str, Any]]:
-            """Recursively build category tree."""
-            query = self.get_query().filter(Categoria.ativo == True)
-            if parent_id is None:
-                query = query.filter(Categoria.categoria_pai_id.is_(None))
-            else:
-                query = query.filter(Categoria.categoria_pai_id == parent_id)
-            
-            categories = query.order_by(Categoria.ordem, Categoria.nome).all()
-            
-            result = []
-            for cat in categories:
-                cat_dict = {
-                    'id': cat.id,
-                    'nome': cat.nome,
-                    'descricao': cat.descricao,
-                    'icone': cat.icone,
-                    'cor': cat.cor,
-                    'ordem': cat.ordem,
-                    'children': build_tree(cat.id)
-                }
-                result.append(cat_dict)
-            return result
-        
-        return build_tree()
+        categories = self.get_query().filter(Categoria.ativo == True).order_by(
+            Categoria.nivel, Categoria.ordem, Categoria.nome
+        ).all()
+        
+        return build_tree(categories, 'categoria_pai_id', lambda cat: {
+            'id': cat.id,
+            'nome': cat.nome,
+            'descricao': cat.descricao,
+            'icone': cat.icone,
+            'cor': cat.cor,
+            'ordem': cat.ordem
+        })
     
     def get_all_descendants(self, categoria_id: int) -> List[Categoria]:
         """
-        Get all descendant categories (recursive).
+        Get all active descendant categories (below inactive ones excluded).
         
         Args:
             categoria_id: Parent category ID
@@ -99,16 +147,21 @@ class CategoryRepository(BaseRepository[Categoria]):
         Returns:
             List of all descendant Categoria instances
         """
-        descendants = []
+        categoria = self.get_by_id(categoria_id)
+        if not categoria:
+            return []
         
-        def collect_descendants(parent_id: int):
-            """Recursively collect all descendants."""
-            children = self.get_subcategories(parent_id)
-            for child in children:
-                descendants.append(child)
-                collect_descendants(child.id)
+        subtree = self.get_query().filter(
+            Categoria.caminho_ids.like(f'{subtree_prefix(categoria.caminho_ids, categoria.id)}%')
+        ).order_by(Categoria.nivel, Categoria.ordem, Categoria.nome).all()
         
-        collect_descendants(categoria_id)
+        # Parents come first: keep active nodes whose parent was kept
+        kept = {categoria_id}
+        descendants = []
+        for child in subtree:
+            if child.ativo and child.categoria_pai_id in kept:
+                kept.add(child.id)
+                descendants.append(child)
         return descendants
     
     def get_path_to_root(self, categoria_id: int) -> List[Categoria]:
@@ -121,17 +174,13 @@ class CategoryRepository(BaseRepository[Categoria]):
         Returns:
             List of Categoria instances from root to specified category
         """
-        path = []
-        current = self.get_by_id(categoria_id)
+        categoria = self.get_by_id(categoria_id)
+        if not categoria:
+            return []
         
-        while current:
-            path.insert(0, current)
-            if current.categoria_pai_id:
-                current = self.get_by_id(current.categoria_pai_id)
-            else:
-                break
-        
-        return path
+        ids = ancestor_ids(categoria.caminho_ids)
+        ancestors = self.get_query().filter(Categoria.id.in_(ids)).all() if ids else []
+        return sorted(ancestors, key=lambda cat: cat.nivel) + [categoria]
     
     def get_depth(self, categoria_id: int) -> int:
         """
@@ -143,14 +192,8 @@ class CategoryRepository(BaseRepository[Categoria]):
         Returns:
             Depth level
         """
-        depth = 0
-        current = self.get_by_id(categoria_id)
-        
-        while current and current.categoria_pai_id:
-            depth += 1
-            current = self.get_by_id(current.categoria_pai_id)
-        
-        return depth
+        categoria = self.get_by_id(categoria_id)
+        return categoria.nivel if categoria else 0
     
     def can_move_to_parent(self, categoria_id: int, new_parent_id: Optional[int]) -> bool:
         """
@@ -169,11 +212,13 @@ class CategoryRepository(BaseRepository[Categoria]):
         if categoria_id == new_parent_id:
             return False
         
-        # Check if new parent is a descendant of category (would create cycle)
-        descendants = self.get_all_descendants(categoria_id)
-        descendant_ids = [d.id for d in descendants]
+        # The new parent must not be a descendant of the category
+        nodes = {cat.id: cat for cat in self.get_query().filter(Categoria.id.in_([categoria_id, new_parent_id]))}
+        categoria, new_parent = nodes.get(categoria_id), nodes.get(new_parent_id)
+        if not categoria or not new_parent:
+            return True
         
-        return new_parent_id not in descendant_ids
+        return not is_in_subtree(Categoria, 'categoria_pai_id', categoria, new_parent)
     
     def get_document_count(self, categoria_id: int, include_subcategories: bool = False) -> int:
         """
@@ -189,12 +234,18 @@ class CategoryRepository(BaseRepository[Categoria]):
         from app.models.document import Documento
         
         if include_subcategories:
-            # Get all descendant category IDs
-            descendants = self.get_all_descendants(categoria_id)
-            category_ids = [categoria_id] + [d.id for d in descendants]
+            # Join the subtree through the materialized path
+            categoria = self.get_by_id(categoria_id)
+            if not categoria:
+                return 0
             
-            count = self.session.query(func.count(Documento.id)).filter(
-                Documento.categoria_id.in_(category_ids),
+            count = self.session.query(func.count(Documento.id)).join(
+                Categoria, Documento.categoria_id == Categoria.id
+            ).filter(
+                or_(
+                    Categoria.id == categoria_id,
+                    Categoria.caminho_ids.like(f'{subtree_prefix(categoria.caminho_ids, categoria_id)}%')
+                ),
                 Documento.status == 'ativo'
             ).scalar()
         else:
@@ -275,31 +326,36 @@ class FolderRepository(BaseRepository[Pasta]):
         Returns:
             List of folder dicts with nested children
         """
-        def build_tree(parent_id: Optional[int] = None) -> List[Dict[str, Any]]:
-            """Recursively build folder tree."""
-            query = self.get_query().filter(Pasta.usuario_id == usuario_id)
-            if parent_id is None:
-                query = query.filter(Pasta.pasta_pai_id.is_(None))
-            else:
-                query = query.filter(Pasta.pasta_pai_id == parent_id)
-            
-            folders = query.order_by(Pasta.ordem, Pasta.nome).all()
+        folders = self.get_query().filter(Pasta.usuario_id == usuario_id).order_by(
+            Pasta.nivel, Pasta.ordem, Pasta.nome
+        ).all()
+        
+        return build_tree(folders, 'pasta_pai_id', lambda folder: {
+            'id': folder.id,
+            'nome': folder.nome,
+            'descricao': folder.descricao,
+            'cor': folder.cor,
+            'ordem': folder.ordem,
+            'nivel': folder.nivel
+        })
+    
+    def get_all_descendants(self, pasta_id: int) -> List[Pasta]:
+        """
+        Get all descendant folders.
+        
+        Args:
+            pasta_id: Parent folder ID
             
-            result = []
-            for folder in folders:
-                folder_dict = {
-                    'id': folder.id,
-                    'nome': folder.nome,
-                    'descricao': folder.descricao,
-                    'cor': folder.cor,
-                    'ordem': folder.ordem,
-                    'nivel': folder.nivel,
-                    'children': build_tree(folder.id)
-                }
-                result.append(folder_dict)
-            return result
-        
-        return build_tree()
+        Returns:
+            List of descendant Pasta instances, shallowest first
+        """
+        pasta = self.get_by_id(pasta_id)
+        if not pasta:
+            return []
+        
+        return self.get_query().filter(
+            Pasta.caminho_ids.like(f'{subtree_prefix(pasta.caminho_ids, pasta.id)}%')
+        ).order_by(Pasta.nivel, Pasta.ordem, Pasta.nome).all()
     
     def get_path_to_root(self, pasta_id: int) -> List[Pasta]:
         """
@@ -311,17 +367,13 @@ class FolderRepository(BaseRepository[Pasta]):
         Returns:
             List of Pasta instances from root to specified folder
         """
-        path = []
-        current = self.get_by_id(pasta_id)
-        
-        while current:
-            path.insert(0, current)
-            if current.pasta_pai_id:
-                current = self.get_by_id(current.pasta_pai_id)
-            else:
-                break
+        pasta = self.get_by_id(pasta_id)
+        if not pasta:
+            return []
         
-        return path
+        ids = ancestor_ids(pasta.caminho_ids)
+        ancestors = self.get_query().filter(Pasta.id.in_(ids)).all() if ids else []
+        return sorted(ancestors, key=lambda folder: folder.nivel) + [pasta]
     
     def can_move_to_parent(self, pasta_id: int, new_parent_id: Optional[int], max_depth: int = 5) -> bool:
         """
@@ -341,22 +393,17 @@ class FolderRepository(BaseRepository[Pasta]):
         if pasta_id == new_parent_id:
             return False
         
+        nodes = {folder.id: folder for folder in self.get_query().filter(Pasta.id.in_([pasta_id, new_parent_id]))}
+        pasta, new_parent = nodes.get(pasta_id), nodes.get(new_parent_id)
+        if not new_parent:
+            return True
+        
         # Check depth limit
-        new_parent = self.get_by_id(new_parent_id)
-        if new_parent and new_parent.nivel >= max_depth - 1:
+        if new_parent.nivel >= max_depth - 1:
             return False
         
         # Check if new parent is a descendant (would create cycle)
-        current = new_parent
-        while current:
-            if current.id == pasta_id:
-                return False
-            if current.pasta_pai_id:
-                current = self.get_by_id(current.pasta_pai_id)
-            else:
-                break
-        
-        return True
+        return not (pasta and is_in_subtree(Pasta, 'pasta_pai_id', pasta, new_parent))
     
     def get_document_count(self, pasta_id: int) -> int:
         """
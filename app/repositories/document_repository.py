@@ -1,12 +1,14 @@
 """
 Document repository with search, filtering, and permission checks
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set
 from datetime import datetime, timedelta
-from sqlalchemy import or_, and_, func
+from sqlalchemy import or_, and_, func, delete, select
 from app.repositories.base_repository import BaseRepository
-from app.models.document import Documento, Tag, DocumentoTag
-from app.models.permission import Permissao
+from app.models.document import Documento, Tag, DocumentoTag, Favorito
+from app.models.permission import Permissao, PermissaoGrupo, PermissaoEfetiva
+from app.models.version import Versao
+from app.models.workflow import AprovacaoDocumento, HistoricoAprovacao
 
 
 class DocumentRepository(BaseRepository[Documento]):
@@ -31,6 +33,27 @@ class DocumentRepository(BaseRepository[Documento]):
         """
         return self.get_one_by(hash_arquivo=hash_arquivo, status='ativo')
     
+    def get_by_hashes(self, hashes: List[str]) -> Dict[str, Documento]:
+        """
+        Find active documents matching any of the given file hashes.
+        Used by batch uploads to detect duplicates with a single query.
+        
+        Args:
+            hashes: List of SHA256 hashes
+        
+        Returns:
+            Dictionary mapping hash to the matching Documento instance
+        """
+        if not hashes:
+            return {}
+        
+        documents = self.get_query().filter(
+            Documento.hash_arquivo.in_(set(hashes)),
+            Documento.status == 'ativo'
+        ).all()
+        
+        return {doc.hash_arquivo: doc for doc in documents}
+    
     def get_by_user(self, usuario_id: int, status: str = 'ativo') -> List[Documento]:
         """
         Get all documents owned by a user.
@@ -257,6 +280,26 @@ class DocumentRepository(BaseRepository[Documento]):
         )
         return query.all()
     
+    def get_favorited_ids(self, usuario_id: int, documento_ids: List[int]) -> Set[int]:
+        """
+        Get which of the given documents a user has favorited, in one query.
+        
+        Args:
+            usuario_id: User ID
+            documento_ids: Document IDs to check
+            
+        Returns:
+            Set of favorited document IDs
+        """
+        if not documento_ids:
+            return set()
+        
+        rows = self.session.query(Favorito.documento_id).filter(
+            Favorito.usuario_id == usuario_id,
+            Favorito.documento_id.in_(set(documento_ids))
+        )
+        return {row[0] for row in rows}
+    
     def get_storage_usage_by_user(self, usuario_id: int) -> int:
         """
         Calculate total storage used by a user.
@@ -314,6 +357,42 @@ class DocumentRepository(BaseRepository[Documento]):
             True if deleted, False if not found
         """
         return self.delete(id)
+    
+    def get_file_paths(self, ids: List[int]) -> List[str]:
+        """
+        Get the storage paths referenced by documents and their versions.
+        
+        Args:
+            ids: Document IDs
+            
+        Returns:
+            Relative storage paths (without duplicates)
+        """
+        caminhos = {
+            row[0] for row in self.session.query(Versao.caminho_arquivo).filter(Versao.documento_id.in_(ids))
+        }
+        caminhos.update(
+            row[0] for row in self.session.query(Documento.caminho_arquivo).filter(Documento.id.in_(ids))
+        )
+        caminhos.discard(None)
+        return list(caminhos)
+    
+    def delete_dependents(self, ids: List[int]) -> None:
+        """
+        Delete the rows referencing documents, ahead of a bulk delete of the
+        documents themselves (the ORM cascades do not run for bulk deletes).
+        
+        Args:
+            ids: Document IDs
+        """
+        aprovacoes = select(AprovacaoDocumento.id).where(AprovacaoDocumento.documento_id.in_(ids))
+        statements = [delete(HistoricoAprovacao).where(HistoricoAprovacao.aprovacao_id.in_(aprovacoes))]
+        statements.extend(
+            delete(model).where(model.documento_id.in_(ids))
+            for model in (AprovacaoDocumento, Versao, Permissao, PermissaoGrupo, PermissaoEfetiva, Favorito, DocumentoTag)
+        )
+        for statement in statements:
+            self.session.execute(statement.execution_options(synchronize_session=False))
 
 
 class TagRepository(BaseRepository[Tag]):
@@ -352,6 +431,35 @@ class TagRepository(BaseRepository[Tag]):
             tag = self.create(nome=nome)
         return tag
     
+    def get_or_create_many(self, nomes: List[str]) -> Dict[str, Tag]:
+        """
+        Get or create several tags at once.
+        Existing tags are loaded with a single query and missing ones are
+        flushed (not committed) so the caller controls the transaction.
+        
+        Args:
+            nomes: List of tag names
+        
+        Returns:
+            Dictionary mapping tag name to Tag instance
+        """
+        nomes = list(dict.fromkeys(nomes))
+        if not nomes:
+            return {}
+        
+        tags = {
+            tag.nome: tag
+            for tag in self.get_query().filter(Tag.nome.in_(nomes)).all()
+        }
+        
+        missing = [Tag(nome=nome) for nome in nomes if nome not in tags]
+        if missing:
+            self.session.add_all(missing)
+            self.session.flush()
+            tags.update({tag.nome: tag for tag in missing})
+        
+        return tags
+    
     def search_tags(self, query: str, limit: int = 10) -> List[Tag]:
         """
         Search tags by name (for autocomplete).
@@ -119,21 +119,34 @@ class PermissionRepository(BaseRepository):
         db.session.commit()
         return count
     
-    def delete_expired(self) -> int:
+    def delete_expired(self, batch_size: int = 1000) -> int:
         """
-        Delete all expired permissions
+        Delete all expired permissions in batches of at most batch_size rows
         
+        Prefer PermissionService.sweep_expired_permissions, which also covers
+        group and inherited grants and invalidates cached decisions.
+        
+        Args:
+            batch_size: Maximum rows deleted per statement
+            
         Returns:
             Number of permissions deleted
         """
         now = datetime.utcnow()
+        count = 0
+        
+        while True:
+            ids = [row[0] for row in db.session.query(self.model.id).filter(
+                self.model.data_expiracao < now
+            ).limit(batch_size)]
+            if not ids:
+                break
+            
+            count += self.model.query.filter(self.model.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            if len(ids) < batch_size:
+                break
         
-        count = self.model.query.filter(
-            self.model.data_expiracao.isnot(None),
-            self.model.data_expiracao < now
-        ).delete()
-        
-        db.session.commit()
         return count
     
     def get_expired(self) -> List[Permissao]:
@@ -0,0 +1,58 @@
+"""
+Report job repository for background report generation
+"""
+from datetime import datetime
+from typing import Optional, List
+from app.repositories.base_repository import BaseRepository
+from app.models.report import RelatorioJob
+
+
+class ReportJobRepository(BaseRepository[RelatorioJob]):
+    """
+    Repository for RelatorioJob records.
+    
+    A job is reusable while it is queued, running, or finished with a result
+    that has not expired; ReportJobService decides what counts as stale.
+    """
+    
+    def __init__(self):
+        """Initialize ReportJobRepository with RelatorioJob model."""
+        super().__init__(RelatorioJob)
+    
+    def find_reusable(self, chave: str, now: Optional[datetime] = None) -> Optional[RelatorioJob]:
+        """
+        Find the newest job whose result can serve a request.
+        
+        Args:
+            chave: Hash of the report type and parameters
+            now: Reference time for result expiry (default utcnow)
+            
+        Returns:
+            Active job, finished job with a live result, or None
+        """
+        now = now or datetime.utcnow()
+        return self.session.query(RelatorioJob).filter(
+            RelatorioJob.chave == chave,
+            RelatorioJob.status.in_([
+                RelatorioJob.STATUS_PENDENTE,
+                RelatorioJob.STATUS_EXECUTANDO,
+                RelatorioJob.STATUS_CONCLUIDO
+            ]),
+            (RelatorioJob.expira_em.is_(None)) | (RelatorioJob.expira_em > now)
+        ).order_by(RelatorioJob.data_criacao.desc()).first()
+    
+    def get_expired(self, now: Optional[datetime] = None, limit: int = 100) -> List[RelatorioJob]:
+        """
+        Get finished jobs whose result has expired.
+        
+        Args:
+            now: Reference time (default utcnow)
+            limit: Maximum number of jobs returned
+            
+        Returns:
+            List of expired jobs, oldest first
+        """
+        now = now or datetime.utcnow()
+        return self.session.query(RelatorioJob).filter(
+            RelatorioJob.expira_em <= now
+        ).order_by(RelatorioJob.expira_em).limit(limit).all()
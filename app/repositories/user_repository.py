@@ -3,6 +3,7 @@ User repository with authentication and user management queries
 """
 from typing import Optional, List
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from app.repositories.base_repository import BaseRepository
 from app.models.user import User, Perfil, PasswordReset
 
@@ -96,6 +97,18 @@ class UserRepository(BaseRepository[User]):
             User.bloqueado_ate > now
         ).all()
     
+    def count_locked_accounts(self) -> int:
+        """
+        Count currently locked accounts without loading them.
+        
+        Returns:
+            Number of users with active locks
+        """
+        return self.session.query(func.count(User.id)).filter(
+            User.bloqueado_ate.isnot(None),
+            User.bloqueado_ate > datetime.utcnow()
+        ).scalar() or 0
+    
     def unlock_expired_accounts(self) -> int:
         """
         Unlock all accounts whose lock period has expired.
@@ -0,0 +1,93 @@
+"""
+Version repository with blob reference tracking
+"""
+from typing import Optional, List
+from app.repositories.base_repository import BaseRepository
+from app.models.version import Versao
+from app.models.document import Documento
+
+
+class VersionRepository(BaseRepository[Versao]):
+    """
+    Repository for Versao model.
+    
+    Version files are immutable blobs: a blob is written once to storage and
+    any number of Versao rows (and the Documento itself) may reference it
+    through caminho_arquivo. A blob can only be removed from storage when no
+    row references it anymore.
+    """
+    
+    def __init__(self):
+        """Initialize VersionRepository with Versao model."""
+        super().__init__(Versao)
+    
+    def get_by_number(self, documento_id: int, numero_versao: int) -> Optional[Versao]:
+        """
+        Get a specific version of a document.
+        
+        Args:
+            documento_id: Document ID
+            numero_versao: Version number
+            
+        Returns:
+            Versao instance or None
+        """
+        return self.get_one_by(documento_id=documento_id, numero_versao=numero_versao)
+    
+    def get_by_hash(self, documento_id: int, hash_arquivo: str) -> Optional[Versao]:
+        """
+        Find a version of a document whose blob has the given content hash.
+        
+        Args:
+            documento_id: Document ID
+            hash_arquivo: SHA256 hash of the content
+            
+        Returns:
+            Most recent matching Versao instance or None
+        """
+        return self.get_query().filter(
+            Versao.documento_id == documento_id,
+            Versao.hash_arquivo == hash_arquivo
+        ).order_by(Versao.numero_versao.desc()).first()
+    
+    def get_versions_to_prune(self, documento_id: int, keep: int) -> List[Versao]:
+        """
+        Get the oldest versions of a document beyond the retention limit.
+        
+        Args:
+            documento_id: Document ID
+            keep: Number of most recent versions to keep
+            
+        Returns:
+            List of Versao instances that exceed the limit (oldest first)
+        """
+        return self.get_query().filter(
+            Versao.documento_id == documento_id
+        ).order_by(Versao.numero_versao.desc()).offset(keep).all()[::-1]
+    
+    def get_unreferenced_blobs(self, caminhos: List[str]) -> List[str]:
+        """
+        Filter a list of blob paths down to those no row references anymore.
+        
+        Args:
+            caminhos: Relative storage paths
+            
+        Returns:
+            Paths that are safe to delete from storage
+        """
+        caminhos = list(set(caminhos))
+        if not caminhos:
+            return []
+        
+        referenced = {
+            row[0] for row in self.session.query(Versao.caminho_arquivo).filter(
+                Versao.caminho_arquivo.in_(caminhos)
+            ).distinct()
+        }
+        referenced.update(
+            row[0] for row in self.session.query(Documento.caminho_arquivo).filter(
+                Documento.caminho_arquivo.in_(caminhos)
+            ).distinct()
+        )
+        
+        return [caminho for caminho in caminhos if caminho not in referenced]
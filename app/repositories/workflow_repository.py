@@ -1,9 +1,11 @@
 """
 Workflow repository for data access
 """
-from typing import List, Optional
+from typing import List, Optional, Dict, Set, Tuple
+from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
 from app.repositories.base_repository import BaseRepository
-from app.models.workflow import Workflow, AprovacaoDocumento, HistoricoAprovacao
+from app.models.workflow import Workflow, WorkflowEstagioAprovador, AprovacaoDocumento, HistoricoAprovacao
 from app import db
 
 
@@ -33,6 +35,44 @@ class WorkflowRepository(BaseRepository[Workflow]):
             Workflow instance or None
         """
         return self.get_one_by(nome=nome)
+    
+    def get_stage_approver_ids(self, workflow_id: int, estagio: int) -> List[int]:
+        """
+        Get the approvers of a workflow stage
+        
+        Args:
+            workflow_id: Workflow ID
+            estagio: Stage number (1-based)
+            
+        Returns:
+            List of user IDs
+        """
+        return [
+            row[0] for row in self.session.query(WorkflowEstagioAprovador.usuario_id).filter_by(
+                workflow_id=workflow_id,
+                estagio=estagio
+            ).order_by(WorkflowEstagioAprovador.id)
+        ]
+    
+    def is_stage_approver(self, workflow_id: int, estagio: int, user_id: int) -> bool:
+        """
+        Check if a user approves a workflow stage
+        
+        Args:
+            workflow_id: Workflow ID
+            estagio: Stage number (1-based)
+            user_id: User ID
+            
+        Returns:
+            True if user is an approver of the stage
+        """
+        return self.session.query(
+            self.session.query(WorkflowEstagioAprovador).filter_by(
+                workflow_id=workflow_id,
+                estagio=estagio,
+                usuario_id=user_id
+            ).exists()
+        ).scalar()
 
 
 class AprovacaoDocumentoRepository(BaseRepository[AprovacaoDocumento]):
@@ -78,23 +118,79 @@ class AprovacaoDocumentoRepository(BaseRepository[AprovacaoDocumento]):
         Returns:
             List of pending approval instances
         """
-        # Get all pending approvals and filter by current stage approvers
-        pending = self.filter_by(status='pendente')
-        result = []
+        # One indexed join: the user's stages, then the pending approvals at them
+        return self.session.query(self.model).join(
+            WorkflowEstagioAprovador,
+            and_(
+                WorkflowEstagioAprovador.workflow_id == self.model.workflow_id,
+                WorkflowEstagioAprovador.estagio == self.model.estagio_atual
+            )
+        ).filter(
+            WorkflowEstagioAprovador.usuario_id == user_id,
+            self.model.status == 'pendente'
+        ).order_by(self.model.id).all()
+    
+    def get_for_decision(self, aprovacao_ids: List[int]) -> List[AprovacaoDocumento]:
+        """
+        Get approvals with their workflow and document loaded
         
-        for aprovacao in pending:
-            workflow = aprovacao.workflow
-            config = workflow.configuracao
+        Args:
+            aprovacao_ids: Approval IDs
             
-            # Check if user is an approver for current stage
-            if 'stages' in config:
-                current_stage = aprovacao.estagio_atual - 1  # 0-indexed
-                if current_stage < len(config['stages']):
-                    stage = config['stages'][current_stage]
-                    if user_id in stage.get('approvers', []):
-                        result.append(aprovacao)
+        Returns:
+            List of approval instances (unknown IDs are omitted)
+        """
+        return self.session.query(self.model).options(
+            joinedload(self.model.workflow),
+            joinedload(self.model.documento)
+        ).filter(self.model.id.in_(aprovacao_ids)).all()
+    
+    def get_authorized_ids(self, aprovacao_ids: List[int], user_id: int) -> Set[int]:
+        """
+        Get the approvals a user approves at their current stage
+        
+        Args:
+            aprovacao_ids: Approval IDs
+            user_id: User ID
+            
+        Returns:
+            Set of approval IDs
+        """
+        return {
+            row[0] for row in self.session.query(self.model.id).join(
+                WorkflowEstagioAprovador,
+                and_(
+                    WorkflowEstagioAprovador.workflow_id == self.model.workflow_id,
+                    WorkflowEstagioAprovador.estagio == self.model.estagio_atual
+                )
+            ).filter(
+                self.model.id.in_(aprovacao_ids),
+                WorkflowEstagioAprovador.usuario_id == user_id
+            )
+        }
+    
+    def get_current_approver_pairs(self, aprovacao_ids: List[int]) -> List[Tuple[int, int]]:
+        """
+        Get the approvers of the current stage of several approvals
         
-        return result
+        Args:
+            aprovacao_ids: Approval IDs
+            
+        Returns:
+            List of (approval ID, approver user ID)
+        """
+        return [
+            (row[0], row[1]) for row in self.session.query(
+                self.model.id,
+                WorkflowEstagioAprovador.usuario_id
+            ).join(
+                WorkflowEstagioAprovador,
+                and_(
+                    WorkflowEstagioAprovador.workflow_id == self.model.workflow_id,
+                    WorkflowEstagioAprovador.estagio == self.model.estagio_atual
+                )
+            ).filter(self.model.id.in_(aprovacao_ids)).order_by(self.model.id, WorkflowEstagioAprovador.id)
+        ]
 
 
 class HistoricoAprovacaoRepository(BaseRepository[HistoricoAprovacao]):
@@ -116,3 +212,31 @@ class HistoricoAprovacaoRepository(BaseRepository[HistoricoAprovacao]):
         return self.session.query(self.model).filter_by(
             aprovacao_id=aprovacao_id
         ).order_by(self.model.data_acao).all()
+    
+    def get_current_stage_approvers(self, aprovacao_ids: List[int]) -> Dict[int, Set[int]]:
+        """
+        Get who already approved the current stage of several approvals (one grouped query)
+        
+        Args:
+            aprovacao_ids: Approval IDs
+            
+        Returns:
+            Dictionary mapping approval ID to the set of approver user IDs
+        """
+        approved_by = {}
+        rows = self.session.query(
+            self.model.aprovacao_id,
+            self.model.aprovador_id
+        ).join(
+            AprovacaoDocumento,
+            and_(
+                AprovacaoDocumento.id == self.model.aprovacao_id,
+                AprovacaoDocumento.estagio_atual == self.model.estagio
+            )
+        ).filter(
+            self.model.aprovacao_id.in_(aprovacao_ids),
+            self.model.acao == 'aprovado'
+        ).group_by(self.model.aprovacao_id, self.model.aprovador_id)
+        for aprovacao_id, aprovador_id in rows:
+            approved_by.setdefault(aprovacao_id, set()).add(aprovador_id)
+        return approved_by
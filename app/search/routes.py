@@ -5,6 +5,26 @@ from flask import render_template, request, jsonify
 from flask_login import login_required, current_user
 from app.search import search_bp
 from app.services.search_service import SearchService, SearchServiceError
+from app.services.permission_service import PermissionService
+from app.repositories.document_repository import DocumentRepository
+
+
+def _row_state(results):
+    """
+    Precompute per-row permissions and favorites for result templates
+    
+    Args:
+        results: Documents rendered on the page
+        
+    Returns:
+        Template context with doc_permissions (document ID to permission
+        bitmask) and favoritos (set of favorited document IDs)
+    """
+    doc_ids = [doc.id for doc in results]
+    return dict(
+        doc_permissions=PermissionService().bulk_effective_permissions(current_user.id, doc_ids),
+        favoritos=DocumentRepository().get_favorited_ids(current_user.id, doc_ids)
+    )
 
 
 @search_bp.route('/')
@@ -46,7 +66,8 @@ def search():
                 total_count=total_count,
                 page=page,
                 per_page=per_page,
-                total_pages=total_pages
+                total_pages=total_pages,
+                **_row_state(results)
             )
         except SearchServiceError as e:
             return render_template(
@@ -83,8 +104,8 @@ def advanced_search():
         per_page: Results per page
         sort_by: Sort order
     """
-    from app.repositories.category_repository import CategoryRepository
     from app.repositories.user_repository import UserRepository
+    from app.utils.category_tree import category_tree
     
     # Get filter parameters
     nome = request.args.get('nome', '').strip()
@@ -150,9 +171,8 @@ def advanced_search():
             total_pages = (total_count + per_page - 1) // per_page
             
             # Get categories and users for form
-            category_repo = CategoryRepository()
             user_repo = UserRepository()
-            categories = category_repo.get_active_categories()
+            categories = category_tree.get().ativas
             users = user_repo.get_active_users()
             
             return render_template(
@@ -165,13 +185,13 @@ def advanced_search():
                 filters=request.args,
                 categories=categories,
                 users=users,
-                sort_by=sort_by
+                sort_by=sort_by,
+                **_row_state(results)
             )
         except SearchServiceError as e:
             # Get categories and users for form
-            category_repo = CategoryRepository()
             user_repo = UserRepository()
-            categories = category_repo.get_active_categories()
+            categories = category_tree.get().ativas
             users = user_repo.get_active_users()
             
             return render_template(
@@ -183,9 +203,8 @@ def advanced_search():
     else:
         # Show advanced search form
         # Get categories and users for form
-        category_repo = CategoryRepository()
         user_repo = UserRepository()
-        categories = category_repo.get_active_categories()
+        categories = category_tree.get().ativas
         users = user_repo.get_active_users()
         
         return render_template(
@@ -230,7 +249,8 @@ def fulltext_search():
                 total_count=total_count,
                 page=page,
                 per_page=per_page,
-                total_pages=total_pages
+                total_pages=total_pages,
+                **_row_state(results)
             )
         except SearchServiceError as e:
             return render_template(
@@ -276,7 +296,8 @@ def quick_filter(filter_type):
             total_count=total_count,
             page=page,
             per_page=per_page,
-            total_pages=total_pages
+            total_pages=total_pages,
+            **_row_state(results)
         )
     except SearchServiceError as e:
         return render_template(
@@ -8,8 +8,13 @@ from app.services.storage_service import StorageService
 from app.services.notification_service import NotificationService
 from app.services.workflow_service import WorkflowService
 from app.services.audit_service import AuditService
+from app.services.audit_archive_service import AuditArchiveService
+from app.services.audit_rollup_service import AuditRollupService
+from app.services.report_job_service import ReportJobService
 from app.services.permission_service import PermissionService
 from app.services.category_service import CategoryService, FolderService
+from app.services.container_stats_service import ContainerStatsService
+from app.services.group_service import GroupService
 
 __all__ = [
     'AuthService',
@@ -19,7 +24,12 @@ __all__ = [
     'NotificationService',
     'WorkflowService',
     'AuditService',
+    'AuditArchiveService',
+    'AuditRollupService',
+    'ReportJobService',
     'PermissionService',
     'CategoryService',
-    'FolderService'
+    'FolderService',
+    'ContainerStatsService',
+    'GroupService'
 ]
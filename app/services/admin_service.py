@@ -6,10 +6,11 @@ from datetime import datetime, timedelta
 from sqlalchemy import func
 from sqlalchemy.types import Date
 from app import db
-from app.models import User, Documento, LogAuditoria, Perfil
+from app.models import User, Documento, Perfil
 from app.repositories.user_repository import UserRepository, PerfilRepository
 from app.repositories.document_repository import DocumentRepository
 from app.repositories.audit_repository import AuditRepository
+from app.utils.dashboard_snapshot import Widget
 
 
 class AdminService:
@@ -34,7 +35,7 @@ class AdminService:
         """
         # Total counts
         total_users = self.user_repository.count()
-        active_users = len(self.user_repository.get_active_users())
+        active_users = self.user_repository.count(ativo=True)
         total_documents = self.document_repository.count()
         
         # Storage statistics
@@ -177,7 +178,7 @@ class AdminService:
         users_by_profile = {r.nome: r.count for r in results}
         
         # Get locked accounts
-        locked_accounts = len(self.user_repository.get_locked_accounts())
+        locked_accounts = self.user_repository.count_locked_accounts()
         
         return {
             'by_profile': users_by_profile,
@@ -194,10 +195,8 @@ class AdminService:
     def _get_recent_logins_count(self, hours: int = 24) -> int:
         """Get count of successful logins in last N hours."""
         cutoff_date = datetime.utcnow() - timedelta(hours=hours)
-        return db.session.query(func.count(LogAuditoria.id)).filter(
-            LogAuditoria.acao == 'login_success',
-            LogAuditoria.data_hora >= cutoff_date
-        ).scalar() or 0
+        counts = self.audit_repository.count_activity((), cutoff_date, filters={'acao': 'login_success'})
+        return sum(counts.values())
     
     def _format_bytes(self, bytes_value: int) -> str:
         """
@@ -221,3 +220,21 @@ class AdminService:
             unit_index += 1
         
         return f"{value:.2f} {units[unit_index]}"
+
+
+# Admin dashboard widgets, kept in the dashboard snapshot (see
+# app.utils.dashboard_snapshot). eventos are the tables whose changes make a
+# widget stale before its TTL; widgets over log_auditoria rely on the TTL
+# alone, since audit rows are bulk inserted outside the ORM.
+DASHBOARD_WIDGETS = [
+    Widget('stats', lambda: AdminService().get_dashboard_statistics(),
+           ttl_seconds=120, eventos=('usuarios', 'documentos')),
+    Widget('upload_stats', lambda: AdminService().get_upload_statistics(days=30),
+           ttl_seconds=900, eventos=('documentos',)),
+    Widget('storage_by_user', lambda: AdminService().get_storage_by_user(limit=10),
+           ttl_seconds=900, eventos=('documentos', 'usuarios')),
+    Widget('recent_activity', lambda: AdminService().get_recent_activity(limit=20),
+           ttl_seconds=30),
+    Widget('user_stats', lambda: AdminService().get_user_statistics(),
+           ttl_seconds=300, eventos=('usuarios', 'perfis')),
+]
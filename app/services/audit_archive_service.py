@@ -0,0 +1,365 @@
+"""
+Audit archive service for moving closed months out of log_auditoria
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Any, Callable
+from flask import current_app
+from sqlalchemy import select, func, text
+from app import db
+from app.models.audit import LogAuditoria, ArquivoAuditoria
+from app.repositories.audit_archive_repository import AuditArchiveRepository
+from app.services.audit_rollup_service import AuditRollupService
+from app.utils.retention import RetentionExecutor
+
+
+# SQL Server partitioning objects created by migration 008
+PARTITION_FUNCTION = 'pf_log_auditoria_mes'
+PARTITION_SCHEME = 'ps_log_auditoria_mes'
+
+
+def month_start(value) -> date:
+    """First day of the month of a date/datetime"""
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    """First day of the month after value"""
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+class AuditArchiveService:
+    """
+    Service for the monthly audit log lifecycle.
+    
+    log_auditoria keeps the live months. Once a month is older than the
+    retention period it is exported to a gzip-compressed JSON lines file
+    under AUDIT_ARCHIVE_DIR, recorded in log_auditoria_arquivos and removed
+    from the live table, so history is kept without the table growing:
+    
+    - On SQL Server, log_auditoria is partitioned by month (migration 008):
+      an archived month is dropped with TRUNCATE ... WITH (PARTITIONS) and
+      its boundary merged, a metadata-only operation with no row locks
+    - Elsewhere the month's rows are deleted in throttled primary key chunks
+      (see RetentionExecutor), one short transaction per chunk
+    
+    AuditRepository reads the archives back when a query's date range needs
+    them. The audit rollups are caught up before a month is archived, so
+    statistics keep counting it without opening the archive files.
+    """
+    
+    def __init__(self, archive_repository: Optional[AuditArchiveRepository] = None):
+        """
+        Initialize AuditArchiveService.
+        
+        Args:
+            archive_repository: Repository for the archive catalog
+        """
+        self.archive_repository = archive_repository or AuditArchiveRepository()
+    
+    def get_archivable_months(self, retention_days: Optional[int] = None) -> List[date]:
+        """
+        Get the closed months with live rows older than the retention period.
+        
+        Args:
+            retention_days: Days to keep in the live table
+                (default AUDIT_LOG_RETENTION_DAYS)
+                
+        Returns:
+            First day of each archivable month, oldest first
+        """
+        if retention_days is None:
+            retention_days = current_app.config['AUDIT_LOG_RETENTION_DAYS']
+        # Only whole months strictly before the retention cutoff
+        limit = datetime.combine(
+            month_start(datetime.utcnow() - timedelta(days=retention_days)), datetime.min.time()
+        )
+        
+        oldest = db.session.query(func.min(LogAuditoria.data_hora)).filter(
+            LogAuditoria.data_hora < limit
+        ).scalar()
+        if not oldest:
+            return []
+        
+        months = []
+        mes = month_start(oldest)
+        while mes < limit.date():
+            inicio, fim = self._month_range(mes)
+            has_rows = db.session.query(LogAuditoria.id).filter(
+                LogAuditoria.data_hora >= inicio,
+                LogAuditoria.data_hora < fim
+            ).first()
+            if has_rows:
+                months.append(mes)
+            mes = next_month(mes)
+        return months
+    
+    def count_month(self, mes: date) -> int:
+        """Count live rows of a month"""
+        inicio, fim = self._month_range(mes)
+        return db.session.query(func.count(LogAuditoria.id)).filter(
+            LogAuditoria.data_hora >= inicio,
+            LogAuditoria.data_hora < fim
+        ).scalar() or 0
+    
+    def archive_closed_months(
+        self,
+        retention_days: Optional[int] = None,
+        archive: bool = True,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Archive (or drop) every closed month older than the retention period.
+        
+        Args:
+            retention_days: Days to keep in the live table
+            archive: If False, rows are removed without writing archive files
+            progress: Called with the executor metrics after every deleted chunk
+            
+        Returns:
+            One result dictionary per month (see archive_month)
+        """
+        # Roll the months up first; only months the rollups cover are archived
+        rollup_service = AuditRollupService()
+        rollup_service.catch_up(max_hours=0)
+        marcador = rollup_service.rollup_repository.get_marcador()
+        
+        results = []
+        for mes in self.get_archivable_months(retention_days):
+            if self._month_range(mes)[1] > marcador.hora_fechada:
+                break
+            results.append(self.archive_month(mes, archive=archive, progress=progress))
+        return results
+    
+    def archive_month(
+        self,
+        mes: date,
+        archive: bool = True,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Move one month of audit logs to an archive file.
+        
+        Rows are streamed to a temporary file, which is renamed into place and
+        recorded in the catalog before any row is removed; a failure leaves the
+        live rows untouched. If an earlier run was interrupted while deleting,
+        the rows its archive already holds are deleted first instead of being
+        archived again.
+        
+        Args:
+            mes: Any date in the month to archive
+            archive: If False, rows are removed without writing an archive file
+            progress: Called with the executor metrics after every deleted chunk
+            
+        Returns:
+            Dictionary with mes, registros, removidos, caminho, nativo and duration_ms
+        """
+        started = time.monotonic()
+        mes = month_start(mes)
+        arquivado_ate = max((a.id_max or 0 for a in self.archive_repository.get_by_month(mes)), default=0)
+        pendentes = self._delete_month(mes, arquivado_ate, progress) if arquivado_ate else 0
+        
+        arquivo = self._export_month(mes) if archive else None
+        if archive and arquivo is None:
+            registros = 0
+            nativo = False
+            removidos = 0
+        else:
+            registros = arquivo.total_registros if arquivo else 0
+            removidos = self._truncate_partition(mes, registros if arquivo else None)
+            nativo = removidos is not None
+            if not nativo:
+                removidos = self._delete_month(mes, arquivo.id_max if arquivo else None, progress)
+        removidos += pendentes
+        
+        result = {
+            'mes': mes.strftime('%Y-%m'),
+            'registros': registros,
+            'removidos': removidos,
+            'caminho': arquivo.caminho if arquivo else None,
+            'nativo': nativo,
+            'duration_ms': int((time.monotonic() - started) * 1000)
+        }
+        current_app.logger.info(
+            f"Audit month archived: {result['mes']} registros={result['registros']} "
+            f"removidos={removidos} nativo={nativo} duration_ms={result['duration_ms']}"
+        )
+        return result
+    
+    def ensure_partitions(self, months_ahead: Optional[int] = None) -> int:
+        """
+        Add monthly partition boundaries ahead of the current month (SQL Server).
+        
+        Splitting the empty partition at the end of the range is cheap, so this
+        runs before the months fill up.
+        
+        Args:
+            months_ahead: Months to prepare (default AUDIT_PARTITION_MONTHS_AHEAD)
+            
+        Returns:
+            Number of boundaries added (0 without native partitioning)
+        """
+        if not self._has_native_partitioning():
+            return 0
+        if months_ahead is None:
+            months_ahead = current_app.config['AUDIT_PARTITION_MONTHS_AHEAD']
+        
+        existing = {
+            value.date() if isinstance(value, datetime) else value
+            for (value,) in db.session.execute(text(
+                "SELECT CAST(v.value AS datetime) FROM sys.partition_range_values v "
+                "JOIN sys.partition_functions f ON f.function_id = v.function_id "
+                "WHERE f.name = :name"
+            ), {'name': PARTITION_FUNCTION})
+        }
+        
+        added = 0
+        mes = month_start(datetime.utcnow())
+        for _ in range(months_ahead + 1):
+            if mes not in existing:
+                db.session.execute(text(f"ALTER PARTITION SCHEME {PARTITION_SCHEME} NEXT USED [PRIMARY]"))
+                db.session.execute(text(
+                    f"ALTER PARTITION FUNCTION {PARTITION_FUNCTION}() SPLIT RANGE ('{mes.isoformat()}')"
+                ))
+                added += 1
+            mes = next_month(mes)
+        db.session.commit()
+        return added
+    
+    def _export_month(self, mes: date) -> Optional[ArquivoAuditoria]:
+        """Write a month's rows, newest first, to a new archive file and catalog it (None if empty)"""
+        inicio, fim = self._month_range(mes)
+        archive_dir = self.archive_repository.archive_dir()
+        os.makedirs(archive_dir, exist_ok=True)
+        
+        part = len(self.archive_repository.get_by_month(mes)) + 1
+        caminho = f"log_auditoria_{mes:%Y_%m}.jsonl.gz" if part == 1 else f"log_auditoria_{mes:%Y_%m}_{part}.jsonl.gz"
+        path = os.path.join(archive_dir, caminho)
+        tmp_path = path + '.tmp'
+        
+        table = LogAuditoria.__table__
+        query = select(table).where(
+            table.c.data_hora >= inicio,
+            table.c.data_hora < fim
+        ).order_by(table.c.data_hora.desc(), table.c.id.desc())
+        
+        arquivo = ArquivoAuditoria(mes=mes, caminho=caminho, total_registros=0)
+        batch_size = current_app.config['AUDIT_ARCHIVE_BATCH_SIZE']
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+                result = db.session.execute(query.execution_options(yield_per=batch_size))
+                for row in result.mappings():
+                    record = dict(row)
+                    record['data_hora'] = row['data_hora'].isoformat()
+                    if row['data_hora_fim']:
+                        record['data_hora_fim'] = row['data_hora_fim'].isoformat()
+                    archive.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    arquivo.total_registros += 1
+                    arquivo.id_min = min(arquivo.id_min or row['id'], row['id'])
+                    arquivo.id_max = max(arquivo.id_max or row['id'], row['id'])
+                    arquivo.data_inicio = row['data_hora']
+                    if arquivo.data_fim is None:
+                        arquivo.data_fim = row['data_hora']
+            
+            if not arquivo.total_registros:
+                os.remove(tmp_path)
+                return None
+            arquivo.tamanho_bytes = os.path.getsize(tmp_path)
+            arquivo.hash_arquivo = self._file_hash(tmp_path)
+            os.replace(tmp_path, path)
+            db.session.add(arquivo)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return arquivo
+    
+    def _delete_month(
+        self,
+        mes: date,
+        id_max: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> int:
+        """Delete a month's live rows in throttled primary key chunks"""
+        inicio, fim = self._month_range(mes)
+        executor = RetentionExecutor(
+            f"audit_month_{mes:%Y_%m}", LogAuditoria,
+            chunk_size=current_app.config['AUDIT_ARCHIVE_BATCH_SIZE'], progress=progress
+        )
+        
+        def filters(cutoff):
+            conditions = [LogAuditoria.data_hora >= inicio, LogAuditoria.data_hora < cutoff]
+            if id_max is not None:
+                # Rows that arrived after the export belong to a later archive part
+                conditions.append(LogAuditoria.id <= id_max)
+            return conditions
+        
+        return executor.run(fim, filters)['deleted']
+    
+    def _truncate_partition(self, mes: date, expected_rows: Optional[int]) -> Optional[int]:
+        """
+        Drop a month's partition when it holds exactly that month (SQL Server).
+        
+        Args:
+            mes: First day of the month
+            expected_rows: Rows exported; the partition is only truncated if it
+                still holds exactly these (None when not archiving)
+                
+        Returns:
+            Rows removed, or None to fall back to batched deletes
+        """
+        if not self._has_native_partitioning():
+            return None
+        
+        inicio, fim = self._month_range(mes)
+        partition_of = f"$PARTITION.{PARTITION_FUNCTION}"
+        anterior, atual, seguinte = db.session.execute(text(
+            f"SELECT {partition_of}(:anterior), {partition_of}(:inicio), {partition_of}(:fim)"
+        ), {'anterior': inicio - timedelta(days=1), 'inicio': inicio, 'fim': fim}).one()
+        if not (anterior + 1 == atual == seguinte - 1):
+            # Partition also covers other months
+            return None
+        rows = self.count_month(mes)
+        if expected_rows is not None and rows != expected_rows:
+            # Rows arrived during the export
+            return None
+        
+        db.session.execute(text(f"TRUNCATE TABLE log_auditoria WITH (PARTITIONS ({int(atual)}))"))
+        db.session.execute(text(
+            f"ALTER PARTITION FUNCTION {PARTITION_FUNCTION}() MERGE RANGE ('{mes.isoformat()}')"
+        ))
+        db.session.commit()
+        return rows
+    
+    @staticmethod
+    def _has_native_partitioning() -> bool:
+        """Whether log_auditoria is partitioned by the database"""
+        if db.engine.dialect.name != 'mssql':
+            return False
+        return db.session.execute(
+            text("SELECT 1 FROM sys.partition_functions WHERE name = :name"),
+            {'name': PARTITION_FUNCTION}
+        ).first() is not None
+    
+    @staticmethod
+    def _month_range(mes: date):
+        """[start, end) datetimes of a month"""
+        return (
+            datetime.combine(mes, datetime.min.time()),
+            datetime.combine(next_month(mes), datetime.min.time())
+        )
+    
+    @staticmethod
+    def _file_hash(path: str) -> str:
+        """SHA-256 of a file"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
@@ -0,0 +1,207 @@
+"""
+Audit rollup service for maintaining the hourly and daily audit counts
+"""
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Set
+from flask import current_app
+from sqlalchemy import select, insert, delete, func, literal
+from app import db
+from app.models.audit import LogAuditoria, ResumoAuditoriaHora, ResumoAuditoriaDia, MarcadorResumoAuditoria
+from app.repositories.audit_rollup_repository import AuditRollupRepository
+
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Closed hours committed per transaction
+COMMIT_EVERY_HOURS = 24
+
+
+def floor_hour(value: datetime) -> datetime:
+    """Start of the hour of a datetime"""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class AuditRollupService:
+    """
+    Service that keeps the audit rollups in step with log_auditoria.
+    
+    A watermark (log_auditoria_resumo_marcador) records the hour before
+    which the rollups are complete (hora_fechada) and the last log id they
+    include (ultimo_id). Each catch-up run:
+    
+    - Adds entries written late (id above ultimo_id, timestamp before
+      hora_fechada) to their hourly rows
+    - Closes every hour that ended AUDIT_ROLLUP_LAG_MINUTES ago, rebuilding
+      its hourly rows from log_auditoria with one grouped INSERT ... SELECT
+      (summing ocorrencias, so coalesced rows count every occurrence)
+    - Rebuilds the daily rows of the touched days from the hourly ones
+    
+    Runs are idempotent and resumable: the watermark advances in the same
+    transaction as the rows it covers.
+    """
+    
+    def __init__(self, rollup_repository: Optional[AuditRollupRepository] = None):
+        """
+        Initialize AuditRollupService.
+        
+        Args:
+            rollup_repository: Repository for the rollups and their watermark
+        """
+        self.rollup_repository = rollup_repository or AuditRollupRepository()
+    
+    def catch_up(self, max_hours: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Bring the rollups up to the last closed hour.
+        
+        Args:
+            max_hours: Hours to close in this run (default
+                AUDIT_ROLLUP_MAX_HOURS, 0 for no limit)
+                
+        Returns:
+            Dictionary with horas, dias, atrasadas, hora_fechada and duration_ms
+        """
+        started = time.monotonic()
+        if max_hours is None:
+            max_hours = current_app.config['AUDIT_ROLLUP_MAX_HOURS']
+        lag = timedelta(minutes=current_app.config['AUDIT_ROLLUP_LAG_MINUTES'])
+        limite = floor_hour(datetime.utcnow() - lag)
+        
+        marcador = self.rollup_repository.get_marcador()
+        if marcador is None:
+            oldest = db.session.query(func.min(LogAuditoria.data_hora)).scalar()
+            inicio = floor_hour(min(oldest or limite, limite))
+            marcador = MarcadorResumoAuditoria(inicio=inicio, hora_fechada=inicio, ultimo_id=0)
+            db.session.add(marcador)
+        
+        max_id = db.session.query(func.max(LogAuditoria.id)).scalar() or 0
+        dias = set()
+        atrasadas = self._apply_late_entries(marcador, max_id, dias)
+        
+        fim = limite
+        if max_hours:
+            fim = min(fim, marcador.hora_fechada + max_hours * HOUR)
+        
+        horas = 0
+        dias_total = set(dias)
+        hora = marcador.hora_fechada
+        while hora < fim:
+            # Skip the hours without entries
+            proxima = db.session.query(func.min(LogAuditoria.data_hora)).filter(
+                LogAuditoria.data_hora >= hora,
+                LogAuditoria.data_hora < fim,
+                LogAuditoria.id <= max_id
+            ).scalar()
+            if proxima is None:
+                hora = fim
+                break
+            hora = floor_hour(proxima)
+            
+            self._rebuild_hour(hora, max_id)
+            dias.add(hora.replace(hour=0))
+            horas += 1
+            hora += HOUR
+            if horas % COMMIT_EVERY_HOURS == 0:
+                dias_total |= dias
+                self._commit(marcador, hora, max_id, dias)
+        
+        dias_total |= dias
+        self._commit(marcador, max(hora, marcador.hora_fechada), max_id, dias)
+        
+        result = {
+            'horas': horas,
+            'dias': len(dias_total),
+            'atrasadas': atrasadas,
+            'hora_fechada': marcador.hora_fechada,
+            'duration_ms': int((time.monotonic() - started) * 1000)
+        }
+        current_app.logger.info(
+            f"Audit rollups caught up to {result['hora_fechada']:%Y-%m-%d %H:%M}: "
+            f"horas={horas} dias={result['dias']} atrasadas={atrasadas} "
+            f"duration_ms={result['duration_ms']}"
+        )
+        return result
+    
+    def _apply_late_entries(self, marcador: MarcadorResumoAuditoria, max_id: int, dias: Set[datetime]) -> int:
+        """Add entries written after their hour was closed to the hourly rows"""
+        late = db.session.query(
+            LogAuditoria.data_hora, LogAuditoria.acao, LogAuditoria.usuario_id, LogAuditoria.tabela,
+            LogAuditoria.ocorrencias
+        ).filter(
+            LogAuditoria.id > marcador.ultimo_id,
+            LogAuditoria.id <= max_id,
+            LogAuditoria.data_hora >= marcador.inicio,
+            LogAuditoria.data_hora < marcador.hora_fechada
+        )
+        counts = Counter()
+        for data_hora, acao, usuario_id, tabela, ocorrencias in late:
+            counts[(floor_hour(data_hora), acao, usuario_id, tabela)] += ocorrencias or 1
+        
+        for (periodo, acao, usuario_id, tabela), count in counts.items():
+            row = db.session.query(ResumoAuditoriaHora).filter(
+                ResumoAuditoriaHora.periodo == periodo,
+                ResumoAuditoriaHora.acao == acao,
+                ResumoAuditoriaHora.usuario_id.is_(None) if usuario_id is None
+                else ResumoAuditoriaHora.usuario_id == usuario_id,
+                ResumoAuditoriaHora.tabela.is_(None) if tabela is None
+                else ResumoAuditoriaHora.tabela == tabela
+            ).first()
+            if row:
+                row.total += count
+            else:
+                db.session.add(ResumoAuditoriaHora(
+                    periodo=periodo, acao=acao, usuario_id=usuario_id, tabela=tabela, total=count
+                ))
+            dias.add(periodo.replace(hour=0))
+        db.session.flush()
+        return sum(counts.values())
+    
+    def _rebuild_hour(self, hora: datetime, max_id: int) -> None:
+        """Replace an hour's rollup rows with a grouped count of its entries"""
+        db.session.execute(delete(ResumoAuditoriaHora).where(ResumoAuditoriaHora.periodo == hora))
+        grouped = select(
+            literal(hora, ResumoAuditoriaHora.periodo.type),
+            LogAuditoria.acao,
+            LogAuditoria.usuario_id,
+            LogAuditoria.tabela,
+            func.sum(LogAuditoria.ocorrencias)
+        ).where(
+            LogAuditoria.data_hora >= hora,
+            LogAuditoria.data_hora < hora + HOUR,
+            LogAuditoria.id <= max_id
+        ).group_by(LogAuditoria.acao, LogAuditoria.usuario_id, LogAuditoria.tabela)
+        db.session.execute(insert(ResumoAuditoriaHora).from_select(
+            ['periodo', 'acao', 'usuario_id', 'tabela', 'total'], grouped
+        ))
+    
+    def _rebuild_day(self, dia: datetime) -> None:
+        """Replace a day's rollup rows with the sum of its hourly rows"""
+        db.session.execute(delete(ResumoAuditoriaDia).where(ResumoAuditoriaDia.periodo == dia))
+        grouped = select(
+            literal(dia, ResumoAuditoriaDia.periodo.type),
+            ResumoAuditoriaHora.acao,
+            ResumoAuditoriaHora.usuario_id,
+            ResumoAuditoriaHora.tabela,
+            func.sum(ResumoAuditoriaHora.total)
+        ).where(
+            ResumoAuditoriaHora.periodo >= dia,
+            ResumoAuditoriaHora.periodo < dia + DAY
+        ).group_by(ResumoAuditoriaHora.acao, ResumoAuditoriaHora.usuario_id, ResumoAuditoriaHora.tabela)
+        db.session.execute(insert(ResumoAuditoriaDia).from_select(
+            ['periodo', 'acao', 'usuario_id', 'tabela', 'total'], grouped
+        ))
+    
+    def _commit(self, marcador: MarcadorResumoAuditoria, hora_fechada: datetime, max_id: int, dias: Set[datetime]) -> None:
+        """Rebuild the touched days and advance the watermark in one transaction"""
+        try:
+            for dia in sorted(dias):
+                self._rebuild_day(dia)
+            dias.clear()
+            marcador.hora_fechada = hora_fechada
+            marcador.ultimo_id = max(marcador.ultimo_id or 0, max_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
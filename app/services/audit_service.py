@@ -2,12 +2,29 @@
 Audit service for logging and tracking all system operations
 Handles automatic logging of user actions, audit trail queries, and reporting
 """
-from typing import Optional, Dict, Any, List
+import csv
+import io
+import json
+import zlib
+from typing import Optional, Dict, Any, List, Iterator
 from datetime import datetime
-from flask import request
+from flask import request, current_app
 from app import db
 from app.models.audit import LogAuditoria
 from app.repositories.audit_repository import AuditRepository
+from app.services.report_aggregation import ReportAggregator, Total, CountBy, Distinct
+from app.utils.audit_coalescer import audit_coalescer
+from app.utils.audit_writer import audit_writer
+
+
+# Streaming export formats: (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'json': ('application/json', 'json')
+}
+EXPORT_FIELDS = ['id', 'usuario_id', 'acao', 'tabela', 'registro_id',
+                 'ip_address', 'user_agent', 'data_hora', 'ocorrencias', 'data_hora_fim', 'dados']
 
 
 class AuditServiceError(Exception):
@@ -26,6 +43,7 @@ class AuditService:
             audit_repository: Repository for audit data access
         """
         self.audit_repository = audit_repository or AuditRepository()
+        self.aggregator = ReportAggregator(self.audit_repository)
     
     def log_action(
         self,
@@ -50,7 +68,8 @@ class AuditService:
             user_agent: User agent string (auto-detected if not provided)
             
         Returns:
-            Created LogAuditoria instance
+            Created LogAuditoria instance (not yet persisted when queued
+            for the background writer, see app.utils.audit_writer)
             
         Example:
             audit_service.log_action(
@@ -83,19 +102,78 @@ class AuditService:
             tabela=tabela,
             registro_id=registro_id,
             ip_address=ip_address,
-            user_agent=user_agent
+            user_agent=user_agent,
+            data_hora=datetime.utcnow()
         )
         
         # Set additional data if provided
         if dados:
             log_entry.dados = dados
         
+        # Repeated views/downloads are counted on the row already written for
+        # them; everything else goes to the background writer, and
+        # security-critical actions, a full queue or a disabled writer fall
+        # back to an inline commit
+        row = log_entry.to_row()
+        if audit_coalescer.submit(row) or audit_writer.submit(row):
+            return log_entry
+        
         # Save to database
         db.session.add(log_entry)
         db.session.commit()
         
         return log_entry
     
+    def log_actions_bulk(
+        self,
+        entries: List[Dict[str, Any]],
+        commit: bool = True
+    ) -> int:
+        """
+        Log several actions with a single bulk insert
+        
+        IP address and user agent are resolved once from the current request
+        and shared by every entry that does not provide its own.
+        
+        Args:
+            entries: List of dicts accepting the same keys as log_action
+                (usuario_id, acao, tabela, registro_id, dados, ip_address, user_agent)
+            commit: Whether to commit; pass False to join the caller's transaction
+        
+        Returns:
+            Number of entries written
+        """
+        if not entries:
+            return 0
+        
+        try:
+            ip_address = self._get_client_ip()
+            user_agent = request.headers.get('User-Agent')
+        except RuntimeError:
+            # Not in request context
+            ip_address = None
+            user_agent = None
+        
+        mappings = []
+        for entry in entries:
+            dados = entry.get('dados')
+            mappings.append({
+                'usuario_id': entry.get('usuario_id'),
+                'acao': entry['acao'],
+                'tabela': entry.get('tabela'),
+                'registro_id': entry.get('registro_id'),
+                'dados_json': json.dumps(dados) if dados else None,
+                'ip_address': entry.get('ip_address', ip_address),
+                'user_agent': entry.get('user_agent', user_agent),
+                'data_hora': entry.get('data_hora') or datetime.utcnow()
+            })
+        
+        db.session.bulk_insert_mappings(LogAuditoria, mappings)
+        if commit:
+            db.session.commit()
+        
+        return len(mappings)
+    
     def _get_client_ip(self) -> Optional[str]:
         """
         Get client IP address from request, handling proxies
@@ -593,6 +671,52 @@ class AuditService:
             per_page=per_page
         )
     
+    def scroll_logs(
+        self,
+        usuario_id: Optional[int] = None,
+        acao: Optional[str] = None,
+        tabela: Optional[str] = None,
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        ip_address: Optional[str] = None,
+        antes_de: Optional[datetime] = None,
+        antes_id: Optional[int] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Get the next page of audit logs after a keyset cursor (infinite scroll)
+        
+        Args:
+            usuario_id: Optional user ID filter
+            acao: Optional action type filter
+            tabela: Optional table name filter
+            data_inicio: Optional start date filter
+            data_fim: Optional end date filter
+            ip_address: Optional IP address filter
+            antes_de: data_hora of the last row received (None for the first page)
+            antes_id: id of the last row received
+            limit: Maximum rows to return
+            
+        Returns:
+            Dictionary with items, has_more and next_cursor
+            
+        Example:
+            page = audit_service.scroll_logs(acao='download', limit=50)
+            if page['has_more']:
+                page = audit_service.scroll_logs(acao='download', limit=50, **page['next_cursor'])
+        """
+        return self.audit_repository.scroll_logs(
+            usuario_id=usuario_id,
+            acao=acao,
+            tabela=tabela,
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            ip_address=ip_address,
+            antes_de=antes_de,
+            antes_id=antes_id,
+            limit=limit
+        )
+    
     def get_action_statistics(
         self,
         data_inicio: Optional[datetime] = None,
@@ -739,6 +863,135 @@ class AuditService:
         else:  # format == 'dict' or default
             return logs
     
+    def stream_export(
+        self,
+        format: str = 'csv',
+        compress: bool = False,
+        usuario_id: Optional[int] = None,
+        acao: Optional[str] = None,
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        antes_de: Optional[datetime] = None,
+        antes_id: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """
+        Export audit logs as a stream of encoded chunks.
+        
+        Rows are read in batches and written one at a time, so memory stays
+        flat whatever the size of the export. Rows come newest first; pass
+        the data_hora and id of the last row received as antes_de and
+        antes_id to resume an interrupted export.
+        
+        Args:
+            format: Export format ('csv', 'jsonl' or 'json')
+            compress: Gzip the stream
+            usuario_id: Optional user ID filter
+            acao: Optional action type filter
+            data_inicio: Optional start date
+            data_fim: Optional end date
+            antes_de: Optional resume position (data_hora of the last row received)
+            antes_id: ID of the last row received
+            batch_size: Rows fetched per database round trip
+                (default AUDIT_EXPORT_BATCH_SIZE)
+            chunk_size: Approximate size of each yielded chunk in bytes
+            
+        Returns:
+            Iterator of bytes
+            
+        Raises:
+            AuditServiceError: If the format is not supported
+            
+        Example:
+            return Response(
+                stream_with_context(audit_service.stream_export('jsonl', compress=True)),
+                mimetype='application/gzip'
+            )
+        """
+        if format not in EXPORT_FORMATS:
+            raise AuditServiceError(f'Formato de exportação inválido: {format}')
+        
+        if batch_size is None:
+            batch_size = current_app.config['AUDIT_EXPORT_BATCH_SIZE']
+        
+        rows = self.audit_repository.iter_export(
+            usuario_id=usuario_id,
+            acao=acao,
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            antes_de=antes_de,
+            antes_id=antes_id,
+            batch_size=batch_size
+        )
+        chunks = self._buffer_chunks(self._encode_rows(rows, format), chunk_size)
+        return self._gzip_chunks(chunks) if compress else chunks
+    
+    @staticmethod
+    def _encode_rows(rows: Iterator[Dict[str, Any]], format: str) -> Iterator[str]:
+        """Encode export rows one by one"""
+        if format == 'csv':
+            line = io.StringIO()
+            writer = csv.DictWriter(line, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                # dados stays as its JSON text
+                writer.writerow(dict(
+                    row,
+                    data_hora=row['data_hora'].isoformat(),
+                    data_hora_fim=row['data_hora_fim'].isoformat() if row.get('data_hora_fim') else '',
+                    dados=row['dados_json'] or ''
+                ))
+                yield line.getvalue()
+                line.seek(0)
+                line.truncate()
+            yield line.getvalue()
+            return
+        
+        if format == 'json':
+            yield '['
+        separator = '\n' if format == 'jsonl' else ','
+        first = True
+        for row in rows:
+            record = {field: row.get(field) for field in EXPORT_FIELDS[:-1]}
+            record['data_hora'] = row['data_hora'].isoformat()
+            if record['data_hora_fim']:
+                record['data_hora_fim'] = record['data_hora_fim'].isoformat()
+            record['dados'] = json.loads(row['dados_json']) if row['dados_json'] else {}
+            encoded = json.dumps(record, ensure_ascii=False)
+            if format == 'jsonl':
+                yield encoded + separator
+            else:
+                yield encoded if first else separator + encoded
+            first = False
+        if format == 'json':
+            yield ']'
+    
+    @staticmethod
+    def _buffer_chunks(pieces: Iterator[str], chunk_size: int) -> Iterator[bytes]:
+        """Group encoded pieces into UTF-8 chunks of about chunk_size bytes"""
+        buffer = []
+        size = 0
+        for piece in pieces:
+            buffer.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield ''.join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+    
+    @staticmethod
+    def _gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Gzip a stream of chunks incrementally"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    
     def generate_audit_report(
         self,
         report_type: str,
@@ -795,21 +1048,13 @@ class AuditService:
         data_inicio: Optional[datetime],
         data_fim: Optional[datetime]
     ) -> Dict[str, Any]:
-        """Generate summary audit report"""
-        # Get action statistics
-        action_stats = self.get_action_statistics(data_inicio, data_fim)
-        
-        # Get user activity statistics
-        user_stats = self.get_user_activity_statistics(data_inicio, data_fim, limit=10)
-        
-        # Get daily activity
-        days = 30
-        if data_inicio and data_fim:
-            days = (data_fim - data_inicio).days
-        daily_activity = self.get_daily_activity(days=min(days, 90))
-        
-        # Calculate total actions
-        total_actions = sum(stat['count'] for stat in action_stats)
+        """Generate summary audit report (one grouped count for all figures)"""
+        activity = self.aggregator.aggregate([
+            Total('total_actions'),
+            CountBy('by_action', 'acao'),
+            CountBy('by_user', 'usuario_id'),
+            CountBy('by_day', 'dia')
+        ], data_inicio, data_fim)
         
         return {
             'report_type': 'summary',
@@ -817,10 +1062,17 @@ class AuditService:
                 'data_inicio': data_inicio.isoformat() if data_inicio else None,
                 'data_fim': data_fim.isoformat() if data_fim else None
             },
-            'total_actions': total_actions,
-            'action_statistics': action_stats,
-            'top_users': user_stats,
-            'daily_activity': daily_activity,
+            'total_actions': activity['total_actions'],
+            'action_statistics': [
+                {'acao': acao, 'count': count} for acao, count in activity['by_action'].most_common()
+            ],
+            'top_users': [
+                {'usuario_id': usuario_id, 'count': count}
+                for usuario_id, count in activity['by_user'].most_common(10)
+            ],
+            'daily_activity': [
+                {'date': dia.isoformat(), 'count': count} for dia, count in sorted(activity['by_day'].items())
+            ],
             'generated_at': datetime.utcnow().isoformat()
         }
     
@@ -834,22 +1086,22 @@ class AuditService:
         if not usuario_id:
             raise AuditServiceError("usuario_id is required for user_activity report")
         
-        # Get user's logs
-        logs_result = self.filter_logs(
+        # Counts over the whole period from one grouped count
+        activity = self.aggregator.aggregate([
+            Total('total_actions'),
+            CountBy('action_breakdown', 'acao'),
+            Total('logins', acao='login'),
+            Total('failed_logins', acao='login_failed')
+        ], data_inicio, data_fim, filters={'usuario_id': usuario_id})
+        
+        # Last 50 actions through the (usuario_id, data_hora) index
+        recent = self.audit_repository.scroll_logs(
             usuario_id=usuario_id,
             data_inicio=data_inicio,
             data_fim=data_fim,
-            per_page=1000  # Get more for report
+            limit=50
         )
         
-        # Count actions by type
-        action_counts = {}
-        for log in logs_result['items']:
-            action_counts[log.acao] = action_counts.get(log.acao, 0) + 1
-        
-        # Get login history
-        login_history = self.get_login_history(usuario_id=usuario_id, hours=24*30)
-        
         return {
             'report_type': 'user_activity',
             'usuario_id': usuario_id,
@@ -857,10 +1109,10 @@ class AuditService:
                 'data_inicio': data_inicio.isoformat() if data_inicio else None,
                 'data_fim': data_fim.isoformat() if data_fim else None
             },
-            'total_actions': logs_result['total'],
-            'action_breakdown': action_counts,
-            'recent_logins': len([l for l in login_history if l.acao == 'login']),
-            'failed_logins': len([l for l in login_history if l.acao == 'login_failed']),
+            'total_actions': activity['total_actions'],
+            'action_breakdown': dict(activity['action_breakdown']),
+            'recent_logins': activity['logins'],
+            'failed_logins': activity['failed_logins'],
             'recent_activity': [
                 {
                     'acao': log.acao,
@@ -869,7 +1121,7 @@ class AuditService:
                     'data_hora': log.data_hora.isoformat() if log.data_hora else None,
                     'ip_address': log.ip_address
                 }
-                for log in logs_result['items'][:50]  # Last 50 actions
+                for log in recent['items']
             ],
             'generated_at': datetime.utcnow().isoformat()
         }
@@ -893,13 +1145,12 @@ class AuditService:
         if data_fim:
             logs = [l for l in logs if l.data_hora <= data_fim]
         
-        # Count actions by type
-        action_counts = {}
-        unique_users = set()
-        for log in logs:
-            action_counts[log.acao] = action_counts.get(log.acao, 0) + 1
-            if log.usuario_id:
-                unique_users.add(log.usuario_id)
+        # Figures from the same pass over the trail the timeline shows
+        activity = self.aggregator.fold([
+            CountBy('action_breakdown', 'acao'),
+            Distinct('unique_users', 'usuario_id')
+        ], logs)
+        action_counts = activity['action_breakdown']
         
         return {
             'report_type': 'document_activity',
@@ -908,9 +1159,9 @@ class AuditService:
                 'data_inicio': data_inicio.isoformat() if data_inicio else None,
                 'data_fim': data_fim.isoformat() if data_fim else None
             },
-            'total_actions': len(logs),
-            'unique_users': len(unique_users),
-            'action_breakdown': action_counts,
+            'total_actions': sum(action_counts.values()),
+            'unique_users': activity['unique_users'],
+            'action_breakdown': dict(action_counts),
             'views': action_counts.get('view', 0),
             'downloads': action_counts.get('download', 0),
             'edits': action_counts.get('edit', 0),
@@ -919,6 +1170,8 @@ class AuditService:
                     'acao': log.acao,
                     'usuario_id': log.usuario_id,
                     'data_hora': log.data_hora.isoformat() if log.data_hora else None,
+                    'ocorrencias': log.ocorrencias or 1,
+                    'data_hora_fim': log.data_hora_fim.isoformat() if log.data_hora_fim else None,
                     'ip_address': log.ip_address,
                     'dados': log.dados
                 }
@@ -932,45 +1185,15 @@ class AuditService:
         data_inicio: Optional[datetime],
         data_fim: Optional[datetime]
     ) -> Dict[str, Any]:
-        """Generate security audit report"""
-        # Get all login attempts
-        all_logins = self.audit_repository.filter_logs(
-            acao='login',
-            data_inicio=data_inicio,
-            data_fim=data_fim,
-            per_page=10000
-        )
-        
-        failed_logins = self.audit_repository.filter_logs(
-            acao='login_failed',
-            data_inicio=data_inicio,
-            data_fim=data_fim,
-            per_page=10000
-        )
-        
-        # Analyze failed login patterns
-        failed_by_ip = {}
-        failed_by_user = {}
-        
-        for log in failed_logins['items']:
-            if log.ip_address:
-                failed_by_ip[log.ip_address] = failed_by_ip.get(log.ip_address, 0) + 1
-            if log.usuario_id:
-                failed_by_user[log.usuario_id] = failed_by_user.get(log.usuario_id, 0) + 1
-        
-        # Get top suspicious IPs (most failed logins)
-        suspicious_ips = sorted(
-            [{'ip': ip, 'failed_attempts': count} for ip, count in failed_by_ip.items()],
-            key=lambda x: x['failed_attempts'],
-            reverse=True
-        )[:10]
-        
-        # Get users with most failed logins
-        users_with_failures = sorted(
-            [{'usuario_id': uid, 'failed_attempts': count} for uid, count in failed_by_user.items()],
-            key=lambda x: x['failed_attempts'],
-            reverse=True
-        )[:10]
+        """Generate security audit report (one grouped count of login attempts)"""
+        activity = self.aggregator.aggregate([
+            Total('successful_logins', acao='login'),
+            Total('failed_logins', acao='login_failed'),
+            CountBy('failed_by_ip', 'ip_address', acao='login_failed'),
+            CountBy('failed_by_user', 'usuario_id', acao='login_failed')
+        ], data_inicio, data_fim, filters={'acao': ['login', 'login_failed']})
+        successful = activity['successful_logins']
+        failed = activity['failed_logins']
         
         return {
             'report_type': 'security',
@@ -978,12 +1201,18 @@ class AuditService:
                 'data_inicio': data_inicio.isoformat() if data_inicio else None,
                 'data_fim': data_fim.isoformat() if data_fim else None
             },
-            'successful_logins': all_logins['total'],
-            'failed_logins': failed_logins['total'],
-            'success_rate': (all_logins['total'] / (all_logins['total'] + failed_logins['total']) * 100) 
-                           if (all_logins['total'] + failed_logins['total']) > 0 else 0,
-            'suspicious_ips': suspicious_ips,
-            'users_with_failures': users_with_failures,
+            'successful_logins': successful,
+            'failed_logins': failed,
+            'success_rate': (successful / (successful + failed) * 100) if (successful + failed) > 0 else 0,
+            # Top suspicious IPs and users with most failed logins
+            'suspicious_ips': [
+                {'ip': ip, 'failed_attempts': count}
+                for ip, count in activity['failed_by_ip'].most_common(10)
+            ],
+            'users_with_failures': [
+                {'usuario_id': usuario_id, 'failed_attempts': count}
+                for usuario_id, count in activity['failed_by_user'].most_common(10)
+            ],
             'generated_at': datetime.utcnow().isoformat()
         }
     
@@ -7,6 +7,8 @@ from app import db
 from app.models.document import Categoria, Pasta
 from app.repositories.category_repository import CategoryRepository, FolderRepository
 from app.services.audit_service import AuditService
+from app.services.permission_service import PermissionService
+from app.utils.category_tree import category_tree
 
 
 class CategoryService:
@@ -50,6 +52,7 @@ class CategoryService:
             ordem=data.get('ordem', 0),
             ativo=True
         )
+        category_tree.bump_version()
         
         # Log action
         self.audit_service.log_action(
@@ -101,6 +104,11 @@ class CategoryService:
         
         # Save changes
         self.category_repo.save(categoria)
+        category_tree.bump_version()
+        
+        # Documents below a moved category inherit from a different chain
+        if categoria.categoria_pai_id != old_data['categoria_pai_id']:
+            PermissionService().refresh_category_permissions(categoria.id)
         
         # Log action
         self.audit_service.log_action(
@@ -137,6 +145,7 @@ class CategoryService:
         # Deactivate category
         categoria.ativo = False
         self.category_repo.save(categoria)
+        category_tree.bump_version()
         
         # Log action
         self.audit_service.log_action(
@@ -164,14 +173,15 @@ class CategoryService:
         if not categoria:
             raise ValueError('Categoria não encontrada')
         
-        doc_count = self.category_repo.get_document_count(categoria_id, include_subcategories=False)
-        doc_count_total = self.category_repo.get_document_count(categoria_id, include_subcategories=True)
+        # Maintained counters (see app.models.container_stats)
         subcategories = self.category_repo.get_subcategories(categoria_id)
         
         return {
             'categoria': categoria,
-            'document_count': doc_count,
-            'document_count_total': doc_count_total,
+            'document_count': categoria.total_documentos,
+            'document_count_total': categoria.total_documentos_subarvore,
+            'total_bytes': categoria.total_bytes,
+            'total_bytes_total': categoria.total_bytes_subarvore,
             'subcategory_count': len(subcategories),
             'subcategories': subcategories
         }
@@ -290,6 +300,10 @@ class FolderService:
         # Save changes
         self.folder_repo.save(pasta)
         
+        # Documents below a moved folder inherit from a different chain
+        if pasta.pasta_pai_id != old_data['pasta_pai_id']:
+            PermissionService().refresh_folder_permissions(pasta.id)
+        
         # Log action
         self.audit_service.log_action(
             usuario_id=usuario_id,
@@ -367,12 +381,15 @@ class FolderService:
         if not pasta:
             raise ValueError('Pasta não encontrada')
         
-        doc_count = self.folder_repo.get_document_count(pasta_id)
+        # Maintained counters (see app.models.container_stats)
         subfolders = self.folder_repo.get_subfolders(pasta_id)
         
         return {
             'pasta': pasta,
-            'document_count': doc_count,
+            'document_count': pasta.total_documentos,
+            'document_count_total': pasta.total_documentos_subarvore,
+            'total_bytes': pasta.total_bytes,
+            'total_bytes_total': pasta.total_bytes_subarvore,
             'subfolder_count': len(subfolders),
             'subfolders': subfolders
         }
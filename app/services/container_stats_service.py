@@ -0,0 +1,83 @@
+"""
+Container statistics service for reconciling the document counters of
+categories and folders
+"""
+import time
+from typing import Dict, Any
+from sqlalchemy import select, func
+from app import db
+from app.models.document import Documento, Categoria, Pasta
+from app.models.container_stats import STATS_COLUMNS, add_to_counters
+from app.models.hierarchy import ancestor_ids
+
+
+class ContainerStatsService:
+    """
+    Service that checks the maintained counters against the documents.
+    
+    The counters are kept up to date by session events on every ORM write
+    (app.models.container_stats); reconciliation recounts the active
+    documents with one grouped query per table, rebuilds the subtree sums
+    from the materialized paths and corrects only the rows that drifted
+    (after bulk statements or manual SQL). Corrections are applied as
+    increments rather than overwrites; run it off-peak, since a document
+    written between the recount and the correction can leave a drift for
+    the next run to fix.
+    """
+    
+    CONTAINERS = (
+        ('categorias', Categoria, Documento.categoria_id),
+        ('pastas', Pasta, Documento.pasta_id)
+    )
+    
+    def reconcile(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Recount the counters of every category and folder.
+        
+        Args:
+            dry_run: Only report the drift, change nothing
+            
+        Returns:
+            Dictionary with verificadas and corrigidas per table, and duration_ms
+        """
+        started = time.monotonic()
+        metrics = {}
+        
+        for nome, model, document_column in self.CONTAINERS:
+            direct = {
+                row[0]: (row[1], row[2] or 0)
+                for row in db.session.query(
+                    document_column, func.count(Documento.id), func.sum(Documento.tamanho_bytes)
+                ).filter(
+                    Documento.status == 'ativo',
+                    document_column.isnot(None)
+                ).group_by(document_column)
+            }
+            
+            nodes = db.session.execute(
+                select(model.id, model.caminho_ids, *(getattr(model, column) for column in STATS_COLUMNS))
+            ).all()
+            expected = {node.id: [*direct.get(node.id, (0, 0)), 0, 0] for node in nodes}
+            for node in nodes:
+                documentos, tamanho = direct.get(node.id, (0, 0))
+                for subtree_id in ancestor_ids(node.caminho_ids) + [node.id]:
+                    if subtree_id in expected:
+                        expected[subtree_id][2] += documentos
+                        expected[subtree_id][3] += tamanho
+            
+            changes = {}
+            for node in nodes:
+                stored = [getattr(node, column) or 0 for column in STATS_COLUMNS]
+                if stored != expected[node.id]:
+                    changes[node.id] = [value - current for value, current in zip(expected[node.id], stored)]
+            
+            if changes and not dry_run:
+                add_to_counters(db.session.connection(), model.__table__, changes)
+                db.session.commit()
+            
+            metrics[nome] = {'verificadas': len(nodes), 'corrigidas': len(changes)}
+        
+        if dry_run:
+            db.session.rollback()
+        metrics['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return metrics
@@ -2,16 +2,23 @@
 Document service for document management operations
 Handles document upload, retrieval, update, deletion, and versioning
 """
-from typing import Optional, List, Dict, Any, BinaryIO
+from typing import Optional, List, Dict, Any, BinaryIO, Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from werkzeug.datastructures import FileStorage
+from sqlalchemy import update
 from app import db
-from app.models.document import Documento, Tag, DocumentoTag
+from app.models.document import Documento, Tag, DocumentoTag, Categoria, Pasta
+from app.models.container_stats import apply_stats_deltas, expire_counters
 from app.models.version import Versao
 from app.models.permission import Permissao
 from app.repositories.document_repository import DocumentRepository, TagRepository
+from app.repositories.version_repository import VersionRepository
 from app.services.storage_service import StorageService
+from app.services.permission_service import PermissionService
 from app.utils.file_handler import FileHandler, FileValidationError
+from app.utils.permission_cache import permission_cache, PERMISSION_BITS
+from app.utils.retention import RetentionExecutor, delete_files_parallel
 
 
 class DocumentServiceError(Exception):
@@ -34,20 +41,19 @@ class DocumentNotFoundError(DocumentServiceError):
     pass
 
 
-class VersionLimitExceededError(DocumentServiceError):
-    """Raised when version limit is exceeded"""
-    pass
-
-
 class DocumentService:
     """Service for document management operations"""
     
+    # Bulk moves check permissions and update documents in chunks of this size
+    BULK_MOVE_CHUNK_SIZE = 500
+    
     def __init__(
         self,
         storage_service: StorageService,
         file_handler: FileHandler,
         document_repository: Optional[DocumentRepository] = None,
-        tag_repository: Optional[TagRepository] = None
+        tag_repository: Optional[TagRepository] = None,
+        version_repository: Optional[VersionRepository] = None
     ):
         """
         Initialize document service
@@ -57,11 +63,13 @@ class DocumentService:
             file_handler: Handler for file validation
             document_repository: Repository for document data access
             tag_repository: Repository for tag data access
+            version_repository: Repository for version data access
         """
         self.storage_service = storage_service
         self.file_handler = file_handler
         self.document_repository = document_repository or DocumentRepository()
         self.tag_repository = tag_repository or TagRepository()
+        self.version_repository = version_repository or VersionRepository()
     
     def upload_document(
         self,
@@ -141,9 +149,14 @@ class DocumentService:
             user_id=user_id,
             caminho_arquivo=storage_result['file_path'],
             tamanho_bytes=validation_result['file_size'],
-            comentario='Initial version'
+            comentario='Initial version',
+            hash_arquivo=validation_result['file_hash']
         )
         
+        # Inherit folder/category grants
+        if categoria_id or pasta_id:
+            PermissionService().refresh_effective_permissions([documento.id])
+        
         # Log document upload
         try:
             from app.services.audit_service import AuditService
@@ -170,6 +183,202 @@ class DocumentService:
         
         return documento
     
+    def upload_documents_batch(
+        self,
+        files: List[FileStorage],
+        user_id: int,
+        descricao: Optional[str] = None,
+        categoria_id: Optional[int] = None,
+        pasta_id: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        check_duplicates: bool = True,
+        max_workers: int = 4
+    ) -> Dict[str, Any]:
+        """
+        Upload several documents sharing the same metadata
+        
+        Files are validated, hashed and written to storage concurrently.
+        Duplicates are detected with a single query, and all database rows
+        (documents, tag associations, versions and audit entries) are written
+        in one transaction. Files that fail validation or are duplicates are
+        reported in 'errors' without aborting the rest of the batch.
+        
+        Args:
+            files: Files to upload
+            user_id: ID of user uploading the documents
+            descricao: Description shared by all documents
+            categoria_id: Category ID shared by all documents
+            pasta_id: Folder ID shared by all documents
+            tags: List of tag names shared by all documents
+            check_duplicates: Whether to check for duplicate files
+            max_workers: Maximum number of threads for validation and storage
+        
+        Returns:
+            Dictionary with created documents and per-file errors
+            {
+                'documents': [Documento, ...],
+                'errors': [{'filename': 'a.pdf', 'error': '...'}, ...]
+            }
+        
+        Raises:
+            DocumentServiceError: If the database transaction fails
+                (no document from the batch is created in that case)
+        """
+        files = [file for file in files if file and file.filename]
+        errors = []
+        
+        if not files:
+            return {'documents': [], 'errors': errors}
+        
+        workers = max(1, min(max_workers, len(files)))
+        
+        def validate(file: FileStorage):
+            try:
+                return file, self.file_handler.validate_file(file.stream, file.filename), None
+            except FileValidationError as e:
+                return file, None, str(e)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            validated = list(executor.map(validate, files))
+        
+        accepted = []
+        for file, validation_result, error in validated:
+            if error:
+                errors.append({'filename': file.filename, 'error': error})
+            else:
+                accepted.append((file, validation_result))
+        
+        # Check for duplicates against stored documents and within the batch
+        if check_duplicates and accepted:
+            existing = self.document_repository.get_by_hashes(
+                [validation_result['file_hash'] for _, validation_result in accepted]
+            )
+            seen_hashes = set()
+            unique = []
+            for file, validation_result in accepted:
+                file_hash = validation_result['file_hash']
+                if file_hash in existing:
+                    errors.append({
+                        'filename': file.filename,
+                        'error': f"Document with same content already exists: {existing[file_hash].nome}"
+                    })
+                elif file_hash in seen_hashes:
+                    errors.append({
+                        'filename': file.filename,
+                        'error': "Duplicate file in the same batch"
+                    })
+                else:
+                    seen_hashes.add(file_hash)
+                    unique.append((file, validation_result))
+            accepted = unique
+        
+        if not accepted:
+            return {'documents': [], 'errors': errors}
+        
+        def store(item):
+            file, validation_result = item
+            try:
+                return file, validation_result, self.storage_service.save_file(
+                    file.stream,
+                    file.filename,
+                    user_id
+                ), None
+            except OSError as e:
+                return file, validation_result, None, str(e)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            stored = list(executor.map(store, accepted))
+        
+        saved = []
+        for file, validation_result, storage_result, error in stored:
+            if error:
+                errors.append({'filename': file.filename, 'error': error})
+            else:
+                saved.append((validation_result, storage_result))
+        
+        if not saved:
+            return {'documents': [], 'errors': errors}
+        
+        tag_names = []
+        for tag_name in tags or []:
+            tag_name = tag_name.strip().lower()
+            if tag_name and tag_name not in tag_names:
+                tag_names.append(tag_name)
+        
+        try:
+            documentos = [
+                Documento(
+                    nome=storage_result['original_filename'],
+                    descricao=descricao or '',
+                    caminho_arquivo=storage_result['file_path'],
+                    nome_arquivo_original=storage_result['original_filename'],
+                    tamanho_bytes=validation_result['file_size'],
+                    tipo_mime=validation_result['mime_type'],
+                    hash_arquivo=validation_result['file_hash'],
+                    categoria_id=categoria_id,
+                    pasta_id=pasta_id,
+                    usuario_id=user_id,
+                    versao_atual=1,
+                    status='ativo'
+                )
+                for validation_result, storage_result in saved
+            ]
+            db.session.add_all(documentos)
+            db.session.flush()
+            
+            if tag_names:
+                tag_map = self.tag_repository.get_or_create_many(tag_names)
+                db.session.bulk_insert_mappings(DocumentoTag, [
+                    {'documento_id': documento.id, 'tag_id': tag.id}
+                    for documento in documentos
+                    for tag in tag_map.values()
+                ])
+            
+            db.session.bulk_insert_mappings(Versao, [
+                {
+                    'documento_id': documento.id,
+                    'numero_versao': 1,
+                    'caminho_arquivo': documento.caminho_arquivo,
+                    'tamanho_bytes': documento.tamanho_bytes,
+                    'hash_arquivo': documento.hash_arquivo,
+                    'usuario_id': user_id,
+                    'comentario': 'Initial version'
+                }
+                for documento in documentos
+            ])
+            
+            from app.services.audit_service import AuditService
+            AuditService().log_actions_bulk([
+                {
+                    'usuario_id': user_id,
+                    'acao': 'upload',
+                    'tabela': 'documentos',
+                    'registro_id': documento.id,
+                    'dados': {
+                        'nome': documento.nome,
+                        'tamanho_bytes': documento.tamanho_bytes,
+                        'tipo_mime': documento.tipo_mime
+                    }
+                }
+                for documento in documentos
+            ], commit=False)
+            
+            # Inherit folder/category grants
+            if categoria_id or pasta_id:
+                PermissionService().refresh_effective_permissions(
+                    [documento.id for documento in documentos], commit=False
+                )
+            
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # Remove files written for this batch so storage stays consistent
+            for _, storage_result in saved:
+                self.storage_service.delete_file(storage_result['file_path'])
+            raise DocumentServiceError(f"Batch upload failed: {e}")
+        
+        return {'documents': documentos, 'errors': errors}
+    
     def _associate_tags(self, documento: Documento, tag_names: List[str]) -> None:
         """
         Associate tags with a document
@@ -209,7 +418,10 @@ class DocumentService:
         user_id: int,
         caminho_arquivo: str,
         tamanho_bytes: int,
-        comentario: str
+        comentario: str,
+        hash_arquivo: Optional[str] = None,
+        numero_versao: Optional[int] = None,
+        commit: bool = True
     ) -> Versao:
         """
         Create a version record for a document
@@ -217,24 +429,81 @@ class DocumentService:
         Args:
             documento: Document to create version for
             user_id: ID of user creating the version
-            caminho_arquivo: Path to version file
+            caminho_arquivo: Path to the version blob
             tamanho_bytes: Size of version file
             comentario: Version comment
+            hash_arquivo: SHA256 hash of the blob content
+            numero_versao: Version number (defaults to the document's current version)
+            commit: Whether to commit the transaction
             
         Returns:
             Created Versao instance
         """
         versao = Versao(
             documento_id=documento.id,
-            numero_versao=documento.versao_atual,
+            numero_versao=numero_versao or documento.versao_atual,
             caminho_arquivo=caminho_arquivo,
             tamanho_bytes=tamanho_bytes,
+            hash_arquivo=hash_arquivo,
             usuario_id=user_id,
             comentario=comentario
         )
         db.session.add(versao)
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return versao
+    
+    def _prune_versions(self, documento: Documento) -> List[str]:
+        """
+        Drop the oldest versions beyond MAX_VERSIONS_PER_DOCUMENT
+        
+        Only Versao rows are removed here; the caller must commit and then
+        pass the returned paths to _delete_unreferenced_blobs so that blobs
+        still referenced by another version or by the document survive.
+        
+        Args:
+            documento: Document whose versions should be pruned
+            
+        Returns:
+            Storage paths of the pruned versions
+        """
+        pruned = self.version_repository.get_versions_to_prune(
+            documento.id,
+            keep=self._max_versions()
+        )
+        
+        caminhos = []
+        for versao in pruned:
+            caminhos.append(versao.caminho_arquivo)
+            db.session.delete(versao)
+        
+        return caminhos
+    
+    def _delete_unreferenced_blobs(self, caminhos: List[str]) -> int:
+        """
+        Delete blobs from storage when no version or document references them
+        
+        Args:
+            caminhos: Candidate storage paths
+            
+        Returns:
+            Number of blobs deleted
+        """
+        deleted = 0
+        for caminho in self.version_repository.get_unreferenced_blobs(caminhos):
+            if self.storage_service.delete_file(caminho):
+                deleted += 1
+        return deleted
+    
+    @staticmethod
+    def _max_versions() -> int:
+        """Get the configured version retention limit"""
+        try:
+            from flask import current_app
+            return current_app.config.get('MAX_VERSIONS_PER_DOCUMENT', 10)
+        except RuntimeError:
+            # Outside application context
+            return 10
 
     def get_document(self, document_id: int, user_id: int) -> Documento:
         """
@@ -279,32 +548,8 @@ class DocumentService:
         Returns:
             True if user has permission, False otherwise
         """
-        # Owner has all permissions
-        if documento.usuario_id == user_id:
-            return True
-        
-        # Check explicit permissions
-        permission = db.session.query(Permissao).filter_by(
-            documento_id=documento.id,
-            usuario_id=user_id,
-            tipo_permissao=permission_type
-        ).first()
-        
-        if permission and not permission.is_expired():
-            return True
-        
-        # For view permission, also check if user has edit, delete, or share permission
-        if permission_type == 'visualizar':
-            for perm_type in ['editar', 'excluir', 'compartilhar']:
-                permission = db.session.query(Permissao).filter_by(
-                    documento_id=documento.id,
-                    usuario_id=user_id,
-                    tipo_permissao=perm_type
-                ).first()
-                if permission and not permission.is_expired():
-                    return True
-        
-        return False
+        # Owner has all permissions; edit, delete and share imply view
+        return permission_cache.has_permission(documento, user_id, permission_type)
     
     def download_document(self, document_id: int, user_id: int) -> Dict[str, Any]:
         """
@@ -474,6 +719,7 @@ class DocumentService:
             raise PermissionDeniedError("You don't have permission to edit this document")
         
         # Update fields if provided
+        location = (documento.categoria_id, documento.pasta_id)
         if nome is not None:
             documento.nome = nome
         if descricao is not None:
@@ -496,11 +742,149 @@ class DocumentService:
         
         db.session.commit()
         
+        # Moving to another folder/category changes the inherited grants
+        if (documento.categoria_id, documento.pasta_id) != location:
+            PermissionService().refresh_effective_permissions([documento.id])
+        
         # Log update
         self._log_access(documento, user_id, 'update_metadata')
         
         return documento
     
+    def bulk_move_documents(
+        self,
+        user_id: int,
+        documento_ids: Optional[List[int]] = None,
+        query: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        categoria_id: Optional[int] = None,
+        pasta_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Move many documents to another folder and/or category at once
+        
+        The documents are given by ID or selected by a search (query and
+        filters, as in SearchService.search). Per chunk, edit permission is
+        checked with one bulk permission query, the documents are moved with
+        one UPDATE, and the folder/category counters, inherited permissions
+        and audit entries are written in the same transaction. Documents the
+        user cannot edit and unknown documents are reported and skipped.
+        
+        Args:
+            user_id: ID of user moving the documents
+            documento_ids: IDs of documents to move
+            query: Search term selecting the documents (when no IDs are given)
+            filters: Search filters selecting the documents (when no IDs are given)
+            categoria_id: New category ID (None keeps the category)
+            pasta_id: New folder ID (None keeps the folder, 0 takes the
+                documents out of their folder)
+                
+        Returns:
+            Dictionary with the count and skipped IDs
+            {
+                'moved': 480,     # documents moved
+                'denied': [7],    # documents the user cannot edit
+                'not_found': [9]  # unknown documents
+            }
+            
+        Raises:
+            DocumentServiceError: If no destination is given, or the category
+                or folder is unknown, inactive or not the user's
+        """
+        if categoria_id is None and pasta_id is None:
+            raise DocumentServiceError("A destination category or folder is required")
+        
+        values = {'data_modificacao': datetime.utcnow()}
+        if categoria_id is not None:
+            categoria = db.session.get(Categoria, categoria_id)
+            if not categoria or not categoria.ativo:
+                raise DocumentServiceError(f"Category with ID {categoria_id} not found")
+            values['categoria_id'] = categoria_id
+        if pasta_id is not None:
+            if pasta_id:
+                pasta = db.session.get(Pasta, pasta_id)
+                if not pasta or pasta.usuario_id != user_id:
+                    raise DocumentServiceError(f"Folder with ID {pasta_id} not found")
+            values['pasta_id'] = pasta_id or None
+        
+        if documento_ids is None:
+            from app.services.search_service import SearchService
+            documento_ids = SearchService().search_ids(query, user_id, filters)
+        documento_ids = list(dict.fromkeys(documento_ids))
+        
+        permission_service = PermissionService()
+        edit_bit = PERMISSION_BITS['editar']
+        result = {'moved': 0, 'denied': [], 'not_found': []}
+        
+        for start in range(0, len(documento_ids), self.BULK_MOVE_CHUNK_SIZE):
+            chunk = documento_ids[start:start + self.BULK_MOVE_CHUNK_SIZE]
+            masks = permission_service.bulk_effective_permissions(user_id, chunk)
+            allowed = [doc_id for doc_id in chunk if masks.get(doc_id, 0) & edit_bit]
+            result['denied'].extend(doc_id for doc_id in chunk if doc_id in masks and not masks[doc_id] & edit_bit)
+            result['not_found'].extend(doc_id for doc_id in chunk if doc_id not in masks)
+            if not allowed:
+                continue
+            
+            documents = db.session.query(
+                Documento.id,
+                Documento.nome,
+                Documento.status,
+                Documento.tamanho_bytes,
+                Documento.categoria_id,
+                Documento.pasta_id
+            ).filter(Documento.id.in_(allowed)).all()
+            
+            # The UPDATE bypasses the session events that maintain the
+            # counters, so the chunk's deltas are applied here
+            deltas = {Categoria: {}, Pasta: {}}
+            audit_entries = []
+            for document in documents:
+                changes = {}
+                for model, attribute in ((Categoria, 'categoria_id'), (Pasta, 'pasta_id')):
+                    old_id = getattr(document, attribute)
+                    new_id = values.get(attribute, old_id)
+                    if old_id == new_id:
+                        continue
+                    changes[attribute] = [old_id, new_id]
+                    if document.status != 'ativo':
+                        continue
+                    for node_id, sign in ((old_id, -1), (new_id, 1)):
+                        if node_id is not None:
+                            delta = deltas[model].setdefault(node_id, [0, 0])
+                            delta[0] += sign
+                            delta[1] += sign * (document.tamanho_bytes or 0)
+                audit_entries.append({
+                    'usuario_id': user_id,
+                    'acao': 'edit',
+                    'tabela': 'documentos',
+                    'registro_id': document.id,
+                    'dados': {'nome': document.nome, 'changes': changes, 'bulk': True}
+                })
+            
+            db.session.execute(
+                update(Documento).where(Documento.id.in_(allowed)).values(**values),
+                execution_options={'synchronize_session': 'evaluate'}
+            )
+            connection = db.session.connection()
+            touched = []
+            for model, model_deltas in deltas.items():
+                touched.extend((model, node_id) for node_id in apply_stats_deltas(connection, model, model_deltas))
+            
+            # Another folder/category changes the inherited grants
+            permission_service.refresh_effective_permissions(allowed, commit=False)
+            
+            try:
+                from app.services.audit_service import AuditService
+                AuditService().log_actions_bulk(audit_entries, commit=False)
+            except Exception as e:
+                print(f"Warning: Failed to log bulk move audit entries: {e}")
+            
+            db.session.commit()
+            expire_counters(db.session, touched)
+            result['moved'] += len(allowed)
+        
+        return result
+    
     def delete_document(self, document_id: int, user_id: int) -> Documento:
         """
         Soft delete a document (move to trash)
@@ -599,48 +983,67 @@ class DocumentService:
         # Log before deletion
         self._log_access(documento, user_id, 'permanent_delete')
         
-        # Delete all version files
-        for versao in documento.versoes:
-            self.storage_service.delete_file(versao.caminho_arquivo)
-        
-        # Delete main file
-        self.storage_service.delete_file(documento.caminho_arquivo)
+        # Collect blobs before the rows referencing them are removed
+        caminhos = [versao.caminho_arquivo for versao in documento.versoes]
+        caminhos.append(documento.caminho_arquivo)
         
         # Delete database record (cascade will handle related records)
         self.document_repository.permanent_delete(document_id)
         
+        # Delete blobs no longer referenced by any version or document
+        self._delete_unreferenced_blobs(caminhos)
+        
         return True
     
-    def cleanup_expired_trash(self, days: int = 30) -> int:
+    def cleanup_expired_trash(
+        self,
+        days: int = 30,
+        max_chunks: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> int:
         """
         Permanently delete documents that have been in trash for more than specified days
         
+        Documents are deleted in throttled primary key chunks (see
+        RetentionExecutor): each chunk removes the documents and their
+        dependent rows in one short transaction, then deletes the blobs no
+        longer referenced in parallel. An interrupted run resumes from its
+        checkpoint.
+        
         Args:
             days: Number of days after which to permanently delete
+            max_chunks: Chunks per run, None or 0 for no limit
+            progress: Called with the executor metrics after every chunk
             
         Returns:
             Number of documents permanently deleted
         """
-        expired_docs = self.document_repository.get_expired_trash(days)
-        count = 0
-        
-        for documento in expired_docs:
-            try:
-                # Delete all version files
-                for versao in documento.versoes:
-                    self.storage_service.delete_file(versao.caminho_arquivo)
-                
-                # Delete main file
-                self.storage_service.delete_file(documento.caminho_arquivo)
-                
-                # Delete database record
-                self.document_repository.permanent_delete(documento.id)
-                count += 1
-            except Exception as e:
-                # Log error but continue with other documents
-                print(f"Error permanently deleting document {documento.id}: {e}")
+        def before_delete(ids):
+            # Collect blobs before the rows referencing them are removed
+            caminhos = self.document_repository.get_file_paths(ids)
+            self.document_repository.delete_dependents(ids)
+            return caminhos
+        
+        def after_commit(ids, caminhos):
+            permission_cache.invalidate_documents(ids)
+            # Delete blobs no longer referenced by any version or document
+            return delete_files_parallel(
+                self.version_repository.get_unreferenced_blobs(caminhos),
+                self.storage_service.delete_file
+            )
         
-        return count
+        executor = RetentionExecutor('trash', Documento, max_chunks=max_chunks, progress=progress)
+        metrics = executor.run(
+            datetime.utcnow() - timedelta(days=days),
+            lambda cutoff: [
+                Documento.status == 'excluido',
+                Documento.data_exclusao.isnot(None),
+                Documento.data_exclusao <= cutoff
+            ],
+            before_delete,
+            after_commit
+        )
+        return metrics['deleted']
 
     def create_version(
         self,
@@ -652,6 +1055,11 @@ class DocumentService:
         """
         Create a new version of a document
         
+        If the content matches a blob already referenced by another version
+        of the document, the existing blob is reused instead of writing a new
+        file. Versions beyond MAX_VERSIONS_PER_DOCUMENT are pruned (oldest
+        first) and their blobs deleted once unreferenced.
+        
         Args:
             document_id: Document ID
             file: New version file
@@ -664,7 +1072,6 @@ class DocumentService:
         Raises:
             DocumentNotFoundError: If document not found
             PermissionDeniedError: If user lacks permission
-            VersionLimitExceededError: If version limit is exceeded
             FileValidationError: If file validation fails
         """
         # Get document
@@ -677,13 +1084,6 @@ class DocumentService:
         if not self._has_permission(documento, user_id, 'editar'):
             raise PermissionDeniedError("You don't have permission to create a new version")
         
-        # Check version limit (max 10 versions)
-        version_count = documento.versoes.count()
-        if version_count >= 10:
-            raise VersionLimitExceededError(
-                "Maximum version limit (10) reached. Please delete old versions first."
-            )
-        
         # Validate file
         validation_result = self.file_handler.validate_file(file.stream, file.filename)
         
@@ -694,12 +1094,20 @@ class DocumentService:
                 f"Expected: {documento.tipo_mime}, Got: {validation_result['mime_type']}"
             )
         
-        # Save file to storage
-        storage_result = self.storage_service.save_file(
-            file.stream,
-            file.filename,
-            user_id
+        # Reuse an existing blob with identical content, otherwise store a new one
+        existing_version = self.version_repository.get_by_hash(
+            documento.id,
+            validation_result['file_hash']
         )
+        if existing_version:
+            caminho_arquivo = existing_version.caminho_arquivo
+        else:
+            storage_result = self.storage_service.save_file(
+                file.stream,
+                file.filename,
+                user_id
+            )
+            caminho_arquivo = storage_result['file_path']
         
         # Increment version number
         new_version_number = documento.versao_atual + 1
@@ -708,20 +1116,27 @@ class DocumentService:
         versao = self._create_version_record(
             documento=documento,
             user_id=user_id,
-            caminho_arquivo=storage_result['file_path'],
+            caminho_arquivo=caminho_arquivo,
             tamanho_bytes=validation_result['file_size'],
-            comentario=comentario
+            comentario=comentario,
+            hash_arquivo=validation_result['file_hash'],
+            numero_versao=new_version_number,
+            commit=False
         )
         
         # Update document with new version info
         documento.versao_atual = new_version_number
-        documento.caminho_arquivo = storage_result['file_path']
+        documento.caminho_arquivo = caminho_arquivo
         documento.tamanho_bytes = validation_result['file_size']
         documento.hash_arquivo = validation_result['file_hash']
         documento.data_modificacao = datetime.utcnow()
         
+        db.session.flush()
+        pruned_paths = self._prune_versions(documento)
         db.session.commit()
         
+        self._delete_unreferenced_blobs(pruned_paths)
+        
         # Log version creation
         self._log_access(documento, user_id, 'create_version')
         
@@ -759,6 +1174,9 @@ class DocumentService:
         """
         Restore a previous version of a document
         
+        Restoring is a metadata-only operation: the new version references
+        the blob of the restored version and no file content is copied.
+        
         Args:
             document_id: Document ID
             version_number: Version number to restore
@@ -770,7 +1188,7 @@ class DocumentService:
         Raises:
             DocumentNotFoundError: If document or version not found
             PermissionDeniedError: If user lacks permission
-            VersionLimitExceededError: If version limit would be exceeded
+            DocumentServiceError: If the version has no stored hash and its file is missing
         """
         # Get document
         documento = self.document_repository.get_by_id(document_id)
@@ -783,45 +1201,52 @@ class DocumentService:
             raise PermissionDeniedError("You don't have permission to restore versions")
         
         # Get the version to restore
-        versao = db.session.query(Versao).filter_by(
-            documento_id=document_id,
-            numero_versao=version_number
-        ).first()
+        versao = self.version_repository.get_by_number(document_id, version_number)
         
         if not versao:
             raise DocumentNotFoundError(
                 f"Version {version_number} not found for document {document_id}"
             )
         
-        # Check if we can create a new version (limit check)
-        version_count = documento.versoes.count()
-        if version_count >= 10:
-            raise VersionLimitExceededError(
-                "Maximum version limit (10) reached. Cannot restore version."
-            )
+        # Versions created before blob hashes were stored get theirs from the file,
+        # so the document never keeps the hash of the content it replaces
+        if not versao.hash_arquivo:
+            file_path = self.storage_service.get_file(versao.caminho_arquivo)
+            if file_path is None:
+                raise DocumentServiceError(
+                    f"File of version {version_number} of document {document_id} not found"
+                )
+            with open(file_path, 'rb') as f:
+                versao.hash_arquivo = self.file_handler.calculate_hash(f)
         
         # Create a new version with the restored content
         new_version_number = documento.versao_atual + 1
         
-        # Create version record pointing to the same file as the restored version
-        new_versao = Versao(
-            documento_id=documento.id,
-            numero_versao=new_version_number,
+        # Create version record referencing the same blob as the restored version
+        self._create_version_record(
+            documento=documento,
+            user_id=user_id,
             caminho_arquivo=versao.caminho_arquivo,
             tamanho_bytes=versao.tamanho_bytes,
-            usuario_id=user_id,
-            comentario=f"Restored from version {version_number}"
+            comentario=f"Restored from version {version_number}",
+            hash_arquivo=versao.hash_arquivo,
+            numero_versao=new_version_number,
+            commit=False
         )
-        db.session.add(new_versao)
         
         # Update document to point to restored version
         documento.versao_atual = new_version_number
         documento.caminho_arquivo = versao.caminho_arquivo
         documento.tamanho_bytes = versao.tamanho_bytes
+        documento.hash_arquivo = versao.hash_arquivo
         documento.data_modificacao = datetime.utcnow()
         
+        db.session.flush()
+        pruned_paths = self._prune_versions(documento)
         db.session.commit()
         
+        self._delete_unreferenced_blobs(pruned_paths)
+        
         # Log version restoration
         self._log_access(documento, user_id, f'restore_version_{version_number}')
         
@@ -0,0 +1,153 @@
+"""
+User group service for business logic
+"""
+from typing import List
+from flask import current_app
+from app import db
+from app.models.group import Grupo, GrupoUsuario
+from app.services.audit_service import AuditService
+
+
+class GroupService:
+    """
+    Service for user group management.
+    
+    Documents shared with a group are never copied to per-user permission
+    rows: adding or removing a member is a single membership write, and the
+    permission cache picks up the change through its membership invalidation.
+    """
+    
+    def __init__(self):
+        """Initialize GroupService"""
+        self.audit_service = AuditService()
+    
+    def get_all_groups(self) -> List[Grupo]:
+        """Get all active groups"""
+        return Grupo.query.filter_by(ativo=True).order_by(Grupo.nome).all()
+    
+    def get_user_groups(self, usuario_id: int) -> List[Grupo]:
+        """Get the active groups a user belongs to"""
+        return Grupo.query.join(GrupoUsuario).filter(
+            GrupoUsuario.usuario_id == usuario_id,
+            Grupo.ativo.is_(True)
+        ).order_by(Grupo.nome).all()
+    
+    def create_group(self, nome: str, user_id: int, descricao: str = None) -> Grupo:
+        """
+        Create a new group.
+        
+        Args:
+            nome: Group name
+            user_id: User creating the group
+            descricao: Optional description
+            
+        Returns:
+            Created Grupo instance
+        """
+        if Grupo.query.filter_by(nome=nome).first():
+            raise ValueError('Já existe um grupo com este nome')
+        
+        grupo = Grupo(nome=nome, descricao=descricao, criado_por=user_id)
+        db.session.add(grupo)
+        db.session.commit()
+        
+        self.audit_service.log_action(
+            usuario_id=user_id,
+            acao='create_group',
+            tabela='grupos',
+            registro_id=grupo.id,
+            dados={'nome': grupo.nome}
+        )
+        
+        current_app.logger.info(f"Group created: {grupo.nome} by user {user_id}")
+        return grupo
+    
+    def add_member(self, grupo_id: int, usuario_id: int, user_id: int) -> GrupoUsuario:
+        """
+        Add a user to a group.
+        
+        Args:
+            grupo_id: Group ID
+            usuario_id: User being added
+            user_id: User performing the change
+            
+        Returns:
+            GrupoUsuario membership (existing one if already a member)
+        """
+        grupo = self._get_group(grupo_id)
+        
+        membro = GrupoUsuario.query.filter_by(grupo_id=grupo.id, usuario_id=usuario_id).first()
+        if membro:
+            return membro
+        
+        membro = GrupoUsuario(grupo_id=grupo.id, usuario_id=usuario_id)
+        db.session.add(membro)
+        db.session.commit()
+        
+        self.audit_service.log_action(
+            usuario_id=user_id,
+            acao='add_group_member',
+            tabela='grupo_usuarios',
+            registro_id=grupo.id,
+            dados={'usuario_id': usuario_id}
+        )
+        return membro
+    
+    def remove_member(self, grupo_id: int, usuario_id: int, user_id: int) -> bool:
+        """
+        Remove a user from a group.
+        
+        Args:
+            grupo_id: Group ID
+            usuario_id: User being removed
+            user_id: User performing the change
+            
+        Returns:
+            True if the user was removed, False if not a member
+        """
+        membro = GrupoUsuario.query.filter_by(grupo_id=grupo_id, usuario_id=usuario_id).first()
+        if not membro:
+            return False
+        
+        db.session.delete(membro)
+        db.session.commit()
+        
+        self.audit_service.log_action(
+            usuario_id=user_id,
+            acao='remove_group_member',
+            tabela='grupo_usuarios',
+            registro_id=grupo_id,
+            dados={'usuario_id': usuario_id}
+        )
+        return True
+    
+    def deactivate_group(self, grupo_id: int, user_id: int) -> Grupo:
+        """
+        Deactivate a group; its grants stop applying to every member.
+        
+        Args:
+            grupo_id: Group ID
+            user_id: User performing the change
+            
+        Returns:
+            Updated Grupo instance
+        """
+        grupo = self._get_group(grupo_id)
+        grupo.ativo = False
+        db.session.commit()
+        
+        self.audit_service.log_action(
+            usuario_id=user_id,
+            acao='deactivate_group',
+            tabela='grupos',
+            registro_id=grupo.id,
+            dados={'nome': grupo.nome}
+        )
+        return grupo
+    
+    def _get_group(self, grupo_id: int) -> Grupo:
+        """Get an active group or raise ValueError"""
+        grupo = db.session.get(Grupo, grupo_id)
+        if not grupo or not grupo.ativo:
+            raise ValueError('Grupo não encontrado')
+        return grupo
@@ -151,6 +151,78 @@ class NotificationService:
             current_app.logger.error(f"Error queueing share notification: {e}")
             return False
     
+    def notify_bulk_share(
+        self,
+        documentos: List[Documento],
+        from_user_id: int,
+        to_user_id: int,
+        permission_types: List[str],
+        expiration_date: Optional[datetime] = None
+    ) -> bool:
+        """
+        Send a single notification for several documents shared at once
+        
+        Args:
+            documentos: Documents being shared
+            from_user_id: ID of user sharing the documents
+            to_user_id: ID of user receiving the share
+            permission_types: List of permission types granted
+            expiration_date: Optional expiration date
+            
+        Returns:
+            True if notification queued successfully
+        """
+        try:
+            from_user = db.session.query(User).filter_by(id=from_user_id).first()
+            to_user = db.session.query(User).filter_by(id=to_user_id).first()
+            
+            if not from_user or not to_user or not documentos:
+                return False
+            
+            permission_display = {
+                'visualizar': 'Visualizar',
+                'editar': 'Editar',
+                'excluir': 'Excluir',
+                'compartilhar': 'Compartilhar'
+            }
+            permissions_text = ', '.join([permission_display.get(p, p) for p in permission_types])
+            
+            expiration_text = None
+            if expiration_date:
+                expiration_text = expiration_date.strftime('%d/%m/%Y')
+            
+            # Long lists are truncated in the email body
+            max_listed = 50
+            context = {
+                'recipient_name': to_user.nome,
+                'sender_name': from_user.nome,
+                'document_names': [documento.nome for documento in documentos[:max_listed]],
+                'remaining_count': max(0, len(documentos) - max_listed),
+                'document_count': len(documentos),
+                'permissions': permissions_text,
+                'expiration_date': expiration_text,
+                'documents_url': url_for('documents.list_documents', _external=True)
+            }
+            
+            notification_queue.enqueue(
+                self._send_template_email,
+                to_user.email,
+                f"{len(documentos)} documento(s) compartilhado(s) com você",
+                'emails/documents_shared_bulk.html',
+                context
+            )
+            
+            current_app.logger.info(
+                f"Bulk share notification queued: {from_user.email} -> {to_user.email} "
+                f"for {len(documentos)} document(s)"
+            )
+            
+            return True
+        
+        except Exception as e:
+            current_app.logger.error(f"Error queueing bulk share notification: {e}")
+            return False
+    
     def notify_upload(
         self,
         documento: Documento,
@@ -416,6 +488,116 @@ class NotificationService:
             current_app.logger.error(f"Error queueing rejection notification: {e}")
             return False
     
+    def notify_workflow_submission_bulk(
+        self,
+        aprovacoes: List[AprovacaoDocumento],
+        approver_id: int
+    ) -> bool:
+        """
+        Send a single notification for several documents awaiting one approver
+        
+        Args:
+            aprovacoes: Approvals that reached a stage of the approver
+            approver_id: ID of user who needs to approve
+            
+        Returns:
+            True if notification queued successfully
+        """
+        try:
+            approver = db.session.query(User).filter_by(id=approver_id).first()
+            
+            if not approver or not aprovacoes:
+                return False
+            
+            # Long lists are truncated in the email body
+            max_listed = 50
+            context = {
+                'approver_name': approver.nome,
+                'document_names': [aprovacao.documento.nome for aprovacao in aprovacoes[:max_listed]],
+                'remaining_count': max(0, len(aprovacoes) - max_listed),
+                'document_count': len(aprovacoes),
+                'approval_url': url_for('workflows.pending_approvals', _external=True)
+            }
+            
+            notification_queue.enqueue(
+                self._send_template_email,
+                approver.email,
+                f"{len(aprovacoes)} documento(s) aguardando sua aprovação",
+                'emails/workflow_submission_bulk.html',
+                context
+            )
+            
+            current_app.logger.info(
+                f"Bulk approval request queued for {approver.email}: {len(aprovacoes)} document(s)"
+            )
+            
+            return True
+        
+        except Exception as e:
+            current_app.logger.error(f"Error queueing bulk approval request notification: {e}")
+            return False
+    
+    def notify_workflow_decisions_bulk(
+        self,
+        aprovacoes: List[AprovacaoDocumento],
+        approver_id: int,
+        submitter_id: int,
+        status: str,
+        comment: Optional[str] = None
+    ) -> bool:
+        """
+        Send a single notification for several workflows one approver completed
+        
+        Args:
+            aprovacoes: Approvals of the submitter that were completed
+            approver_id: ID of user who decided
+            submitter_id: ID of user who submitted the documents
+            status: Final status ('aprovado' or 'rejeitado')
+            comment: Optional decision comment
+            
+        Returns:
+            True if notification queued successfully
+        """
+        try:
+            approver = db.session.query(User).filter_by(id=approver_id).first()
+            submitter = db.session.query(User).filter_by(id=submitter_id).first()
+            
+            if not approver or not submitter or not aprovacoes:
+                return False
+            
+            max_listed = 50
+            context = {
+                'submitter_name': submitter.nome,
+                'approver_name': approver.nome,
+                'approved': status == 'aprovado',
+                'document_names': [aprovacao.documento.nome for aprovacao in aprovacoes[:max_listed]],
+                'remaining_count': max(0, len(aprovacoes) - max_listed),
+                'document_count': len(aprovacoes),
+                'decision_date': datetime.now().strftime('%d/%m/%Y %H:%M'),
+                'comment': comment,
+                'documents_url': url_for('documents.list_documents', _external=True)
+            }
+            
+            subject = 'aprovado(s)' if status == 'aprovado' else 'rejeitado(s)'
+            notification_queue.enqueue(
+                self._send_template_email,
+                submitter.email,
+                f"{len(aprovacoes)} documento(s) {subject}",
+                'emails/workflow_decisions_bulk.html',
+                context
+            )
+            
+            current_app.logger.info(
+                f"Bulk decision notification queued: {len(aprovacoes)} document(s) {status} "
+                f"by {approver.email} for {submitter.email}"
+            )
+            
+            return True
+        
+        except Exception as e:
+            current_app.logger.error(f"Error queueing bulk decision notification: {e}")
+            return False
+    
     def send_password_reset_email(
         self,
         user: User,
@@ -2,12 +2,17 @@
 Permission service for access control and document sharing
 Handles permission checking, granting, revocation, and sharing
 """
+import time
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
+from sqlalchemy import or_, select, delete, union_all, cast, null, Integer, String
 from app import db
-from app.models.permission import Permissao
-from app.models.document import Documento
-from app.models.user import User
+from app.models.permission import Permissao, PermissaoPasta, PermissaoCategoria, PermissaoEfetiva, PermissaoGrupo
+from app.models.group import Grupo
+from app.models.document import Documento, Pasta, Categoria
+from app.models.hierarchy import ancestor_ids, subtree_prefix
+from app.models.user import User, Perfil
+from app.utils.permission_cache import permission_cache, mask_from_types, group_grant_filter, ALL_PERMISSIONS, PERMISSION_BITS
 
 
 class PermissionServiceError(Exception):
@@ -30,6 +35,9 @@ class PermissionService:
     
     VALID_PERMISSION_TYPES = ['visualizar', 'editar', 'excluir', 'compartilhar']
     
+    # Documents are processed in chunks to keep IN lists within database limits
+    EFFECTIVE_PERMISSION_CHUNK_SIZE = 500
+    
     def __init__(self):
         """Initialize permission service"""
         pass
@@ -58,33 +66,85 @@ class PermissionService:
                 f"Valid types: {', '.join(self.VALID_PERMISSION_TYPES)}"
             )
         
-        # Owner has all permissions (owner-based permission inheritance)
-        if documento.usuario_id == user_id:
-            return True
+        # Owner has all permissions (owner-based permission inheritance) and
+        # higher-level permissions imply view; decisions are cached per request
+        # and across requests, see app.utils.permission_cache
+        return permission_cache.has_permission(documento, user_id, permission_type)
+    
+    def bulk_effective_permissions(self, user_id: int, doc_ids: List[int]) -> Dict[int, int]:
+        """
+        Get effective permissions of a user for many documents in one query
         
-        # Check explicit permissions
-        permission = db.session.query(Permissao).filter_by(
-            documento_id=documento.id,
-            usuario_id=user_id,
-            tipo_permissao=permission_type
-        ).first()
+        Intended for list and search pages, which would otherwise check every
+        action button of every row separately.
         
-        if permission and not permission.is_expired():
-            return True
+        Args:
+            user_id: User ID
+            doc_ids: Document IDs
+            
+        Returns:
+            Dictionary mapping document ID to permission bitmask
+            (see app.utils.permission_cache.PERMISSION_BITS); unknown
+            documents are omitted
+        """
+        doc_ids = list(set(doc_ids))
+        if not doc_ids:
+            return {}
+        
+        now = datetime.utcnow()
+        documents = select(
+            Documento.id.label('documento_id'),
+            Documento.usuario_id.label('owner_id'),
+            cast(null(), String(20)).label('tipo_permissao')
+        ).where(Documento.id.in_(doc_ids))
+        direct = select(
+            Permissao.documento_id,
+            cast(null(), Integer),
+            Permissao.tipo_permissao
+        ).where(
+            Permissao.documento_id.in_(doc_ids),
+            Permissao.usuario_id == user_id,
+            or_(Permissao.data_expiracao.is_(None), Permissao.data_expiracao >= now)
+        )
+        inherited = select(
+            PermissaoEfetiva.documento_id,
+            cast(null(), Integer),
+            PermissaoEfetiva.tipo_permissao
+        ).where(
+            PermissaoEfetiva.documento_id.in_(doc_ids),
+            PermissaoEfetiva.usuario_id == user_id,
+            or_(PermissaoEfetiva.data_expiracao.is_(None), PermissaoEfetiva.data_expiracao >= now)
+        )
+        grupo_ids, perfil_id = permission_cache.get_memberships(user_id)
+        shared = select(
+            PermissaoGrupo.documento_id,
+            cast(null(), Integer),
+            PermissaoGrupo.tipo_permissao
+        ).where(
+            PermissaoGrupo.documento_id.in_(doc_ids),
+            group_grant_filter(grupo_ids, perfil_id),
+            or_(PermissaoGrupo.data_expiracao.is_(None), PermissaoGrupo.data_expiracao >= now)
+        )
+        rows = db.session.execute(union_all(documents, direct, inherited, shared)).all()
         
-        # For view permission, also check if user has higher-level permissions
-        # (edit, delete, or share implies view)
-        if permission_type == 'visualizar':
-            for perm_type in ['editar', 'excluir', 'compartilhar']:
-                permission = db.session.query(Permissao).filter_by(
-                    documento_id=documento.id,
-                    usuario_id=user_id,
-                    tipo_permissao=perm_type
-                ).first()
-                if permission and not permission.is_expired():
-                    return True
+        owners = {}
+        types_by_document = {}
+        for documento_id, owner_id, tipo_permissao in rows:
+            if owner_id is not None:
+                owners[documento_id] = owner_id
+            else:
+                types_by_document.setdefault(documento_id, []).append(tipo_permissao)
         
-        return False
+        masks = {
+            documento_id: ALL_PERMISSIONS if owner_id == user_id
+            else mask_from_types(types_by_document.get(documento_id, []))
+            for documento_id, owner_id in owners.items()
+        }
+        
+        # Later per-document checks in this request reuse the decisions
+        permission_cache.prime(user_id, masks)
+        
+        return masks
 
     def grant_permission(
         self,
@@ -148,6 +208,7 @@ class PermissionService:
             existing_permission.data_concessao = datetime.utcnow()
             existing_permission.data_expiracao = expiration_date
             db.session.commit()
+            permission_cache.invalidate(documento_id=documento.id, usuario_id=target_user_id)
             return existing_permission
         
         # Create new permission
@@ -160,6 +221,7 @@ class PermissionService:
         )
         db.session.add(permission)
         db.session.commit()
+        permission_cache.invalidate(documento_id=documento.id, usuario_id=target_user_id)
         
         # Log permission grant
         try:
@@ -216,6 +278,7 @@ class PermissionService:
         if permission:
             db.session.delete(permission)
             db.session.commit()
+            permission_cache.invalidate(documento_id=documento.id, usuario_id=target_user_id)
             
             # Log permission revocation
             try:
@@ -272,6 +335,9 @@ class PermissionService:
         ).delete()
         
         db.session.commit()
+        
+        # Bulk deletes bypass ORM events, so invalidate explicitly
+        permission_cache.invalidate(documento_id=documento.id, usuario_id=target_user_id)
         return count
 
     def get_document_permissions(
@@ -370,18 +436,114 @@ class PermissionService:
         Remove expired permissions from the database
         
         Returns:
-            Number of permissions removed
+            Number of permissions removed (materialized inherited rows are not counted)
         """
+        tables = self.sweep_expired_permissions()['tables']
+        return sum(count for table, count in tables.items() if table != 'permissoes_efetivas')
+    
+    def sweep_expired_permissions(
+        self,
+        batch_size: Optional[int] = None,
+        max_batches: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Delete expired grants in bounded batches
+        
+        Each batch selects at most batch_size expired rows through the
+        data_expiracao index, deletes them by primary key and commits, so
+        locks stay short and the permission tables stay small. Cached
+        decisions of the affected documents/users are invalidated per batch,
+        and one version stamp per batch makes the other workers drop theirs.
+        
+        Args:
+            batch_size: Rows per batch (default: PERMISSION_SWEEP_BATCH_SIZE)
+            max_batches: Maximum batches per run, across all tables
+                (default: PERMISSION_SWEEP_MAX_BATCHES; None or 0 for no limit)
+                
+        Returns:
+            Metrics dictionary
+            {
+                'deleted': 1200,
+                'tables': {'permissoes': 1150, 'permissoes_grupos': 50, ...},
+                'batches': 3,
+                'users': 40,
+                'documents': 310,
+                'complete': True,       # False if max_batches stopped the run
+                'duration_ms': 85.2
+            }
+        """
+        from flask import current_app
+        
+        if batch_size is None:
+            batch_size = current_app.config.get('PERMISSION_SWEEP_BATCH_SIZE', 1000)
+        if max_batches is None:
+            max_batches = current_app.config.get('PERMISSION_SWEEP_MAX_BATCHES', 100)
+        
+        started = time.perf_counter()
         now = datetime.utcnow()
+        metrics = {'deleted': 0, 'tables': {}, 'batches': 0, 'users': 0, 'documents': 0, 'complete': True}
+        users = set()
+        documents = set()
         
-        # Delete permissions where expiration date has passed
-        count = db.session.query(Permissao).filter(
-            Permissao.data_expiracao.isnot(None),
-            Permissao.data_expiracao < now
-        ).delete()
+        # Folder/category grants go before the effective rows they materialized,
+        # which carry the same expiration date
+        for model in (Permissao, PermissaoGrupo, PermissaoPasta, PermissaoCategoria, PermissaoEfetiva):
+            table = model.__tablename__
+            metrics['tables'][table] = 0
+            while True:
+                if max_batches and metrics['batches'] >= max_batches:
+                    metrics['complete'] = False
+                    break
+                
+                keys = self._delete_expired_batch(model, now, batch_size)
+                if not keys:
+                    break
+                
+                metrics['batches'] += 1
+                metrics['tables'][table] += len(keys)
+                for documento_id, usuario_id in keys:
+                    if documento_id is None:
+                        continue
+                    documents.add(documento_id)
+                    if usuario_id is not None:
+                        users.add(usuario_id)
+                        permission_cache.invalidate(documento_id=documento_id, usuario_id=usuario_id, publish=False)
+                    else:
+                        permission_cache.invalidate(documento_id=documento_id, publish=False)
+                # One version stamp per batch makes the web workers drop the expired grants too
+                permission_cache.publish()
+                
+                if len(keys) < batch_size:
+                    break
+        
+        metrics['deleted'] = sum(metrics['tables'].values())
+        metrics['users'] = len(users)
+        metrics['documents'] = len(documents)
+        metrics['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
         
+        current_app.logger.info(
+            'Permission sweep | '
+            + ' '.join(f'{key}={value}' for key, value in metrics.items() if key != 'tables')
+            + ' | ' + ' '.join(f'{table}={count}' for table, count in metrics['tables'].items())
+        )
+        return metrics
+    
+    @staticmethod
+    def _delete_expired_batch(model, now: datetime, batch_size: int) -> List[tuple]:
+        """Delete up to batch_size expired rows of a grant table and return their (documento_id, usuario_id)"""
+        documento_column = getattr(model, 'documento_id', null())
+        usuario_column = getattr(model, 'usuario_id', null())
+        rows = db.session.query(model.id, documento_column, usuario_column).filter(
+            model.data_expiracao < now
+        ).limit(batch_size).all()
+        if not rows:
+            return []
+        
+        db.session.query(model).filter(
+            model.id.in_([row[0] for row in rows])
+        ).delete(synchronize_session=False)
         db.session.commit()
-        return count
+        return [(row[1], row[2]) for row in rows]
     
     def share_document(
         self,
@@ -471,6 +633,264 @@ class PermissionService:
             revoked_by_user_id=unshared_by_user_id
         )
     
+    def bulk_grant_permissions(
+        self,
+        documento_ids: List[int],
+        target_user_ids: List[int],
+        permission_types: List[str],
+        granted_by_user_id: int,
+        expiration_date: Optional[datetime] = None,
+        send_notification: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Grant permissions for many documents to many users at once
+        
+        Every (document, user, permission type) combination is granted.
+        Sharing authority is checked once per document with a single bulk
+        permission query, existing grants are looked up and new ones inserted
+        once per chunk, audit entries are written in bulk, and each recipient
+        receives one consolidated notification. Documents the granting user
+        cannot share and unknown or inactive users are reported and skipped.
+        
+        Args:
+            documento_ids: IDs of documents to share
+            target_user_ids: IDs of users receiving the permissions
+            permission_types: Types of permission to grant
+            granted_by_user_id: ID of user granting the permissions
+            expiration_date: Optional expiration date for the permissions
+            send_notification: Whether to notify each recipient
+            
+        Returns:
+            Dictionary with counts and skipped IDs
+            {
+                'granted': 12,          # new permission rows
+                'updated': 3,           # existing rows renewed
+                'denied': [7],          # documents the user cannot share
+                'not_found': [9],       # unknown documents
+                'invalid_users': [42]   # unknown or inactive users
+            }
+            
+        Raises:
+            InvalidPermissionTypeError: If invalid permission type
+        """
+        permission_types = list(dict.fromkeys(permission_types))
+        for permission_type in permission_types:
+            if permission_type not in self.VALID_PERMISSION_TYPES:
+                raise InvalidPermissionTypeError(
+                    f"Invalid permission type: {permission_type}. "
+                    f"Valid types: {', '.join(self.VALID_PERMISSION_TYPES)}"
+                )
+        
+        allowed, denied, not_found = self._split_by_share_authority(documento_ids, granted_by_user_id)
+        
+        target_user_ids = list(dict.fromkeys(target_user_ids))
+        user_ids = set()
+        for start in range(0, len(target_user_ids), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+            chunk = target_user_ids[start:start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+            user_ids.update(row[0] for row in db.session.query(User.id).filter(
+                User.id.in_(chunk),
+                User.ativo.is_(True)
+            ))
+        users = [user_id for user_id in target_user_ids if user_id in user_ids]
+        invalid_users = [user_id for user_id in target_user_ids if user_id not in user_ids]
+        
+        result = {
+            'granted': 0,
+            'updated': 0,
+            'denied': denied,
+            'not_found': not_found,
+            'invalid_users': invalid_users
+        }
+        if not allowed or not users or not permission_types:
+            return result
+        
+        now = datetime.utcnow()
+        for doc_start in range(0, len(allowed), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+            doc_chunk = allowed[doc_start:doc_start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+            for user_start in range(0, len(users), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+                user_chunk = users[user_start:user_start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+                existing = {
+                    (documento_id, usuario_id, tipo_permissao): permission_id
+                    for permission_id, documento_id, usuario_id, tipo_permissao in db.session.query(
+                        Permissao.id,
+                        Permissao.documento_id,
+                        Permissao.usuario_id,
+                        Permissao.tipo_permissao
+                    ).filter(
+                        Permissao.documento_id.in_(doc_chunk),
+                        Permissao.usuario_id.in_(user_chunk),
+                        Permissao.tipo_permissao.in_(permission_types)
+                    )
+                }
+                
+                inserts = []
+                updates = []
+                for documento_id in doc_chunk:
+                    for usuario_id in user_chunk:
+                        for permission_type in permission_types:
+                            values = {
+                                'concedido_por': granted_by_user_id,
+                                'data_concessao': now,
+                                'data_expiracao': expiration_date
+                            }
+                            permission_id = existing.get((documento_id, usuario_id, permission_type))
+                            if permission_id:
+                                values['id'] = permission_id
+                                updates.append(values)
+                            else:
+                                values.update(
+                                    documento_id=documento_id,
+                                    usuario_id=usuario_id,
+                                    tipo_permissao=permission_type
+                                )
+                                inserts.append(values)
+                
+                # Bulk statements bypass ORM events; the cache is invalidated below
+                if inserts:
+                    db.session.bulk_insert_mappings(Permissao, inserts)
+                if updates:
+                    db.session.bulk_update_mappings(Permissao, updates)
+                result['granted'] += len(inserts)
+                result['updated'] += len(updates)
+        
+        try:
+            from app.services.audit_service import AuditService
+            AuditService().log_actions_bulk([
+                {
+                    'usuario_id': granted_by_user_id,
+                    'acao': 'share',
+                    'tabela': 'documentos',
+                    'registro_id': documento_id,
+                    'dados': {
+                        'shared_with_user_id': usuario_id,
+                        'permission_types': permission_types,
+                        'bulk': True
+                    }
+                }
+                for documento_id in allowed
+                for usuario_id in users
+            ], commit=False)
+        except Exception as e:
+            print(f"Warning: Failed to log bulk permission grant audit entries: {e}")
+        
+        db.session.commit()
+        permission_cache.invalidate_documents(allowed)
+        
+        if send_notification:
+            try:
+                from app.services.notification_service import NotificationService
+                notification_service = NotificationService()
+                documentos = []
+                for start in range(0, len(allowed), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+                    chunk = allowed[start:start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+                    documentos.extend(db.session.query(Documento).filter(Documento.id.in_(chunk)))
+                for usuario_id in users:
+                    notification_service.notify_bulk_share(
+                        documentos=documentos,
+                        from_user_id=granted_by_user_id,
+                        to_user_id=usuario_id,
+                        permission_types=permission_types,
+                        expiration_date=expiration_date
+                    )
+            except (ImportError, AttributeError):
+                pass
+        
+        return result
+    
+    def bulk_revoke_permissions(
+        self,
+        documento_ids: List[int],
+        target_user_ids: List[int],
+        revoked_by_user_id: int,
+        permission_types: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Revoke permissions for many documents from many users at once
+        
+        Args:
+            documento_ids: IDs of documents to revoke permissions for
+            target_user_ids: IDs of users losing the permissions
+            revoked_by_user_id: ID of user revoking the permissions
+            permission_types: Types of permission to revoke (None for all)
+            
+        Returns:
+            Dictionary with the number of revoked rows and skipped documents
+            {'revoked': 8, 'denied': [7], 'not_found': [9]}
+        """
+        allowed, denied, not_found = self._split_by_share_authority(documento_ids, revoked_by_user_id)
+        target_user_ids = list(dict.fromkeys(target_user_ids))
+        result = {'revoked': 0, 'denied': denied, 'not_found': not_found}
+        if not allowed or not target_user_ids:
+            return result
+        
+        # Types actually removed per (document, user); only these are audited
+        removed = {}
+        for doc_start in range(0, len(allowed), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+            doc_chunk = allowed[doc_start:doc_start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+            for user_start in range(0, len(target_user_ids), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+                user_chunk = target_user_ids[user_start:user_start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+                statement = delete(Permissao).where(
+                    Permissao.documento_id.in_(doc_chunk),
+                    Permissao.usuario_id.in_(user_chunk)
+                )
+                if permission_types:
+                    statement = statement.where(Permissao.tipo_permissao.in_(permission_types))
+                rows = db.session.execute(
+                    statement.returning(Permissao.documento_id, Permissao.usuario_id, Permissao.tipo_permissao),
+                    execution_options={'synchronize_session': False}
+                ).all()
+                for documento_id, usuario_id, tipo_permissao in rows:
+                    removed.setdefault((documento_id, usuario_id), []).append(tipo_permissao)
+                result['revoked'] += len(rows)
+        
+        if not removed:
+            db.session.commit()
+            return result
+        
+        try:
+            from app.services.audit_service import AuditService
+            AuditService().log_actions_bulk([
+                {
+                    'usuario_id': revoked_by_user_id,
+                    'acao': 'revoke_permission',
+                    'tabela': 'permissoes',
+                    'registro_id': documento_id,
+                    'dados': {
+                        'target_user_id': usuario_id,
+                        'permission_types': sorted(tipos),
+                        'bulk': True
+                    }
+                }
+                for (documento_id, usuario_id), tipos in removed.items()
+            ], commit=False)
+        except Exception as e:
+            print(f"Warning: Failed to log bulk permission revocation audit entries: {e}")
+        
+        db.session.commit()
+        
+        # Bulk deletes bypass ORM events, so invalidate explicitly
+        permission_cache.invalidate_documents({documento_id for documento_id, _ in removed})
+        return result
+    
+    def _split_by_share_authority(self, documento_ids: List[int], user_id: int):
+        """
+        Split documents into those the user may share, those denied and those not found
+        
+        Returns:
+            Tuple of (allowed IDs, denied IDs, not found IDs), in input order
+        """
+        documento_ids = list(dict.fromkeys(documento_ids))
+        masks = {}
+        for start in range(0, len(documento_ids), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+            chunk = documento_ids[start:start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+            masks.update(self.bulk_effective_permissions(user_id, chunk))
+        
+        share_bit = PERMISSION_BITS['compartilhar']
+        allowed = [doc_id for doc_id in documento_ids if masks.get(doc_id, 0) & share_bit]
+        denied = [doc_id for doc_id in documento_ids if doc_id in masks and not masks[doc_id] & share_bit]
+        not_found = [doc_id for doc_id in documento_ids if doc_id not in masks]
+        return allowed, denied, not_found
+    
     def get_shared_with_me(
         self,
         user_id: int,
@@ -564,3 +984,609 @@ class PermissionService:
                     })
         
         return result
+    
+    # Group and profile permissions
+    #
+    # A PermissaoGrupo row shares a document with every member of a group (or
+    # every user of a profile). Membership is resolved at check time through
+    # the cached memberships in permission_cache, so group membership changes
+    # never write permission rows.
+    
+    def grant_group_permission(
+        self,
+        documento: Documento,
+        grupo_id: int,
+        permission_type: str,
+        granted_by_user_id: int,
+        expiration_date: Optional[datetime] = None
+    ) -> PermissaoGrupo:
+        """
+        Grant permission for a document to every member of a group
+        
+        Args:
+            documento: Document to grant permission for
+            grupo_id: ID of group receiving the permission
+            permission_type: Type of permission (visualizar, editar, excluir, compartilhar)
+            granted_by_user_id: ID of user granting the permission
+            expiration_date: Optional expiration date for the permission
+            
+        Returns:
+            Created or updated PermissaoGrupo instance
+            
+        Raises:
+            PermissionDeniedError: If granting user lacks permission
+            InvalidPermissionTypeError: If invalid permission type
+            PermissionServiceError: If group not found or inactive
+        """
+        grupo = db.session.query(Grupo).filter_by(id=grupo_id).first()
+        if not grupo:
+            raise PermissionServiceError(f"Group with ID {grupo_id} not found")
+        if not grupo.ativo:
+            raise PermissionServiceError("Cannot grant permission to inactive group")
+        
+        return self._grant_shared_permission(
+            documento, permission_type, granted_by_user_id, expiration_date, grupo_id=grupo_id
+        )
+    
+    def grant_profile_permission(
+        self,
+        documento: Documento,
+        perfil_id: int,
+        permission_type: str,
+        granted_by_user_id: int,
+        expiration_date: Optional[datetime] = None
+    ) -> PermissaoGrupo:
+        """
+        Grant permission for a document to every user of a profile
+        
+        Args:
+            documento: Document to grant permission for
+            perfil_id: ID of profile receiving the permission
+            permission_type: Type of permission (visualizar, editar, excluir, compartilhar)
+            granted_by_user_id: ID of user granting the permission
+            expiration_date: Optional expiration date for the permission
+            
+        Returns:
+            Created or updated PermissaoGrupo instance
+            
+        Raises:
+            PermissionDeniedError: If granting user lacks permission
+            InvalidPermissionTypeError: If invalid permission type
+            PermissionServiceError: If profile not found
+        """
+        if not db.session.query(Perfil.id).filter_by(id=perfil_id).first():
+            raise PermissionServiceError(f"Profile with ID {perfil_id} not found")
+        
+        return self._grant_shared_permission(
+            documento, permission_type, granted_by_user_id, expiration_date, perfil_id=perfil_id
+        )
+    
+    def revoke_group_permission(
+        self,
+        documento: Documento,
+        permission_type: str,
+        revoked_by_user_id: int,
+        grupo_id: Optional[int] = None,
+        perfil_id: Optional[int] = None
+    ) -> bool:
+        """
+        Revoke a document permission from a group or profile
+        
+        Args:
+            documento: Document to revoke permission for
+            permission_type: Type of permission to revoke
+            revoked_by_user_id: ID of user revoking the permission
+            grupo_id: ID of group losing the permission
+            perfil_id: ID of profile losing the permission (when grupo_id is not given)
+            
+        Returns:
+            True if permission was revoked, False if it didn't exist
+            
+        Raises:
+            PermissionDeniedError: If revoking user lacks permission
+        """
+        self._check_can_share(documento, revoked_by_user_id)
+        
+        permission = db.session.query(PermissaoGrupo).filter_by(
+            documento_id=documento.id,
+            grupo_id=grupo_id,
+            perfil_id=None if grupo_id else perfil_id,
+            tipo_permissao=permission_type
+        ).first()
+        
+        if not permission:
+            return False
+        
+        db.session.delete(permission)
+        db.session.commit()
+        permission_cache.invalidate(documento_id=documento.id)
+        
+        try:
+            from app.services.audit_service import AuditService
+            AuditService().log_action(
+                usuario_id=revoked_by_user_id,
+                acao='revoke_permission',
+                tabela='permissoes_grupos',
+                registro_id=documento.id,
+                dados={
+                    'grupo_id': grupo_id,
+                    'perfil_id': perfil_id,
+                    'permission_type': permission_type
+                }
+            )
+        except Exception as e:
+            print(f"Warning: Failed to log permission revocation audit entry: {e}")
+        
+        return True
+    
+    def _check_can_share(self, documento: Documento, user_id: int) -> None:
+        """Raise PermissionDeniedError unless the user owns or may share the document"""
+        if documento.usuario_id != user_id:
+            if not self.check_permission(documento, user_id, 'compartilhar'):
+                raise PermissionDeniedError(
+                    "You don't have permission to share this document"
+                )
+    
+    def _grant_shared_permission(
+        self,
+        documento: Documento,
+        permission_type: str,
+        granted_by_user_id: int,
+        expiration_date: Optional[datetime],
+        grupo_id: Optional[int] = None,
+        perfil_id: Optional[int] = None
+    ) -> PermissaoGrupo:
+        """Create or update a group/profile grant"""
+        if permission_type not in self.VALID_PERMISSION_TYPES:
+            raise InvalidPermissionTypeError(
+                f"Invalid permission type: {permission_type}. "
+                f"Valid types: {', '.join(self.VALID_PERMISSION_TYPES)}"
+            )
+        
+        self._check_can_share(documento, granted_by_user_id)
+        
+        permission = db.session.query(PermissaoGrupo).filter_by(
+            documento_id=documento.id,
+            grupo_id=grupo_id,
+            perfil_id=perfil_id,
+            tipo_permissao=permission_type
+        ).first()
+        
+        if permission:
+            permission.concedido_por = granted_by_user_id
+            permission.data_concessao = datetime.utcnow()
+            permission.data_expiracao = expiration_date
+        else:
+            permission = PermissaoGrupo(
+                documento_id=documento.id,
+                grupo_id=grupo_id,
+                perfil_id=perfil_id,
+                tipo_permissao=permission_type,
+                concedido_por=granted_by_user_id,
+                data_expiracao=expiration_date
+            )
+            db.session.add(permission)
+        
+        db.session.commit()
+        permission_cache.invalidate(documento_id=documento.id)
+        
+        try:
+            from app.services.audit_service import AuditService
+            AuditService().log_action(
+                usuario_id=granted_by_user_id,
+                acao='share',
+                tabela='permissoes_grupos',
+                registro_id=documento.id,
+                dados={
+                    'grupo_id': grupo_id,
+                    'perfil_id': perfil_id,
+                    'permission_type': permission_type
+                }
+            )
+        except Exception as e:
+            print(f"Warning: Failed to log permission grant audit entry: {e}")
+        
+        return permission
+    
+    # Folder and category permissions
+    #
+    # Grants on a Pasta or Categoria apply to every document in that container
+    # and its descendants. They are materialized into PermissaoEfetiva (one row
+    # per reached document) so permission checks stay a single indexed lookup.
+    
+    def grant_folder_permission(
+        self,
+        pasta: Pasta,
+        target_user_id: int,
+        permission_type: str,
+        granted_by_user_id: int,
+        expiration_date: Optional[datetime] = None
+    ) -> PermissaoPasta:
+        """
+        Grant permission on a folder, inherited by all documents in it and its subfolders
+        
+        Args:
+            pasta: Folder to grant permission for
+            target_user_id: ID of user receiving the permission
+            permission_type: Type of permission (visualizar, editar, excluir, compartilhar)
+            granted_by_user_id: ID of user granting the permission (must own the folder)
+            expiration_date: Optional expiration date for the permission
+            
+        Returns:
+            Created or updated PermissaoPasta instance
+            
+        Raises:
+            PermissionDeniedError: If granting user does not own the folder
+            InvalidPermissionTypeError: If invalid permission type
+        """
+        if pasta.usuario_id != granted_by_user_id:
+            raise PermissionDeniedError("You don't have permission to share this folder")
+        
+        return self._grant_container_permission(
+            'pasta', pasta.id, target_user_id, permission_type,
+            granted_by_user_id, expiration_date
+        )
+    
+    def revoke_folder_permission(
+        self,
+        pasta: Pasta,
+        target_user_id: int,
+        permission_type: str,
+        revoked_by_user_id: int
+    ) -> bool:
+        """
+        Revoke a folder permission and everything it granted to documents below it
+        
+        Args:
+            pasta: Folder to revoke permission for
+            target_user_id: ID of user losing the permission
+            permission_type: Type of permission to revoke
+            revoked_by_user_id: ID of user revoking the permission (must own the folder)
+            
+        Returns:
+            True if permission was revoked, False if it didn't exist
+            
+        Raises:
+            PermissionDeniedError: If revoking user does not own the folder
+        """
+        if pasta.usuario_id != revoked_by_user_id:
+            raise PermissionDeniedError("You don't have permission to manage this folder")
+        
+        return self._revoke_container_permission(
+            'pasta', pasta.id, target_user_id, permission_type, revoked_by_user_id
+        )
+    
+    def grant_category_permission(
+        self,
+        categoria: Categoria,
+        target_user_id: int,
+        permission_type: str,
+        granted_by_user_id: int,
+        expiration_date: Optional[datetime] = None
+    ) -> PermissaoCategoria:
+        """
+        Grant permission on a category, inherited by all documents in it and its subcategories
+        
+        Args:
+            categoria: Category to grant permission for
+            target_user_id: ID of user receiving the permission
+            permission_type: Type of permission (visualizar, editar, excluir, compartilhar)
+            granted_by_user_id: ID of user granting the permission (must manage categories)
+            expiration_date: Optional expiration date for the permission
+            
+        Returns:
+            Created or updated PermissaoCategoria instance
+            
+        Raises:
+            PermissionDeniedError: If granting user cannot manage categories
+            InvalidPermissionTypeError: If invalid permission type
+        """
+        self._check_can_manage_categories(granted_by_user_id)
+        
+        return self._grant_container_permission(
+            'categoria', categoria.id, target_user_id, permission_type,
+            granted_by_user_id, expiration_date
+        )
+    
+    def revoke_category_permission(
+        self,
+        categoria: Categoria,
+        target_user_id: int,
+        permission_type: str,
+        revoked_by_user_id: int
+    ) -> bool:
+        """
+        Revoke a category permission and everything it granted to documents below it
+        
+        Args:
+            categoria: Category to revoke permission for
+            target_user_id: ID of user losing the permission
+            permission_type: Type of permission to revoke
+            revoked_by_user_id: ID of user revoking the permission (must manage categories)
+            
+        Returns:
+            True if permission was revoked, False if it didn't exist
+            
+        Raises:
+            PermissionDeniedError: If revoking user cannot manage categories
+        """
+        self._check_can_manage_categories(revoked_by_user_id)
+        
+        return self._revoke_container_permission(
+            'categoria', categoria.id, target_user_id, permission_type, revoked_by_user_id
+        )
+    
+    def refresh_effective_permissions(self, documento_ids: List[int], commit: bool = True) -> int:
+        """
+        Rebuild the inherited permissions of documents from their folder and category chains
+        
+        Call after documents are created in, or moved to, another folder or category.
+        
+        Args:
+            documento_ids: Document IDs
+            commit: Whether to commit the transaction
+            
+        Returns:
+            Number of effective permission rows written
+        """
+        documento_ids = list(set(documento_ids))
+        written = 0
+        
+        for start in range(0, len(documento_ids), self.EFFECTIVE_PERMISSION_CHUNK_SIZE):
+            chunk = documento_ids[start:start + self.EFFECTIVE_PERMISSION_CHUNK_SIZE]
+            documents = db.session.query(
+                Documento.id,
+                Documento.pasta_id,
+                Documento.categoria_id
+            ).filter(Documento.id.in_(chunk)).all()
+            
+            folder_chains = self._ancestor_chains('pasta', {d.pasta_id for d in documents if d.pasta_id})
+            category_chains = self._ancestor_chains('categoria', {d.categoria_id for d in documents if d.categoria_id})
+            folder_grants = self._grants_by_container('pasta', {i for chain in folder_chains.values() for i in chain})
+            category_grants = self._grants_by_container('categoria', {i for chain in category_chains.values() for i in chain})
+            
+            rows = []
+            for documento_id, pasta_id, categoria_id in documents:
+                for origem, chains, grants, container_id in (
+                    ('pasta', folder_chains, folder_grants, pasta_id),
+                    ('categoria', category_chains, category_grants, categoria_id)
+                ):
+                    for origem_id in chains.get(container_id, []):
+                        for grant in grants.get(origem_id, []):
+                            rows.append({
+                                'documento_id': documento_id,
+                                'usuario_id': grant.usuario_id,
+                                'tipo_permissao': grant.tipo_permissao,
+                                'data_expiracao': grant.data_expiracao,
+                                'origem': origem,
+                                'origem_id': origem_id
+                            })
+            
+            db.session.query(PermissaoEfetiva).filter(
+                PermissaoEfetiva.documento_id.in_(chunk)
+            ).delete(synchronize_session=False)
+            if rows:
+                db.session.bulk_insert_mappings(PermissaoEfetiva, rows)
+            written += len(rows)
+        
+        if commit:
+            db.session.commit()
+            permission_cache.invalidate_documents(documento_ids)
+        else:
+            permission_cache.invalidate_documents(documento_ids, publish=False)
+            permission_cache.publish_after_commit()
+        
+        return written
+    
+    def refresh_folder_permissions(self, pasta_id: int, commit: bool = True) -> int:
+        """
+        Rebuild inherited permissions of every document below a folder (after the folder moved)
+        
+        Args:
+            pasta_id: Folder ID
+            commit: Whether to commit the transaction
+            
+        Returns:
+            Number of effective permission rows written
+        """
+        return self.refresh_effective_permissions(self._subtree_document_ids('pasta', pasta_id), commit=commit)
+    
+    def refresh_category_permissions(self, categoria_id: int, commit: bool = True) -> int:
+        """
+        Rebuild inherited permissions of every document below a category (after the category moved)
+        
+        Args:
+            categoria_id: Category ID
+            commit: Whether to commit the transaction
+            
+        Returns:
+            Number of effective permission rows written
+        """
+        return self.refresh_effective_permissions(self._subtree_document_ids('categoria', categoria_id), commit=commit)
+    
+    @staticmethod
+    def _container(origem: str):
+        """Get (container model, parent column, grant model, grant container column, document column)"""
+        if origem == 'pasta':
+            return Pasta, Pasta.pasta_pai_id, PermissaoPasta, PermissaoPasta.pasta_id, Documento.pasta_id
+        return Categoria, Categoria.categoria_pai_id, PermissaoCategoria, PermissaoCategoria.categoria_id, Documento.categoria_id
+    
+    def _check_can_manage_categories(self, user_id: int) -> None:
+        """Raise PermissionDeniedError unless the user may manage categories"""
+        user = db.session.query(User).filter_by(id=user_id).first()
+        if not user or not (user.perfil.pode_gerenciar_categorias or user.has_permission('admin')):
+            raise PermissionDeniedError("You don't have permission to share this category")
+    
+    def _grant_container_permission(
+        self,
+        origem: str,
+        container_id: int,
+        target_user_id: int,
+        permission_type: str,
+        granted_by_user_id: int,
+        expiration_date: Optional[datetime]
+    ):
+        """Create or update a folder/category grant and materialize it for every document below"""
+        if permission_type not in self.VALID_PERMISSION_TYPES:
+            raise InvalidPermissionTypeError(
+                f"Invalid permission type: {permission_type}. "
+                f"Valid types: {', '.join(self.VALID_PERMISSION_TYPES)}"
+            )
+        
+        target_user = db.session.query(User).filter_by(id=target_user_id).first()
+        if not target_user:
+            raise PermissionServiceError(f"User with ID {target_user_id} not found")
+        if not target_user.ativo:
+            raise PermissionServiceError(f"Cannot grant permission to inactive user")
+        
+        _, _, grant_model, grant_column, _ = self._container(origem)
+        grant = db.session.query(grant_model).filter(
+            grant_column == container_id,
+            grant_model.usuario_id == target_user_id,
+            grant_model.tipo_permissao == permission_type
+        ).first()
+        
+        if grant:
+            grant.concedido_por = granted_by_user_id
+            grant.data_concessao = datetime.utcnow()
+            grant.data_expiracao = expiration_date
+        else:
+            grant = grant_model(
+                usuario_id=target_user_id,
+                tipo_permissao=permission_type,
+                concedido_por=granted_by_user_id,
+                data_expiracao=expiration_date
+            )
+            setattr(grant, grant_column.key, container_id)
+            db.session.add(grant)
+        
+        # Replace the rows this grant materialized before (expiration may have changed)
+        self._delete_effective_rows(origem, container_id, target_user_id, permission_type)
+        
+        rows = [
+            {
+                'documento_id': documento_id,
+                'usuario_id': target_user_id,
+                'tipo_permissao': permission_type,
+                'data_expiracao': expiration_date,
+                'origem': origem,
+                'origem_id': container_id
+            }
+            for documento_id in self._subtree_document_ids(origem, container_id)
+        ]
+        if rows:
+            db.session.bulk_insert_mappings(PermissaoEfetiva, rows)
+        
+        db.session.commit()
+        permission_cache.invalidate(usuario_id=target_user_id)
+        
+        try:
+            from app.services.audit_service import AuditService
+            AuditService().log_action(
+                usuario_id=granted_by_user_id,
+                acao='share_' + ('folder' if origem == 'pasta' else 'category'),
+                tabela=grant_model.__tablename__,
+                registro_id=container_id,
+                dados={
+                    'target_user_id': target_user_id,
+                    'permission_type': permission_type,
+                    'documents': len(rows)
+                }
+            )
+        except Exception as e:
+            print(f"Warning: Failed to log permission grant audit entry: {e}")
+        
+        return grant
+    
+    def _revoke_container_permission(
+        self,
+        origem: str,
+        container_id: int,
+        target_user_id: int,
+        permission_type: str,
+        revoked_by_user_id: int
+    ) -> bool:
+        """Delete a folder/category grant together with the rows it materialized"""
+        _, _, grant_model, grant_column, _ = self._container(origem)
+        grant = db.session.query(grant_model).filter(
+            grant_column == container_id,
+            grant_model.usuario_id == target_user_id,
+            grant_model.tipo_permissao == permission_type
+        ).first()
+        
+        if not grant:
+            return False
+        
+        db.session.delete(grant)
+        self._delete_effective_rows(origem, container_id, target_user_id, permission_type)
+        db.session.commit()
+        permission_cache.invalidate(usuario_id=target_user_id)
+        
+        try:
+            from app.services.audit_service import AuditService
+            AuditService().log_action(
+                usuario_id=revoked_by_user_id,
+                acao='revoke_' + ('folder' if origem == 'pasta' else 'category') + '_permission',
+                tabela=grant_model.__tablename__,
+                registro_id=container_id,
+                dados={
+                    'target_user_id': target_user_id,
+                    'permission_type': permission_type
+                }
+            )
+        except Exception as e:
+            print(f"Warning: Failed to log permission revocation audit entry: {e}")
+        
+        return True
+    
+    @staticmethod
+    def _delete_effective_rows(origem: str, container_id: int, usuario_id: int, permission_type: str) -> int:
+        """Delete the effective rows materialized by one grant"""
+        return db.session.query(PermissaoEfetiva).filter(
+            PermissaoEfetiva.origem == origem,
+            PermissaoEfetiva.origem_id == container_id,
+            PermissaoEfetiva.usuario_id == usuario_id,
+            PermissaoEfetiva.tipo_permissao == permission_type
+        ).delete(synchronize_session=False)
+    
+    def _subtree_document_ids(self, origem: str, container_id: int) -> List[int]:
+        """Get IDs of all documents in a folder/category and its descendants"""
+        model, _, _, _, document_column = self._container(origem)
+        
+        # One range scan over the materialized path, as a subquery so large
+        # trees do not turn into one bound parameter per container
+        container = db.session.query(model.caminho_ids).filter(model.id == container_id).first()
+        subtree = select(model.id).where(model.id == container_id)
+        if container is not None and container.caminho_ids is not None:
+            prefix = subtree_prefix(container.caminho_ids, container_id)
+            subtree = select(model.id).where(or_(
+                model.id == container_id,
+                model.caminho_ids.like(f'{prefix}%')
+            ))
+        
+        return [
+            row[0] for row in db.session.query(Documento.id).filter(document_column.in_(subtree))
+        ]
+    
+    def _ancestor_chains(self, origem: str, container_ids) -> Dict[int, List[int]]:
+        """Map each folder/category ID to itself followed by its ancestors"""
+        model, _, _, _, _ = self._container(origem)
+        
+        # Ancestors are encoded in each path, nearest last
+        paths = dict(db.session.query(model.id, model.caminho_ids).filter(model.id.in_(container_ids)).all())
+        
+        chains = {}
+        for container_id in container_ids:
+            chains[container_id] = [container_id] + ancestor_ids(paths.get(container_id))[::-1]
+        return chains
+    
+    def _grants_by_container(self, origem: str, container_ids) -> Dict[int, list]:
+        """Load all grants on the given folders/categories, grouped by container ID"""
+        if not container_ids:
+            return {}
+        
+        _, _, grant_model, grant_column, _ = self._container(origem)
+        grants = {}
+        for grant in db.session.query(grant_model).filter(grant_column.in_(container_ids)):
+            grants.setdefault(getattr(grant, grant_column.key), []).append(grant)
+        return grants
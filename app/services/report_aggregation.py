@@ -0,0 +1,182 @@
+"""
+Report aggregation engine
+Computes several report figures from one grouped count of the audit log
+(or one pass over already loaded entries) instead of one query per figure
+"""
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterable, Sequence
+from app.repositories.audit_repository import AuditRepository
+
+
+def _values(value) -> frozenset:
+    """Accepted values of a where condition"""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return frozenset(value)
+    return frozenset([value])
+
+
+class Metric(ABC):
+    """
+    A report figure folded from grouped audit counts.
+    
+    Subclasses implement add and result; a subclass missing either cannot
+    be instantiated.
+    
+    Args:
+        name: Key of the figure in the aggregation result
+        dimensions: Dimensions the figure needs ('acao', 'usuario_id',
+            'tabela', 'dia', or any log column such as 'ip_address')
+        where: Dimension-value conditions a group must match to be counted;
+            a list, tuple or set value matches any of its items
+    """
+    
+    def __init__(self, name: str, dimensions: Sequence[str] = (), **where):
+        self.name = name
+        self.where = {dimension: _values(value) for dimension, value in where.items()}
+        self.dimensions = tuple(dimensions) + tuple(d for d in self.where if d not in dimensions)
+    
+    def matches(self, row: Dict[str, Any]) -> bool:
+        """True if a group satisfies the where conditions"""
+        return all(row[dimension] in values for dimension, values in self.where.items())
+    
+    @abstractmethod
+    def add(self, row: Dict[str, Any], count: int):
+        """Fold the count of one group into the figure"""
+    
+    @abstractmethod
+    def result(self) -> Any:
+        """Final value of the figure"""
+
+
+class Total(Metric):
+    """Sum of the matching counts"""
+    
+    def __init__(self, name: str, **where):
+        super().__init__(name, **where)
+        self.total = 0
+    
+    def add(self, row: Dict[str, Any], count: int):
+        if self.matches(row):
+            self.total += count
+    
+    def result(self) -> int:
+        return self.total
+
+
+class CountBy(Metric):
+    """Counter of the matching counts by one dimension (None values skipped)"""
+    
+    def __init__(self, name: str, dimension: str, **where):
+        super().__init__(name, (dimension,), **where)
+        self.dimension = dimension
+        self.counts = Counter()
+    
+    def add(self, row: Dict[str, Any], count: int):
+        value = row[self.dimension]
+        if value is not None and self.matches(row):
+            self.counts[value] += count
+    
+    def result(self) -> Counter:
+        return self.counts
+
+
+class Distinct(Metric):
+    """Number of distinct values of a dimension among matching groups (None skipped)"""
+    
+    def __init__(self, name: str, dimension: str, **where):
+        super().__init__(name, (dimension,), **where)
+        self.dimension = dimension
+        self.seen = set()
+    
+    def add(self, row: Dict[str, Any], count: int):
+        value = row[self.dimension]
+        if value is not None and count and self.matches(row):
+            self.seen.add(value)
+    
+    def result(self) -> int:
+        return len(self.seen)
+
+
+class ReportAggregator:
+    """
+    Shared aggregation for usage, access and audit reports.
+    
+    aggregate() groups the audit log once by the union of the dimensions
+    its metrics need (AuditRepository.count_activity, which reads the
+    rollups and archives where it can) and folds every group into every
+    metric, so a report with N figures costs one grouped query instead
+    of N scans of the range. fold() does the same for entries a report
+    already loaded, counting each entry by its ocorrencias.
+    """
+    
+    def __init__(self, audit_repository: Optional[AuditRepository] = None):
+        """
+        Initialize report aggregator
+        
+        Args:
+            audit_repository: Optional AuditRepository instance
+        """
+        self.audit_repository = audit_repository or AuditRepository()
+    
+    def aggregate(
+        self,
+        metrics: Iterable[Metric],
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Compute metrics from one grouped count of the audit log.
+        
+        Args:
+            metrics: Metrics to compute
+            data_inicio: Optional start date
+            data_fim: Optional end date (inclusive)
+            filters: Column-value filters applied to every metric (see
+                AuditRepository.count_activity)
+                
+        Returns:
+            Dictionary of metric name to result
+        """
+        metrics = list(metrics)
+        dimensions = self._dimensions(metrics)
+        counts = self.audit_repository.count_activity(dimensions, data_inicio, data_fim, filters)
+        for key, count in counts.items():
+            row = dict(zip(dimensions, key))
+            for metric in metrics:
+                metric.add(row, count)
+        return {metric.name: metric.result() for metric in metrics}
+    
+    def fold(self, metrics: Iterable[Metric], entries: Iterable[Any]) -> Dict[str, Any]:
+        """
+        Compute metrics in one pass over loaded audit entries.
+        
+        Args:
+            metrics: Metrics to compute
+            entries: LogAuditoria rows or archived entries
+            
+        Returns:
+            Dictionary of metric name to result
+        """
+        metrics = list(metrics)
+        dimensions = self._dimensions(metrics)
+        for entry in entries:
+            row = {
+                dimension: entry.data_hora.date() if dimension == 'dia' else getattr(entry, dimension)
+                for dimension in dimensions
+            }
+            count = getattr(entry, 'ocorrencias', None) or 1
+            for metric in metrics:
+                metric.add(row, count)
+        return {metric.name: metric.result() for metric in metrics}
+    
+    def _dimensions(self, metrics: Sequence[Metric]) -> tuple:
+        """Union of the dimensions of the metrics, in first-use order"""
+        dimensions = []
+        for metric in metrics:
+            for dimension in metric.dimensions:
+                if dimension not in dimensions:
+                    dimensions.append(dimension)
+        return tuple(dimensions)
@@ -0,0 +1,435 @@
+"""
+Report job service for background report generation
+Queues usage, access, storage and audit reports, tracks their progress and
+keeps their results on disk so identical requests share one generation
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Optional, Dict, Any, Tuple
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.report import RelatorioJob
+from app.repositories.report_job_repository import ReportJobRepository
+from app.utils.report_jobs import report_job_runner
+
+
+# Report types: parameters accepted, parameters required and whether a CSV
+# export exists (ReportService.export_report_csv)
+REPORT_JOB_TYPES = {
+    'usage': {'parametros': ('data_inicio', 'data_fim'), 'csv': True},
+    'access': {'parametros': ('data_inicio', 'data_fim', 'usuario_id', 'documento_id'), 'csv': True},
+    'storage': {'parametros': (), 'csv': True},
+    'audit_summary': {'parametros': ('data_inicio', 'data_fim')},
+    'audit_user_activity': {'parametros': ('usuario_id', 'data_inicio', 'data_fim'), 'obrigatorios': ('usuario_id',)},
+    'audit_document_activity': {'parametros': ('documento_id', 'data_inicio', 'data_fim'), 'obrigatorios': ('documento_id',)},
+    'audit_security': {'parametros': ('data_inicio', 'data_fim')}
+}
+DATE_PARAMETERS = ('data_inicio', 'data_fim')
+RESULT_MIMETYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv'
+}
+
+
+class ReportJobError(Exception):
+    """Base exception for report job errors"""
+    pass
+
+
+def job_key(tipo: str, parametros: Dict[str, Any]) -> str:
+    """
+    Hash identifying a report request.
+    
+    Args:
+        tipo: Report type
+        parametros: Normalized parameters (see ReportJobService.normalize_params)
+        
+    Returns:
+        Hex sha256 of the type and parameters
+    """
+    payload = json.dumps({'tipo': tipo, 'parametros': parametros}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _json_default(value):
+    """Encode report values json does not know"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+class ReportJobService:
+    """
+    Service for report jobs.
+    
+    A submission is normalized and hashed into a chave. If a job with the
+    same chave is queued, running, or finished with a result that has not
+    expired, that job is returned instead of starting a new one. Otherwise
+    a RelatorioJob row is created and handed to the report job runner. A
+    unique index on the chave of queued and running jobs makes the database
+    arbitrate between processes: the submission that loses the insert
+    attaches to the winner's job.
+    
+    Reports without explicit dates keep their defaults (last 30 days up to
+    now) out of the chave, so their result is reused for up to
+    REPORT_RESULT_TTL_SECONDS. A running job touches data_atualizacao every
+    REPORT_JOB_HEARTBEAT_SECONDS, also during long steps; a queued or
+    running job silent for REPORT_JOB_STALE_SECONDS (its process died) is
+    marked failed and replaced.
+    """
+    
+    def __init__(self, repository: Optional[ReportJobRepository] = None):
+        """
+        Initialize report job service
+        
+        Args:
+            repository: Optional ReportJobRepository instance
+        """
+        self.repository = repository or ReportJobRepository()
+    
+    def normalize_params(self, tipo: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate and normalize the parameters of a report request.
+        
+        Args:
+            tipo: Report type (see REPORT_JOB_TYPES)
+            parametros: Raw parameters; unknown and empty ones are ignored
+            
+        Returns:
+            Parameters with ISO dates and integer IDs
+            
+        Raises:
+            ReportJobError: If the type is unknown or a parameter is invalid
+        """
+        definicao = REPORT_JOB_TYPES.get(tipo)
+        if definicao is None:
+            raise ReportJobError(f"Unknown report type: {tipo}")
+        
+        normalizados = {}
+        for nome in definicao['parametros']:
+            valor = parametros.get(nome)
+            if valor in (None, ''):
+                continue
+            try:
+                if nome in DATE_PARAMETERS:
+                    valor = valor if isinstance(valor, datetime) else datetime.fromisoformat(str(valor))
+                    normalizados[nome] = valor.replace(microsecond=0).isoformat()
+                else:
+                    normalizados[nome] = int(valor)
+            except (TypeError, ValueError):
+                raise ReportJobError(f"Invalid value for {nome}: {valor}")
+        
+        for nome in definicao.get('obrigatorios', ()):
+            if nome not in normalizados:
+                raise ReportJobError(f"{nome} is required for {tipo} reports")
+        return normalizados
+    
+    def submit(self, tipo: str, parametros: Dict[str, Any],
+               usuario_id: Optional[int] = None) -> Tuple[RelatorioJob, bool]:
+        """
+        Request a report, reusing a matching job when there is one.
+        
+        Args:
+            tipo: Report type (see REPORT_JOB_TYPES)
+            parametros: Raw report parameters
+            usuario_id: User requesting the report
+            
+        Returns:
+            Tuple (job, reused); reused is True when an existing job serves
+            the request
+            
+        Raises:
+            ReportJobError: If the type or a parameter is invalid
+        """
+        parametros = self.normalize_params(tipo, parametros)
+        chave = job_key(tipo, parametros)
+        self.purge_expired()
+        
+        job = self.repository.find_reusable(chave)
+        if job is not None and job.ativo and self._fail_if_stale(job):
+            job = None
+        if job is not None:
+            return job, True
+        
+        job = RelatorioJob(
+            id=uuid.uuid4().hex,
+            tipo=tipo,
+            chave=chave,
+            solicitado_por=usuario_id,
+            status=RelatorioJob.STATUS_PENDENTE,
+            progresso=0
+        )
+        job.parametros = parametros
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another process queued the same report since the lookup
+            db.session.rollback()
+            job = self.repository.find_reusable(chave)
+            if job is None:
+                raise ReportJobError(f"Report job for {tipo} could not be queued")
+            return job, True
+        
+        report_job_runner.submit(job.id, self.run_job)
+        return job, False
+    
+    def get_job(self, job_id: str) -> Optional[RelatorioJob]:
+        """
+        Get a job, marking it failed if it stopped reporting progress.
+        
+        Args:
+            job_id: Job identifier
+            
+        Returns:
+            RelatorioJob or None if not found
+        """
+        job = self.repository.get_by_id(job_id)
+        if job is not None and job.ativo:
+            self._fail_if_stale(job)
+        return job
+    
+    def result_path(self, job: RelatorioJob, formato: str = 'json') -> str:
+        """
+        Get the result file of a finished job.
+        
+        Args:
+            job: Report job
+            formato: Result format ('json' or 'csv')
+            
+        Returns:
+            Absolute path of the result file
+            
+        Raises:
+            ReportJobError: If the job has not finished, the format is not
+                available for the report type, or the result is gone
+        """
+        if job.status != RelatorioJob.STATUS_CONCLUIDO:
+            raise ReportJobError(f"Report job {job.id} is {job.status}")
+        if formato not in (job.formatos or '').split(','):
+            raise ReportJobError(f"Format {formato} is not available for {job.tipo} reports")
+        
+        path = self._result_file(job.id, formato)
+        if not os.path.exists(path):
+            raise ReportJobError(f"Result of report job {job.id} is no longer available")
+        return path
+    
+    def run_job(self, job_id: str) -> None:
+        """
+        Generate a queued report and store its results.
+        
+        Args:
+            job_id: Job identifier
+            
+        Raises:
+            Exception: Whatever the report generation raised, after the job
+                was marked failed
+        """
+        job = self.repository.get_by_id(job_id)
+        if job is None or job.status != RelatorioJob.STATUS_PENDENTE:
+            return
+        
+        job.status = RelatorioJob.STATUS_EXECUTANDO
+        job.data_inicio = datetime.utcnow()
+        self._set_progress(job, 5, 'Starting')
+        heartbeat = self._start_heartbeat(job.id)
+        
+        def progress(percentual: int, etapa: str):
+            # Generators report 0-100; the last 10% is writing the results
+            self._set_progress(job, 5 + percentual * 85 // 100, etapa)
+        
+        try:
+            dados = self._generate(job.tipo, job.parametros, progress)
+            
+            self._set_progress(job, 90, 'Writing results')
+            formatos = self._write_results(job, dados)
+            
+            now = datetime.utcnow()
+            job.status = RelatorioJob.STATUS_CONCLUIDO
+            job.progresso = 100
+            job.etapa = None
+            job.formatos = ','.join(formatos)
+            job.data_conclusao = now
+            job.data_atualizacao = now
+            job.expira_em = now + timedelta(seconds=current_app.config.get('REPORT_RESULT_TTL_SECONDS', 3600))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self._fail(job, str(e))
+            raise
+        finally:
+            heartbeat.set()
+    
+    def purge_expired(self, limit: int = 100) -> int:
+        """
+        Delete expired jobs and their result files.
+        
+        Args:
+            limit: Maximum number of jobs removed in this call
+            
+        Returns:
+            Number of jobs removed
+        """
+        try:
+            expirados = self.repository.get_expired(limit=limit)
+            for job in expirados:
+                for formato in RESULT_MIMETYPES:
+                    path = self._result_file(job.id, formato)
+                    if os.path.exists(path):
+                        os.remove(path)
+                db.session.delete(job)
+            if expirados:
+                db.session.commit()
+            return len(expirados)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Warning: Failed to purge expired report jobs: {e}")
+            return 0
+    
+    def _generate(self, tipo: str, parametros: Dict[str, Any], progress) -> Dict[str, Any]:
+        """Run the report generator of a job"""
+        from app.services.report_service import ReportService
+        from app.services.audit_service import AuditService
+        
+        datas = {
+            nome: datetime.fromisoformat(parametros[nome]) if nome in parametros else None
+            for nome in DATE_PARAMETERS
+        }
+        
+        if tipo == 'usage':
+            return ReportService().generate_usage_report(progress=progress, **datas)
+        if tipo == 'access':
+            return ReportService().generate_access_report(
+                usuario_id=parametros.get('usuario_id'),
+                documento_id=parametros.get('documento_id'),
+                progress=progress,
+                **datas
+            )
+        if tipo == 'storage':
+            return ReportService().generate_storage_report(progress=progress)
+        
+        progress(0, 'Generating audit report')
+        return AuditService().generate_audit_report(
+            tipo[len('audit_'):],
+            usuario_id=parametros.get('usuario_id'),
+            documento_id=parametros.get('documento_id'),
+            **datas
+        )
+    
+    def _write_results(self, job: RelatorioJob, dados: Dict[str, Any]) -> list:
+        """Write the JSON (and CSV when available) results; returns the formats written"""
+        from app.services.report_service import ReportService
+        
+        os.makedirs(current_app.config['REPORT_RESULTS_DIR'], exist_ok=True)
+        self._write_file(
+            self._result_file(job.id, 'json'),
+            json.dumps(dados, default=_json_default, ensure_ascii=False).encode('utf-8')
+        )
+        formatos = ['json']
+        
+        if REPORT_JOB_TYPES[job.tipo].get('csv'):
+            self._write_file(
+                self._result_file(job.id, 'csv'),
+                ReportService().export_report_csv(dados, job.tipo).getvalue()
+            )
+            formatos.append('csv')
+        return formatos
+    
+    def _write_file(self, path: str, content: bytes):
+        """Write a result file atomically"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    
+    def _result_file(self, job_id: str, formato: str) -> str:
+        """Path of a job's result file"""
+        return os.path.join(current_app.config['REPORT_RESULTS_DIR'], f'{job_id}.{formato}')
+    
+    def _set_progress(self, job: RelatorioJob, progresso: int, etapa: str):
+        """Record a progress step"""
+        job.progresso = max(job.progresso or 0, min(progresso, 99))
+        job.etapa = etapa
+        job.data_atualizacao = datetime.utcnow()
+        db.session.commit()
+    
+    def _start_heartbeat(self, job_id: str) -> threading.Event:
+        """
+        Touch a running job's data_atualizacao until the returned event is set.
+        
+        Runs in a daemon thread on its own connections, so a report step that
+        takes longer than REPORT_JOB_STALE_SECONDS is not mistaken for a job
+        whose process died.
+        """
+        interval = current_app.config.get('REPORT_JOB_HEARTBEAT_SECONDS', 60)
+        engine = db.engine
+        stop = threading.Event()
+        
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(
+                            update(RelatorioJob).where(
+                                RelatorioJob.id == job_id,
+                                RelatorioJob.status == RelatorioJob.STATUS_EXECUTANDO
+                            ).values(data_atualizacao=datetime.utcnow())
+                        )
+                except Exception as e:
+                    print(f"Warning: Failed to record heartbeat of report job {job_id}: {e}")
+        
+        threading.Thread(target=beat, name=f'report-job-heartbeat-{job_id[:8]}', daemon=True).start()
+        return stop
+    
+    def _fail_if_stale(self, job: RelatorioJob) -> bool:
+        """
+        Mark an active job failed if its heartbeat stopped.
+        
+        The UPDATE re-checks status and data_atualizacao, so a heartbeat
+        written since the job was loaded keeps it alive.
+        
+        Returns:
+            True if the job was marked failed
+        """
+        stale_seconds = current_app.config.get('REPORT_JOB_STALE_SECONDS', 900)
+        limite = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        if job.data_atualizacao >= limite:
+            return False
+        
+        now = datetime.utcnow()
+        failed = db.session.execute(
+            update(RelatorioJob).where(
+                RelatorioJob.id == job.id,
+                RelatorioJob.status.in_([RelatorioJob.STATUS_PENDENTE, RelatorioJob.STATUS_EXECUTANDO]),
+                RelatorioJob.data_atualizacao < limite
+            ).values(
+                status=RelatorioJob.STATUS_ERRO,
+                erro='Interrupted: no heartbeat',
+                data_conclusao=now,
+                data_atualizacao=now,
+                expira_em=now + timedelta(seconds=current_app.config.get('REPORT_RESULT_TTL_SECONDS', 3600))
+            ),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        db.session.commit()
+        db.session.refresh(job)
+        return bool(failed)
+    
+    def _fail(self, job: RelatorioJob, erro: str):
+        """Mark a job failed; failed jobs are purged like expired results"""
+        now = datetime.utcnow()
+        job.status = RelatorioJob.STATUS_ERRO
+        job.erro = erro
+        job.data_conclusao = now
+        job.data_atualizacao = now
+        job.expira_em = now + timedelta(seconds=current_app.config.get('REPORT_RESULT_TTL_SECONDS', 3600))
+        db.session.commit()
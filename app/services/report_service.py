@@ -1,17 +1,18 @@
 """
 Report service for generating system reports
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
-from sqlalchemy.types import Date
-from io import BytesIO
+from io import BytesIO, StringIO
+from types import SimpleNamespace
 import csv
 from app import db
 from app.models import User, Documento, LogAuditoria, Perfil
 from app.repositories.document_repository import DocumentRepository
 from app.repositories.user_repository import UserRepository
 from app.repositories.audit_repository import AuditRepository
+from app.services.report_aggregation import ReportAggregator, Total, CountBy, Distinct
 
 
 class ReportService:
@@ -25,11 +26,13 @@ class ReportService:
         self.document_repository = DocumentRepository()
         self.user_repository = UserRepository()
         self.audit_repository = AuditRepository()
+        self.aggregator = ReportAggregator(self.audit_repository)
     
     def generate_usage_report(
         self,
         data_inicio: Optional[datetime] = None,
-        data_fim: Optional[datetime] = None
+        data_fim: Optional[datetime] = None,
+        progress: Optional[Callable[[int, str], None]] = None
     ) -> Dict[str, Any]:
         """
         Generate system usage report.
@@ -37,6 +40,8 @@ class ReportService:
         Args:
             data_inicio: Start date for report
             data_fim: End date for report
+            progress: Optional callback receiving (percent, step) as the
+                report advances (see ReportJobService)
             
         Returns:
             Dictionary with usage statistics
@@ -47,52 +52,53 @@ class ReportService:
             data_fim = datetime.utcnow()
         
         # Document uploads in period
+        if progress:
+            progress(0, 'Counting uploads')
         uploads = db.session.query(func.count(Documento.id)).filter(
             Documento.data_upload.between(data_inicio, data_fim)
         ).scalar() or 0
         
-        # User logins in period
-        logins = db.session.query(func.count(LogAuditoria.id)).filter(
-            LogAuditoria.acao == 'login_success',
-            LogAuditoria.data_hora.between(data_inicio, data_fim)
-        ).scalar() or 0
+        # Audit activity in period: every figure comes from one grouped
+        # count, served by the audit rollups (see AuditRollupService) and
+        # raw rows for open hours
+        if progress:
+            progress(20, 'Counting audit activity')
+        activity = self.aggregator.aggregate([
+            Total('logins', acao='login_success'),
+            Total('downloads', acao='document_download'),
+            Distinct('active_users', 'usuario_id'),
+            CountBy('by_user', 'usuario_id'),
+            CountBy('by_day', 'dia')
+        ], data_inicio, data_fim)
+        logins = activity['logins']
+        downloads = activity['downloads']
+        active_users = activity['active_users']
+        by_user = activity['by_user']
+        by_day = activity['by_day']
         
-        # Document downloads in period
-        downloads = db.session.query(func.count(LogAuditoria.id)).filter(
-            LogAuditoria.acao == 'document_download',
-            LogAuditoria.data_hora.between(data_inicio, data_fim)
-        ).scalar() or 0
+        # Top users by activity (users that no longer exist are skipped)
+        if progress:
+            progress(80, 'Ranking users')
+        top_users = []
+        ranked = by_user.most_common()
+        for start in range(0, len(ranked), 50):
+            chunk = ranked[start:start + 50]
+            users = {
+                u.id: u for u in db.session.query(User.id, User.nome, User.email).filter(
+                    User.id.in_([user_id for user_id, _ in chunk])
+                )
+            }
+            top_users.extend(
+                SimpleNamespace(id=user_id, nome=users[user_id].nome,
+                                email=users[user_id].email, activity_count=count)
+                for user_id, count in chunk if user_id in users
+            )
+            if len(top_users) >= 10:
+                break
+        top_users = top_users[:10]
         
-        # Active users in period
-        active_users = db.session.query(func.count(func.distinct(LogAuditoria.usuario_id))).filter(
-            LogAuditoria.data_hora.between(data_inicio, data_fim)
-        ).scalar() or 0
-        
-        # Top users by activity
-        top_users = db.session.query(
-            User.id,
-            User.nome,
-            User.email,
-            func.count(LogAuditoria.id).label('activity_count')
-        ).join(
-            LogAuditoria, User.id == LogAuditoria.usuario_id
-        ).filter(
-            LogAuditoria.data_hora.between(data_inicio, data_fim)
-        ).group_by(
-            User.id, User.nome, User.email
-        ).order_by(
-            func.count(LogAuditoria.id).desc()
-        ).limit(10).all()
-        
-        # Daily activity - Use CAST for SQL Server compatibility
-        daily_activity = db.session.query(
-            func.cast(LogAuditoria.data_hora, Date).label('date'),
-            func.count(LogAuditoria.id).label('count')
-        ).filter(
-            LogAuditoria.data_hora.between(data_inicio, data_fim)
-        ).group_by(
-            func.cast(LogAuditoria.data_hora, Date)
-        ).order_by('date').all()
+        # Daily activity
+        daily_activity = [SimpleNamespace(date=day, count=count) for day, count in sorted(by_day.items())]
         
         return {
             'period': {
@@ -128,7 +134,8 @@ class ReportService:
         data_inicio: Optional[datetime] = None,
         data_fim: Optional[datetime] = None,
         usuario_id: Optional[int] = None,
-        documento_id: Optional[int] = None
+        documento_id: Optional[int] = None,
+        progress: Optional[Callable[[int, str], None]] = None
     ) -> Dict[str, Any]:
         """
         Generate document access report.
@@ -138,6 +145,8 @@ class ReportService:
             data_fim: End date for report
             usuario_id: Filter by specific user
             documento_id: Filter by specific document
+            progress: Optional callback receiving (percent, step) as the
+                report advances
             
         Returns:
             Dictionary with access statistics
@@ -148,6 +157,8 @@ class ReportService:
             data_fim = datetime.utcnow()
         
         # Build query
+        if progress:
+            progress(0, 'Loading access logs')
         query = db.session.query(
             LogAuditoria.id,
             LogAuditoria.usuario_id,
@@ -172,23 +183,46 @@ class ReportService:
         
         access_logs = query.order_by(LogAuditoria.data_hora.desc()).limit(1000).all()
         
-        # Access summary by action
-        action_summary = db.session.query(
-            LogAuditoria.acao,
-            func.count(LogAuditoria.id).label('count')
-        ).filter(
-            LogAuditoria.tabela == 'documentos',
-            LogAuditoria.acao.in_(['document_view', 'document_download', 'document_upload']),
-            LogAuditoria.data_hora.between(data_inicio, data_fim)
-        )
-        
+        access_filters = {
+            'tabela': 'documentos',
+            'acao': ['document_view', 'document_download', 'document_upload']
+        }
         if usuario_id:
-            action_summary = action_summary.filter(LogAuditoria.usuario_id == usuario_id)
-        
+            access_filters['usuario_id'] = usuario_id
         if documento_id:
-            action_summary = action_summary.filter(LogAuditoria.registro_id == documento_id)
+            access_filters['registro_id'] = documento_id
+        arquivos = self.audit_repository.get_archives_for_range(data_inicio, data_fim)
+        if arquivos and len(access_logs) < 1000:
+            if progress:
+                progress(40, 'Reading archived access logs')
+            archived_logs = []
+            for entry in self.audit_repository.archive_repository.iter_entries(
+                arquivos, data_inicio, data_fim, access_filters
+            ):
+                if entry.usuario_id is None:
+                    continue
+                archived_logs.append(entry)
+                if len(access_logs) + len(archived_logs) >= 1000:
+                    break
+            users = {u.id: u.nome for u in User.query.filter(
+                User.id.in_({entry.usuario_id for entry in archived_logs})
+            )}
+            access_logs = list(access_logs) + [
+                SimpleNamespace(
+                    id=entry.id, usuario_id=entry.usuario_id, user_name=users[entry.usuario_id],
+                    acao=entry.acao, registro_id=entry.registro_id,
+                    data_hora=entry.data_hora, ip_address=entry.ip_address
+                )
+                for entry in archived_logs if entry.usuario_id in users
+            ]
         
-        action_summary = action_summary.group_by(LogAuditoria.acao).all()
+        # Access summary by action, one grouped count (raw rows when the
+        # document filter is set, since per-document counts are not rolled up)
+        if progress:
+            progress(70, 'Summarizing accesses')
+        summary = self.aggregator.aggregate(
+            [CountBy('summary', 'acao')], data_inicio, data_fim, access_filters
+        )['summary']
         
         return {
             'period': {
@@ -199,9 +233,7 @@ class ReportService:
                 'usuario_id': usuario_id,
                 'documento_id': documento_id
             },
-            'summary': {
-                action.acao: action.count for action in action_summary
-            },
+            'summary': dict(summary),
             'access_logs': [
                 {
                     'id': log.id,
@@ -216,14 +248,23 @@ class ReportService:
             ]
         }
     
-    def generate_storage_report(self) -> Dict[str, Any]:
+    def generate_storage_report(
+        self,
+        progress: Optional[Callable[[int, str], None]] = None
+    ) -> Dict[str, Any]:
         """
         Generate storage usage report by user.
         
+        Args:
+            progress: Optional callback receiving (percent, step) as the
+                report advances
+                
         Returns:
             Dictionary with storage statistics
         """
         # Storage by user
+        if progress:
+            progress(0, 'Summing storage by user')
         storage_by_user = db.session.query(
             User.id,
             User.nome,
@@ -244,6 +285,8 @@ class ReportService:
         ).all()
         
         # Storage by file type
+        if progress:
+            progress(50, 'Summing storage by file type')
         storage_by_type = db.session.query(
             Documento.tipo_mime,
             func.count(Documento.id).label('document_count'),
@@ -300,8 +343,9 @@ class ReportService:
         Returns:
             BytesIO object containing CSV data
         """
-        output = BytesIO()
-        output.write('\ufeff'.encode('utf-8'))  # UTF-8 BOM
+        # csv writes text; the rows are encoded once at the end
+        output = StringIO()
+        output.write('\ufeff')  # UTF-8 BOM
         
         writer = csv.writer(output, delimiter=';')
         
@@ -363,8 +407,7 @@ class ReportService:
                     file_type['total_formatted']
                 ])
         
-        output.seek(0)
-        return output
+        return BytesIO(output.getvalue().encode('utf-8'))
     
     def _format_bytes(self, bytes_value: int) -> str:
         """Format bytes to human-readable string."""
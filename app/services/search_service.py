@@ -6,8 +6,10 @@ from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 from sqlalchemy import or_, and_, func, text
 from app import db
-from app.models.document import Documento, Tag, DocumentoTag, Categoria
-from app.models.permission import Permissao
+from app.models.document import Documento, Tag, DocumentoTag
+from app.models.permission import Permissao, PermissaoEfetiva, PermissaoGrupo
+from app.utils.permission_cache import permission_cache, group_grant_filter
+from app.utils.category_tree import category_tree
 from app.repositories.document_repository import DocumentRepository, TagRepository
 import os
 from pathlib import Path
@@ -83,6 +85,33 @@ class SearchService:
         
         return results, total_count
     
+    def search_ids(
+        self,
+        query: str,
+        user_id: int,
+        filters: Optional[Dict[str, Any]] = None,
+        include_shared: bool = True
+    ) -> List[int]:
+        """
+        IDs of every document a search matches, without loading the documents
+        
+        Args:
+            query: Search term (searches in name, description, and tags)
+            user_id: ID of user performing the search
+            filters: Optional filters, as in search()
+            include_shared: Whether to include documents shared with user
+            
+        Returns:
+            List of document IDs in ID order
+        """
+        search_query = self._build_base_query(user_id, include_shared)
+        if query and query.strip():
+            search_query = self._apply_text_search(search_query, query.strip())
+        if filters:
+            search_query = self._apply_filters(search_query, filters)
+        
+        return [row[0] for row in search_query.with_entities(Documento.id).order_by(Documento.id)]
+    
     def _build_base_query(self, user_id: int, include_shared: bool):
         """
         Build base query with permission filtering
@@ -98,7 +127,23 @@ class SearchService:
         query = db.session.query(Documento).filter(Documento.status == 'ativo')
         
         if include_shared:
-            # Include documents owned by user OR shared with user
+            # Include documents owned by user OR shared with user, directly,
+            # through a folder/category grant or through a group/profile grant
+            inherited = db.session.query(PermissaoEfetiva.documento_id).filter(
+                PermissaoEfetiva.usuario_id == user_id,
+                or_(
+                    PermissaoEfetiva.data_expiracao.is_(None),
+                    PermissaoEfetiva.data_expiracao > datetime.utcnow()
+                )
+            )
+            grupo_ids, perfil_id = permission_cache.get_memberships(user_id)
+            shared = db.session.query(PermissaoGrupo.documento_id).filter(
+                group_grant_filter(grupo_ids, perfil_id),
+                or_(
+                    PermissaoGrupo.data_expiracao.is_(None),
+                    PermissaoGrupo.data_expiracao > datetime.utcnow()
+                )
+            )
             query = query.outerjoin(Permissao).filter(
                 or_(
                     Documento.usuario_id == user_id,
@@ -109,7 +154,9 @@ class SearchService:
                             Permissao.data_expiracao.is_(None),
                             Permissao.data_expiracao > datetime.utcnow()
                         )
-                    )
+                    ),
+                    Documento.id.in_(inherited),
+                    Documento.id.in_(shared)
                 )
             ).distinct()
         else:
@@ -683,11 +730,7 @@ class SearchService:
         tag_names = [tag.nome for tag in tag_suggestions]
         
         # Get category suggestions
-        category_suggestions = db.session.query(Categoria).filter(
-            Categoria.nome.ilike(search_pattern),
-            Categoria.ativo == True
-        ).limit(limit).all()
-        category_names = [cat.nome for cat in category_suggestions]
+        category_names = [cat.nome for cat in category_tree.get().search(partial_query, limit)]
         
         return {
             'documents': document_names,
@@ -742,19 +785,13 @@ class SearchService:
             
         Requirements: 3.5
         """
+        tree = category_tree.get()
         if not partial_category or len(partial_category) < 1:
             # Return root categories if no query
-            categories = db.session.query(Categoria).filter(
-                Categoria.ativo == True,
-                Categoria.categoria_pai_id.is_(None)
-            ).order_by(Categoria.ordem, Categoria.nome).limit(limit).all()
+            categories = tree.children(None)[:limit]
         else:
             # Search for matching categories
-            search_pattern = f'%{partial_category}%'
-            categories = db.session.query(Categoria).filter(
-                Categoria.nome.ilike(search_pattern),
-                Categoria.ativo == True
-            ).order_by(Categoria.nome).limit(limit).all()
+            categories = tree.search(partial_category, limit)
         
         return [
             {
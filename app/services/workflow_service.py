@@ -4,6 +4,7 @@ Workflow service for approval processes
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from flask import current_app
+from sqlalchemy import update
 from app import db
 from app.models.workflow import Workflow, AprovacaoDocumento, HistoricoAprovacao
 from app.models.document import Documento
@@ -14,6 +15,7 @@ from app.repositories.workflow_repository import (
     HistoricoAprovacaoRepository
 )
 from app.services.notification_service import NotificationService
+from app.utils.workflow_definitions import workflow_definitions
 
 
 class WorkflowServiceError(Exception):
@@ -44,6 +46,9 @@ class UnauthorizedApproverError(WorkflowServiceError):
 class WorkflowService:
     """Service for managing document approval workflows"""
     
+    # Batch decisions load, record and advance approvals in chunks of this size
+    DECISION_CHUNK_SIZE = 500
+    
     def __init__(self):
         """Initialize workflow service"""
         self.workflow_repo = WorkflowRepository()
@@ -157,6 +162,7 @@ class WorkflowService:
                 workflow.ativo = ativo
             
             db.session.commit()
+            workflow_definitions.invalidate(workflow_id)
             
             current_app.logger.info(f"Workflow updated: {workflow_id}")
             
@@ -313,9 +319,7 @@ class WorkflowService:
             # Check if stage is complete
             if self._is_stage_complete(aprovacao, 'aprovado'):
                 # Move to next stage or complete workflow
-                workflow = aprovacao.workflow
-                config = workflow.configuracao
-                total_stages = len(config.get('stages', []))
+                total_stages = aprovacao.workflow.definicao.total_estagios
                 
                 if aprovacao.estagio_atual < total_stages:
                     # Move to next stage
@@ -453,6 +457,174 @@ class WorkflowService:
             current_app.logger.error(f"Error rejecting document: {e}")
             raise
     
+    def decide_approvals_bulk(
+        self,
+        aprovacao_ids: List[int],
+        aprovador_id: int,
+        acao: str,
+        comentario: str
+    ) -> Dict[str, Any]:
+        """
+        Approve or reject many pending approvals at once
+        
+        Per chunk, the approvals are loaded and the user's authority checked
+        with one query each, completion of require_all stages is computed
+        with one grouped query over the history, approvals advance or
+        complete with UPDATEs guarded on the status and stage they were
+        loaded at, and history rows are inserted in bulk for the approvals
+        actually decided. Next stage approvers and submitters each receive
+        one consolidated notification. Approvals the user cannot decide are
+        reported and skipped.
+        
+        Args:
+            aprovacao_ids: Approval IDs
+            aprovador_id: ID of user deciding
+            acao: 'aprovado' or 'rejeitado'
+            comentario: Decision comment (mandatory), recorded on every approval
+            
+        Returns:
+            Dictionary with counts and skipped IDs
+            {
+                'decided': 298,       # approvals the decision was recorded for
+                'advanced': 120,      # moved to their next stage
+                'completed': 178,     # workflows finished (approved or rejected)
+                'unauthorized': [7],  # not at a stage the user approves
+                'not_pending': [8],   # already approved or rejected, or decided concurrently
+                'not_found': [9]      # unknown approvals
+            }
+            
+        Raises:
+            WorkflowServiceError: If the action is invalid or the comment is empty
+        """
+        if acao not in ('aprovado', 'rejeitado'):
+            raise WorkflowServiceError(f"Invalid action: {acao}")
+        if not comentario or not comentario.strip():
+            raise WorkflowServiceError("Decision comment is mandatory")
+        
+        aprovacao_ids = list(dict.fromkeys(aprovacao_ids))
+        result = {
+            'decided': 0,
+            'advanced': 0,
+            'completed': 0,
+            'unauthorized': [],
+            'not_pending': [],
+            'not_found': []
+        }
+        advanced = []
+        completed = []
+        now = datetime.utcnow()
+        
+        try:
+            for start in range(0, len(aprovacao_ids), self.DECISION_CHUNK_SIZE):
+                chunk = aprovacao_ids[start:start + self.DECISION_CHUNK_SIZE]
+                aprovacoes = {aprovacao.id: aprovacao for aprovacao in self.aprovacao_repo.get_for_decision(chunk)}
+                authorized = self.aprovacao_repo.get_authorized_ids(chunk, aprovador_id)
+                
+                decided = []
+                for aprovacao_id in chunk:
+                    aprovacao = aprovacoes.get(aprovacao_id)
+                    if aprovacao is None:
+                        result['not_found'].append(aprovacao_id)
+                    elif aprovacao.status != 'pendente':
+                        result['not_pending'].append(aprovacao_id)
+                    elif aprovacao_id not in authorized:
+                        result['unauthorized'].append(aprovacao_id)
+                    else:
+                        decided.append(aprovacao)
+                if not decided:
+                    continue
+                
+                if acao == 'rejeitado':
+                    # One rejection ends the workflow
+                    to_advance, to_complete, waiting = [], decided, []
+                else:
+                    # require_all stages: who already approved each one, plus this decision
+                    require_all = []
+                    for aprovacao in decided:
+                        stage = aprovacao.workflow.definicao.stage(aprovacao.estagio_atual)
+                        if stage is not None and stage.require_all:
+                            require_all.append(aprovacao.id)
+                    approved_by = self.historico_repo.get_current_stage_approvers(require_all) if require_all else {}
+                    
+                    to_advance, to_complete, waiting = [], [], []
+                    for aprovacao in decided:
+                        definicao = aprovacao.workflow.definicao
+                        stage = definicao.stage(aprovacao.estagio_atual)
+                        if stage is not None and stage.require_all and \
+                                not stage.approvers <= approved_by.get(aprovacao.id, set()) | {aprovador_id}:
+                            waiting.append(aprovacao)
+                        elif aprovacao.estagio_atual < definicao.total_estagios:
+                            to_advance.append(aprovacao)
+                        else:
+                            to_complete.append(aprovacao)
+                
+                # Stage each decision is recorded at, before advancing
+                stages = {aprovacao.id: aprovacao.estagio_atual for aprovacao in decided}
+                
+                # Approvals decided concurrently since they were loaded are left alone
+                lost = self._update_if_unchanged(to_advance, estagio_atual=AprovacaoDocumento.estagio_atual + 1)
+                lost |= self._update_if_unchanged(to_complete, status=acao, data_conclusao=now)
+                if lost:
+                    result['not_pending'].extend(aprovacao.id for aprovacao in decided if aprovacao.id in lost)
+                    decided = [aprovacao for aprovacao in decided if aprovacao.id not in lost]
+                    to_advance = [aprovacao for aprovacao in to_advance if aprovacao.id not in lost]
+                    to_complete = [aprovacao for aprovacao in to_complete if aprovacao.id not in lost]
+                    if not decided:
+                        db.session.commit()
+                        continue
+                
+                db.session.bulk_insert_mappings(HistoricoAprovacao, [
+                    {
+                        'aprovacao_id': aprovacao.id,
+                        'estagio': stages[aprovacao.id],
+                        'aprovador_id': aprovador_id,
+                        'acao': acao,
+                        'comentario': comentario,
+                        'data_acao': now
+                    }
+                    for aprovacao in decided
+                ])
+                
+                try:
+                    from app.services.audit_service import AuditService
+                    AuditService().log_actions_bulk([
+                        {
+                            'usuario_id': aprovador_id,
+                            'acao': 'workflow_approve' if acao == 'aprovado' else 'workflow_reject',
+                            'tabela': 'documentos',
+                            'registro_id': aprovacao.documento_id,
+                            'dados': {
+                                'workflow_id': aprovacao.workflow_id,
+                                'comentario': comentario,
+                                'bulk': True
+                            }
+                        }
+                        for aprovacao in decided
+                    ], commit=False)
+                except Exception as e:
+                    print(f"Warning: Failed to log bulk workflow decision audit entries: {e}")
+                
+                db.session.commit()
+                result['decided'] += len(decided)
+                advanced.extend(to_advance)
+                completed.extend(to_complete)
+        
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error deciding approvals in bulk: {e}")
+            raise
+        
+        result['advanced'] = len(advanced)
+        result['completed'] = len(completed)
+        self._notify_bulk_decisions(advanced, completed, aprovador_id, acao, comentario)
+        
+        current_app.logger.info(
+            f"Bulk decision by user {aprovador_id}: {result['decided']} {acao}, "
+            f"{result['advanced']} advanced, {result['completed']} completed"
+        )
+        
+        return result
+    
     def get_approval_history(self, aprovacao_id: int) -> List[HistoricoAprovacao]:
         """
         Get approval history for an approval
@@ -491,6 +663,45 @@ class WorkflowService:
     
     # Private helper methods
     
+    def _update_if_unchanged(self, aprovacoes: List[AprovacaoDocumento], **values) -> set:
+        """
+        Update approvals that are still pending at the stage they were loaded at
+        
+        Runs one UPDATE per stage, guarded on status and estagio_atual, so an
+        approval decided by someone else in the meantime is neither advanced
+        twice nor has its outcome overwritten.
+        
+        Args:
+            aprovacoes: Approvals as loaded for the decision
+            **values: Column values to set
+            
+        Returns:
+            Set of IDs that were not updated (lost to a concurrent decision)
+        """
+        by_stage = {}
+        for aprovacao in aprovacoes:
+            by_stage.setdefault(aprovacao.estagio_atual, []).append(aprovacao.id)
+        
+        lost = set()
+        for estagio, ids in by_stage.items():
+            updated = {
+                row[0] for row in db.session.execute(
+                    update(AprovacaoDocumento).where(
+                        AprovacaoDocumento.id.in_(ids),
+                        AprovacaoDocumento.status == 'pendente',
+                        AprovacaoDocumento.estagio_atual == estagio
+                    ).values(**values).returning(AprovacaoDocumento.id),
+                    execution_options={'synchronize_session': 'fetch'}
+                )
+            }
+            if len(updated) != len(ids):
+                lost.update(aprovacao_id for aprovacao_id in ids if aprovacao_id not in updated)
+        
+        for aprovacao in aprovacoes:
+            if aprovacao.id in lost:
+                db.session.expire(aprovacao)
+        return lost
+    
     def _validate_workflow_config(self, config: Dict[str, Any]) -> None:
         """
         Validate workflow configuration structure
@@ -542,22 +753,7 @@ class WorkflowService:
         Returns:
             True if user is authorized approver
         """
-        workflow = aprovacao.workflow
-        config = workflow.configuracao
-        
-        if 'stages' not in config:
-            return False
-        
-        stages = config['stages']
-        current_stage_idx = aprovacao.estagio_atual - 1  # 0-indexed
-        
-        if current_stage_idx >= len(stages):
-            return False
-        
-        stage = stages[current_stage_idx]
-        approvers = stage.get('approvers', [])
-        
-        return user_id in approvers
+        return self.workflow_repo.is_stage_approver(aprovacao.workflow_id, aprovacao.estagio_atual, user_id)
     
     def _is_stage_complete(
         self,
@@ -578,23 +774,15 @@ class WorkflowService:
         if acao == 'rejeitado':
             return True
         
-        workflow = aprovacao.workflow
-        config = workflow.configuracao
-        stages = config.get('stages', [])
-        current_stage_idx = aprovacao.estagio_atual - 1
-        
-        if current_stage_idx >= len(stages):
+        stage = aprovacao.workflow.definicao.stage(aprovacao.estagio_atual)
+        if stage is None:
             return True
         
-        stage = stages[current_stage_idx]
-        require_all = stage.get('require_all', False)
-        
         # If require_all is False, one approval completes the stage
-        if not require_all:
+        if not stage.require_all:
             return True
         
         # If require_all is True, check if all approvers have approved
-        approvers = stage.get('approvers', [])
         history = self.historico_repo.get_by_approval(aprovacao.id)
         
         # Get approvers who have approved at this stage
@@ -604,7 +792,7 @@ class WorkflowService:
                 approved_by.add(h.aprovador_id)
         
         # Check if all approvers have approved
-        return len(approved_by) >= len(approvers)
+        return stage.approvers <= approved_by
     
     def _notify_stage_approvers(self, aprovacao: AprovacaoDocumento) -> None:
         """
@@ -614,17 +802,10 @@ class WorkflowService:
             aprovacao: Approval instance
         """
         try:
-            workflow = aprovacao.workflow
-            config = workflow.configuracao
-            stages = config.get('stages', [])
-            current_stage_idx = aprovacao.estagio_atual - 1
-            
-            if current_stage_idx >= len(stages):
+            approvers = self.workflow_repo.get_stage_approver_ids(aprovacao.workflow_id, aprovacao.estagio_atual)
+            if not approvers:
                 return
             
-            stage = stages[current_stage_idx]
-            approvers = stage.get('approvers', [])
-            
             documento = aprovacao.documento
             
             # Send notification to each approver
@@ -632,13 +813,55 @@ class WorkflowService:
                 self.notification_service.notify_workflow_submission(
                     documento=documento,
                     approver_id=approver_id,
-                    workflow_id=workflow.id,
+                    workflow_id=aprovacao.workflow_id,
                     submitter_id=aprovacao.submetido_por
                 )
                 
         except Exception as e:
             current_app.logger.error(f"Error notifying stage approvers: {e}")
     
+    def _notify_bulk_decisions(
+        self,
+        advanced: List[AprovacaoDocumento],
+        completed: List[AprovacaoDocumento],
+        aprovador_id: int,
+        status: str,
+        comentario: str
+    ) -> None:
+        """
+        Send one notification per recipient for a batch decision
+        
+        Args:
+            advanced: Approvals moved to their next stage
+            completed: Approvals whose workflow finished
+            aprovador_id: ID of user who decided
+            status: Decision ('aprovado' or 'rejeitado')
+            comentario: Decision comment
+        """
+        try:
+            by_approver = {}
+            if advanced:
+                aprovacoes = {aprovacao.id: aprovacao for aprovacao in advanced}
+                ids = list(aprovacoes)
+                for start in range(0, len(ids), self.DECISION_CHUNK_SIZE):
+                    for aprovacao_id, approver_id in self.aprovacao_repo.get_current_approver_pairs(
+                        ids[start:start + self.DECISION_CHUNK_SIZE]
+                    ):
+                        by_approver.setdefault(approver_id, []).append(aprovacoes[aprovacao_id])
+            for approver_id, aprovacoes in by_approver.items():
+                self.notification_service.notify_workflow_submission_bulk(aprovacoes, approver_id)
+            
+            by_submitter = {}
+            for aprovacao in completed:
+                by_submitter.setdefault(aprovacao.submetido_por, []).append(aprovacao)
+            for submitter_id, aprovacoes in by_submitter.items():
+                self.notification_service.notify_workflow_decisions_bulk(
+                    aprovacoes, aprovador_id, submitter_id, status, comentario
+                )
+        
+        except Exception as e:
+            current_app.logger.error(f"Error notifying bulk decisions: {e}")
+    
     def _notify_approval_complete(
         self,
         aprovacao: AprovacaoDocumento,
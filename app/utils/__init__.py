@@ -31,6 +31,19 @@ from app.utils.middleware import (
     check_role_permission,
     validate_resource_access
 )
+from app.utils.permission_cache import (
+    PermissionCache,
+    permission_cache,
+    PERMISSION_BITS,
+    ALL_PERMISSIONS
+)
+from app.utils.audit_writer import AuditWriter, audit_writer
+from app.utils.audit_coalescer import AuditCoalescer, audit_coalescer
+from app.utils.dashboard_snapshot import DashboardSnapshot, Widget, dashboard_snapshot
+from app.utils.report_jobs import ReportJobRunner, report_job_runner
+from app.utils.category_tree import CategoryTree, CategoryTreeCache, category_tree
+from app.utils.workflow_definitions import WorkflowDefinition, WorkflowDefinitionCache, workflow_definitions
+from app.utils.retention import RetentionExecutor, delete_files_parallel
 
 __all__ = [
     'FileHandler',
@@ -54,5 +67,26 @@ __all__ = [
     'PermissionMiddleware',
     'check_document_permission',
     'check_role_permission',
-    'validate_resource_access'
+    'validate_resource_access',
+    'PermissionCache',
+    'permission_cache',
+    'PERMISSION_BITS',
+    'ALL_PERMISSIONS',
+    'AuditWriter',
+    'audit_writer',
+    'AuditCoalescer',
+    'audit_coalescer',
+    'DashboardSnapshot',
+    'Widget',
+    'dashboard_snapshot',
+    'ReportJobRunner',
+    'report_job_runner',
+    'CategoryTree',
+    'CategoryTreeCache',
+    'category_tree',
+    'WorkflowDefinition',
+    'WorkflowDefinitionCache',
+    'workflow_definitions',
+    'RetentionExecutor',
+    'delete_files_parallel'
 ]
@@ -0,0 +1,293 @@
+"""
+Audit event coalescing
+Folds repeated view/download events of the same user on the same record into
+a single log_auditoria row carrying an occurrence count and the first and
+last timestamps
+"""
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from flask import has_app_context
+from sqlalchemy import update
+from app import db
+from app.models.audit import LogAuditoria
+from app.utils.audit_writer import audit_writer, is_sync_action
+
+
+# SQL Server DATETIME stores timestamps in 1/300 s steps, so the row written
+# for the first event is matched within this tolerance
+MATCH_TOLERANCE = timedelta(milliseconds=5)
+
+# Sweeps triggered by new events run at most this often
+SWEEP_INTERVAL_SECONDS = 1.0
+
+# Attempts to update a closed row that is not visible yet (still queued in the
+# background writer) before the extra occurrences are dropped
+MAX_UPDATE_ATTEMPTS = 5
+
+# Time allowed between a key reaching max_span_seconds and its count being
+# written (sweep cadence, writer flush, retries); see AuditCoalescer.init_app
+ROLLUP_MARGIN_SECONDS = 120
+
+
+class AuditCoalescer:
+    """
+    Process-local coalescing of repeated audit events.
+    
+    The first event of a (usuario_id, acao, tabela, registro_id, ip_address)
+    key is written as usual, so it is durable and visible right away. Events
+    for the same key arriving within window_seconds of the previous one are
+    only counted in memory. Once the key has been idle for window_seconds,
+    its first event is older than max_span_seconds, or the map holds max_keys
+    entries, the key is closed and its row is updated once with ocorrencias
+    and data_hora_fim.
+    
+    Only actions listed in AUDIT_COALESCE_ACTIONS are coalesced; actions
+    written synchronously by the audit writer (logins, permission and user
+    changes, see SYNC_ACTIONS) never are, whatever the configuration.
+    
+    The audit rollups close an hour AUDIT_ROLLUP_LAG_MINUTES after it ends
+    and only pick up new rows afterwards, so counts must be written before
+    that: init_app clamps max_span_seconds to the rollup lag minus
+    ROLLUP_MARGIN_SECONDS (and disables coalescing when the lag leaves no
+    room). Counts are written on a connection of their own, never in the
+    session of the request that triggered the sweep.
+    
+    Each worker process coalesces on its own, so a burst served by several
+    workers yields one row per worker. Counters still open when a process
+    dies are lost; the first event of every burst is always kept. Repeats
+    keep the dados of the first event.
+    """
+    
+    def __init__(self, window_seconds: int = 60, max_span_seconds: int = 300,
+                 actions=('view', 'download'), max_keys: int = 10000):
+        self.enabled = False
+        self.window_seconds = window_seconds
+        self.max_span_seconds = max_span_seconds
+        self.actions = frozenset(actions)
+        self.max_keys = max_keys
+        self.app = None
+        self._open = OrderedDict()
+        self._closed = []
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._exit_registered = False
+        self._stats = {
+            'rows': 0,
+            'coalesced': 0,
+            'updates': 0,
+            'dropped': 0
+        }
+    
+    def init_app(self, app):
+        """Configure the coalescer from AUDIT_COALESCE_* settings"""
+        self.app = app
+        self.window_seconds = app.config.get('AUDIT_COALESCE_WINDOW_SECONDS', self.window_seconds)
+        self.max_span_seconds = app.config.get('AUDIT_COALESCE_MAX_SPAN_SECONDS', self.max_span_seconds)
+        self.max_keys = app.config.get('AUDIT_COALESCE_MAX_KEYS', self.max_keys)
+        actions = app.config.get('AUDIT_COALESCE_ACTIONS')
+        if actions is not None:
+            self.actions = frozenset(a.strip() for a in actions.split(',') if a.strip())
+        self.enabled = self.window_seconds > 0 and bool(self.actions)
+        
+        # Counts must land before the rollups close the hour of their row
+        rollup_lag = app.config.get('AUDIT_ROLLUP_LAG_MINUTES', 10) * 60
+        max_span = rollup_lag - ROLLUP_MARGIN_SECONDS
+        if self.enabled and max_span <= 0:
+            print(f"Warning: Audit coalescing disabled: AUDIT_ROLLUP_LAG_MINUTES must exceed "
+                  f"{ROLLUP_MARGIN_SECONDS // 60} minutes for counts to reach the rollups")
+            self.enabled = False
+        elif self.enabled and self.max_span_seconds > max_span:
+            print(f"Warning: AUDIT_COALESCE_MAX_SPAN_SECONDS={self.max_span_seconds} lets counts miss "
+                  f"the audit rollups; using {max_span} (AUDIT_ROLLUP_LAG_MINUTES minus "
+                  f"{ROLLUP_MARGIN_SECONDS} seconds)")
+            self.max_span_seconds = max_span
+        
+        if self.enabled and not self._exit_registered:
+            atexit.register(self.close_all)
+            self._exit_registered = True
+    
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """
+        Count an audit entry against an open row of the same key.
+        
+        Args:
+            entry: LogAuditoria column values (see LogAuditoria.to_row)
+            
+        Returns:
+            True if the entry was folded into an open row and must not be
+            written, False if the caller writes it as a new row
+        """
+        acao = entry['acao']
+        if not self.enabled or acao not in self.actions or is_sync_action(acao):
+            return False
+        
+        data_hora = entry.get('data_hora') or datetime.utcnow()
+        key = (entry.get('usuario_id'), acao, entry.get('tabela'), entry.get('registro_id'), entry.get('ip_address'))
+        window = timedelta(seconds=self.window_seconds)
+        max_span = timedelta(seconds=self.max_span_seconds)
+        
+        with self._lock:
+            current = self._open.get(key)
+            if current and data_hora - current['ultimo'] <= window and data_hora - current['data_hora'] <= max_span:
+                current['ultimo'] = max(current['ultimo'], data_hora)
+                current['ocorrencias'] += 1
+                self._open.move_to_end(key)
+                self._stats['coalesced'] += 1
+                folded = True
+            else:
+                if current:
+                    self._close(key)
+                while len(self._open) >= self.max_keys:
+                    self._close(next(iter(self._open)))
+                self._open[key] = {'data_hora': data_hora, 'ultimo': data_hora, 'ocorrencias': 1}
+                self._stats['rows'] += 1
+                folded = False
+        
+        # The background writer sweeps after each flush; without it, sweep
+        # here, where the caller commits its audit entry inline anyway
+        if not audit_writer.enabled and time.monotonic() - self._last_sweep >= SWEEP_INTERVAL_SECONDS:
+            self.sweep()
+        return folded
+    
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """
+        Close idle keys and write the counts of closed rows.
+        
+        Args:
+            now: Reference time (default utcnow)
+            
+        Returns:
+            Number of rows updated
+        """
+        if not self.enabled:
+            return 0
+        now = now or datetime.utcnow()
+        window = timedelta(seconds=self.window_seconds)
+        max_span = timedelta(seconds=self.max_span_seconds)
+        
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            expired = [
+                key for key, current in self._open.items()
+                if now - current['ultimo'] > window or now - current['data_hora'] > max_span
+            ]
+            for key in expired:
+                self._close(key)
+        return self._write_closed()
+    
+    def close_all(self) -> int:
+        """
+        Close every open key and write its count (on shutdown).
+        
+        Returns:
+            Number of rows updated
+        """
+        with self._lock:
+            for key in list(self._open):
+                self._close(key)
+        if not self._closed or self.app is None:
+            return 0
+        
+        with self.app.app_context():
+            # First events may still be queued in the background writer
+            if audit_writer.enabled:
+                audit_writer.flush()
+            return self._write_closed()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._open)
+            stats['closing'] = len(self._closed)
+        stats.update(
+            enabled=self.enabled,
+            window_seconds=self.window_seconds,
+            max_span_seconds=self.max_span_seconds,
+            actions=sorted(self.actions)
+        )
+        return stats
+    
+    def _close(self, key: Tuple) -> None:
+        """Move an open key to the rows to update (caller holds the lock)"""
+        current = self._open.pop(key)
+        if current['ocorrencias'] > 1:
+            self._closed.append((key, current, 0))
+    
+    def _write_closed(self) -> int:
+        """Update the rows of closed keys, keeping those not visible yet for a retry"""
+        with self._lock:
+            closed, self._closed = self._closed, []
+        if not closed:
+            return 0
+        
+        if has_app_context():
+            retry = self._update_rows(closed)
+        elif self.app is not None:
+            with self.app.app_context():
+                retry = self._update_rows(closed)
+                db.session.remove()
+        else:
+            retry = closed
+        
+        with self._lock:
+            self._closed.extend(retry)
+        return len(closed) - len(retry)
+    
+    def _update_rows(self, closed: List[Tuple]) -> List[Tuple]:
+        """
+        Write ocorrencias and data_hora_fim of closed rows in one transaction
+        on a connection of its own, leaving the caller's session untouched.
+        """
+        retry = []
+        with self._sweep_lock:
+            try:
+                with db.engine.begin() as connection:
+                    retry = self._execute_updates(connection, closed)
+            except Exception as e:
+                print(f"Warning: Failed to write coalesced audit counts: {e}")
+                return [(key, current, attempts) for key, current, attempts in closed]
+        return retry
+    
+    def _execute_updates(self, connection, closed: List[Tuple]) -> List[Tuple]:
+        """Run the UPDATE of each closed row; returns the rows to retry"""
+        retry = []
+        for key, current, attempts in closed:
+            usuario_id, acao, tabela, registro_id, ip_address = key
+            result = connection.execute(
+                update(LogAuditoria).where(
+                    LogAuditoria.usuario_id.is_(None) if usuario_id is None
+                    else LogAuditoria.usuario_id == usuario_id,
+                    LogAuditoria.acao == acao,
+                    LogAuditoria.tabela.is_(None) if tabela is None else LogAuditoria.tabela == tabela,
+                    LogAuditoria.registro_id.is_(None) if registro_id is None
+                    else LogAuditoria.registro_id == registro_id,
+                    LogAuditoria.ip_address.is_(None) if ip_address is None
+                    else LogAuditoria.ip_address == ip_address,
+                    LogAuditoria.data_hora.between(
+                        current['data_hora'] - MATCH_TOLERANCE,
+                        current['data_hora'] + MATCH_TOLERANCE
+                    )
+                ).values(
+                    ocorrencias=current['ocorrencias'],
+                    data_hora_fim=current['ultimo']
+                )
+            )
+            if result.rowcount:
+                self._stats['updates'] += 1
+            elif attempts + 1 < MAX_UPDATE_ATTEMPTS:
+                retry.append((key, current, attempts + 1))
+            else:
+                self._stats['dropped'] += current['ocorrencias'] - 1
+                print(f"Warning: Audit row for {acao} on {tabela}:{registro_id} not found, "
+                      f"dropping {current['ocorrencias'] - 1} coalesced occurrences")
+        return retry
+
+
+# Global audit coalescer instance, configured in create_app
+audit_coalescer = AuditCoalescer()
@@ -0,0 +1,334 @@
+"""
+Asynchronous batched audit writer
+Queues audit entries in memory, journals them to disk and bulk-inserts them
+from a background thread, so request handlers never commit for audit logging
+"""
+import atexit
+import glob
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from sqlalchemy import insert
+from app import db
+from app.models.audit import LogAuditoria
+
+
+# Actions written synchronously: failed login counting reads them right away,
+# and authentication/authorization changes must never be lost in a crash
+SYNC_ACTIONS = frozenset({
+    'login',
+    'login_failed',
+    'logout',
+    'admin_password_reset',
+    'settings_update',
+    'share',
+    'revoke_permission'
+})
+SYNC_ACTION_PREFIXES = ('user_',)
+
+_JOURNAL_PATTERN = re.compile(r'^audit_journal_(\d+)(?:_(\d+))?\.(jsonl|pending)$')
+
+
+def is_sync_action(acao: str) -> bool:
+    """Whether an action must bypass the queue and be written synchronously"""
+    return acao in SYNC_ACTIONS or acao.startswith(SYNC_ACTION_PREFIXES)
+
+
+class AuditWriter:
+    """
+    Background writer for LogAuditoria rows.
+    
+    - Entries are appended to a bounded in-memory queue and to a per-process
+      journal file (one JSON line per entry) under the same lock
+    - A daemon thread flushes the queue every flush_interval_ms, or earlier
+      once batch_size entries are waiting, with one bulk insert per batch
+    - Before flushing, the journal is rotated to a .pending file; the file is
+      removed once its entries are committed, and kept for a later retry if
+      the insert fails
+    - On startup, journals left behind by processes that died (no longer
+      running and older than journal_stale_seconds) are claimed and replayed;
+      a live process whose flushes keep failing keeps its own journals, so
+      its batches are never inserted twice
+    
+    submit() returns False when the caller must write synchronously: the
+    writer is disabled, the action is security-critical (see SYNC_ACTIONS),
+    or the queue is full.
+    """
+    
+    def __init__(self, queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval_ms: int = 1000, journal_dir: Optional[str] = None,
+                 journal_stale_seconds: int = 300):
+        self.enabled = False
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.journal_dir = journal_dir
+        self.journal_stale_seconds = journal_stale_seconds
+        self.app = None
+        self._queue = deque()
+        self._journal = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self._stats = {
+            'queued': 0,
+            'written': 0,
+            'batches': 0,
+            'sync_fallbacks': 0,
+            'flush_failures': 0,
+            'recovered': 0
+        }
+    
+    def init_app(self, app):
+        """Configure the writer and start the flusher when AUDIT_ASYNC_ENABLED is set"""
+        self.app = app
+        self.enabled = app.config.get('AUDIT_ASYNC_ENABLED', False)
+        self.queue_size = app.config.get('AUDIT_QUEUE_SIZE', self.queue_size)
+        self.batch_size = app.config.get('AUDIT_FLUSH_BATCH_SIZE', self.batch_size)
+        self.flush_interval_ms = app.config.get('AUDIT_FLUSH_INTERVAL_MS', self.flush_interval_ms)
+        self.journal_dir = app.config.get('AUDIT_JOURNAL_DIR', self.journal_dir)
+        self.journal_stale_seconds = app.config.get('AUDIT_JOURNAL_STALE_SECONDS', self.journal_stale_seconds)
+        
+        if self.enabled:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with app.app_context():
+                self.recover()
+            self.start()
+    
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """
+        Queue an audit entry for asynchronous writing.
+        
+        Args:
+            entry: LogAuditoria column values (usuario_id, acao, tabela,
+                registro_id, dados_json, ip_address, user_agent, data_hora)
+                
+        Returns:
+            True if queued, False if the caller must write it synchronously
+        """
+        if not self.enabled or is_sync_action(entry['acao']):
+            return False
+        
+        entry = dict(entry)
+        entry['data_hora'] = entry.get('data_hora') or datetime.utcnow()
+        
+        with self._lock:
+            if len(self._queue) >= self.queue_size:
+                self._stats['sync_fallbacks'] += 1
+                return False
+            try:
+                self._append_journal(entry)
+            except OSError as e:
+                print(f"Warning: Failed to journal audit entry: {e}")
+                self._stats['sync_fallbacks'] += 1
+                return False
+            self._queue.append(entry)
+            self._stats['queued'] += 1
+            pending = len(self._queue)
+        
+        if pending >= self.batch_size:
+            self._wake.set()
+        return True
+    
+    def flush(self) -> int:
+        """
+        Write every queued entry (and any pending journal) to the database.
+        
+        Returns:
+            Number of entries written
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self._queue)
+                self._queue.clear()
+                rotated = self._rotate_journal() if entries else None
+            
+            written = 0
+            for path in self._own_pending_files():
+                try:
+                    rows = entries if path == rotated else self._read_journal(path)
+                except FileNotFoundError:
+                    # Claimed by another process since it was listed
+                    continue
+                try:
+                    written += self._insert(rows)
+                except Exception as e:
+                    self._stats['flush_failures'] += 1
+                    print(f"Warning: Failed to flush audit entries, kept in {path}: {e}")
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            
+            return written
+    
+    def recover(self) -> int:
+        """
+        Claim journals left behind by processes that stopped and replay them.
+        
+        A journal is claimed only when its process is no longer running and
+        it is older than journal_stale_seconds (the age covers processes this
+        one cannot see, such as workers of another container sharing the
+        journal directory).
+        
+        Returns:
+            Number of entries recovered
+        """
+        if not self.journal_dir or not os.path.isdir(self.journal_dir):
+            return 0
+        
+        own_pid = os.getpid()
+        cutoff = time.time() - self.journal_stale_seconds
+        for path in glob.glob(os.path.join(self.journal_dir, 'audit_journal_*')):
+            match = _JOURNAL_PATTERN.match(os.path.basename(path))
+            if not match or int(match.group(1)) == own_pid or self._process_alive(int(match.group(1))):
+                continue
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                with self._lock:
+                    os.replace(path, self._next_pending_path())
+            except OSError:
+                # Claimed by another process in the meantime
+                continue
+        
+        before = self._stats['written']
+        self.flush()
+        recovered = self._stats['written'] - before
+        self._stats['recovered'] += recovered
+        return recovered
+    
+    def start(self):
+        """Start the background flusher thread"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+    
+    def stop(self):
+        """Stop the flusher and write whatever is still queued"""
+        if self._running:
+            self._running = False
+            self._wake.set()
+            if self._thread:
+                self._thread.join(timeout=5)
+        if self.app is not None and (self._queue or self._own_pending_files()):
+            with self.app.app_context():
+                self.flush()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get writer statistics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._queue)
+        stats.update(
+            enabled=self.enabled,
+            queue_size=self.queue_size,
+            batch_size=self.batch_size,
+            flush_interval_ms=self.flush_interval_ms
+        )
+        return stats
+    
+    def _run(self):
+        """Flusher loop: wake on interval or when a batch is ready"""
+        while self._running:
+            self._wake.wait(self.flush_interval_ms / 1000.0)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+                    # Counts of coalesced rows, now that their first events are written
+                    from app.utils.audit_coalescer import audit_coalescer
+                    audit_coalescer.sweep()
+                    db.session.remove()
+            except Exception as e:
+                print(f"Warning: Audit writer flush error: {e}")
+    
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        """Bulk insert rows in batches and commit"""
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                db.session.execute(insert(LogAuditoria), rows[start:start + self.batch_size])
+                self._stats['batches'] += 1
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self._stats['written'] += len(rows)
+        return len(rows)
+    
+    def _append_journal(self, entry: Dict[str, Any]):
+        """Append one entry to this process's journal (caller holds the lock)"""
+        if self._journal is None:
+            self._journal = open(self._journal_path(), 'a', encoding='utf-8')
+        record = dict(entry, data_hora=entry['data_hora'].isoformat())
+        self._journal.write(json.dumps(record) + '\n')
+        self._journal.flush()
+    
+    def _rotate_journal(self) -> Optional[str]:
+        """Close the active journal and rename it to a pending file (caller holds the lock)"""
+        if self._journal is None:
+            return None
+        self._journal.close()
+        self._journal = None
+        path = self._next_pending_path()
+        os.replace(self._journal_path(), path)
+        return path
+    
+    def _journal_path(self) -> str:
+        return os.path.join(self.journal_dir, f'audit_journal_{os.getpid()}.jsonl')
+    
+    def _next_pending_path(self) -> str:
+        self._sequence += 1
+        return os.path.join(self.journal_dir, f'audit_journal_{os.getpid()}_{self._sequence:010d}.pending')
+    
+    def _own_pending_files(self) -> List[str]:
+        """Pending journals of this process, oldest first"""
+        if not self.journal_dir:
+            return []
+        return sorted(glob.glob(os.path.join(self.journal_dir, f'audit_journal_{os.getpid()}_*.pending')))
+    
+    @staticmethod
+    def _process_alive(pid: int) -> bool:
+        """Whether a process with this ID is running"""
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # Running under another user
+            return True
+        except OSError:
+            return False
+        return True
+    
+    @staticmethod
+    def _read_journal(path: str) -> List[Dict[str, Any]]:
+        """Read journal entries, skipping a torn last line"""
+        rows = []
+        with open(path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                row['data_hora'] = datetime.fromisoformat(row['data_hora'])
+                # Journals written before rows carried a count
+                row.setdefault('ocorrencias', 1)
+                rows.append(row)
+        return rows
+
+
+# Global audit writer instance, configured in create_app
+audit_writer = AuditWriter()
@@ -0,0 +1,255 @@
+"""
+Category tree cache
+Keeps every category, with its full path, depth and children, in memory so
+document forms, search filters and autocomplete stop querying categorias on
+every render; a version stamp in system_settings keeps workers consistent
+"""
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, List, NamedTuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models.document import Categoria
+from app.models.settings import SystemSettings
+
+
+class CategoryNode(NamedTuple):
+    """Read-only copy of a category, safe to share between requests"""
+    id: int
+    nome: str
+    categoria_pai_id: Optional[int]
+    caminho_completo: str
+    nivel: int
+    ordem: int
+    ativo: bool
+
+
+class CategoryTree:
+    """
+    Snapshot of the category hierarchy built from one query.
+    
+    Args:
+        rows: (id, nome, categoria_pai_id, ordem, ativo) of every category
+    """
+    
+    def __init__(self, rows):
+        rows = list(rows)
+        parents = {row[0]: row[2] for row in rows}
+        names = {row[0]: row[1] for row in rows}
+        
+        self._nodes = {}
+        for categoria_id, nome, pai_id, ordem, ativo in rows:
+            # Inactive ancestors still appear in the path, like Categoria.caminho_completo
+            caminho = [nome]
+            seen = {categoria_id}
+            current = pai_id
+            while current is not None and current in names and current not in seen:
+                caminho.append(names[current])
+                seen.add(current)
+                current = parents[current]
+            self._nodes[categoria_id] = CategoryNode(
+                categoria_id, nome, pai_id, ' > '.join(reversed(caminho)), len(caminho) - 1, ordem or 0, bool(ativo)
+            )
+        
+        # Active categories only, in the orders the pages use
+        ativas = [node for node in self._nodes.values() if node.ativo]
+        self.ativas = sorted(ativas, key=lambda node: node.nome)
+        self._children = {}
+        for node in sorted(ativas, key=lambda node: (node.ordem, node.nome)):
+            self._children.setdefault(node.categoria_pai_id, []).append(node)
+    
+    def __len__(self):
+        return len(self._nodes)
+    
+    def get(self, categoria_id: int) -> Optional[CategoryNode]:
+        """
+        Get a category (active or not).
+        
+        Args:
+            categoria_id: Category ID
+            
+        Returns:
+            CategoryNode or None if not found
+        """
+        return self._nodes.get(categoria_id)
+    
+    def children(self, categoria_id: Optional[int] = None) -> List[CategoryNode]:
+        """
+        Get the active children of a category.
+        
+        Args:
+            categoria_id: Parent category ID (None for root categories)
+            
+        Returns:
+            List of CategoryNode ordered by ordem and nome
+        """
+        return list(self._children.get(categoria_id, ()))
+    
+    def search(self, partial: str, limit: int = 10) -> List[CategoryNode]:
+        """
+        Find active categories whose name contains a string (case-insensitive).
+        
+        Args:
+            partial: Text to look for
+            limit: Maximum number of results
+            
+        Returns:
+            List of CategoryNode ordered by nome
+        """
+        partial = partial.lower()
+        return [node for node in self.ativas if partial in node.nome.lower()][:limit]
+
+
+class CategoryTreeCache:
+    """
+    Process-wide cache of the category tree.
+    
+    The tree is loaded in one query and rebuilt when:
+    - A commit in this process inserted, changed or deleted a Categoria
+      (ORM events), so this worker sees its own writes immediately
+    - The version stamp (system_settings row category_tree_version) no
+      longer matches the one the tree was built under. CategoryService
+      bumps it on create, update and delete; each worker reads it at most
+      once every check_interval_seconds (one primary key lookup), so
+      other workers converge within that interval
+    """
+    
+    VERSION_KEY = 'category_tree_version'
+    
+    def __init__(self, check_interval_seconds: int = 5):
+        self.check_interval_seconds = check_interval_seconds
+        self._tree = None
+        self._version = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'version_checks': 0,
+            'loads': 0,
+            'invalidations': 0
+        }
+    
+    def init_app(self, app):
+        """Configure the version check interval from CATEGORY_TREE_CHECK_SECONDS"""
+        self.check_interval_seconds = app.config.get('CATEGORY_TREE_CHECK_SECONDS', self.check_interval_seconds)
+    
+    def get(self) -> CategoryTree:
+        """
+        Get the current category tree.
+        
+        Returns:
+            CategoryTree (shared; do not modify)
+        """
+        with self._lock:
+            tree, generation = self._tree, self._generation
+            fresh = tree is not None and time.monotonic() - self._checked_at < self.check_interval_seconds
+        if fresh:
+            self._stats['hits'] += 1
+            return tree
+        
+        version = self._read_version()
+        with self._lock:
+            self._stats['version_checks'] += 1
+            if tree is not None and self._tree is tree and version == self._version:
+                self._checked_at = time.monotonic()
+                self._stats['hits'] += 1
+                return tree
+        
+        tree = self._load()
+        with self._lock:
+            # A commit that invalidated the tree while it loaded wins
+            if generation == self._generation:
+                self._tree, self._version = tree, version
+                self._checked_at = time.monotonic()
+        return tree
+    
+    def invalidate(self):
+        """Drop the tree held by this process"""
+        with self._lock:
+            self._tree = None
+            self._generation += 1
+            self._stats['invalidations'] += 1
+    
+    def bump_version(self):
+        """
+        Publish a new version stamp so every worker rebuilds its tree.
+        
+        Commits the current session; a failure is reported and leaves the
+        other workers on their tree until the stamp changes again.
+        """
+        self.invalidate()
+        try:
+            setting = db.session.query(SystemSettings).filter_by(chave=self.VERSION_KEY).first()
+            if setting is None:
+                setting = SystemSettings(
+                    chave=self.VERSION_KEY,
+                    descricao='Versão da árvore de categorias em cache',
+                    tipo='string'
+                )
+                db.session.add(setting)
+            setting.valor = uuid.uuid4().hex
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Warning: Failed to bump category tree version: {e}")
+    
+    def clear(self):
+        """Drop the tree and the version it was built under"""
+        with self._lock:
+            self._tree = None
+            self._version = None
+            self._generation += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        stats = dict(self._stats)
+        tree = self._tree
+        stats.update(
+            loaded=tree is not None,
+            categories=len(tree) if tree is not None else 0,
+            check_interval_seconds=self.check_interval_seconds
+        )
+        return stats
+    
+    def _read_version(self) -> Optional[str]:
+        """Current version stamp (None until the first bump)"""
+        return db.session.query(SystemSettings.valor).filter(
+            SystemSettings.chave == self.VERSION_KEY
+        ).scalar()
+    
+    def _load(self) -> CategoryTree:
+        """Build the tree from one query"""
+        self._stats['loads'] += 1
+        rows = db.session.query(
+            Categoria.id, Categoria.nome, Categoria.categoria_pai_id, Categoria.ordem, Categoria.ativo
+        ).all()
+        return CategoryTree(rows)
+
+
+# Global category tree cache, configured in create_app
+category_tree = CategoryTreeCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_category_changes(session, flush_context):
+    """Remember that a transaction wrote to categorias"""
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Categoria):
+            session.info['category_tree_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    """Rebuild the tree after committed category changes"""
+    if session.info.pop('category_tree_changed', None):
+        category_tree.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    """Changes rolled back do not invalidate anything"""
+    session.info.pop('category_tree_changed', None)
@@ -0,0 +1,318 @@
+"""
+Dashboard snapshot
+Keeps the result of every admin dashboard widget in memory and recomputes
+widgets in the background before they expire, so the dashboard renders from
+the snapshot instead of running its aggregate queries on every load
+"""
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Iterable
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+
+
+class Widget:
+    """
+    Declaration of a dashboard widget.
+    
+    Args:
+        name: Template variable the widget result is exposed as
+        compute: Runs the widget's queries and returns its data; called
+            inside an application context
+        ttl_seconds: How long a result is served before it is recomputed
+        eventos: Tables whose committed changes make the result stale
+    """
+    
+    __slots__ = ('name', 'compute', 'ttl_seconds', 'eventos')
+    
+    def __init__(self, name: str, compute: Callable[[], Any], ttl_seconds: int, eventos: Iterable[str] = ()):
+        self.name = name
+        self.compute = compute
+        self.ttl_seconds = ttl_seconds
+        self.eventos = frozenset(eventos)
+    
+    def __repr__(self):
+        return f'<Widget {self.name} ttl={self.ttl_seconds}s>'
+
+
+class DashboardSnapshot:
+    """
+    Process-wide snapshot of the dashboard widgets (stale-while-revalidate).
+    
+    - A read returns the stored result of each widget. Only a widget that
+      was never computed is computed inline (first load after startup)
+    - An expired or invalidated result is still returned while a background
+      thread recomputes it; without the thread (DASHBOARD_BACKGROUND_REFRESH
+      off) the reader recomputes it inline
+    - The thread also recomputes widgets refresh_ahead_seconds before they
+      expire, as long as the dashboard was read in the last idle_seconds,
+      so an open dashboard never waits on a query
+    - Commits touching a table a widget lists in its eventos mark the
+      widget stale, at most once per min_refresh_seconds
+    
+    Every computation is timed; stats() reports the last and average
+    duration per widget for tuning TTLs.
+    """
+    
+    def __init__(self, refresh_interval_seconds: int = 5, refresh_ahead_seconds: int = 15,
+                 min_refresh_seconds: int = 10, idle_seconds: int = 900):
+        self.background = False
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self.idle_seconds = idle_seconds
+        self.app = None
+        self._widgets = {}
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self._last_read = 0.0
+    
+    def init_app(self, app, widgets: Iterable[Widget] = ()):
+        """Register the widgets and start the refresher when DASHBOARD_BACKGROUND_REFRESH is set"""
+        self.app = app
+        self.background = app.config.get('DASHBOARD_BACKGROUND_REFRESH', False)
+        self.refresh_interval_seconds = app.config.get('DASHBOARD_REFRESH_INTERVAL_SECONDS', self.refresh_interval_seconds)
+        self.refresh_ahead_seconds = app.config.get('DASHBOARD_REFRESH_AHEAD_SECONDS', self.refresh_ahead_seconds)
+        self.min_refresh_seconds = app.config.get('DASHBOARD_MIN_REFRESH_SECONDS', self.min_refresh_seconds)
+        self.idle_seconds = app.config.get('DASHBOARD_IDLE_SECONDS', self.idle_seconds)
+        for widget in widgets:
+            self.register(widget)
+        
+        if self.background:
+            self.start()
+    
+    def register(self, widget: Widget):
+        """Add or replace a widget (its stored result is dropped)"""
+        with self._lock:
+            self._widgets[widget.name] = widget
+            self._entries.pop(widget.name, None)
+            self._locks.setdefault(widget.name, threading.Lock())
+    
+    def get(self, name: str) -> Any:
+        """
+        Get one widget's result.
+        
+        Args:
+            name: Widget name
+            
+        Returns:
+            The widget data
+            
+        Raises:
+            KeyError: If no widget has that name
+        """
+        widget = self._widgets[name]
+        self._last_read = time.monotonic()
+        entry = self._entries.get(name)
+        
+        if entry is None:
+            return self._compute(widget, if_older_than=0.0)['data']
+        
+        entry['hits'] += 1
+        if time.monotonic() >= entry['expires_at']:
+            entry['stale_hits'] += 1
+            if self.background and self._running:
+                self._wake.set()
+            else:
+                return self._compute(widget, if_older_than=entry['computed_at'])['data']
+        return entry['data']
+    
+    def get_all(self) -> Dict[str, Any]:
+        """
+        Get every widget's result.
+        
+        Returns:
+            Dictionary of widget name to data
+        """
+        return {name: self.get(name) for name in list(self._widgets)}
+    
+    def invalidate(self, eventos: Optional[Iterable[str]] = None) -> int:
+        """
+        Mark widgets stale.
+        
+        Args:
+            eventos: Changed tables; None marks every widget stale
+            
+        Returns:
+            Number of widgets marked stale
+        """
+        eventos = None if eventos is None else set(eventos)
+        marked = 0
+        with self._lock:
+            for name, widget in self._widgets.items():
+                entry = self._entries.get(name)
+                if entry is None or (eventos is not None and not widget.eventos & eventos):
+                    continue
+                # Bursts of writes trigger one recomputation per min_refresh_seconds
+                stale_at = entry['computed_at'] + self.min_refresh_seconds
+                if stale_at < entry['expires_at']:
+                    entry['expires_at'] = stale_at
+                    entry['invalidations'] += 1
+                    marked += 1
+        if marked and self._running:
+            self._wake.set()
+        return marked
+    
+    def refresh(self, force: bool = False) -> int:
+        """
+        Recompute the widgets that are stale or about to expire.
+        
+        Args:
+            force: Recompute every widget
+            
+        Returns:
+            Number of widgets recomputed
+        """
+        now = time.monotonic()
+        refreshed = 0
+        for name, widget in list(self._widgets.items()):
+            entry = self._entries.get(name)
+            due = entry is None or (
+                entry['expires_at'] - now <= self.refresh_ahead_seconds
+                and now - entry['computed_at'] >= self.min_refresh_seconds
+            )
+            if force or due:
+                try:
+                    self._compute(widget, if_older_than=entry['computed_at'] if entry and not force else None)
+                    refreshed += 1
+                except Exception as e:
+                    # The previous result keeps being served
+                    print(f"Warning: Failed to refresh dashboard widget {name}: {e}")
+        return refreshed
+    
+    def start(self):
+        """Start the background refresher thread"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='dashboard-refresher', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background refresher"""
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def clear(self):
+        """Drop every stored result"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get per-widget computation statistics"""
+        now = time.monotonic()
+        widgets = {}
+        for name, widget in self._widgets.items():
+            entry = self._entries.get(name)
+            widgets[name] = {
+                'ttl_seconds': widget.ttl_seconds,
+                'eventos': sorted(widget.eventos),
+                'computed': entry is not None
+            }
+            if entry:
+                widgets[name].update(
+                    age_seconds=round(now - entry['computed_at'], 1),
+                    stale=now >= entry['expires_at'],
+                    duration_ms=entry['duration_ms'],
+                    avg_duration_ms=round(entry['total_ms'] / entry['computations'], 1),
+                    computations=entry['computations'],
+                    hits=entry['hits'],
+                    stale_hits=entry['stale_hits'],
+                    invalidations=entry['invalidations'],
+                    errors=entry['errors']
+                )
+        return {
+            'background': self.background and self._running,
+            'refresh_interval_seconds': self.refresh_interval_seconds,
+            'refresh_ahead_seconds': self.refresh_ahead_seconds,
+            'widgets': widgets
+        }
+    
+    def _compute(self, widget: Widget, if_older_than: Optional[float] = None) -> Dict[str, Any]:
+        """Run a widget's queries and store the result (one computation at a time per widget)"""
+        with self._locks[widget.name]:
+            entry = self._entries.get(widget.name)
+            if entry is not None and if_older_than is not None and entry['computed_at'] > if_older_than:
+                # Recomputed by another thread while this one waited
+                return entry
+            
+            started = time.monotonic()
+            try:
+                data = widget.compute()
+            except Exception:
+                if entry is not None:
+                    entry['errors'] += 1
+                raise
+            finished = time.monotonic()
+            duration_ms = round((finished - started) * 1000, 1)
+            
+            with self._lock:
+                previous = self._entries.get(widget.name) or {}
+                entry = {
+                    'data': data,
+                    'computed_at': finished,
+                    'expires_at': finished + widget.ttl_seconds,
+                    'duration_ms': duration_ms,
+                    'total_ms': previous.get('total_ms', 0) + duration_ms,
+                    'computations': previous.get('computations', 0) + 1,
+                    'hits': previous.get('hits', 0),
+                    'stale_hits': previous.get('stale_hits', 0),
+                    'invalidations': previous.get('invalidations', 0),
+                    'errors': previous.get('errors', 0)
+                }
+                self._entries[widget.name] = entry
+        
+        current_app.logger.debug(f"Dashboard widget {widget.name} computed in {duration_ms} ms")
+        return entry
+    
+    def _run(self):
+        """Refresher loop: wake on interval or when a widget went stale"""
+        while self._running:
+            self._wake.wait(self.refresh_interval_seconds)
+            self._wake.clear()
+            if not self._running or time.monotonic() - self._last_read > self.idle_seconds:
+                # Nobody is looking at the dashboard: let widgets expire
+                continue
+            try:
+                with self.app.app_context():
+                    self.refresh()
+                    db.session.remove()
+            except Exception as e:
+                print(f"Warning: Dashboard refresher error: {e}")
+
+
+# Global dashboard snapshot, configured in create_app
+dashboard_snapshot = DashboardSnapshot()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_tables(session, flush_context):
+    """Remember which tables a transaction wrote to"""
+    changed = session.info.setdefault('dashboard_eventos', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        tablename = getattr(instance, '__tablename__', None)
+        if tablename:
+            changed.add(tablename)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    """Mark the widgets depending on the committed tables stale"""
+    changed = session.info.pop('dashboard_eventos', None)
+    if changed:
+        dashboard_snapshot.invalidate(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    """Changes rolled back do not invalidate anything"""
+    session.info.pop('dashboard_eventos', None)
@@ -5,8 +5,8 @@ from functools import wraps
 from datetime import datetime
 from flask import session, redirect, url_for, flash, request, abort
 from flask_login import current_user
-from app.models.permission import Permissao
 from app.models.document import Documento
+from app.utils.permission_cache import permission_cache
 from app import db
 
 
@@ -153,16 +153,13 @@ def document_permission_required(permission_type, document_id_param='document_id
             elif current_user.perfil.nome == 'Administrador':
                 has_permission = True
             
-            # 3. Check explicit document permissions
+            # 3. Check explicit document permissions (cached decision)
             else:
-                permissao = Permissao.query.filter_by(
-                    documento_id=document_id,
-                    usuario_id=current_user.id,
-                    tipo_permissao=permission_type
-                ).first()
-                
-                if permissao and not permissao.is_expired():
-                    has_permission = True
+                has_permission = permission_cache.has_permission(
+                    documento,
+                    current_user.id,
+                    permission_type
+                )
             
             if not has_permission:
                 flash('Você não tem permissão para acessar este documento.', 'danger')
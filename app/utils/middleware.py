@@ -86,7 +86,7 @@ def check_document_permission(documento, user, permission_type):
     
     Requirements: 5.1, 5.2, 5.3, 5.4, 5.5
     """
-    from app.models.permission import Permissao
+    from app.utils.permission_cache import permission_cache
     
     # Owner has all permissions
     if documento.usuario_id == user.id:
@@ -96,17 +96,8 @@ def check_document_permission(documento, user, permission_type):
     if user.perfil.nome == 'Administrador':
         return True
     
-    # Check explicit document permissions
-    permissao = Permissao.query.filter_by(
-        documento_id=documento.id,
-        usuario_id=user.id,
-        tipo_permissao=permission_type
-    ).first()
-    
-    if permissao and not permissao.is_expired():
-        return True
-    
-    return False
+    # Check explicit document permissions (cached decision)
+    return permission_cache.has_permission(documento, user.id, permission_type)
 
 
 def check_role_permission(user, permission_name):
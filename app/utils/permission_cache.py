@@ -0,0 +1,576 @@
+"""
+Permission decision cache
+Loads all of a user's permission rows for a document in one query and keeps
+the resulting decision per request (in flask.g) and in a bounded process-wide LRU;
+a version stamp in system_settings makes every worker drop its entries after a
+grant change
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple, FrozenSet
+from flask import g, has_app_context
+from sqlalchemy import event, select, union_all, or_, cast, null, Integer, inspect, update, insert
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.permission import Permissao, PermissaoEfetiva, PermissaoGrupo
+from app.models.group import Grupo, GrupoUsuario
+from app.models.user import User
+from app.models.settings import SystemSettings
+
+
+# Permission bitmask: one bit per permission type
+PERMISSION_BITS = {
+    'visualizar': 1,
+    'editar': 2,
+    'excluir': 4,
+    'compartilhar': 8
+}
+ALL_PERMISSIONS = 15
+
+
+def group_grant_filter(grupo_ids, perfil_id: Optional[int]):
+    """
+    Build the filter matching PermissaoGrupo rows granted to any of a user's
+    groups or to the user's profile.
+    
+    Args:
+        grupo_ids: IDs of the user's active groups
+        perfil_id: The user's profile ID (None when the user has none)
+        
+    Returns:
+        SQLAlchemy boolean expression
+    """
+    conditions = [PermissaoGrupo.grupo_id.in_(list(grupo_ids))]
+    if perfil_id is not None:
+        # perfil_id == None would compile to IS NULL and match every group grant
+        conditions.append(PermissaoGrupo.perfil_id == perfil_id)
+    return or_(*conditions)
+
+
+def mask_from_types(permission_types) -> int:
+    """
+    Build an effective permission bitmask from permission type names.
+    Any permission implies 'visualizar' (edit, delete or share implies view).
+    
+    Args:
+        permission_types: Iterable of permission type names
+        
+    Returns:
+        Permission bitmask
+    """
+    mask = 0
+    for permission_type in permission_types:
+        mask |= PERMISSION_BITS.get(permission_type, 0)
+    if mask:
+        mask |= PERMISSION_BITS['visualizar']
+    return mask
+
+
+class PermissionCache:
+    """
+    Two-level cache of effective document permissions.
+    
+    - Request level: decisions are memoized in flask.g and reset before each request
+    - Process level: bounded LRU keyed by (documento_id, usuario_id)
+    
+    Decisions combine direct grants (Permissao), inherited folder/category
+    grants materialized in PermissaoEfetiva, and group/profile grants
+    (PermissaoGrupo) resolved against the user's cached memberships.
+    
+    Memberships (group IDs and profile ID per user) are cached separately and
+    versioned: a membership change drops one user's entry, while group-wide
+    changes (deactivating or deleting a group) bump the version, which
+    invalidates every entry in O(1).
+    
+    LRU entries are invalidated when permissions are granted or revoked
+    (service calls and ORM events on Permissao) and expire on their own at the
+    earliest data_expiracao of the rows they were built from.
+    
+    Other worker processes learn about a change through the version stamp
+    (system_settings row permission_cache_version): every invalidation
+    publishes a new stamp (after the transaction commits when it is made
+    inside one), and each process compares it once per request, dropping all
+    of its entries and memberships when it changed. A revoked grant is thus
+    honored from the next request on in every worker, as it was before the
+    cache existed; the TTL only bounds entries of processes that stop
+    serving requests.
+    """
+    
+    VERSION_KEY = 'permission_cache_version'
+    
+    def __init__(self, max_size: int = 10000, ttl_seconds: int = 60):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._by_document = {}
+        self._memberships = OrderedDict()
+        self._membership_version = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'lookups': 0,
+            'request_hits': 0,
+            'cache_hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'version_changes': 0,
+            'total_time': 0.0
+        }
+    
+    def init_app(self, app):
+        """Configure cache size/TTL and reset the request memo before each request"""
+        self.max_size = app.config.get('PERMISSION_CACHE_SIZE', self.max_size)
+        self.ttl_seconds = app.config.get('PERMISSION_CACHE_TTL', self.ttl_seconds)
+        app.before_request(self._reset_request_memo)
+    
+    def get_mask(self, documento, user_id: int) -> int:
+        """
+        Get the effective permission bitmask of a user for a document.
+        
+        Args:
+            documento: Document (must expose id and usuario_id)
+            user_id: User ID
+            
+        Returns:
+            Permission bitmask (see PERMISSION_BITS)
+        """
+        # Owner has all permissions
+        if documento.usuario_id == user_id:
+            return ALL_PERMISSIONS
+        
+        start = time.perf_counter()
+        key = (documento.id, user_id)
+        
+        memo = self._request_memo()
+        if memo is not None and key in memo:
+            self._record('request_hits', start)
+            return memo[key]
+        
+        self._check_version()
+        mask = self._get_cached(key)
+        if mask is not None:
+            self._record('cache_hits', start)
+        else:
+            mask, valid_until = self._load_mask(documento.id, user_id)
+            self._store(key, mask, valid_until)
+            self._record('misses', start)
+        
+        if memo is not None:
+            memo[key] = mask
+        
+        return mask
+    
+    def has_permission(self, documento, user_id: int, permission_type: str) -> bool:
+        """
+        Check if a user has a specific permission for a document.
+        
+        Args:
+            documento: Document (must expose id and usuario_id)
+            user_id: User ID
+            permission_type: Type of permission (visualizar, editar, excluir, compartilhar)
+            
+        Returns:
+            True if user has permission, False otherwise
+        """
+        bit = PERMISSION_BITS.get(permission_type, 0)
+        return bool(bit and self.get_mask(documento, user_id) & bit)
+    
+    def prime(self, user_id: int, masks: Dict[int, int]) -> None:
+        """
+        Seed the request memo with decisions computed in bulk.
+        
+        Args:
+            user_id: User ID
+            masks: Dictionary mapping document ID to permission bitmask
+        """
+        memo = self._request_memo()
+        if memo is not None:
+            for documento_id, mask in masks.items():
+                memo[(documento_id, user_id)] = mask
+    
+    def get_memberships(self, user_id: int) -> Tuple[FrozenSet[int], Optional[int]]:
+        """
+        Get the groups and profile a user receives grants through.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            Tuple of (active group IDs, profile ID)
+        """
+        self._check_version()
+        now = datetime.utcnow()
+        with self._lock:
+            version = self._membership_version
+            entry = self._memberships.get(user_id)
+            if entry is not None and entry[0] == version and entry[3] > now:
+                self._memberships.move_to_end(user_id)
+                return entry[1], entry[2]
+        
+        grupo_ids, perfil_id = self._load_memberships(user_id)
+        
+        with self._lock:
+            # Skip storing if memberships changed while loading
+            if version == self._membership_version and self.max_size > 0:
+                valid_until = now + timedelta(seconds=self.ttl_seconds)
+                self._memberships[user_id] = (version, grupo_ids, perfil_id, valid_until)
+                self._memberships.move_to_end(user_id)
+                while len(self._memberships) > self.max_size:
+                    self._memberships.popitem(last=False)
+        
+        return grupo_ids, perfil_id
+    
+    def invalidate_memberships(self, usuario_id: Optional[int] = None, publish: bool = True) -> None:
+        """
+        Drop cached memberships (and the decisions built from them).
+        
+        Args:
+            usuario_id: Only drop this user's memberships (None for every user)
+            publish: Publish a new version stamp for the other workers right away
+        """
+        with self._lock:
+            if usuario_id is None:
+                self._membership_version += 1
+                self._memberships.clear()
+            else:
+                self._memberships.pop(usuario_id, None)
+        
+        self.invalidate(usuario_id=usuario_id, publish=publish)
+    
+    def invalidate(
+        self,
+        documento_id: Optional[int] = None,
+        usuario_id: Optional[int] = None,
+        publish: bool = True
+    ) -> None:
+        """
+        Drop cached decisions.
+        
+        Call after the change is committed, or pass publish=False and call
+        publish_after_commit() when the change is still part of a transaction.
+        
+        Args:
+            documento_id: Only drop decisions for this document (None for all documents)
+            usuario_id: Only drop decisions for this user (None for all users)
+            publish: Publish a new version stamp for the other workers right away
+        """
+        with self._lock:
+            self._stats['invalidations'] += 1
+            if documento_id is None:
+                keys = [key for key in self._entries if usuario_id is None or key[1] == usuario_id]
+            else:
+                users = self._by_document.get(documento_id, set())
+                keys = [(documento_id, uid) for uid in users if usuario_id is None or uid == usuario_id]
+            for key in keys:
+                self._remove(key)
+        
+        memo = self._request_memo()
+        if memo:
+            for key in list(memo):
+                if (documento_id is None or key[0] == documento_id) and \
+                   (usuario_id is None or key[1] == usuario_id):
+                    del memo[key]
+        
+        if publish:
+            self.publish()
+    
+    def invalidate_documents(self, documento_ids, publish: bool = True) -> None:
+        """
+        Drop cached decisions of several documents, publishing one version stamp.
+        
+        Args:
+            documento_ids: Document IDs
+            publish: Publish a new version stamp for the other workers right away
+        """
+        for documento_id in documento_ids:
+            self.invalidate(documento_id=documento_id, publish=False)
+        if publish:
+            self.publish()
+    
+    def publish(self) -> None:
+        """
+        Publish a new version stamp so every other worker drops its entries.
+        
+        Written on its own connection and committed at once; call it after
+        the permission change itself was committed. A failure is reported and
+        leaves the other workers on their entries until the next stamp or TTL.
+        """
+        version = uuid.uuid4().hex
+        try:
+            with db.engine.begin() as connection:
+                updated = connection.execute(
+                    update(SystemSettings).where(
+                        SystemSettings.chave == self.VERSION_KEY
+                    ).values(valor=version, data_atualizacao=datetime.utcnow())
+                ).rowcount
+                if not updated:
+                    connection.execute(insert(SystemSettings).values(
+                        chave=self.VERSION_KEY,
+                        valor=version,
+                        descricao='Versão do cache de permissões',
+                        tipo='string',
+                        data_atualizacao=datetime.utcnow()
+                    ))
+        except Exception as e:
+            print(f"Warning: Failed to publish permission cache version: {e}")
+            return
+        
+        # This process already dropped what the change affected
+        with self._lock:
+            self._version = version
+    
+    def publish_after_commit(self, session: Optional[Session] = None) -> None:
+        """
+        Publish a new version stamp once the session's transaction commits.
+        
+        Args:
+            session: Session holding the change (default: db.session)
+        """
+        session = session if session is not None else db.session
+        session.info['permission_cache_changed'] = True
+    
+    def clear(self) -> None:
+        """Drop every cached decision and reset statistics"""
+        with self._lock:
+            self._entries.clear()
+            self._by_document.clear()
+            self._memberships.clear()
+            self._version = None
+            for stat in self._stats:
+                self._stats[stat] = 0 if stat != 'total_time' else 0.0
+        
+        memo = self._request_memo()
+        if memo:
+            memo.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+        
+        Returns:
+            Dictionary with lookup counters, hit rate and average decision latency
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        
+        lookups = stats['lookups']
+        hits = stats['request_hits'] + stats['cache_hits']
+        return {
+            'lookups': lookups,
+            'request_hits': stats['request_hits'],
+            'cache_hits': stats['cache_hits'],
+            'misses': stats['misses'],
+            'invalidations': stats['invalidations'],
+            'version_changes': stats['version_changes'],
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'avg_latency_ms': round(stats['total_time'] * 1000 / lookups, 4) if lookups else 0.0,
+            'size': size,
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl_seconds,
+            'membership_version': self._membership_version
+        }
+    
+    def _check_version(self) -> None:
+        """
+        Drop every entry if another process published a permission change.
+        Reads the version stamp once per request (one primary key lookup).
+        """
+        if not has_app_context() or getattr(g, '_permission_version_checked', False):
+            return
+        g._permission_version_checked = True
+        
+        version = db.session.query(SystemSettings.valor).filter(
+            SystemSettings.chave == self.VERSION_KEY
+        ).scalar()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+                self._by_document.clear()
+                self._memberships.clear()
+                self._membership_version += 1
+                self._stats['version_changes'] += 1
+    
+    def _load_mask(self, documento_id: int, user_id: int) -> Tuple[int, datetime]:
+        """Load all permission rows of a user for a document in a single query"""
+        now = datetime.utcnow()
+        valid_until = now + timedelta(seconds=self.ttl_seconds)
+        
+        grupo_ids, perfil_id = self.get_memberships(user_id)
+        
+        # Direct, materialized folder/category and group/profile grants, one round trip
+        direct = select(Permissao.tipo_permissao, Permissao.data_expiracao).where(
+            Permissao.documento_id == documento_id,
+            Permissao.usuario_id == user_id
+        )
+        inherited = select(PermissaoEfetiva.tipo_permissao, PermissaoEfetiva.data_expiracao).where(
+            PermissaoEfetiva.documento_id == documento_id,
+            PermissaoEfetiva.usuario_id == user_id
+        )
+        shared = select(PermissaoGrupo.tipo_permissao, PermissaoGrupo.data_expiracao).where(
+            PermissaoGrupo.documento_id == documento_id,
+            group_grant_filter(grupo_ids, perfil_id)
+        )
+        rows = db.session.execute(union_all(direct, inherited, shared)).all()
+        
+        active_types = []
+        for tipo_permissao, data_expiracao in rows:
+            if data_expiracao is not None:
+                if data_expiracao < now:
+                    continue
+                # The decision changes when this permission expires
+                valid_until = min(valid_until, data_expiracao)
+            active_types.append(tipo_permissao)
+        
+        return mask_from_types(active_types), valid_until
+    
+    @staticmethod
+    def _load_memberships(user_id: int) -> Tuple[FrozenSet[int], Optional[int]]:
+        """Load a user's active group IDs and profile ID in a single query"""
+        groups = select(GrupoUsuario.grupo_id, cast(null(), Integer)).join(
+            Grupo, Grupo.id == GrupoUsuario.grupo_id
+        ).where(
+            GrupoUsuario.usuario_id == user_id,
+            Grupo.ativo.is_(True)
+        )
+        profile = select(cast(null(), Integer), User.perfil_id).where(User.id == user_id)
+        
+        grupo_ids = set()
+        perfil_id = None
+        for grupo_id, row_perfil_id in db.session.execute(union_all(groups, profile)):
+            if grupo_id is not None:
+                grupo_ids.add(grupo_id)
+            else:
+                perfil_id = row_perfil_id
+        return frozenset(grupo_ids), perfil_id
+    
+    def _get_cached(self, key: Tuple[int, int]) -> Optional[int]:
+        """Get a still-valid LRU entry, refreshing its recency"""
+        if self.max_size <= 0:
+            return None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            mask, valid_until = entry
+            if valid_until <= datetime.utcnow():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return mask
+    
+    def _store(self, key: Tuple[int, int], mask: int, valid_until: datetime) -> None:
+        """Store an LRU entry, evicting the least recently used ones"""
+        if self.max_size <= 0:
+            return
+        
+        with self._lock:
+            self._entries[key] = (mask, valid_until)
+            self._entries.move_to_end(key)
+            self._by_document.setdefault(key[0], set()).add(key[1])
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+    
+    def _remove(self, key: Tuple[int, int]) -> None:
+        """Remove an LRU entry (caller holds the lock)"""
+        self._entries.pop(key, None)
+        users = self._by_document.get(key[0])
+        if users is not None:
+            users.discard(key[1])
+            if not users:
+                del self._by_document[key[0]]
+    
+    def _record(self, stat: str, start: float) -> None:
+        """Record a lookup outcome and its latency"""
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats['lookups'] += 1
+            self._stats[stat] += 1
+            self._stats['total_time'] += elapsed
+    
+    @staticmethod
+    def _request_memo() -> Optional[Dict[Tuple[int, int], int]]:
+        """Get the per-request decision memo (None outside application context)"""
+        if not has_app_context():
+            return None
+        if not hasattr(g, '_permission_masks'):
+            g._permission_masks = {}
+        return g._permission_masks
+    
+    @staticmethod
+    def _reset_request_memo():
+        """Start every request with an empty decision memo and an unchecked version"""
+        g._permission_masks = {}
+        g._permission_version_checked = False
+
+
+# Shared cache instance (configured by create_app)
+permission_cache = PermissionCache()
+
+
+@event.listens_for(Permissao, 'after_insert')
+@event.listens_for(Permissao, 'after_update')
+@event.listens_for(Permissao, 'after_delete')
+def _invalidate_on_permission_change(mapper, connection, target):
+    """Invalidate cached decisions whenever a Permissao row changes through the ORM"""
+    permission_cache.invalidate(documento_id=target.documento_id, usuario_id=target.usuario_id, publish=False)
+    permission_cache.publish_after_commit(object_session(target))
+
+
+@event.listens_for(PermissaoGrupo, 'after_insert')
+@event.listens_for(PermissaoGrupo, 'after_update')
+@event.listens_for(PermissaoGrupo, 'after_delete')
+def _invalidate_on_group_permission_change(mapper, connection, target):
+    """Invalidate every user's cached decision for a document shared with a group/profile"""
+    permission_cache.invalidate(documento_id=target.documento_id, publish=False)
+    permission_cache.publish_after_commit(object_session(target))
+
+
+@event.listens_for(GrupoUsuario, 'after_insert')
+@event.listens_for(GrupoUsuario, 'after_delete')
+def _invalidate_on_membership_change(mapper, connection, target):
+    """Adding or removing a member only affects that member"""
+    permission_cache.invalidate_memberships(usuario_id=target.usuario_id, publish=False)
+    permission_cache.publish_after_commit(object_session(target))
+
+
+@event.listens_for(Grupo, 'after_update')
+def _invalidate_on_group_status_change(mapper, connection, target):
+    """Deactivating or reactivating a group affects all of its members"""
+    if inspect(target).attrs.ativo.history.has_changes():
+        permission_cache.invalidate_memberships(publish=False)
+        permission_cache.publish_after_commit(object_session(target))
+
+
+@event.listens_for(Grupo, 'after_delete')
+def _invalidate_on_group_delete(mapper, connection, target):
+    """Deleting a group affects all of its members"""
+    permission_cache.invalidate_memberships(publish=False)
+    permission_cache.publish_after_commit(object_session(target))
+
+
+@event.listens_for(User, 'after_update')
+def _invalidate_on_profile_change(mapper, connection, target):
+    """A profile change moves the user to other profile grants"""
+    if inspect(target).attrs.perfil_id.history.has_changes():
+        permission_cache.invalidate_memberships(usuario_id=target.id, publish=False)
+        permission_cache.publish_after_commit(object_session(target))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_on_commit(session):
+    """Publish the version stamp once the permission changes are visible to other workers"""
+    if session.info.pop('permission_cache_changed', None):
+        permission_cache.publish()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    """Changes rolled back do not need publishing"""
+    session.info.pop('permission_cache_changed', None)
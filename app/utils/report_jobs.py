@@ -0,0 +1,123 @@
+"""
+Report job runner
+Runs report generation in a worker pool outside the request that asked for
+it, so long report ranges are not cut by the web server's request timeout
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, Callable
+from app import db
+
+
+class ReportJobRunner:
+    """
+    Process-local worker pool for report jobs.
+    
+    The pool is created on the first submission, so no thread exists in a
+    process that never generates a report (or before a pre-fork server
+    forks its workers). With REPORT_JOBS_ASYNC off, jobs run inline in the
+    submitting request, which is how the tests exercise them.
+    
+    Job state lives in the relatorio_jobs table (see ReportJobService), so
+    any worker process can answer status and download requests. A job
+    queued in a process that dies stays pending until ReportJobService
+    treats it as stale.
+    """
+    
+    def __init__(self, max_workers: int = 2):
+        self.enabled = False
+        self.max_workers = max_workers
+        self.app = None
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0
+        }
+    
+    def init_app(self, app):
+        """Configure the runner from REPORT_JOBS_ASYNC and REPORT_JOB_WORKERS"""
+        self.app = app
+        self.enabled = app.config.get('REPORT_JOBS_ASYNC', False)
+        self.max_workers = app.config.get('REPORT_JOB_WORKERS', self.max_workers)
+    
+    def submit(self, job_id: str, target: Callable[[str], Any]) -> None:
+        """
+        Run a job.
+        
+        Args:
+            job_id: Job identifier passed to target
+            target: Callable generating the report; runs inside an
+                application context
+        """
+        self._stats['submitted'] += 1
+        if not self.enabled:
+            self._execute(target, job_id)
+            return
+        
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='report-job')
+            future = self._executor.submit(self._run, target, job_id)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._futures.pop(job_id, None))
+    
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a job queued in this process.
+        
+        Args:
+            job_id: Job identifier
+            timeout: Seconds to wait (None waits until done)
+            
+        Returns:
+            True if the job is not queued or running here anymore
+        """
+        future = self._futures.get(job_id)
+        if future is None:
+            return True
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+        return True
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the pool (queued jobs still run when wait is True)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get runner statistics"""
+        stats = dict(self._stats)
+        stats.update(
+            enabled=self.enabled,
+            workers=self.max_workers,
+            queued=len(self._futures)
+        )
+        return stats
+    
+    def _run(self, target: Callable[[str], Any], job_id: str):
+        """Worker thread entry point: run the job in its own app context and session"""
+        with self.app.app_context():
+            try:
+                self._execute(target, job_id)
+            finally:
+                db.session.remove()
+    
+    def _execute(self, target: Callable[[str], Any], job_id: str):
+        """Run the job, counting outcomes; failures are recorded by the target itself"""
+        try:
+            target(job_id)
+            self._stats['completed'] += 1
+        except Exception as e:
+            self._stats['failed'] += 1
+            print(f"Warning: Report job {job_id} failed: {e}")
+
+
+# Global report job runner, configured in create_app
+report_job_runner = ReportJobRunner()
@@ -0,0 +1,220 @@
+"""
+Chunked retention executor
+Deletes the rows matching a retention rule in primary key ranges, pausing
+between chunks and checkpointing progress, so long cleanups never hold locks
+for long and resume where they stopped
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable, Iterable
+from flask import current_app
+from sqlalchemy import delete
+from app import db
+
+
+def delete_files_parallel(paths: Iterable[str], delete_file: Callable[[str], bool], workers: Optional[int] = None) -> int:
+    """
+    Delete files from storage on a thread pool.
+    
+    Args:
+        paths: Paths to delete
+        delete_file: Function deleting one path, returning True on success
+        workers: Threads to use (default RETENTION_FILE_WORKERS)
+        
+    Returns:
+        Number of files deleted
+    """
+    paths = list(paths)
+    if not paths:
+        return 0
+    if workers is None:
+        workers = current_app.config['RETENTION_FILE_WORKERS']
+    if workers <= 1 or len(paths) == 1:
+        return sum(1 for path in paths if delete_file(path))
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return sum(1 for deleted in pool.map(delete_file, paths) if deleted)
+
+
+class RetentionExecutor:
+    """
+    Delete expired rows of one table in short, throttled transactions.
+    
+    Each chunk selects the next chunk_size matching primary keys after the
+    cursor, deletes that primary key range (still restricted to the
+    retention filters) and commits, then sleeps pause_ms before the next
+    one. After every chunk the cursor and cutoff are written to a checkpoint
+    file under RETENTION_CHECKPOINT_DIR; a run that finds a checkpoint
+    continues from it with the original cutoff. The checkpoint is removed
+    once no matching rows are left.
+    
+    Hooks let callers extend a chunk:
+    
+    - before_delete(ids) runs in the chunk's transaction (delete dependent
+      rows, collect file paths) and its return value is passed on to
+    - after_commit(ids, context), which runs once the chunk is committed
+      (delete files, invalidate caches) and may return a file count
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        model,
+        chunk_size: Optional[int] = None,
+        pause_ms: Optional[int] = None,
+        max_chunks: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Initialize RetentionExecutor.
+        
+        Args:
+            name: Job name, used for the checkpoint file and log lines
+            model: Model with an integer primary key named id
+            chunk_size: Rows per chunk (default RETENTION_CHUNK_SIZE)
+            pause_ms: Sleep between chunks (default RETENTION_PAUSE_MS)
+            max_chunks: Chunks per run, None or 0 for no limit
+            progress: Called with the metrics dictionary after every chunk
+        """
+        self.name = name
+        self.model = model
+        self.chunk_size = chunk_size or current_app.config['RETENTION_CHUNK_SIZE']
+        self.pause_ms = current_app.config['RETENTION_PAUSE_MS'] if pause_ms is None else pause_ms
+        self.max_chunks = max_chunks
+        self.progress = progress
+    
+    @property
+    def checkpoint_path(self) -> str:
+        """Path of this job's checkpoint file"""
+        return os.path.join(current_app.config['RETENTION_CHECKPOINT_DIR'], f'{self.name}.json')
+    
+    def run(
+        self,
+        cutoff: datetime,
+        filters: Callable[[datetime], List],
+        before_delete: Optional[Callable[[List[int]], Any]] = None,
+        after_commit: Optional[Callable[[List[int], Any], Optional[int]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Delete every row matching the retention filters.
+        
+        Args:
+            cutoff: Retention cutoff of a new run (a resumed run keeps the
+                checkpointed one)
+            filters: Builds the filter expressions from the cutoff
+            before_delete: Hook run in each chunk's transaction
+            after_commit: Hook run after each chunk's commit
+            
+        Returns:
+            Metrics dictionary
+            {
+                'deleted': 12000,
+                'files': 0,
+                'chunks': 12,
+                'cursor': 48113,        # last primary key processed
+                'cutoff': datetime(...),
+                'resumed': False,       # True if continued from a checkpoint
+                'complete': True,       # False if max_chunks stopped the run
+                'duration_ms': 1520
+            }
+        """
+        started = time.monotonic()
+        pk = self.model.id
+        checkpoint = self._load_checkpoint()
+        metrics = {
+            'deleted': 0,
+            'files': 0,
+            'chunks': 0,
+            'cursor': 0,
+            'cutoff': cutoff,
+            'resumed': checkpoint is not None,
+            'complete': True
+        }
+        if checkpoint:
+            metrics['cursor'] = checkpoint['cursor']
+            metrics['cutoff'] = datetime.fromisoformat(checkpoint['cutoff'])
+        conditions = filters(metrics['cutoff'])
+        
+        while True:
+            if self.max_chunks and metrics['chunks'] >= self.max_chunks:
+                metrics['complete'] = False
+                break
+            
+            ids = [row[0] for row in db.session.query(pk).filter(
+                pk > metrics['cursor'], *conditions
+            ).order_by(pk).limit(self.chunk_size)]
+            if not ids:
+                break
+            
+            try:
+                context = before_delete(ids) if before_delete else None
+                result = db.session.execute(
+                    delete(self.model).where(pk >= ids[0], pk <= ids[-1], *conditions)
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            
+            metrics['deleted'] += max(result.rowcount or 0, 0)
+            metrics['chunks'] += 1
+            metrics['cursor'] = ids[-1]
+            self._save_checkpoint(metrics)
+            if after_commit:
+                metrics['files'] += after_commit(ids, context) or 0
+            
+            current_app.logger.info(
+                f"Retention {self.name}: chunk={metrics['chunks']} deleted={metrics['deleted']} "
+                f"cursor={metrics['cursor']}"
+            )
+            if self.progress:
+                self.progress(dict(metrics))
+            
+            if len(ids) < self.chunk_size:
+                break
+            if self.pause_ms:
+                time.sleep(self.pause_ms / 1000)
+        
+        if metrics['complete']:
+            self._clear_checkpoint()
+        metrics['duration_ms'] = int((time.monotonic() - started) * 1000)
+        current_app.logger.info(
+            f"Retention {self.name} finished: deleted={metrics['deleted']} files={metrics['files']} "
+            f"chunks={metrics['chunks']} resumed={metrics['resumed']} complete={metrics['complete']} "
+            f"duration_ms={metrics['duration_ms']}"
+        )
+        return metrics
+    
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """Read the checkpoint left by an interrupted run"""
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable retention checkpoint {self.checkpoint_path}: {e}")
+            return None
+    
+    def _save_checkpoint(self, metrics: Dict[str, Any]) -> None:
+        """Record the cursor after a committed chunk"""
+        path = self.checkpoint_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump({
+                'cursor': metrics['cursor'],
+                'cutoff': metrics['cutoff'].isoformat(),
+                'updated_at': datetime.utcnow().isoformat()
+            }, handle)
+        os.replace(tmp_path, path)
+    
+    def _clear_checkpoint(self) -> None:
+        """Remove the checkpoint of a finished run"""
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
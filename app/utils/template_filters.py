@@ -59,6 +59,21 @@ def format_file_size(bytes_size):
     return f"{size:.2f} PB"
 
 
+def allows(permission_mask, permission_type):
+    """
+    Check a permission bitmask (see PermissionService.bulk_effective_permissions)
+    
+    Args:
+        permission_mask: Permission bitmask
+        permission_type: Type of permission (visualizar, editar, excluir, compartilhar)
+        
+    Returns:
+        True if the mask includes the permission
+    """
+    from app.utils.permission_cache import PERMISSION_BITS
+    return bool((permission_mask or 0) & PERMISSION_BITS.get(permission_type, 0))
+
+
 def register_filters(app):
     """
     Register custom template filters with Flask app
@@ -68,3 +83,4 @@ def register_filters(app):
     """
     app.jinja_env.filters['get_file_icon'] = get_file_icon
     app.jinja_env.filters['format_file_size'] = format_file_size
+    app.jinja_env.filters['allows'] = allows
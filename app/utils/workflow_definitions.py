@@ -0,0 +1,158 @@
+"""
+Compiled workflow definitions
+Parses a workflow's JSON configuration once per version into immutable
+stages, so approval checks, stage advances and approval pages stop
+re-reading configuracao_json on every access
+"""
+import json
+import threading
+from typing import Optional, Dict, Any, Tuple, FrozenSet, NamedTuple
+
+
+class StageDefinition(NamedTuple):
+    """One stage of a workflow (keys as in the JSON configuration)"""
+    numero: int
+    name: str
+    approvers: FrozenSet[int]
+    require_all: bool
+
+
+class WorkflowDefinition(NamedTuple):
+    """Read-only, parsed configuration of one workflow version"""
+    workflow_id: Optional[int]
+    versao: int
+    stages: Tuple[StageDefinition, ...]
+    
+    @property
+    def total_estagios(self) -> int:
+        """Number of stages"""
+        return len(self.stages)
+    
+    def stage(self, numero: int) -> Optional[StageDefinition]:
+        """
+        Get a stage by number.
+        
+        Args:
+            numero: Stage number (1-based, like AprovacaoDocumento.estagio_atual)
+            
+        Returns:
+            StageDefinition or None if the workflow has no such stage
+        """
+        if 1 <= numero <= len(self.stages):
+            return self.stages[numero - 1]
+        return None
+
+
+def compile_definition(workflow_id: Optional[int], versao: int, configuracao_json: Optional[str]) -> WorkflowDefinition:
+    """
+    Parse a workflow configuration into a WorkflowDefinition.
+    
+    Args:
+        workflow_id: Workflow ID
+        versao: Configuration version
+        configuracao_json: JSON configuration ({'stages': [...]})
+        
+    Returns:
+        WorkflowDefinition (no stages when the configuration is empty or invalid)
+    """
+    try:
+        configuracao = json.loads(configuracao_json) if configuracao_json else {}
+    except ValueError:
+        configuracao = {}
+    stages = configuracao.get('stages') if isinstance(configuracao, dict) else None
+    
+    compiled = []
+    for numero, stage in enumerate(stages if isinstance(stages, list) else [], start=1):
+        stage = stage if isinstance(stage, dict) else {}
+        approvers = stage.get('approvers')
+        compiled.append(StageDefinition(
+            numero=numero,
+            name=stage.get('name', ''),
+            approvers=frozenset(
+                approver for approver in (approvers if isinstance(approvers, list) else [])
+                if isinstance(approver, int) and not isinstance(approver, bool)
+            ),
+            require_all=bool(stage.get('require_all', False))
+        ))
+    return WorkflowDefinition(workflow_id, versao, tuple(compiled))
+
+
+class WorkflowDefinitionCache:
+    """
+    Process-wide cache of compiled workflow definitions.
+    
+    Entries are keyed by (workflow id, versao); Workflow.versao is bumped
+    whenever configuracao_json changes, so a changed workflow misses the
+    cache in every process. WorkflowService.update_workflow also drops the
+    entries of the workflow it changed.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._definitions = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0
+        }
+    
+    def get(self, workflow) -> WorkflowDefinition:
+        """
+        Get the compiled definition of a workflow.
+        
+        Args:
+            workflow: Workflow instance
+            
+        Returns:
+            WorkflowDefinition (shared; immutable)
+        """
+        if workflow.id is None:
+            return compile_definition(None, workflow.versao or 1, workflow.configuracao_json)
+        
+        key = (workflow.id, workflow.versao or 1)
+        definition = self._definitions.get(key)
+        if definition is not None:
+            self._stats['hits'] += 1
+            return definition
+        
+        self._stats['misses'] += 1
+        definition = compile_definition(workflow.id, key[1], workflow.configuracao_json)
+        with self._lock:
+            # Older versions of this workflow are never asked for again
+            for stale in [k for k in self._definitions if k[0] == workflow.id]:
+                del self._definitions[stale]
+            while len(self._definitions) >= self.max_entries:
+                del self._definitions[next(iter(self._definitions))]
+            self._definitions[key] = definition
+        return definition
+    
+    def invalidate(self, workflow_id: Optional[int] = None):
+        """
+        Drop cached definitions.
+        
+        Args:
+            workflow_id: Workflow ID (None drops every workflow)
+        """
+        with self._lock:
+            if workflow_id is None:
+                self._definitions.clear()
+            else:
+                for key in [k for k in self._definitions if k[0] == workflow_id]:
+                    del self._definitions[key]
+            self._stats['invalidations'] += 1
+    
+    def clear(self):
+        """Drop every definition"""
+        with self._lock:
+            self._definitions.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        stats = dict(self._stats)
+        stats.update(entries=len(self._definitions), max_entries=self.max_entries)
+        return stats
+
+
+# Global workflow definition cache
+workflow_definitions = WorkflowDefinitionCache()
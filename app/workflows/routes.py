@@ -1,7 +1,7 @@
 """
 Workflow routes
 """
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app.workflows import workflow_bp
 from app.workflows.forms import WorkflowForm, ApprovalActionForm
@@ -240,6 +240,54 @@ def pending_approvals():
     )
 
 
+@workflow_bp.route('/approvals/batch', methods=['POST'])
+@login_required
+def decide_approvals_batch():
+    """
+    Approve or reject many pending approvals at once (JSON API)
+    
+    JSON body:
+        aprovacao_ids: Approval IDs
+        acao: 'aprovar' or 'rejeitar'
+        comentario: Decision comment (mandatory), recorded on every approval
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        aprovacao_ids = [int(i) for i in data.get('aprovacao_ids') or []]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid IDs'}), 400
+    acao = {'aprovar': 'aprovado', 'rejeitar': 'rejeitado'}.get(data.get('acao'))
+    comentario = (data.get('comentario') or '').strip()
+    
+    if not aprovacao_ids or not comentario:
+        return jsonify({'success': False, 'message': 'Missing parameters'}), 400
+    if acao is None:
+        return jsonify({'success': False, 'message': 'Ação inválida'}), 400
+    
+    max_decisions = current_app.config.get('WORKFLOW_BATCH_MAX_DECISIONS', 1000)
+    if len(aprovacao_ids) > max_decisions:
+        return jsonify({
+            'success': False,
+            'message': f'Máximo de {max_decisions} aprovações por operação'
+        }), 400
+    
+    try:
+        result = WorkflowService().decide_approvals_bulk(
+            aprovacao_ids=aprovacao_ids,
+            aprovador_id=current_user.id,
+            acao=acao,
+            comentario=comentario
+        )
+    except WorkflowServiceError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    skipped = result['unauthorized'] or result['not_pending'] or result['not_found']
+    return jsonify({'success': not skipped, **result}), 207 if skipped else 200
+
+
 @workflow_bp.route('/approval/<int:id>')
 @login_required
 def view_approval(id):
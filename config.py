@@ -62,6 +62,17 @@ class Config:
     # Application Settings
     MAX_VERSIONS_PER_DOCUMENT = int(os.environ.get('MAX_VERSIONS_PER_DOCUMENT', 10))
     TRASH_RETENTION_DAYS = int(os.environ.get('TRASH_RETENTION_DAYS', 30))
+    BATCH_UPLOAD_MAX_FILES = int(os.environ.get('BATCH_UPLOAD_MAX_FILES', 500))
+    BATCH_UPLOAD_MAX_WORKERS = int(os.environ.get('BATCH_UPLOAD_MAX_WORKERS', 4))
+    BULK_SHARE_MAX_GRANTS = int(os.environ.get('BULK_SHARE_MAX_GRANTS', 100000))  # documents x users x types
+    BULK_MOVE_MAX_DOCUMENTS = int(os.environ.get('BULK_MOVE_MAX_DOCUMENTS', 50000))
+    WORKFLOW_BATCH_MAX_DECISIONS = int(os.environ.get('WORKFLOW_BATCH_MAX_DECISIONS', 1000))
+    
+    # Retention jobs (trash and audit cleanups delete in throttled primary key chunks)
+    RETENTION_CHUNK_SIZE = int(os.environ.get('RETENTION_CHUNK_SIZE', 1000))
+    RETENTION_PAUSE_MS = int(os.environ.get('RETENTION_PAUSE_MS', 100))  # sleep between chunks
+    RETENTION_FILE_WORKERS = int(os.environ.get('RETENTION_FILE_WORKERS', 4))  # parallel file deletions
+    RETENTION_CHECKPOINT_DIR = os.path.join(basedir, os.environ.get('RETENTION_CHECKPOINT_DIR', os.path.join('logs', 'retention')))
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE', 100))
@@ -69,6 +80,53 @@ class Config:
     # Caching
     CACHE_TYPE = 'SimpleCache'
     CACHE_DEFAULT_TIMEOUT = 300
+    PERMISSION_CACHE_SIZE = int(os.environ.get('PERMISSION_CACHE_SIZE', 10000))
+    PERMISSION_CACHE_TTL = int(os.environ.get('PERMISSION_CACHE_TTL', 60))  # seconds
+    PERMISSION_SWEEP_BATCH_SIZE = int(os.environ.get('PERMISSION_SWEEP_BATCH_SIZE', 1000))
+    PERMISSION_SWEEP_MAX_BATCHES = int(os.environ.get('PERMISSION_SWEEP_MAX_BATCHES', 100))  # per run, 0 for no limit
+    
+    # Audit writer (asynchronous batched inserts with an on-disk journal)
+    AUDIT_ASYNC_ENABLED = os.environ.get('AUDIT_ASYNC_ENABLED', 'True').lower() == 'true'
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_FLUSH_BATCH_SIZE = int(os.environ.get('AUDIT_FLUSH_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL_MS = int(os.environ.get('AUDIT_FLUSH_INTERVAL_MS', 1000))
+    AUDIT_JOURNAL_DIR = os.path.join(basedir, os.environ.get('AUDIT_JOURNAL_DIR', os.path.join('logs', 'audit_journal')))
+    AUDIT_JOURNAL_STALE_SECONDS = int(os.environ.get('AUDIT_JOURNAL_STALE_SECONDS', 300))
+    
+    # Audit coalescing (repeated views/downloads of a record share one row)
+    AUDIT_COALESCE_WINDOW_SECONDS = int(os.environ.get('AUDIT_COALESCE_WINDOW_SECONDS', 60))  # idle gap closing a row, 0 = disabled
+    AUDIT_COALESCE_MAX_SPAN_SECONDS = int(os.environ.get('AUDIT_COALESCE_MAX_SPAN_SECONDS', 300))  # clamped to the rollup lag minus 2 minutes
+    AUDIT_COALESCE_ACTIONS = os.environ.get('AUDIT_COALESCE_ACTIONS', 'view,download')
+    AUDIT_COALESCE_MAX_KEYS = int(os.environ.get('AUDIT_COALESCE_MAX_KEYS', 10000))
+    
+    # Audit archive (months older than the retention period leave log_auditoria)
+    AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', 365))
+    AUDIT_ARCHIVE_DIR = os.path.join(basedir, os.environ.get('AUDIT_ARCHIVE_DIR', os.path.join('backups', 'audit_logs')))
+    AUDIT_ARCHIVE_BATCH_SIZE = int(os.environ.get('AUDIT_ARCHIVE_BATCH_SIZE', 5000))
+    AUDIT_PARTITION_MONTHS_AHEAD = int(os.environ.get('AUDIT_PARTITION_MONTHS_AHEAD', 3))  # SQL Server only
+    AUDIT_EXPORT_BATCH_SIZE = int(os.environ.get('AUDIT_EXPORT_BATCH_SIZE', 1000))  # rows per cursor fetch
+    
+    # Audit rollups (hourly/daily counts behind statistics and dashboards)
+    AUDIT_ROLLUP_LAG_MINUTES = int(os.environ.get('AUDIT_ROLLUP_LAG_MINUTES', 10))  # grace before an hour is closed
+    AUDIT_ROLLUP_MAX_HOURS = int(os.environ.get('AUDIT_ROLLUP_MAX_HOURS', 744))  # hours per catch-up run, 0 = unlimited
+    
+    # Admin dashboard snapshot (widgets served from memory, refreshed in the background)
+    DASHBOARD_BACKGROUND_REFRESH = os.environ.get('DASHBOARD_BACKGROUND_REFRESH', 'True').lower() == 'true'
+    DASHBOARD_REFRESH_INTERVAL_SECONDS = int(os.environ.get('DASHBOARD_REFRESH_INTERVAL_SECONDS', 5))
+    DASHBOARD_REFRESH_AHEAD_SECONDS = int(os.environ.get('DASHBOARD_REFRESH_AHEAD_SECONDS', 15))  # recompute before expiry
+    DASHBOARD_MIN_REFRESH_SECONDS = int(os.environ.get('DASHBOARD_MIN_REFRESH_SECONDS', 10))  # per widget, after writes
+    DASHBOARD_IDLE_SECONDS = int(os.environ.get('DASHBOARD_IDLE_SECONDS', 900))  # stop refreshing when nobody looks
+    
+    # Report jobs (reports generated in a worker pool, results kept on disk)
+    REPORT_JOBS_ASYNC = os.environ.get('REPORT_JOBS_ASYNC', 'True').lower() == 'true'
+    REPORT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 2))  # per process
+    REPORT_RESULTS_DIR = os.path.join(basedir, os.environ.get('REPORT_RESULTS_DIR', os.path.join('backups', 'reports')))
+    REPORT_RESULT_TTL_SECONDS = int(os.environ.get('REPORT_RESULT_TTL_SECONDS', 3600))  # identical requests reuse the result
+    REPORT_JOB_STALE_SECONDS = int(os.environ.get('REPORT_JOB_STALE_SECONDS', 900))  # no heartbeat: job considered lost
+    REPORT_JOB_HEARTBEAT_SECONDS = int(os.environ.get('REPORT_JOB_HEARTBEAT_SECONDS', 60))  # keep well below the stale limit
+    
+    # Category tree cache (other workers' category changes show up within this interval)
+    CATEGORY_TREE_CHECK_SECONDS = int(os.environ.get('CATEGORY_TREE_CHECK_SECONDS', 5))
 
 
 class DevelopmentConfig(Config):
@@ -91,6 +149,16 @@ class TestingConfig(Config):
     # Keep ORM objects usable after commit during tests (prevents expired attributes)
     SQLALCHEMY_EXPIRE_ON_COMMIT = False
     WTF_CSRF_ENABLED = False
+    # Write audit entries inline so tests can assert on them immediately
+    AUDIT_ASYNC_ENABLED = False
+    # One row per audit event (tests enable coalescing explicitly)
+    AUDIT_COALESCE_WINDOW_SECONDS = 0
+    # Recompute stale dashboard widgets on read instead of in a thread
+    DASHBOARD_BACKGROUND_REFRESH = False
+    # Generate reports inline in the submitting request
+    REPORT_JOBS_ASYNC = False
+    # Run retention chunks back to back
+    RETENTION_PAUSE_MS = 0
     # Increase upload limit during tests to avoid RequestEntityTooLarge for test payloads
     MAX_CONTENT_LENGTH = int(os.environ.get('TESTING_MAX_CONTENT_LENGTH', 209715200))  # 200MB
 
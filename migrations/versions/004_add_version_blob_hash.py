@@ -0,0 +1,46 @@
+"""Add content hash to versoes for blob references
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Versions reference immutable blobs; the hash lets identical content reuse a blob
+    op.add_column('versoes', sa.Column('hash_arquivo', sa.String(length=64), nullable=True))
+    op.create_index(
+        op.f('ix_versoes_hash_arquivo'),
+        'versoes',
+        ['hash_arquivo'],
+        unique=False
+    )
+    
+    # Backfill versions that point to the document's current file
+    op.execute(
+        """
+        UPDATE versoes
+        SET hash_arquivo = (
+            SELECT documentos.hash_arquivo
+            FROM documentos
+            WHERE documentos.id = versoes.documento_id
+              AND documentos.caminho_arquivo = versoes.caminho_arquivo
+        )
+        WHERE hash_arquivo IS NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_versoes_hash_arquivo'), table_name='versoes')
+    op.drop_column('versoes', 'hash_arquivo')
@@ -0,0 +1,86 @@
+"""Add folder/category permissions and materialized effective permissions
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create permissoes_pastas table
+    op.create_table('permissoes_pastas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('pasta_id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('tipo_permissao', sa.String(length=20), nullable=False),
+        sa.Column('data_concessao', sa.DateTime(), nullable=False),
+        sa.Column('concedido_por', sa.Integer(), nullable=False),
+        sa.Column('data_expiracao', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['concedido_por'], ['usuarios.id'], ),
+        sa.ForeignKeyConstraint(['pasta_id'], ['pastas.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('pasta_id', 'usuario_id', 'tipo_permissao', name='uq_pasta_usuario_permissao')
+    )
+    op.create_index(op.f('ix_permissoes_pastas_pasta_id'), 'permissoes_pastas', ['pasta_id'], unique=False)
+    op.create_index(op.f('ix_permissoes_pastas_usuario_id'), 'permissoes_pastas', ['usuario_id'], unique=False)
+    
+    # Create permissoes_categorias table
+    op.create_table('permissoes_categorias',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('categoria_id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('tipo_permissao', sa.String(length=20), nullable=False),
+        sa.Column('data_concessao', sa.DateTime(), nullable=False),
+        sa.Column('concedido_por', sa.Integer(), nullable=False),
+        sa.Column('data_expiracao', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['categoria_id'], ['categorias.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['concedido_por'], ['usuarios.id'], ),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('categoria_id', 'usuario_id', 'tipo_permissao', name='uq_categoria_usuario_permissao')
+    )
+    op.create_index(op.f('ix_permissoes_categorias_categoria_id'), 'permissoes_categorias', ['categoria_id'], unique=False)
+    op.create_index(op.f('ix_permissoes_categorias_usuario_id'), 'permissoes_categorias', ['usuario_id'], unique=False)
+    
+    # Create permissoes_efetivas table (materialized inherited permissions)
+    op.create_table('permissoes_efetivas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('documento_id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('tipo_permissao', sa.String(length=20), nullable=False),
+        sa.Column('data_expiracao', sa.DateTime(), nullable=True),
+        sa.Column('origem', sa.String(length=20), nullable=False),
+        sa.Column('origem_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_permissoes_efetivas_usuario_id'), 'permissoes_efetivas', ['usuario_id'], unique=False)
+    op.create_index('idx_permissao_efetiva_documento_usuario', 'permissoes_efetivas', ['documento_id', 'usuario_id'], unique=False)
+    op.create_index('idx_permissao_efetiva_origem', 'permissoes_efetivas', ['origem', 'origem_id', 'usuario_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_permissao_efetiva_origem', table_name='permissoes_efetivas')
+    op.drop_index('idx_permissao_efetiva_documento_usuario', table_name='permissoes_efetivas')
+    op.drop_index(op.f('ix_permissoes_efetivas_usuario_id'), table_name='permissoes_efetivas')
+    op.drop_table('permissoes_efetivas')
+    
+    op.drop_index(op.f('ix_permissoes_categorias_usuario_id'), table_name='permissoes_categorias')
+    op.drop_index(op.f('ix_permissoes_categorias_categoria_id'), table_name='permissoes_categorias')
+    op.drop_table('permissoes_categorias')
+    
+    op.drop_index(op.f('ix_permissoes_pastas_usuario_id'), table_name='permissoes_pastas')
+    op.drop_index(op.f('ix_permissoes_pastas_pasta_id'), table_name='permissoes_pastas')
+    op.drop_table('permissoes_pastas')
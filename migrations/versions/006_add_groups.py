@@ -0,0 +1,83 @@
+"""Add user groups and group/profile document permissions
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create grupos table
+    op.create_table('grupos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(length=100), nullable=False),
+        sa.Column('descricao', sa.Text(), nullable=True),
+        sa.Column('ativo', sa.Boolean(), nullable=False),
+        sa.Column('criado_por', sa.Integer(), nullable=False),
+        sa.Column('data_criacao', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['criado_por'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('nome')
+    )
+    
+    # Create grupo_usuarios table
+    op.create_table('grupo_usuarios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('grupo_id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('data_adicao', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['grupo_id'], ['grupos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('grupo_id', 'usuario_id', name='uq_grupo_usuario')
+    )
+    op.create_index(op.f('ix_grupo_usuarios_grupo_id'), 'grupo_usuarios', ['grupo_id'], unique=False)
+    op.create_index(op.f('ix_grupo_usuarios_usuario_id'), 'grupo_usuarios', ['usuario_id'], unique=False)
+    
+    # Create permissoes_grupos table
+    op.create_table('permissoes_grupos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('documento_id', sa.Integer(), nullable=False),
+        sa.Column('grupo_id', sa.Integer(), nullable=True),
+        sa.Column('perfil_id', sa.Integer(), nullable=True),
+        sa.Column('tipo_permissao', sa.String(length=20), nullable=False),
+        sa.Column('data_concessao', sa.DateTime(), nullable=False),
+        sa.Column('concedido_por', sa.Integer(), nullable=False),
+        sa.Column('data_expiracao', sa.DateTime(), nullable=True),
+        sa.CheckConstraint(
+            '(grupo_id IS NULL AND perfil_id IS NOT NULL) OR (grupo_id IS NOT NULL AND perfil_id IS NULL)',
+            name='ck_permissao_grupo_destinatario'
+        ),
+        sa.ForeignKeyConstraint(['concedido_por'], ['usuarios.id'], ),
+        sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['grupo_id'], ['grupos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['perfil_id'], ['perfis.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('documento_id', 'grupo_id', 'perfil_id', 'tipo_permissao', name='uq_documento_grupo_perfil_permissao')
+    )
+    op.create_index(op.f('ix_permissoes_grupos_documento_id'), 'permissoes_grupos', ['documento_id'], unique=False)
+    op.create_index(op.f('ix_permissoes_grupos_grupo_id'), 'permissoes_grupos', ['grupo_id'], unique=False)
+    op.create_index(op.f('ix_permissoes_grupos_perfil_id'), 'permissoes_grupos', ['perfil_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_permissoes_grupos_perfil_id'), table_name='permissoes_grupos')
+    op.drop_index(op.f('ix_permissoes_grupos_grupo_id'), table_name='permissoes_grupos')
+    op.drop_index(op.f('ix_permissoes_grupos_documento_id'), table_name='permissoes_grupos')
+    op.drop_table('permissoes_grupos')
+    
+    op.drop_index(op.f('ix_grupo_usuarios_usuario_id'), table_name='grupo_usuarios')
+    op.drop_index(op.f('ix_grupo_usuarios_grupo_id'), table_name='grupo_usuarios')
+    op.drop_table('grupo_usuarios')
+    
+    op.drop_table('grupos')
@@ -0,0 +1,33 @@
+"""Add indexes on permission expiration dates
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Used by the expired permission sweeper to find expired grants in batches
+    op.create_index('idx_permissao_expiracao', 'permissoes', ['data_expiracao'], unique=False)
+    op.create_index('idx_permissao_efetiva_expiracao', 'permissoes_efetivas', ['data_expiracao'], unique=False)
+    op.create_index('idx_permissao_grupo_expiracao', 'permissoes_grupos', ['data_expiracao'], unique=False)
+    op.create_index('idx_permissao_pasta_expiracao', 'permissoes_pastas', ['data_expiracao'], unique=False)
+    op.create_index('idx_permissao_categoria_expiracao', 'permissoes_categorias', ['data_expiracao'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_permissao_categoria_expiracao', table_name='permissoes_categorias')
+    op.drop_index('idx_permissao_pasta_expiracao', table_name='permissoes_pastas')
+    op.drop_index('idx_permissao_grupo_expiracao', table_name='permissoes_grupos')
+    op.drop_index('idx_permissao_efetiva_expiracao', table_name='permissoes_efetivas')
+    op.drop_index('idx_permissao_expiracao', table_name='permissoes')
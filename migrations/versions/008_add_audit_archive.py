@@ -0,0 +1,123 @@
+"""Add audit archive catalog and monthly partitioning of log_auditoria
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 00:00:00.000000
+
+On SQL Server, log_auditoria is rebuilt on a monthly partition scheme
+(one-time rebuild of the clustered index) so archived months can be removed
+with TRUNCATE ... WITH (PARTITIONS) instead of row deletes. Other databases
+keep a single table and delete archived months in batches.
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+PARTITION_FUNCTION = 'pf_log_auditoria_mes'
+PARTITION_SCHEME = 'ps_log_auditoria_mes'
+MONTHS_AHEAD = 3
+
+# Nonclustered indexes of log_auditoria, rebuilt aligned with the partition scheme
+AUDIT_INDEXES = [
+    ('ix_log_auditoria_usuario_id', 'usuario_id'),
+    ('ix_log_auditoria_acao', 'acao'),
+    ('ix_log_auditoria_tabela', 'tabela'),
+    ('ix_log_auditoria_registro_id', 'registro_id'),
+    ('ix_log_auditoria_data_hora', 'data_hora'),
+    ('idx_audit_usuario_data', 'usuario_id, data_hora'),
+    ('idx_audit_tabela_registro', 'tabela, registro_id'),
+]
+
+
+def _next_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _partition_log_auditoria():
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("SELECT MIN(data_hora) FROM log_auditoria")).scalar() or datetime.utcnow()
+    
+    # Month boundaries from the oldest row to a few months ahead
+    boundaries = []
+    mes = date(oldest.year, oldest.month, 1)
+    now = datetime.utcnow()
+    limit = date(now.year, now.month, 1)
+    for _ in range(MONTHS_AHEAD):
+        limit = _next_month(limit)
+    while mes <= limit:
+        boundaries.append(f"'{mes.isoformat()}'")
+        mes = _next_month(mes)
+    
+    op.execute(
+        f"CREATE PARTITION FUNCTION {PARTITION_FUNCTION} (datetime) "
+        f"AS RANGE RIGHT FOR VALUES ({', '.join(boundaries)})"
+    )
+    op.execute(f"CREATE PARTITION SCHEME {PARTITION_SCHEME} AS PARTITION {PARTITION_FUNCTION} ALL TO ([PRIMARY])")
+    
+    for name, _ in AUDIT_INDEXES:
+        op.drop_index(name, table_name='log_auditoria')
+    
+    # The clustering key must contain the partitioning column
+    op.execute(
+        "DECLARE @pk sysname = (SELECT name FROM sys.key_constraints "
+        "WHERE parent_object_id = OBJECT_ID('log_auditoria') AND type = 'PK'); "
+        "EXEC('ALTER TABLE log_auditoria DROP CONSTRAINT ' + QUOTENAME(@pk));"
+    )
+    op.execute(
+        "ALTER TABLE log_auditoria ADD CONSTRAINT pk_log_auditoria "
+        f"PRIMARY KEY CLUSTERED (id, data_hora) ON {PARTITION_SCHEME}(data_hora)"
+    )
+    
+    for name, columns in AUDIT_INDEXES:
+        op.execute(f"CREATE INDEX {name} ON log_auditoria ({columns}) ON {PARTITION_SCHEME}(data_hora)")
+
+
+def _unpartition_log_auditoria():
+    for name, _ in AUDIT_INDEXES:
+        op.drop_index(name, table_name='log_auditoria')
+    op.execute("ALTER TABLE log_auditoria DROP CONSTRAINT pk_log_auditoria")
+    op.execute("ALTER TABLE log_auditoria ADD CONSTRAINT pk_log_auditoria PRIMARY KEY CLUSTERED (id) ON [PRIMARY]")
+    for name, columns in AUDIT_INDEXES:
+        op.execute(f"CREATE INDEX {name} ON log_auditoria ({columns}) ON [PRIMARY]")
+    op.execute(f"DROP PARTITION SCHEME {PARTITION_SCHEME}")
+    op.execute(f"DROP PARTITION FUNCTION {PARTITION_FUNCTION}")
+
+
+def upgrade() -> None:
+    # Create log_auditoria_arquivos table
+    op.create_table('log_auditoria_arquivos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('mes', sa.Date(), nullable=False),
+        sa.Column('caminho', sa.String(length=255), nullable=False),
+        sa.Column('total_registros', sa.Integer(), nullable=False),
+        sa.Column('id_min', sa.BigInteger(), nullable=True),
+        sa.Column('id_max', sa.BigInteger(), nullable=True),
+        sa.Column('data_inicio', sa.DateTime(), nullable=True),
+        sa.Column('data_fim', sa.DateTime(), nullable=True),
+        sa.Column('tamanho_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('hash_arquivo', sa.String(length=64), nullable=True),
+        sa.Column('data_arquivamento', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('caminho')
+    )
+    op.create_index(op.f('ix_log_auditoria_arquivos_mes'), 'log_auditoria_arquivos', ['mes'], unique=False)
+    op.create_index('idx_audit_arquivo_periodo', 'log_auditoria_arquivos', ['data_inicio', 'data_fim'], unique=False)
+    
+    if op.get_bind().dialect.name == 'mssql':
+        _partition_log_auditoria()
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'mssql':
+        _unpartition_log_auditoria()
+    
+    op.drop_index('idx_audit_arquivo_periodo', table_name='log_auditoria_arquivos')
+    op.drop_index(op.f('ix_log_auditoria_arquivos_mes'), table_name='log_auditoria_arquivos')
+    op.drop_table('log_auditoria_arquivos')
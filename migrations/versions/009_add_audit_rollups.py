@@ -0,0 +1,54 @@
+"""Add hourly and daily audit rollups
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 00:00:00.000000
+
+The rollups start empty; the first run of scripts/rollup_audit_logs.py
+builds them from log_auditoria.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def _create_rollup_table(name, index_name):
+    op.create_table(name,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('periodo', sa.DateTime(), nullable=False),
+        sa.Column('acao', sa.String(length=50), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=True),
+        sa.Column('tabela', sa.String(length=50), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(index_name, name, ['periodo', 'acao'], unique=False)
+
+
+def upgrade() -> None:
+    _create_rollup_table('log_auditoria_resumo_hora', 'idx_resumo_hora_periodo')
+    _create_rollup_table('log_auditoria_resumo_dia', 'idx_resumo_dia_periodo')
+    
+    # Create log_auditoria_resumo_marcador table
+    op.create_table('log_auditoria_resumo_marcador',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('inicio', sa.DateTime(), nullable=False),
+        sa.Column('hora_fechada', sa.DateTime(), nullable=False),
+        sa.Column('ultimo_id', sa.BigInteger(), nullable=False),
+        sa.Column('data_atualizacao', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('log_auditoria_resumo_marcador')
+    op.drop_index('idx_resumo_dia_periodo', table_name='log_auditoria_resumo_dia')
+    op.drop_table('log_auditoria_resumo_dia')
+    op.drop_index('idx_resumo_hora_periodo', table_name='log_auditoria_resumo_hora')
+    op.drop_table('log_auditoria_resumo_hora')
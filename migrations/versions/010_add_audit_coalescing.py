@@ -0,0 +1,27 @@
+"""Add occurrence count to audit log entries
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 00:00:00.000000
+
+Existing rows stand for a single occurrence (server default 1).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('log_auditoria', sa.Column('ocorrencias', sa.Integer(), nullable=False, server_default=sa.text('1')))
+    op.add_column('log_auditoria', sa.Column('data_hora_fim', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('log_auditoria', 'data_hora_fim')
+    op.drop_column('log_auditoria', 'ocorrencias')
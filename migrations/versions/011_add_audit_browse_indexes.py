@@ -0,0 +1,44 @@
+"""Add audit log indexes for keyset browsing
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 00:00:00.000000
+
+One (column, data_hora) index per browse filter without one, so every
+filter combination of the audit log browser can be read in data_hora order
+from an index. On SQL Server the indexes are aligned with the monthly
+partition scheme of log_auditoria (see 008), which partition truncation
+requires.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+PARTITION_SCHEME = 'ps_log_auditoria_mes'
+
+BROWSE_INDEXES = [
+    ('idx_audit_ip_data', ['ip_address', 'data_hora']),
+    ('idx_audit_acao_data', ['acao', 'data_hora']),
+    ('idx_audit_tabela_data', ['tabela', 'data_hora']),
+]
+
+
+def upgrade() -> None:
+    partitioned = op.get_bind().dialect.name == 'mssql'
+    for name, columns in BROWSE_INDEXES:
+        if partitioned:
+            op.execute(
+                f"CREATE INDEX {name} ON log_auditoria ({', '.join(columns)}) ON {PARTITION_SCHEME}(data_hora)"
+            )
+        else:
+            op.create_index(name, 'log_auditoria', columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(BROWSE_INDEXES):
+        op.drop_index(name, table_name='log_auditoria')
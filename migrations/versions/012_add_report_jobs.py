@@ -0,0 +1,49 @@
+"""Add background report jobs
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 00:00:00.000000
+
+Result files live in REPORT_RESULTS_DIR; rows and files are removed once
+their result expires.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create relatorio_jobs table
+    op.create_table('relatorio_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('chave', sa.String(length=64), nullable=False),
+        sa.Column('parametros_json', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('progresso', sa.Integer(), nullable=False),
+        sa.Column('etapa', sa.String(length=100), nullable=True),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('formatos', sa.String(length=50), nullable=True),
+        sa.Column('solicitado_por', sa.Integer(), nullable=True),
+        sa.Column('data_criacao', sa.DateTime(), nullable=False),
+        sa.Column('data_inicio', sa.DateTime(), nullable=True),
+        sa.Column('data_conclusao', sa.DateTime(), nullable=True),
+        sa.Column('data_atualizacao', sa.DateTime(), nullable=False),
+        sa.Column('expira_em', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['solicitado_por'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_relatorio_jobs_chave', 'relatorio_jobs', ['chave', 'status'], unique=False)
+    op.create_index('idx_relatorio_jobs_expira', 'relatorio_jobs', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_relatorio_jobs_expira', table_name='relatorio_jobs')
+    op.drop_index('idx_relatorio_jobs_chave', table_name='relatorio_jobs')
+    op.drop_table('relatorio_jobs')
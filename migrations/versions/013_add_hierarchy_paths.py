@@ -0,0 +1,64 @@
+"""Add materialized paths to categorias and pastas
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-18 00:00:00.000000
+
+caminho_ids holds the ancestor IDs of a node ('/1/5/', '/' for a root)
+and nivel its depth; both are backfilled one level at a time from the
+roots down.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+HIERARCHIES = (
+    ('categorias', 'categoria_pai_id'),
+    ('pastas', 'pasta_pai_id')
+)
+
+
+def upgrade() -> None:
+    for table, parent_column in HIERARCHIES:
+        op.add_column(table, sa.Column('caminho_ids', sa.String(length=450), nullable=True))
+        op.add_column(table, sa.Column('nivel', sa.Integer(), nullable=False, server_default=sa.text('0')))
+        op.create_index(op.f(f'ix_{table}_caminho_ids'), table, ['caminho_ids'], unique=False)
+    
+    connection = op.get_bind()
+    for table, parent_column in HIERARCHIES:
+        # Roots first, then each level from the paths of the previous one
+        op.execute(f"UPDATE {table} SET caminho_ids = '/', nivel = 0 WHERE {parent_column} IS NULL")
+        nivel = 0
+        while True:
+            rows = connection.execute(sa.text(
+                f"""
+                SELECT filho.id, pai.caminho_ids, pai.id AS pai_id
+                FROM {table} filho
+                JOIN {table} pai ON pai.id = filho.{parent_column}
+                WHERE filho.caminho_ids IS NULL AND pai.caminho_ids IS NOT NULL
+                """
+            )).fetchall()
+            if not rows:
+                break
+            nivel += 1
+            connection.execute(
+                sa.text(f"UPDATE {table} SET caminho_ids = :caminho_ids, nivel = :nivel WHERE id = :id"),
+                [
+                    {'id': row.id, 'caminho_ids': f'{row.caminho_ids}{row.pai_id}/', 'nivel': nivel}
+                    for row in rows
+                ]
+            )
+
+
+def downgrade() -> None:
+    for table, parent_column in reversed(HIERARCHIES):
+        op.drop_index(op.f(f'ix_{table}_caminho_ids'), table_name=table)
+        op.drop_column(table, 'nivel')
+        op.drop_column(table, 'caminho_ids')
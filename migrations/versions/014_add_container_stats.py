@@ -0,0 +1,87 @@
+"""Add document counters to categorias and pastas
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-18 00:00:00.000000
+
+Direct and subtree counts and sizes of active documents, filled from the
+current documents; afterwards they are maintained by the application
+(scripts/reconcile_container_stats.py repairs drift).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+CONTAINERS = (
+    ('categorias', 'categoria_id'),
+    ('pastas', 'pasta_id')
+)
+COLUMNS = (
+    ('total_documentos', sa.Integer()),
+    ('total_bytes', sa.BigInteger()),
+    ('total_documentos_subarvore', sa.Integer()),
+    ('total_bytes_subarvore', sa.BigInteger())
+)
+
+
+def upgrade() -> None:
+    for table, _ in CONTAINERS:
+        for column, column_type in COLUMNS:
+            op.add_column(table, sa.Column(column, column_type, nullable=False, server_default=sa.text('0')))
+    
+    connection = op.get_bind()
+    for table, document_column in CONTAINERS:
+        direct = {
+            row[0]: (row[1], row[2] or 0)
+            for row in connection.execute(sa.text(
+                f"""
+                SELECT {document_column}, COUNT(*), SUM(tamanho_bytes)
+                FROM documentos
+                WHERE status = 'ativo' AND {document_column} IS NOT NULL
+                GROUP BY {document_column}
+                """
+            ))
+        }
+        if not direct:
+            continue
+        
+        # Subtree sums from the materialized paths (migration 013)
+        totals = {}
+        for node_id, caminho_ids in connection.execute(sa.text(f"SELECT id, caminho_ids FROM {table}")):
+            documentos, tamanho = direct.get(node_id, (0, 0))
+            if not documentos:
+                continue
+            ancestors = [int(part) for part in (caminho_ids or '').split('/') if part]
+            for subtree_id in ancestors + [node_id]:
+                total = totals.setdefault(subtree_id, [0, 0, 0, 0])
+                total[2] += documentos
+                total[3] += tamanho
+            totals.setdefault(node_id, [0, 0, 0, 0])[:2] = [documentos, tamanho]
+        
+        connection.execute(
+            sa.text(
+                f"""
+                UPDATE {table}
+                SET total_documentos = :documentos, total_bytes = :bytes,
+                    total_documentos_subarvore = :documentos_subarvore, total_bytes_subarvore = :bytes_subarvore
+                WHERE id = :id
+                """
+            ),
+            [
+                {'id': node_id, 'documentos': t[0], 'bytes': t[1], 'documentos_subarvore': t[2], 'bytes_subarvore': t[3]}
+                for node_id, t in totals.items()
+            ]
+        )
+
+
+def downgrade() -> None:
+    for table, _ in reversed(CONTAINERS):
+        for column, _ in reversed(COLUMNS):
+            op.drop_column(table, column)
@@ -0,0 +1,73 @@
+"""Add normalized workflow stage approvers
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-18 00:00:00.000000
+
+One row per (workflow, stage, approver), filled from the current workflow
+configurations; afterwards the application rewrites a workflow's rows when
+its configuration changes. Together with the index on
+aprovacao_documentos (status, workflow_id, estagio_atual) it turns the
+approver inbox into a single indexed join.
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create workflow_stage_approvers table
+    op.create_table('workflow_stage_approvers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('workflow_id', sa.Integer(), nullable=False),
+        sa.Column('estagio', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['workflow_id'], ['workflows.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('workflow_id', 'estagio', 'usuario_id', name='uq_workflow_estagio_aprovador')
+    )
+    op.create_index(
+        'idx_workflow_stage_approvers_usuario', 'workflow_stage_approvers',
+        ['usuario_id', 'workflow_id', 'estagio'], unique=False
+    )
+    op.create_index(
+        'idx_aprovacao_documentos_estagio', 'aprovacao_documentos',
+        ['status', 'workflow_id', 'estagio_atual'], unique=False
+    )
+    
+    # Backfill from the JSON configurations (approvers that are not users are skipped)
+    connection = op.get_bind()
+    user_ids = {row[0] for row in connection.execute(sa.text("SELECT id FROM usuarios"))}
+    rows = []
+    for workflow_id, configuracao_json in connection.execute(sa.text("SELECT id, configuracao_json FROM workflows")):
+        try:
+            stages = json.loads(configuracao_json or '{}').get('stages') or []
+        except (ValueError, AttributeError):
+            continue
+        for estagio, stage in enumerate(stages, start=1):
+            approvers = stage.get('approvers') if isinstance(stage, dict) else None
+            for usuario_id in dict.fromkeys(approvers if isinstance(approvers, list) else []):
+                if isinstance(usuario_id, int) and usuario_id in user_ids:
+                    rows.append({'workflow_id': workflow_id, 'estagio': estagio, 'usuario_id': usuario_id})
+    if rows:
+        connection.execute(
+            sa.text(
+                "INSERT INTO workflow_stage_approvers (workflow_id, estagio, usuario_id) "
+                "VALUES (:workflow_id, :estagio, :usuario_id)"
+            ),
+            rows
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_aprovacao_documentos_estagio', table_name='aprovacao_documentos')
+    op.drop_index('idx_workflow_stage_approvers_usuario', table_name='workflow_stage_approvers')
+    op.drop_table('workflow_stage_approvers')
@@ -0,0 +1,26 @@
+"""Add configuration version to workflows
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-19 00:00:00.000000
+
+Compiled workflow definitions are cached per (workflow, versao); the
+application bumps versao whenever configuracao_json changes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('workflows', sa.Column('versao', sa.Integer(), nullable=False, server_default=sa.text('1')))
+
+
+def downgrade() -> None:
+    op.drop_column('workflows', 'versao')
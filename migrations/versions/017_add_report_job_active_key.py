@@ -0,0 +1,43 @@
+"""Allow one queued or running report job per request key
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-19 00:00:00.000000
+
+Filtered unique index on relatorio_jobs.chave for pending and running jobs,
+so identical report requests served by different worker processes attach
+to one job instead of generating the report twice. Duplicate active jobs
+left by earlier versions are marked failed first.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '017'
+down_revision = '016'
+branch_labels = None
+depends_on = None
+
+
+ACTIVE = "status IN ('pendente', 'executando')"
+
+
+def upgrade() -> None:
+    # Keep the newest active job of each chave
+    op.execute(
+        "UPDATE relatorio_jobs SET status = 'erro', erro = 'Superseded by a newer identical job' "
+        "WHERE status IN ('pendente', 'executando') AND EXISTS ("
+        "SELECT 1 FROM relatorio_jobs newer "
+        "WHERE newer.chave = relatorio_jobs.chave AND newer.status IN ('pendente', 'executando') "
+        "AND (newer.data_criacao > relatorio_jobs.data_criacao "
+        "OR (newer.data_criacao = relatorio_jobs.data_criacao AND newer.id > relatorio_jobs.id)))"
+    )
+    op.create_index(
+        'uq_relatorio_jobs_chave_ativa', 'relatorio_jobs', ['chave'], unique=True,
+        mssql_where=sa.text(ACTIVE), sqlite_where=sa.text(ACTIVE)
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_relatorio_jobs_chave_ativa', table_name='relatorio_jobs')
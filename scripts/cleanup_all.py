@@ -13,6 +13,7 @@ from app import create_app
 from cleanup_trash import TrashCleanup
 from cleanup_tokens import TokenCleanup
 from cleanup_audit_logs import AuditLogCleanup
+from cleanup_permissions import PermissionCleanup
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -25,8 +26,10 @@ def main():
     print("=" * 60)
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
-    # Check for dry-run flag
+    # Check for flags
     dry_run = '--dry-run' in sys.argv
+    # --max-chunks=N bounds the trash phase; the next run resumes from the checkpoint
+    max_chunks = next((int(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--max-chunks=')), None)
     if dry_run:
         print("*** DRY RUN MODE - No changes will be made ***\n")
     
@@ -36,6 +39,7 @@ def main():
     results = {
         'trash': 0,
         'tokens': 0,
+        'permissions': 0,
         'audit_logs': 0
     }
     
@@ -45,7 +49,7 @@ def main():
     print("-" * 60)
     try:
         trash_cleanup = TrashCleanup(app)
-        result = trash_cleanup.cleanup(dry_run=dry_run)
+        result = trash_cleanup.cleanup(dry_run=dry_run, max_chunks=max_chunks)
         if isinstance(result, tuple):
             results['trash'] = result[0]
         else:
@@ -63,9 +67,19 @@ def main():
     except Exception as e:
         print(f"✗ Token cleanup error: {str(e)}")
     
-    # Cleanup 3: Audit logs
+    # Cleanup 3: Expired permissions
     print("\n" + "-" * 60)
-    print("PHASE 3: Audit Log Cleanup")
+    print("PHASE 3: Expired Permission Cleanup")
+    print("-" * 60)
+    try:
+        permission_cleanup = PermissionCleanup(app)
+        results['permissions'] = permission_cleanup.cleanup(dry_run=dry_run, max_batches=0)
+    except Exception as e:
+        print(f"✗ Permission cleanup error: {str(e)}")
+    
+    # Cleanup 4: Audit logs
+    print("\n" + "-" * 60)
+    print("PHASE 4: Audit Log Cleanup")
     print("-" * 60)
     try:
         audit_cleanup = AuditLogCleanup(app)
@@ -79,6 +93,7 @@ def main():
     print("=" * 60)
     print(f"Trash documents deleted: {results['trash']}")
     print(f"Password reset tokens deleted: {results['tokens']}")
+    print(f"Expired permissions deleted: {results['permissions']}")
     print(f"Audit logs archived/deleted: {results['audit_logs']}")
     print(f"Total items processed: {sum(results.values())}")
     print("=" * 60)
@@ -1,17 +1,17 @@
 """
 Cleanup script for old audit logs
-Archives or deletes audit logs older than retention period
+Moves closed months older than the retention period out of log_auditoria
+into compressed monthly archive files
 """
 import os
 import sys
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Add parent directory to path to import app modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import create_app, db
-from app.models.audit import LogAuditoria
+from app import create_app
+from app.services.audit_archive_service import AuditArchiveService
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -19,156 +19,68 @@ load_dotenv()
 
 
 class AuditLogCleanup:
-    """Handle cleanup and archival of old audit logs"""
+    """Handle monthly archival of old audit logs"""
     
     def __init__(self, app):
         self.app = app
-        self.retention_days = int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', 365))  # Default 1 year
-        self.archive_dir = os.path.join(
-            os.path.dirname(__file__), 
-            '..', 
-            'backups', 
-            'audit_logs'
-        )
-        
-        # Create archive directory if it doesn't exist
-        os.makedirs(self.archive_dir, exist_ok=True)
-    
-    def get_old_logs(self):
-        """Get audit logs older than retention period"""
-        cutoff_date = datetime.utcnow() - timedelta(days=self.retention_days)
-        
-        with self.app.app_context():
-            old_logs = LogAuditoria.query.filter(
-                LogAuditoria.data_hora < cutoff_date
-            ).all()
-            
-            return old_logs
-    
-    def archive_logs_to_json(self, logs):
-        """Archive logs to JSON file"""
-        if not logs:
-            return None
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        archive_filename = f"audit_logs_archive_{timestamp}.json"
-        archive_path = os.path.join(self.archive_dir, archive_filename)
-        
-        try:
-            # Convert logs to dictionaries
-            logs_data = []
-            for log in logs:
-                log_dict = {
-                    'id': log.id,
-                    'usuario_id': log.usuario_id,
-                    'acao': log.acao,
-                    'tabela': log.tabela,
-                    'registro_id': log.registro_id,
-                    'dados_json': log.dados_json,
-                    'ip_address': log.ip_address,
-                    'user_agent': log.user_agent,
-                    'data_hora': log.data_hora.isoformat() if log.data_hora else None
-                }
-                logs_data.append(log_dict)
-            
-            # Write to JSON file
-            with open(archive_path, 'w', encoding='utf-8') as f:
-                json.dump(logs_data, f, indent=2, ensure_ascii=False)
-            
-            print(f"✓ Archived {len(logs)} log(s) to: {archive_filename}")
-            
-            # Get file size
-            size_mb = os.path.getsize(archive_path) / (1024 * 1024)
-            print(f"  Archive size: {size_mb:.2f} MB")
-            
-            return archive_path
-            
-        except Exception as e:
-            print(f"✗ Error archiving logs: {str(e)}")
-            return None
+        self.retention_days = app.config['AUDIT_LOG_RETENTION_DAYS']  # Default 1 year
+        self.archive_dir = app.config['AUDIT_ARCHIVE_DIR']
     
-    def delete_logs(self, logs):
-        """Delete logs from database"""
-        try:
-            for log in logs:
-                db.session.delete(log)
-            db.session.commit()
-            return True
-        except Exception as e:
-            db.session.rollback()
-            print(f"✗ Error deleting logs: {str(e)}")
-            return False
-    
-    def get_log_statistics(self, logs):
-        """Get statistics about logs to be archived"""
-        if not logs:
-            return {}
-        
-        stats = {
-            'total_count': len(logs),
-            'date_range': {
-                'oldest': min(log.data_hora for log in logs),
-                'newest': max(log.data_hora for log in logs)
-            },
-            'by_action': {},
-            'by_user': {}
+    def get_log_statistics(self, service):
+        """Count live rows of each archivable month"""
+        return {
+            mes.strftime('%Y-%m'): service.count_month(mes)
+            for mes in service.get_archivable_months(self.retention_days)
         }
-        
-        # Count by action
-        for log in logs:
-            action = log.acao or 'unknown'
-            stats['by_action'][action] = stats['by_action'].get(action, 0) + 1
-        
-        # Count by user
-        for log in logs:
-            user_id = log.usuario_id or 0
-            stats['by_user'][user_id] = stats['by_user'].get(user_id, 0) + 1
-        
-        return stats
+    
+    @staticmethod
+    def print_progress(metrics):
+        """Print one line per deleted chunk"""
+        print(f"  Chunk {metrics['chunks']}: {metrics['deleted']} log(s) deleted (last ID {metrics['cursor']})")
     
     def cleanup(self, dry_run=False, archive=True):
         """Execute cleanup process"""
-        print(f"Searching for audit logs older than {self.retention_days} days...")
+        print(f"Searching for closed months older than {self.retention_days} days...")
         
-        old_logs = self.get_old_logs()
+        with self.app.app_context():
+            service = AuditArchiveService()
+            
+            if dry_run:
+                stats = self.get_log_statistics(service)
+                if not stats:
+                    print("✓ No old audit logs found")
+                    return 0
+                for mes, count in stats.items():
+                    print(f"  - {mes}: {count} log(s)")
+                action = 'archive' if archive else 'delete'
+                print(f"[DRY RUN] Would {action} {sum(stats.values())} log(s) from {len(stats)} month(s)")
+                return sum(stats.values())
+            
+            # Keep partition boundaries ahead of incoming logs (SQL Server only)
+            added = service.ensure_partitions()
+            if added:
+                print(f"✓ Added {added} monthly partition(s)")
+            
+            # Rows leave the live table in throttled chunks (see RetentionExecutor)
+            results = service.archive_closed_months(
+                self.retention_days, archive=archive, progress=self.print_progress
+            )
         
-        if not old_logs:
+        if not results:
             print("✓ No old audit logs found")
             return 0
         
-        print(f"Found {len(old_logs)} old log(s)\n")
+        for result in results:
+            method = 'partition truncated' if result['nativo'] else 'batched delete'
+            if result['caminho']:
+                print(f"✓ {result['mes']}: archived {result['registros']} log(s) to {result['caminho']} ({method})")
+            else:
+                print(f"✓ {result['mes']}: deleted {result['removidos']} log(s) ({method})")
         
-        # Display statistics
-        stats = self.get_log_statistics(old_logs)
-        print("Log Statistics:")
-        print(f"  Total logs: {stats['total_count']}")
-        print(f"  Date range: {stats['date_range']['oldest'].strftime('%Y-%m-%d')} to {stats['date_range']['newest'].strftime('%Y-%m-%d')}")
-        print(f"  Actions breakdown:")
-        for action, count in sorted(stats['by_action'].items(), key=lambda x: x[1], reverse=True)[:10]:
-            print(f"    - {action}: {count}")
-        print()
-        
-        if dry_run:
-            print(f"[DRY RUN] Would archive and delete {len(old_logs)} log(s)")
-            return len(old_logs)
-        
-        # Archive logs if requested
         if archive:
-            print("Archiving logs to JSON...")
-            archive_path = self.archive_logs_to_json(old_logs)
-            if not archive_path:
-                print("✗ Archival failed - aborting cleanup")
-                return 0
-            print()
+            print(f"  Archive directory: {self.archive_dir}")
         
-        # Delete logs from database
-        print("Deleting logs from database...")
-        if self.delete_logs(old_logs):
-            print(f"✓ Successfully deleted {len(old_logs)} log(s)")
-            return len(old_logs)
-        else:
-            print(f"✗ Failed to delete logs")
-            return 0
+        return sum(result['removidos'] for result in results)
 
 
 def main():
@@ -0,0 +1,104 @@
+"""
+Cleanup script for expired document permissions
+Removes expired direct, group, folder/category and inherited grants in batches
+"""
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models.permission import (
+    Permissao, PermissaoGrupo, PermissaoPasta, PermissaoCategoria, PermissaoEfetiva
+)
+from app.services.permission_service import PermissionService
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class PermissionCleanup:
+    """Handle cleanup of expired permissions"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def count_expired(self):
+        """Count expired grants per table"""
+        now = datetime.utcnow()
+        with self.app.app_context():
+            return {
+                model.__tablename__: db.session.query(model.id).filter(
+                    model.data_expiracao < now
+                ).count()
+                for model in (Permissao, PermissaoGrupo, PermissaoPasta, PermissaoCategoria, PermissaoEfetiva)
+            }
+    
+    def cleanup(self, dry_run=False, max_batches=None):
+        """Execute cleanup process"""
+        print("Searching for expired permissions...")
+        
+        if dry_run:
+            expired = self.count_expired()
+            total = sum(expired.values())
+            for table, count in expired.items():
+                print(f"  - {table}: {count}")
+            print(f"[DRY RUN] Would delete {total} permission(s)")
+            return total
+        
+        with self.app.app_context():
+            metrics = PermissionService().sweep_expired_permissions(max_batches=max_batches)
+        
+        for table, count in metrics['tables'].items():
+            print(f"  - {table}: {count}")
+        print(f"Batches: {metrics['batches']}")
+        print(f"Users affected: {metrics['users']}")
+        print(f"Documents affected: {metrics['documents']}")
+        print(f"Duration: {metrics['duration_ms']} ms")
+        
+        if metrics['complete']:
+            print(f"✓ Successfully deleted {metrics['deleted']} permission(s)")
+        else:
+            print(f"✓ Deleted {metrics['deleted']} permission(s); batch limit reached, "
+                  f"remaining rows will be removed on the next run")
+        
+        return metrics['deleted']
+
+
+def main():
+    """Main cleanup execution"""
+    print("=" * 60)
+    print("SGDI - Expired Permission Cleanup")
+    print("=" * 60)
+    print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
+    # Check for flags
+    dry_run = '--dry-run' in sys.argv
+    # --all ignores PERMISSION_SWEEP_MAX_BATCHES and empties the backlog in one run
+    max_batches = 0 if '--all' in sys.argv else None
+    
+    if dry_run:
+        print("*** DRY RUN MODE - No changes will be made ***\n")
+    
+    # Create Flask app context
+    app = create_app(os.getenv('FLASK_ENV', 'production'))
+    
+    cleanup = PermissionCleanup(app)
+    deleted_count = cleanup.cleanup(dry_run=dry_run, max_batches=max_batches)
+    
+    print("=" * 60)
+    print("Cleanup Summary")
+    print("=" * 60)
+    print(f"Permissions deleted: {deleted_count}")
+    print("=" * 60)
+    print(f"Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
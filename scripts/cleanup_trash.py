@@ -9,8 +9,11 @@ from datetime import datetime, timedelta
 # Add parent directory to path to import app modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import create_app, db
+from app import create_app
 from app.models.document import Documento
+from app.services.document_service import DocumentService
+from app.services.storage_service import StorageService
+from app.utils.file_handler import FileHandler
 from config import Config
 from dotenv import load_dotenv
 
@@ -38,80 +41,62 @@ class TrashCleanup:
             
             return expired_docs
     
-    def delete_file(self, file_path):
-        """Delete physical file from storage"""
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
-            else:
-                print(f"    Warning: File not found: {file_path}")
-                return False
-        except Exception as e:
-            print(f"    Error deleting file: {str(e)}")
-            return False
+    def get_document_service(self):
+        """Document service backed by the configured upload folder"""
+        storage_service = StorageService(self.app.config['UPLOAD_FOLDER'])
+        file_handler = FileHandler(self.app.config['ALLOWED_EXTENSIONS'], self.app.config['MAX_CONTENT_LENGTH'])
+        return DocumentService(storage_service, file_handler)
     
-    def permanently_delete_document(self, documento):
-        """Permanently delete document and its files"""
-        try:
-            # Delete main document file
-            if documento.caminho_arquivo:
-                self.delete_file(documento.caminho_arquivo)
-            
-            # Delete version files
-            for versao in documento.versoes:
-                if versao.caminho_arquivo:
-                    self.delete_file(versao.caminho_arquivo)
-            
-            # Delete database record (cascade will handle related records)
-            db.session.delete(documento)
-            db.session.commit()
-            
-            return True
-            
-        except Exception as e:
-            db.session.rollback()
-            print(f"    Error deleting document from database: {str(e)}")
-            return False
+    @staticmethod
+    def print_progress(metrics):
+        """Print one line per committed chunk"""
+        print(f"  Chunk {metrics['chunks']}: {metrics['deleted']} document(s), "
+              f"{metrics['files']} file(s) deleted (last ID {metrics['cursor']})")
     
-    def cleanup(self, dry_run=False):
+    def cleanup(self, dry_run=False, max_chunks=None):
         """Execute cleanup process"""
         print(f"Searching for documents in trash older than {self.retention_days} days...")
         
-        expired_docs = self.get_expired_documents()
-        
-        if not expired_docs:
-            print("✓ No expired documents found in trash")
-            return 0
-        
-        print(f"Found {len(expired_docs)} expired document(s) to delete\n")
-        
-        deleted_count = 0
-        failed_count = 0
-        
-        for doc in expired_docs:
-            days_in_trash = (datetime.utcnow() - doc.data_exclusao).days
+        if dry_run:
+            expired_docs = self.get_expired_documents()
             
-            print(f"Document: {doc.nome}")
-            print(f"  ID: {doc.id}")
-            print(f"  Deleted on: {doc.data_exclusao.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"  Days in trash: {days_in_trash}")
-            print(f"  Size: {doc.tamanho_formatado}")
+            if not expired_docs:
+                print("✓ No expired documents found in trash")
+                return 0
             
-            if dry_run:
+            print(f"Found {len(expired_docs)} expired document(s) to delete\n")
+            
+            for doc in expired_docs:
+                days_in_trash = (datetime.utcnow() - doc.data_exclusao).days
+                
+                print(f"Document: {doc.nome}")
+                print(f"  ID: {doc.id}")
+                print(f"  Deleted on: {doc.data_exclusao.strftime('%Y-%m-%d %H:%M:%S')}")
+                print(f"  Days in trash: {days_in_trash}")
+                print(f"  Size: {doc.tamanho_formatado}")
                 print(f"  [DRY RUN] Would permanently delete this document")
-                deleted_count += 1
-            else:
-                if self.permanently_delete_document(doc):
-                    print(f"  ✓ Permanently deleted")
-                    deleted_count += 1
-                else:
-                    print(f"  ✗ Failed to delete")
-                    failed_count += 1
+                print()
             
-            print()
+            return len(expired_docs), 0
+        
+        # Documents are deleted in throttled chunks; an interrupted run resumes
+        # from its checkpoint on the next execution
+        with self.app.app_context():
+            try:
+                deleted_count = self.get_document_service().cleanup_expired_trash(
+                    days=self.retention_days, max_chunks=max_chunks, progress=self.print_progress
+                )
+            except Exception as e:
+                print(f"  ✗ Cleanup interrupted: {str(e)}")
+                return 0, 1
+        
+        if deleted_count:
+            print(f"✓ Permanently deleted {deleted_count} document(s)")
+        else:
+            print("✓ No expired documents found in trash")
+        print()
         
-        return deleted_count, failed_count
+        return deleted_count, 0
 
 
 def main():
@@ -121,8 +106,10 @@ def main():
     print("=" * 60)
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
-    # Check for dry-run flag
+    # Check for flags
     dry_run = '--dry-run' in sys.argv
+    # --max-chunks=N stops after N chunks; the next run resumes from the checkpoint
+    max_chunks = next((int(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--max-chunks=')), None)
     if dry_run:
         print("*** DRY RUN MODE - No changes will be made ***\n")
     
@@ -130,7 +117,7 @@ def main():
     app = create_app(os.getenv('FLASK_ENV', 'production'))
     
     cleanup = TrashCleanup(app)
-    result = cleanup.cleanup(dry_run=dry_run)
+    result = cleanup.cleanup(dry_run=dry_run, max_chunks=max_chunks)
     
     if isinstance(result, tuple):
         deleted_count, failed_count = result
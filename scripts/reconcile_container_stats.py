@@ -0,0 +1,71 @@
+"""
+Reconciliation script for category and folder statistics
+Recounts the active documents of every category and folder and corrects
+the maintained counters that drifted
+"""
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.services.container_stats_service import ContainerStatsService
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class ContainerStatsReconciliation:
+    """Handle reconciliation of the category and folder counters"""
+    
+    def __init__(self, app, dry_run=False):
+        self.app = app
+        self.dry_run = dry_run
+    
+    def run(self):
+        """Execute reconciliation process"""
+        print("Recounting documents of categories and folders...")
+        if self.dry_run:
+            print("DRY RUN MODE - No counters will be changed")
+        
+        with self.app.app_context():
+            metrics = ContainerStatsService().reconcile(dry_run=self.dry_run)
+        
+        for tabela in ('categorias', 'pastas'):
+            print(f"{tabela}: {metrics[tabela]['verificadas']} checked, {metrics[tabela]['corrigidas']} drifted")
+        print(f"Duration: {metrics['duration_ms']} ms")
+        
+        return metrics['categorias']['corrigidas'] + metrics['pastas']['corrigidas']
+
+
+def main():
+    """Main reconciliation execution"""
+    print("=" * 60)
+    print("SGDI - Category and Folder Statistics Reconciliation")
+    print("=" * 60)
+    print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
+    dry_run = '--dry-run' in sys.argv
+    
+    # Create Flask app context
+    app = create_app(os.getenv('FLASK_ENV', 'production'))
+    
+    reconciliation = ContainerStatsReconciliation(app, dry_run=dry_run)
+    drifted = reconciliation.run()
+    
+    print("=" * 60)
+    print("Reconciliation Summary")
+    print("=" * 60)
+    print(f"Counters {'to correct' if dry_run else 'corrected'}: {drifted}")
+    print("=" * 60)
+    print(f"Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
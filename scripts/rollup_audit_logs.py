@@ -0,0 +1,71 @@
+"""
+Rollup script for audit log statistics
+Adds the hours closed since the last run to the hourly and daily audit
+rollups read by statistics and dashboards
+"""
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.services.audit_rollup_service import AuditRollupService
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class AuditRollup:
+    """Handle catch-up of the audit rollups"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def run(self, max_hours=None):
+        """Execute rollup process"""
+        print("Rolling up closed hours of audit logs...")
+        
+        with self.app.app_context():
+            metrics = AuditRollupService().catch_up(max_hours=max_hours)
+        
+        print(f"Hours rolled up: {metrics['horas']}")
+        print(f"Days rebuilt: {metrics['dias']}")
+        print(f"Late entries added: {metrics['atrasadas']}")
+        print(f"Duration: {metrics['duration_ms']} ms")
+        print(f"✓ Rollups complete up to {metrics['hora_fechada']:%Y-%m-%d %H:%M}")
+        
+        return metrics['horas']
+
+
+def main():
+    """Main rollup execution"""
+    print("=" * 60)
+    print("SGDI - Audit Log Rollup")
+    print("=" * 60)
+    print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
+    # --all ignores AUDIT_ROLLUP_MAX_HOURS and catches up in one run
+    max_hours = 0 if '--all' in sys.argv else None
+    
+    # Create Flask app context
+    app = create_app(os.getenv('FLASK_ENV', 'production'))
+    
+    rollup = AuditRollup(app)
+    hours = rollup.run(max_hours=max_hours)
+    
+    print("=" * 60)
+    print("Rollup Summary")
+    print("=" * 60)
+    print(f"Hours rolled up: {hours}")
+    print("=" * 60)
+    print(f"Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
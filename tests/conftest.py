@@ -38,6 +38,14 @@ def db_session(app):
         yield db
         db.session.remove()
         db.drop_all()
+        # Database IDs restart on every test; drop cached permission decisions,
+        # the cached category tree and the compiled workflow definitions
+        from app.utils.permission_cache import permission_cache
+        from app.utils.category_tree import category_tree
+        from app.utils.workflow_definitions import workflow_definitions
+        permission_cache.clear()
+        category_tree.clear()
+        workflow_definitions.clear()
 
 
 @pytest.fixture(scope='function')
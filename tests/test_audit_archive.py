@@ -0,0 +1,170 @@
+"""
+Tests for monthly audit log archiving and archive-aware queries
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, date
+import pytest
+from app.models.audit import LogAuditoria, ArquivoAuditoria
+from app.repositories.audit_repository import AuditRepository
+from app.services.audit_archive_service import AuditArchiveService
+
+
+@pytest.fixture
+def archive_dir(app, tmp_path, monkeypatch):
+    """Point AUDIT_ARCHIVE_DIR at a temporary directory"""
+    monkeypatch.setitem(app.config, 'AUDIT_ARCHIVE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _log(usuario_id, acao, data_hora, **kwargs):
+    return LogAuditoria(usuario_id=usuario_id, acao=acao, data_hora=data_hora, **kwargs)
+
+
+@pytest.fixture
+def audit_history(db_session, test_user, admin_user):
+    """Logs in January 2020 (archivable) and in the current month (live)"""
+    now = datetime.utcnow()
+    logs = [
+        _log(test_user.id, 'login_success', datetime(2020, 1, 5, 10)),
+        _log(test_user.id, 'document_download', datetime(2020, 1, 10, 9), tabela='documentos', registro_id=7),
+        _log(admin_user.id, 'login_success', datetime(2020, 1, 20, 8)),
+        _log(admin_user.id, 'login_success', now),
+        _log(test_user.id, 'document_download', now, tabela='documentos', registro_id=7),
+    ]
+    db_session.session.add_all(logs)
+    db_session.session.commit()
+    return logs
+
+
+class TestAuditArchive:
+    """Test archiving closed months and reading them back"""
+    
+    def test_archive_month_moves_rows_to_file(self, archive_dir, audit_history):
+        """A closed month is written newest first, cataloged and removed from the live table"""
+        service = AuditArchiveService()
+        assert service.get_archivable_months() == [date(2020, 1, 1)]
+        
+        results = service.archive_closed_months()
+        
+        assert results[0]['registros'] == 3
+        assert results[0]['removidos'] == 3
+        assert not results[0]['nativo']
+        assert LogAuditoria.query.count() == 2
+        
+        arquivo = ArquivoAuditoria.query.one()
+        path = os.path.join(archive_dir, arquivo.caminho)
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            rows = [json.loads(line) for line in archive]
+        assert [row['data_hora'][:10] for row in rows] == ['2020-01-20', '2020-01-10', '2020-01-05']
+        with open(path, 'rb') as handle:
+            assert hashlib.sha256(handle.read()).hexdigest() == arquivo.hash_arquivo
+        assert arquivo.data_inicio == datetime(2020, 1, 5, 10)
+        assert arquivo.data_fim == datetime(2020, 1, 20, 8)
+    
+    def test_late_entries_go_to_a_new_part(self, db_session, archive_dir, audit_history, test_user):
+        """Entries arriving for an archived month are archived to a second file"""
+        service = AuditArchiveService()
+        service.archive_closed_months()
+        db_session.session.add(_log(test_user.id, 'document_view', datetime(2020, 1, 25)))
+        db_session.session.commit()
+        
+        results = service.archive_closed_months()
+        
+        assert results[0]['caminho'] == 'log_auditoria_2020_01_2.jsonl.gz'
+        assert ArquivoAuditoria.query.count() == 2
+    
+    def test_interrupted_delete_is_finished_without_new_part(self, archive_dir, audit_history):
+        """Rows an earlier run archived but did not delete are removed, not archived again"""
+        service = AuditArchiveService()
+        service._export_month(date(2020, 1, 1))
+        
+        results = service.archive_closed_months()
+        
+        assert results[0]['removidos'] == 3
+        assert results[0]['caminho'] is None
+        assert ArquivoAuditoria.query.count() == 1
+        assert LogAuditoria.query.count() == 2
+    
+    def test_filter_logs_pages_across_live_and_archive(self, archive_dir, audit_history, test_user):
+        """Ranges reaching archived months include archived entries after the live ones"""
+        AuditArchiveService().archive_closed_months()
+        repository = AuditRepository()
+        
+        first = repository.filter_logs(data_inicio=datetime(2019, 12, 1), per_page=2)
+        assert first['total'] == 5
+        assert first['pages'] == 3
+        assert all(not getattr(item, 'arquivado', False) for item in first['items'])
+        
+        second = repository.filter_logs(data_inicio=datetime(2019, 12, 1), page=2, per_page=2)
+        assert [item.data_hora for item in second['items']] == [datetime(2020, 1, 20, 8), datetime(2020, 1, 10, 9)]
+        
+        filtered = repository.filter_logs(
+            usuario_id=test_user.id, data_inicio=datetime(2020, 1, 6), data_fim=datetime(2020, 1, 31)
+        )
+        assert filtered['total'] == 1
+        archived = filtered['items'][0]
+        assert archived.acao == 'document_download'
+        assert archived.usuario.id == test_user.id
+    
+    def test_queries_without_start_date_stay_live(self, archive_dir, audit_history):
+        """Archives are only read when the date range reaches them"""
+        AuditArchiveService().archive_closed_months()
+        
+        assert AuditRepository().filter_logs()['total'] == 2
+    
+    def test_statistics_include_archived_months(self, archive_dir, audit_history, test_user):
+        """Action and user statistics merge live and archived counts"""
+        AuditArchiveService().archive_closed_months()
+        repository = AuditRepository()
+        data_inicio = datetime(2020, 1, 1)
+        
+        actions = {s['acao']: s['count'] for s in repository.get_action_statistics(data_inicio)}
+        assert actions == {'login_success': 3, 'document_download': 2}
+        users = {s['usuario_id']: s['count'] for s in repository.get_user_activity_statistics(data_inicio)}
+        assert users[test_user.id] == 3
+    
+    def test_export_merges_archives_in_order(self, archive_dir, audit_history):
+        """Exports reaching archived months stream them after live rows and resume inside them"""
+        AuditArchiveService().archive_closed_months()
+        repository = AuditRepository()
+        
+        rows = list(repository.iter_export(data_inicio=datetime(2020, 1, 1)))
+        assert len(rows) == 5
+        assert [row['data_hora'] for row in rows[2:]] == [
+            datetime(2020, 1, 20, 8), datetime(2020, 1, 10, 9), datetime(2020, 1, 5, 10)
+        ]
+        
+        resumed = list(repository.iter_export(
+            data_inicio=datetime(2020, 1, 1), antes_de=rows[2]['data_hora'], antes_id=rows[2]['id']
+        ))
+        assert resumed == rows[3:]
+    
+    def test_deep_pages_only_open_the_archive_they_fall_in(self, db_session, archive_dir, audit_history,
+                                                           test_user, monkeypatch):
+        """Unfiltered pages count whole archives from the catalog instead of reading them"""
+        db_session.session.add_all([
+            _log(test_user.id, 'document_view', datetime(2020, mes, dia))
+            for mes in (2, 3) for dia in (3, 2, 1)
+        ])
+        db_session.session.commit()
+        AuditArchiveService().archive_closed_months()
+        assert ArquivoAuditoria.query.count() == 3
+        
+        import app.repositories.audit_archive_repository as archive_module
+        opened = []
+        real_open = archive_module.gzip.open
+        monkeypatch.setattr(archive_module.gzip, 'open',
+                            lambda path, *args, **kwargs: opened.append(os.path.basename(path))
+                            or real_open(path, *args, **kwargs))
+        
+        page = AuditRepository().filter_logs(data_inicio=datetime(2019, 12, 1), page=4, per_page=2)
+        
+        assert page['total'] == 11
+        assert [item.data_hora for item in page['items']] == [datetime(2020, 2, 2), datetime(2020, 2, 1)]
+        assert opened == ['log_auditoria_2020_02.jsonl.gz']
+        
+        page = AuditRepository().filter_logs(data_inicio=datetime(2019, 12, 1), page=5, per_page=2)
+        assert [item.data_hora for item in page['items']] == [datetime(2020, 1, 20, 8), datetime(2020, 1, 10, 9)]
@@ -0,0 +1,98 @@
+"""
+Tests for keyset-paginated audit log browsing
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.audit import LogAuditoria
+from app.repositories.audit_repository import AuditRepository, keyset_index
+from app.services.audit_archive_service import AuditArchiveService
+
+
+@pytest.fixture
+def browse_history(db_session, test_user, admin_user):
+    """Seven logs, several sharing a timestamp, from two users and IPs"""
+    base = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    logs = [
+        LogAuditoria(
+            usuario_id=test_user.id if i % 2 else admin_user.id,
+            acao='download' if i % 3 else 'view',
+            tabela='documentos',
+            registro_id=i,
+            ip_address='10.0.0.1' if i < 4 else '10.0.0.2',
+            data_hora=base + timedelta(minutes=i // 2)
+        )
+        for i in range(7)
+    ]
+    db_session.session.add_all(logs)
+    db_session.session.commit()
+    return logs
+
+
+def _scroll_all(repository, **kwargs):
+    """Follow next_cursor until the last page"""
+    items = []
+    page = repository.scroll_logs(**kwargs)
+    items.extend(page['items'])
+    while page['has_more']:
+        page = repository.scroll_logs(**kwargs, **page['next_cursor'])
+        items.extend(page['items'])
+    return items
+
+
+class TestAuditBrowse:
+    """Test keyset scrolling over live and archived logs"""
+    
+    def test_index_follows_most_selective_filter(self):
+        """The index of the most selective equality filter is used"""
+        assert keyset_index({}) == 'ix_log_auditoria_data_hora'
+        assert keyset_index({'acao': 'view', 'tabela': 'documentos'}) == 'idx_audit_acao_data'
+        assert keyset_index({'acao': 'view', 'ip_address': '10.0.0.1'}) == 'idx_audit_ip_data'
+        assert keyset_index({'ip_address': '10.0.0.1', 'usuario_id': 3}) == 'idx_audit_usuario_data'
+    
+    def test_scroll_visits_every_row_once(self, browse_history, test_user):
+        """Pages split inside equal timestamps without gaps or repeats"""
+        repository = AuditRepository()
+        expected = sorted(browse_history, key=lambda log: (log.data_hora, log.id), reverse=True)
+        
+        items = _scroll_all(repository, limit=2)
+        assert [item.id for item in items] == [log.id for log in expected]
+        
+        filtered = _scroll_all(repository, usuario_id=test_user.id, ip_address='10.0.0.1', limit=1)
+        assert [item.registro_id for item in filtered] == [3, 1]
+        
+        last = repository.scroll_logs(limit=len(browse_history))
+        assert not last['has_more']
+        assert last['next_cursor'] is None
+    
+    def test_scroll_continues_into_archived_months(self, app, db_session, tmp_path, monkeypatch, test_user):
+        """Ranges reaching archived months continue into the archives"""
+        monkeypatch.setitem(app.config, 'AUDIT_ARCHIVE_DIR', str(tmp_path))
+        db_session.session.add_all([
+            LogAuditoria(usuario_id=test_user.id, acao='view', data_hora=datetime(2020, 1, day, 10))
+            for day in (5, 10, 20)
+        ] + [LogAuditoria(usuario_id=test_user.id, acao='view', data_hora=datetime.utcnow())])
+        db_session.session.commit()
+        AuditArchiveService().archive_closed_months()
+        
+        items = _scroll_all(AuditRepository(), acao='view', data_inicio=datetime(2019, 12, 1), limit=2)
+        
+        assert [item.data_hora.date() for item in items[1:]] == [
+            datetime(2020, 1, day).date() for day in (20, 10, 5)
+        ]
+        assert all(getattr(item, 'arquivado', False) for item in items[1:])
+    
+    def test_scroll_endpoint_returns_next_cursor(self, admin_client, browse_history):
+        """The JSON endpoint pages with the cursor it returns"""
+        first = admin_client.get('/admin/audit/logs/scroll?limit=4').get_json()
+        assert len(first['logs']) == 4
+        assert first['has_more']
+        
+        cursor = first['next_cursor']
+        second = admin_client.get(
+            f"/admin/audit/logs/scroll?limit=4&antes_de={cursor['antes_de']}&antes_id={cursor['antes_id']}"
+        ).get_json()
+        ids = [log['id'] for log in first['logs'] + second['logs']]
+        assert len(set(ids)) == len(ids) >= len(browse_history)
+        
+        response = admin_client.get('/admin/audit/logs/scroll?antes_de=ontem')
+        assert response.status_code == 400
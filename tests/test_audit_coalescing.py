@@ -0,0 +1,129 @@
+"""
+Tests for coalescing of repeated view/download audit events
+"""
+import importlib
+from datetime import datetime, timedelta
+import pytest
+from app.models.audit import LogAuditoria, ResumoAuditoriaHora
+from app.repositories.audit_repository import AuditRepository
+from app.services.audit_rollup_service import AuditRollupService
+from app.services.audit_service import AuditService
+from app.utils.audit_coalescer import audit_coalescer
+
+# app.utils re-exports the instance under the module's name
+coalescer_module = importlib.import_module('app.utils.audit_coalescer')
+
+
+@pytest.fixture
+def coalescer(db_session, monkeypatch):
+    """Enable the global coalescer for one test, sweeping only when asked"""
+    monkeypatch.setattr(coalescer_module, 'SWEEP_INTERVAL_SECONDS', float('inf'))
+    monkeypatch.setattr(audit_coalescer, 'enabled', True)
+    monkeypatch.setattr(audit_coalescer, 'window_seconds', 60)
+    monkeypatch.setattr(audit_coalescer, 'max_span_seconds', 300)
+    monkeypatch.setattr(audit_coalescer, 'actions', frozenset({'view', 'download', 'login_failed'}))
+    yield audit_coalescer
+    audit_coalescer._open.clear()
+    audit_coalescer._closed.clear()
+
+
+def _view(db_session, coalescer, usuario_id, data_hora, ip_address='10.0.0.1'):
+    """Log a view at a given time the way LogAuditoria.log does"""
+    entry = LogAuditoria(
+        usuario_id=usuario_id, acao='view', tabela='documentos', registro_id=7,
+        ip_address=ip_address, data_hora=data_hora
+    )
+    if not coalescer.submit(entry.to_row()):
+        db_session.session.add(entry)
+        db_session.session.commit()
+
+
+class TestAuditCoalescing:
+    """Test folding of repeated events into one row"""
+    
+    def test_repeated_views_share_one_row(self, app, coalescer, test_user):
+        """Repeats are counted on the first row once the burst ends"""
+        with app.test_request_context():
+            for _ in range(5):
+                AuditService().log_document_view(test_user.id, 7, 'contrato.pdf')
+        
+        assert LogAuditoria.query.count() == 1
+        assert coalescer.sweep(now=datetime.utcnow() + timedelta(minutes=2)) == 1
+        
+        row = LogAuditoria.query.one()
+        assert row.acao == 'view'
+        assert row.ocorrencias == 5
+        assert row.data_hora_fim >= row.data_hora
+    
+    def test_security_actions_are_never_coalesced(self, app, coalescer):
+        """Actions written synchronously keep one row each, even when listed"""
+        with app.test_request_context():
+            for _ in range(3):
+                AuditService().log_login(None, success=False, email='x@example.com', reason='bad password')
+        
+        assert LogAuditoria.query.filter_by(acao='login_failed').count() == 3
+        assert not coalescer.stats()['open']
+    
+    def test_window_and_key_start_new_rows(self, db_session, coalescer, test_user):
+        """A gap longer than the window or another IP opens a new row"""
+        inicio = datetime(2026, 3, 1, 9, 0)
+        for segundos in (0, 30, 80):
+            _view(db_session, coalescer, test_user.id, inicio + timedelta(seconds=segundos))
+        _view(db_session, coalescer, test_user.id, inicio + timedelta(seconds=200))
+        _view(db_session, coalescer, test_user.id, inicio + timedelta(seconds=210), ip_address='10.0.0.2')
+        
+        coalescer.sweep(now=inicio + timedelta(hours=1))
+        
+        rows = [(row.data_hora, row.ocorrencias, row.data_hora_fim) for row in LogAuditoria.query.order_by(LogAuditoria.id)]
+        assert rows == [
+            (inicio, 3, inicio + timedelta(seconds=80)),
+            (inicio + timedelta(seconds=200), 1, None),
+            (inicio + timedelta(seconds=210), 1, None)
+        ]
+    
+    def test_statistics_count_occurrences(self, db_session, coalescer, test_user):
+        """Raw counts and rollups sum the occurrences of coalesced rows"""
+        inicio = datetime(2026, 3, 1, 9, 0)
+        for segundos in range(0, 240, 20):
+            _view(db_session, coalescer, test_user.id, inicio + timedelta(seconds=segundos))
+        coalescer.sweep(now=inicio + timedelta(hours=1))
+        assert LogAuditoria.query.count() == 1
+        
+        counts = AuditRepository().count_activity(('acao',), datetime(2026, 2, 1))
+        assert counts == {('view',): 12}
+        
+        AuditRollupService().catch_up(max_hours=0)
+        hourly = ResumoAuditoriaHora.query.filter_by(periodo=inicio, acao='view').one()
+        assert hourly.total == 12
+    
+    def test_span_is_clamped_below_the_rollup_lag(self):
+        """Counts must be written before the rollups close the hour"""
+        from types import SimpleNamespace
+        config = {
+            'AUDIT_COALESCE_WINDOW_SECONDS': 60,
+            'AUDIT_COALESCE_MAX_SPAN_SECONDS': 3600,
+            'AUDIT_ROLLUP_LAG_MINUTES': 10
+        }
+        instance = coalescer_module.AuditCoalescer()
+        instance.init_app(SimpleNamespace(config=config))
+        assert instance.enabled
+        assert instance.max_span_seconds == 600 - coalescer_module.ROLLUP_MARGIN_SECONDS
+        
+        config['AUDIT_ROLLUP_LAG_MINUTES'] = 1
+        instance = coalescer_module.AuditCoalescer()
+        instance.init_app(SimpleNamespace(config=config))
+        assert not instance.enabled
+    
+    def test_sweep_leaves_the_callers_session_alone(self, db_session, coalescer, test_user):
+        """Counts are written on their own connection, not committed with pending work"""
+        from app.models.document import Categoria
+        inicio = datetime(2026, 3, 1, 9, 0)
+        for segundos in (0, 10):
+            _view(db_session, coalescer, test_user.id, inicio + timedelta(seconds=segundos))
+        
+        db_session.session.add(Categoria(nome='Pendente'))
+        assert coalescer.sweep(now=inicio + timedelta(hours=1)) == 1
+        db_session.session.rollback()
+        
+        assert Categoria.query.filter_by(nome='Pendente').count() == 0
+        assert LogAuditoria.query.one().ocorrencias == 2
@@ -0,0 +1,75 @@
+"""
+Tests for the streaming audit log export
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+from app.models.audit import LogAuditoria
+from app.services.audit_service import AuditService
+
+
+@pytest.fixture
+def audit_logs(db_session, test_user):
+    """Five logs one minute apart, the last one with extra data"""
+    base = datetime(2026, 3, 1, 12)
+    logs = [
+        LogAuditoria(usuario_id=test_user.id, acao='document_view', data_hora=base + timedelta(minutes=i))
+        for i in range(5)
+    ]
+    logs[-1].dados = {'nome': 'relatório.pdf'}
+    db_session.session.add_all(logs)
+    db_session.session.commit()
+    return logs
+
+
+class TestAuditExport:
+    """Test streamed CSV/JSONL/JSON exports"""
+    
+    def test_stream_yields_chunks_newest_first(self, app, audit_logs):
+        """Rows stream newest first in small chunks"""
+        with app.test_request_context():
+            chunks = list(AuditService().stream_export('jsonl', batch_size=2, chunk_size=1))
+        
+        assert len(chunks) == 5
+        rows = [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+        assert [row['id'] for row in rows] == [log.id for log in reversed(audit_logs)]
+        assert rows[0]['dados'] == {'nome': 'relatório.pdf'}
+    
+    def test_resume_after_last_row(self, app, audit_logs):
+        """antes_de/antes_id continue right after the last row received"""
+        last = audit_logs[3]
+        with app.test_request_context():
+            data = b''.join(AuditService().stream_export(
+                'jsonl', antes_de=last.data_hora, antes_id=last.id
+            ))
+        
+        rows = [json.loads(line) for line in data.decode('utf-8').splitlines()]
+        assert [row['id'] for row in rows] == [audit_logs[2].id, audit_logs[1].id, audit_logs[0].id]
+    
+    def test_gzip_csv_route(self, admin_client, audit_logs):
+        """The export route streams a gzip-compressed CSV download"""
+        response = admin_client.get('/admin/audit/export?format=csv&gzip=true&acao=document_view')
+        
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == 'application/gzip'
+        assert '.csv.gz' in response.headers['Content-Disposition']
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode('utf-8'))))
+        assert len(rows) == 5
+        assert json.loads(rows[0]['dados']) == {'nome': 'relatório.pdf'}
+    
+    def test_json_route_stays_valid_json(self, admin_client, audit_logs):
+        """The default JSON format streams a valid array"""
+        response = admin_client.get('/admin/audit/export')
+        
+        assert response.status_code == 200
+        assert len(json.loads(response.data)) == 5
+    
+    def test_invalid_format(self, admin_client, audit_logs):
+        """Unknown formats are rejected before streaming"""
+        response = admin_client.get('/admin/audit/export?format=xml')
+        
+        assert response.status_code == 400
@@ -0,0 +1,117 @@
+"""
+Tests for the hourly and daily audit rollups
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.audit import LogAuditoria, ResumoAuditoriaHora, ResumoAuditoriaDia
+from app.repositories.audit_repository import AuditRepository
+from app.repositories.audit_rollup_repository import AuditRollupRepository
+from app.services.admin_service import AdminService
+from app.services.audit_rollup_service import AuditRollupService, floor_hour
+
+
+def _log(usuario_id, acao, data_hora, **kwargs):
+    return LogAuditoria(usuario_id=usuario_id, acao=acao, data_hora=data_hora, **kwargs)
+
+
+@pytest.fixture
+def closed_hours(db_session, test_user, admin_user):
+    """Logs over two closed days and one in the current (open) hour"""
+    logs = [
+        _log(test_user.id, 'login_success', datetime(2026, 3, 1, 9, 15)),
+        _log(test_user.id, 'login_success', datetime(2026, 3, 1, 9, 45)),
+        _log(test_user.id, 'document_download', datetime(2026, 3, 1, 17, 5), tabela='documentos', registro_id=1),
+        _log(admin_user.id, 'login_success', datetime(2026, 3, 2, 8, 30)),
+        _log(None, 'login_failed', datetime(2026, 3, 2, 23, 59)),
+        _log(admin_user.id, 'login_success', datetime.utcnow()),
+    ]
+    db_session.session.add_all(logs)
+    db_session.session.commit()
+    return logs
+
+
+def _delete_closed(db_session):
+    """Remove the raw rows the rollups already cover"""
+    marcador = AuditRollupRepository().get_marcador()
+    LogAuditoria.query.filter(LogAuditoria.data_hora < marcador.hora_fechada).delete()
+    db_session.session.commit()
+
+
+class TestAuditRollup:
+    """Test rollup catch-up and rollup-backed statistics"""
+    
+    def test_catch_up_builds_hourly_and_daily_rows(self, app, closed_hours):
+        """Closed hours are grouped per hour and per day and the watermark advances"""
+        result = AuditRollupService().catch_up(max_hours=0)
+        
+        assert result['horas'] == 4
+        assert result['dias'] == 2
+        marcador = AuditRollupRepository().get_marcador()
+        assert marcador.inicio == datetime(2026, 3, 1, 9)
+        assert marcador.hora_fechada == floor_hour(datetime.utcnow() - timedelta(minutes=10))
+        
+        hourly = ResumoAuditoriaHora.query.filter_by(periodo=datetime(2026, 3, 1, 9)).one()
+        assert (hourly.acao, hourly.total) == ('login_success', 2)
+        daily = {(row.acao, row.usuario_id): row.total for row in ResumoAuditoriaDia.query.filter_by(
+            periodo=datetime(2026, 3, 2)
+        )}
+        assert daily == {('login_success', closed_hours[3].usuario_id): 1, ('login_failed', None): 1}
+        
+        # A second run has nothing left to do
+        assert AuditRollupService().catch_up(max_hours=0)['horas'] == 0
+    
+    def test_statistics_read_rollups_and_open_hours(self, db_session, closed_hours, test_user, admin_user):
+        """Closed hours come from the rollups, the open hour from raw rows"""
+        AuditRollupService().catch_up()
+        _delete_closed(db_session)
+        repository = AuditRepository()
+        data_inicio = datetime(2026, 2, 1)
+        
+        actions = {s['acao']: s['count'] for s in repository.get_action_statistics(data_inicio)}
+        assert actions == {'login_success': 4, 'document_download': 1, 'login_failed': 1}
+        users = {s['usuario_id']: s['count'] for s in repository.get_user_activity_statistics(data_inicio)}
+        assert users == {test_user.id: 3, admin_user.id: 2}
+        
+        # Partial hours at the edges of the range are counted from raw rows
+        partial = repository.count_activity(('acao',), datetime(2026, 3, 1, 9, 30), datetime(2026, 3, 2, 9))
+        assert partial == {('login_success',): 1, ('document_download',): 1}
+        
+        daily = repository.get_daily_activity(days=30)
+        assert daily[-1] == {'date': datetime.utcnow().date().isoformat(), 'count': 1}
+    
+    def test_late_entries_are_added(self, db_session, closed_hours, test_user):
+        """Entries written after their hour closed are added to the rollups"""
+        AuditRollupService().catch_up()
+        db_session.session.add(_log(test_user.id, 'login_success', datetime(2026, 3, 1, 9, 50)))
+        db_session.session.add(_log(test_user.id, 'document_view', datetime(2026, 3, 1, 9, 55)))
+        db_session.session.commit()
+        
+        result = AuditRollupService().catch_up()
+        
+        assert result['atrasadas'] == 2
+        counts = AuditRollupRepository().count(True, ('acao',), datetime(2026, 3, 1), datetime(2026, 3, 2))
+        assert counts == {('login_success',): 3, ('document_view',): 1, ('document_download',): 1}
+    
+    def test_max_hours_resumes_on_next_run(self, app, closed_hours):
+        """A bounded run stops early and the next one continues from the watermark"""
+        first = AuditRollupService().catch_up(max_hours=24)
+        
+        assert first['hora_fechada'] == datetime(2026, 3, 2, 9)
+        assert first['horas'] == 3
+        assert AuditRollupService().catch_up(max_hours=0)['horas'] == 1
+        counts = AuditRollupRepository().count(False, (), datetime(2026, 3, 1), datetime(2026, 3, 3))
+        assert counts == {(): 5}
+    
+    def test_dashboard_logins_use_rollups(self, db_session, admin_user):
+        """Recent login counts include rolled up hours"""
+        now = datetime.utcnow()
+        db_session.session.add_all([
+            _log(admin_user.id, 'login_success', now - timedelta(hours=3)),
+            _log(admin_user.id, 'login_success', now),
+            _log(admin_user.id, 'login_success', now - timedelta(hours=30)),
+        ])
+        db_session.session.commit()
+        AuditRollupService().catch_up()
+        _delete_closed(db_session)
+        
+        assert AdminService()._get_recent_logins_count(hours=24) == 2
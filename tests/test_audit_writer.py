@@ -0,0 +1,124 @@
+"""
+Tests for the asynchronous audit writer
+"""
+import json
+import os
+import time
+from datetime import datetime
+import pytest
+from app.models.audit import LogAuditoria
+from app.services.audit_service import AuditService
+from app.utils.audit_writer import AuditWriter, audit_writer
+
+
+def _entry(acao='view', registro_id=1):
+    return {
+        'usuario_id': None,
+        'acao': acao,
+        'tabela': 'documentos',
+        'registro_id': registro_id,
+        'dados_json': None,
+        'ip_address': None,
+        'user_agent': None,
+        'data_hora': datetime.utcnow()
+    }
+
+
+@pytest.fixture
+def writer(app, db_session, tmp_path):
+    """Enabled writer without the background thread"""
+    writer = AuditWriter(queue_size=3, batch_size=2, journal_dir=str(tmp_path))
+    writer.app = app
+    writer.enabled = True
+    return writer
+
+
+class TestAuditWriter:
+    """Test queueing, batching, journaling and recovery"""
+    
+    def test_entries_are_written_on_flush(self, writer, tmp_path):
+        """Queued entries reach the database in batches and the journal is removed"""
+        for i in range(3):
+            assert writer.submit(_entry(registro_id=i))
+        assert LogAuditoria.query.count() == 0
+        assert len(os.listdir(tmp_path)) == 1
+        
+        assert writer.flush() == 3
+        
+        assert LogAuditoria.query.count() == 3
+        assert writer.stats()['batches'] == 2
+        assert os.listdir(tmp_path) == []
+    
+    def test_security_actions_are_synchronous(self, writer):
+        """Security-critical actions are refused so the caller commits them inline"""
+        assert not writer.submit(_entry(acao='login_failed'))
+        assert not writer.submit(_entry(acao='user_create'))
+        assert writer.stats()['pending'] == 0
+    
+    def test_full_queue_falls_back(self, writer):
+        """A full queue applies backpressure by refusing entries"""
+        for i in range(3):
+            assert writer.submit(_entry(registro_id=i))
+        assert not writer.submit(_entry(registro_id=4))
+        assert writer.stats()['sync_fallbacks'] == 1
+    
+    def test_failed_flush_keeps_journal(self, writer, tmp_path, monkeypatch):
+        """Entries survive a failed insert and are written on the next flush"""
+        writer.submit(_entry())
+        
+        def fail(rows):
+            raise RuntimeError('database unavailable')
+        
+        monkeypatch.setattr(writer, '_insert', fail)
+        assert writer.flush() == 0
+        assert len(os.listdir(tmp_path)) == 1
+        
+        monkeypatch.undo()
+        assert writer.flush() == 1
+        assert LogAuditoria.query.count() == 1
+        assert os.listdir(tmp_path) == []
+    
+    def test_recover_journal_of_dead_process(self, writer, tmp_path):
+        """Journals left by a stopped process are replayed"""
+        journal = tmp_path / 'audit_journal_999999.jsonl'
+        rows = [dict(_entry(registro_id=i), data_hora=datetime.utcnow().isoformat()) for i in range(2)]
+        journal.write_text(''.join(json.dumps(row) + '\n' for row in rows) + '{"torn')
+        old = time.time() - 3600
+        os.utime(journal, (old, old))
+        
+        assert writer.recover() == 2
+        assert LogAuditoria.query.count() == 2
+        assert os.listdir(tmp_path) == []
+    
+    def test_running_process_keeps_its_journals(self, writer, tmp_path):
+        """Stale journals of a live process are left to it, so no batch is inserted twice"""
+        journal = tmp_path / f'audit_journal_{os.getppid()}_0000000001.pending'
+        journal.write_text(json.dumps(dict(_entry(), data_hora=datetime.utcnow().isoformat())) + '\n')
+        old = time.time() - 3600
+        os.utime(journal, (old, old))
+        
+        assert writer.recover() == 0
+        assert journal.exists()
+        assert LogAuditoria.query.count() == 0
+    
+    def test_flush_skips_journals_claimed_meanwhile(self, writer, tmp_path, monkeypatch):
+        """A pending journal renamed by another process after the listing is skipped"""
+        claimed = str(tmp_path / f'audit_journal_{os.getpid()}_0000000001.pending')
+        monkeypatch.setattr(writer, '_own_pending_files', lambda: [claimed])
+        
+        assert writer.flush() == 0
+        assert writer.stats()['flush_failures'] == 0
+    
+    def test_log_action_uses_writer(self, db_session, tmp_path, monkeypatch):
+        """AuditService queues regular actions and commits security actions inline"""
+        monkeypatch.setattr(audit_writer, 'enabled', True)
+        monkeypatch.setattr(audit_writer, 'journal_dir', str(tmp_path))
+        service = AuditService()
+        
+        service.log_action(usuario_id=None, acao='view', tabela='documentos', registro_id=1)
+        service.log_login(usuario_id=None, success=False, email='x@example.com')
+        
+        assert LogAuditoria.query.filter_by(acao='view').count() == 0
+        assert LogAuditoria.query.filter_by(acao='login_failed').count() == 1
+        assert audit_writer.flush() == 1
+        assert LogAuditoria.query.filter_by(acao='view').count() == 1
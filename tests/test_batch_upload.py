@@ -0,0 +1,98 @@
+"""
+Tests for the batch upload API
+"""
+import io
+from app.models.audit import LogAuditoria
+from app.models.document import Documento, DocumentoTag
+from app.models.version import Versao
+
+
+class TestBatchUpload:
+    """Test uploading many files with shared metadata"""
+    
+    def test_batch_upload_creates_all_rows(self, authenticated_client, test_category, db_session):
+        """Documents, tags, versions and audit entries are created for every file"""
+        data = {
+            'files': [
+                (io.BytesIO(b'Batch content one'), 'one.pdf'),
+                (io.BytesIO(b'Batch content two'), 'two.pdf'),
+                (io.BytesIO(b'Batch content three'), 'three.pdf')
+            ],
+            'descricao': 'Scanned batch',
+            'categoria_id': test_category.id,
+            'tags': 'scan,lote'
+        }
+        
+        response = authenticated_client.post(
+            '/documents/batch-upload',
+            data=data,
+            content_type='multipart/form-data'
+        )
+        
+        assert response.status_code == 200
+        payload = response.get_json()
+        assert payload['success'] is True
+        assert len(payload['uploaded']) == 3
+        
+        doc_ids = [doc['id'] for doc in payload['uploaded']]
+        session = db_session.session
+        documentos = session.query(Documento).filter(Documento.id.in_(doc_ids)).all()
+        assert {doc.descricao for doc in documentos} == {'Scanned batch'}
+        assert {doc.categoria_id for doc in documentos} == {test_category.id}
+        assert session.query(DocumentoTag).filter(DocumentoTag.documento_id.in_(doc_ids)).count() == 6
+        assert session.query(Versao).filter(Versao.documento_id.in_(doc_ids)).count() == 3
+        assert session.query(LogAuditoria).filter(
+            LogAuditoria.acao == 'upload',
+            LogAuditoria.registro_id.in_(doc_ids)
+        ).count() == 3
+    
+    def test_batch_upload_reports_duplicates(self, authenticated_client, db_session):
+        """Duplicates within the batch are rejected without failing the others"""
+        data = {
+            'files': [
+                (io.BytesIO(b'Same content'), 'first.pdf'),
+                (io.BytesIO(b'Same content'), 'second.pdf'),
+                (io.BytesIO(b'Other content'), 'third.pdf')
+            ]
+        }
+        
+        response = authenticated_client.post(
+            '/documents/batch-upload',
+            data=data,
+            content_type='multipart/form-data'
+        )
+        
+        assert response.status_code == 207
+        payload = response.get_json()
+        assert len(payload['uploaded']) == 2
+        assert [error['filename'] for error in payload['errors']] == ['second.pdf']
+    
+    def test_batch_upload_rejects_invalid_extension(self, authenticated_client, db_session):
+        """Files with disallowed extensions are reported as errors"""
+        data = {
+            'files': [
+                (io.BytesIO(b'Valid content'), 'valid.pdf'),
+                (io.BytesIO(b'#!/bin/sh'), 'script.sh')
+            ]
+        }
+        
+        response = authenticated_client.post(
+            '/documents/batch-upload',
+            data=data,
+            content_type='multipart/form-data'
+        )
+        
+        assert response.status_code == 207
+        payload = response.get_json()
+        assert [doc['nome'] for doc in payload['uploaded']] == ['valid.pdf']
+        assert payload['errors'][0]['filename'] == 'script.sh'
+    
+    def test_batch_upload_requires_files(self, authenticated_client, db_session):
+        """Request without files returns 400"""
+        response = authenticated_client.post(
+            '/documents/batch-upload',
+            data={},
+            content_type='multipart/form-data'
+        )
+        
+        assert response.status_code == 400
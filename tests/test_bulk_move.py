@@ -0,0 +1,150 @@
+"""
+Tests for moving and reclassifying documents in bulk
+"""
+import json
+import pytest
+from app.models.audit import LogAuditoria
+from app.models.document import Documento, Categoria, Pasta
+from app.models.permission import PermissaoCategoria, PermissaoEfetiva
+from app.services.container_stats_service import ContainerStatsService
+from app.services.document_service import DocumentService, DocumentServiceError
+from app.services.storage_service import StorageService
+from app.utils.file_handler import FileHandler
+
+
+def _documento(owner_id, nome, tamanho, **containers):
+    return Documento(
+        nome=nome,
+        caminho_arquivo=f'{owner_id}/{nome}',
+        nome_arquivo_original=nome,
+        tamanho_bytes=tamanho,
+        tipo_mime='application/pdf',
+        hash_arquivo=nome.ljust(64, '0'),
+        usuario_id=owner_id,
+        **containers
+    )
+
+
+def _counters(node):
+    """Reload and return (direct docs, direct bytes, subtree docs, subtree bytes)"""
+    node = type(node).query.get(node.id)
+    return node.total_documentos, node.total_bytes, node.total_documentos_subarvore, node.total_bytes_subarvore
+
+
+@pytest.fixture
+def service(app, db_session):
+    """Document service backed by the test upload folder"""
+    storage = StorageService(app.config['UPLOAD_FOLDER'])
+    handler = FileHandler(app.config['ALLOWED_EXTENSIONS'], app.config['MAX_CONTENT_LENGTH'])
+    return DocumentService(storage, handler)
+
+
+@pytest.fixture
+def library(db_session, test_user, admin_user):
+    """Documents of test_user in Origem/Antiga, plus one document of admin_user"""
+    origem = Categoria(nome='Origem')
+    destino = Categoria(nome='Destino')
+    antiga = Pasta(nome='Antiga', usuario_id=test_user.id)
+    nova = Pasta(nome='Nova', usuario_id=test_user.id)
+    db_session.session.add_all([origem, destino, antiga, nova])
+    db_session.session.flush()
+    documentos = [
+        _documento(test_user.id, 'relatorio-jan.pdf', 100, categoria_id=origem.id, pasta_id=antiga.id),
+        _documento(test_user.id, 'relatorio-fev.pdf', 50, categoria_id=origem.id, pasta_id=antiga.id),
+        _documento(test_user.id, 'contrato.pdf', 7, categoria_id=origem.id, pasta_id=antiga.id),
+        _documento(admin_user.id, 'alheio.pdf', 1, categoria_id=origem.id)
+    ]
+    db_session.session.add_all(documentos)
+    db_session.session.commit()
+    return origem, destino, antiga, nova, documentos
+
+
+class TestBulkMove:
+    """Test set-based moves with counters, permissions and audit"""
+    
+    def test_move_by_ids_updates_counters_and_grants(self, db_session, service, library, test_user, admin_user):
+        """Moved documents leave the old containers and inherit the new category grants"""
+        origem, destino, antiga, nova, documentos = library
+        db_session.session.add(PermissaoCategoria(
+            categoria_id=destino.id, usuario_id=admin_user.id, tipo_permissao='visualizar', concedido_por=test_user.id
+        ))
+        db_session.session.commit()
+        
+        result = service.bulk_move_documents(
+            test_user.id,
+            documento_ids=[documentos[0].id, documentos[1].id, documentos[0].id],
+            categoria_id=destino.id,
+            pasta_id=nova.id
+        )
+        
+        assert result == {'moved': 2, 'denied': [], 'not_found': []}
+        assert Documento.query.get(documentos[0].id).pasta_id == nova.id
+        assert _counters(origem) == (2, 8, 2, 8)
+        assert _counters(destino) == (2, 150, 2, 150)
+        assert _counters(antiga) == (1, 7, 1, 7)
+        assert _counters(nova) == (2, 150, 2, 150)
+        assert PermissaoEfetiva.query.filter_by(usuario_id=admin_user.id).count() == 2
+        
+        reconciled = ContainerStatsService().reconcile(dry_run=True)
+        assert reconciled['categorias']['corrigidas'] == 0
+        assert reconciled['pastas']['corrigidas'] == 0
+    
+    def test_skips_denied_and_unknown_documents(self, db_session, service, library, test_user):
+        """Documents the user cannot edit are reported, not moved"""
+        origem, destino, antiga, nova, documentos = library
+        
+        result = service.bulk_move_documents(
+            test_user.id,
+            documento_ids=[documentos[2].id, documentos[3].id, 999999],
+            pasta_id=0
+        )
+        
+        assert result == {'moved': 1, 'denied': [documentos[3].id], 'not_found': [999999]}
+        assert Documento.query.get(documentos[2].id).pasta_id is None
+        assert Documento.query.get(documentos[3].id).categoria_id == origem.id
+        assert _counters(antiga) == (2, 150, 2, 150)
+        
+        with pytest.raises(DocumentServiceError):
+            service.bulk_move_documents(test_user.id, documento_ids=[documentos[2].id])
+        with pytest.raises(DocumentServiceError):
+            service.bulk_move_documents(test_user.id, documento_ids=[documentos[2].id], pasta_id=999999)
+    
+    def test_move_documents_selected_by_search(self, db_session, service, library, test_user):
+        """A search term selects the documents to reclassify"""
+        origem, destino, antiga, nova, documentos = library
+        
+        result = service.bulk_move_documents(test_user.id, query='relatorio', categoria_id=destino.id)
+        
+        assert result['moved'] == 2
+        assert Documento.query.get(documentos[2].id).categoria_id == origem.id
+        assert _counters(destino) == (2, 150, 2, 150)
+        assert _counters(antiga) == (3, 157, 3, 157)
+    
+    def test_bulk_move_route(self, authenticated_client, library):
+        """The JSON endpoint reports skipped documents and audits each move"""
+        origem, destino, antiga, nova, documentos = library
+        
+        response = authenticated_client.post(
+            '/documents/bulk-move',
+            data=json.dumps({
+                'documento_ids': [documentos[0].id, documentos[3].id],
+                'categoria_id': destino.id
+            }),
+            content_type='application/json'
+        )
+        
+        assert response.status_code == 207
+        data = response.get_json()
+        assert data['moved'] == 1
+        assert data['denied'] == [documentos[3].id]
+        
+        logs = LogAuditoria.query.filter_by(acao='edit', registro_id=documentos[0].id).all()
+        assert len(logs) == 1
+        assert json.loads(logs[0].dados_json)['changes'] == {'categoria_id': [origem.id, destino.id]}
+        
+        response = authenticated_client.post(
+            '/documents/bulk-move',
+            data=json.dumps({'documento_ids': [documentos[0].id]}),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
@@ -0,0 +1,108 @@
+"""
+Tests for bulk permission and favorite lookups used by list and search pages
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app.models.document import Documento, Favorito
+from app.models.permission import Permissao
+from app.repositories.document_repository import DocumentRepository
+from app.services.permission_service import PermissionService
+from app.utils.permission_cache import permission_cache
+
+
+def _documento(owner_id, index):
+    return Documento(
+        nome=f'doc{index}.pdf',
+        caminho_arquivo=f'{owner_id}/doc{index}.pdf',
+        nome_arquivo_original=f'doc{index}.pdf',
+        tamanho_bytes=10,
+        tipo_mime='application/pdf',
+        hash_arquivo=f'{index:064d}',
+        usuario_id=owner_id
+    )
+
+
+@pytest.fixture
+def documents(db_session, test_user, admin_user):
+    """Two documents owned by test_user and three owned by admin_user"""
+    docs = [_documento(test_user.id, i) for i in range(2)]
+    docs += [_documento(admin_user.id, i) for i in range(2, 5)]
+    db_session.session.add_all(docs)
+    db_session.session.commit()
+    return docs
+
+
+class TestBulkPermissions:
+    """Test batch permission evaluation"""
+    
+    def test_bulk_effective_permissions(self, db_session, documents, test_user, admin_user):
+        """Owners get every permission, grants imply view, expired grants are ignored"""
+        own, _, shared_edit, shared_expired, not_shared = documents
+        db_session.session.add_all([
+            Permissao(documento_id=shared_edit.id, usuario_id=test_user.id,
+                      tipo_permissao='editar', concedido_por=admin_user.id),
+            Permissao(documento_id=shared_edit.id, usuario_id=test_user.id,
+                      tipo_permissao='compartilhar', concedido_por=admin_user.id),
+            Permissao(documento_id=shared_expired.id, usuario_id=test_user.id,
+                      tipo_permissao='excluir', concedido_por=admin_user.id,
+                      data_expiracao=datetime.utcnow() - timedelta(days=1))
+        ])
+        db_session.session.commit()
+        
+        masks = PermissionService().bulk_effective_permissions(
+            test_user.id, [doc.id for doc in documents]
+        )
+        
+        assert masks[own.id] == 15
+        assert masks[shared_edit.id] == 1 | 2 | 8
+        assert masks[shared_expired.id] == 0
+        assert masks[not_shared.id] == 0
+    
+    def test_bulk_effective_permissions_single_query(self, db_session, documents, test_user):
+        """The whole page is evaluated in one round trip and primes per-document checks"""
+        doc_ids = [doc.id for doc in documents]
+        user_id = test_user.id
+        permission_cache.get_memberships(user_id)
+        statements = []
+        
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db_session.engine, 'before_cursor_execute', before_execute)
+        try:
+            masks = PermissionService().bulk_effective_permissions(user_id, doc_ids)
+            for doc in documents:
+                permission_cache.has_permission(doc, user_id, 'visualizar')
+        finally:
+            event.remove(db_session.engine, 'before_cursor_execute', before_execute)
+        
+        assert len(masks) == len(documents)
+        assert len(statements) == 1
+    
+    def test_bulk_effective_permissions_empty(self, db_session, test_user):
+        """No documents means no query"""
+        assert PermissionService().bulk_effective_permissions(test_user.id, []) == {}
+    
+    def test_get_favorited_ids(self, db_session, documents, test_user):
+        """Favorites for a page are returned as a set of document IDs"""
+        db_session.session.add(Favorito(usuario_id=test_user.id, documento_id=documents[2].id))
+        db_session.session.commit()
+        
+        favoritos = DocumentRepository().get_favorited_ids(
+            test_user.id, [doc.id for doc in documents]
+        )
+        
+        assert favoritos == {documents[2].id}
+    
+    def test_list_renders_precomputed_state(self, authenticated_client, db_session, documents, test_user):
+        """The document list renders favorite stars without per-row requests"""
+        db_session.session.add(Favorito(usuario_id=test_user.id, documento_id=documents[0].id))
+        db_session.session.commit()
+        
+        response = authenticated_client.get('/documents/?filter=my')
+        
+        assert response.status_code == 200
+        html = response.get_data(as_text=True)
+        assert html.count('btn btn-warning favorite-btn') == 1
+        assert '/is-favorite' not in html
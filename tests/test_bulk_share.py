@@ -0,0 +1,171 @@
+"""
+Tests for bulk share and revoke
+"""
+import pytest
+from sqlalchemy import event
+from app.models.audit import LogAuditoria
+from app.models.document import Documento
+from app.models.permission import Permissao
+from app.models.user import User
+from app.services.permission_service import PermissionService, InvalidPermissionTypeError
+
+
+def _documento(owner_id, index):
+    return Documento(
+        nome=f'doc{index}.pdf',
+        caminho_arquivo=f'{owner_id}/doc{index}.pdf',
+        nome_arquivo_original=f'doc{index}.pdf',
+        tamanho_bytes=10,
+        tipo_mime='application/pdf',
+        hash_arquivo=f'{index:064d}',
+        usuario_id=owner_id
+    )
+
+
+@pytest.fixture
+def documents(db_session, test_user, admin_user):
+    """Four documents owned by admin_user and one owned by test_user"""
+    docs = [_documento(admin_user.id, i) for i in range(4)]
+    docs.append(_documento(test_user.id, 4))
+    db_session.session.add_all(docs)
+    db_session.session.commit()
+    return docs
+
+
+@pytest.fixture
+def recipients(db_session, test_user):
+    """Two extra active users"""
+    users = [
+        User(nome=f'Destinatario {i}', email=f'dest{i}@example.com', perfil_id=test_user.perfil_id)
+        for i in range(2)
+    ]
+    for user in users:
+        user.set_password('Senha@123')
+    db_session.session.add_all(users)
+    db_session.session.commit()
+    return users
+
+
+class TestBulkShare:
+    """Test bulk grant and revoke over documents x users x types"""
+    
+    def test_bulk_grant(self, documents, recipients, admin_user):
+        """Every combination is granted, unshareable documents are reported"""
+        own = [doc.id for doc in documents[:4]]
+        user_ids = [user.id for user in recipients]
+        service = PermissionService()
+        
+        result = service.bulk_grant_permissions(
+            own + [documents[4].id, 999], user_ids, ['visualizar', 'editar'],
+            admin_user.id, send_notification=False
+        )
+        
+        assert result['granted'] == 4 * 2 * 2
+        assert result['denied'] == [documents[4].id]
+        assert result['not_found'] == [999]
+        assert Permissao.query.count() == 16
+        assert service.check_permission(documents[0], recipients[1].id, 'editar')
+        assert LogAuditoria.query.filter_by(acao='share').count() == 4 * 2
+    
+    def test_bulk_grant_upserts(self, documents, recipients, admin_user):
+        """Granting again renews existing rows instead of duplicating them"""
+        doc_ids = [doc.id for doc in documents[:4]]
+        service = PermissionService()
+        service.bulk_grant_permissions(doc_ids, [recipients[0].id], ['visualizar'], admin_user.id,
+                                       send_notification=False)
+        
+        result = service.bulk_grant_permissions(doc_ids, [recipients[0].id], ['visualizar', 'editar'],
+                                                admin_user.id, send_notification=False)
+        
+        assert result['updated'] == 4
+        assert result['granted'] == 4
+        assert Permissao.query.count() == 8
+    
+    def test_bulk_grant_statement_count_independent_of_size(self, db_session, documents, recipients,
+                                                            admin_user):
+        """The number of statements does not grow with documents x users"""
+        doc_ids = [doc.id for doc in documents[:4]]
+        user_ids = [user.id for user in recipients]
+        admin_id = admin_user.id
+        statements = []
+        
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db_session.engine, 'before_cursor_execute', before_execute)
+        try:
+            PermissionService().bulk_grant_permissions(
+                doc_ids, user_ids, ['visualizar', 'editar', 'excluir'], admin_id,
+                send_notification=False
+            )
+        finally:
+            event.remove(db_session.engine, 'before_cursor_execute', before_execute)
+        
+        inserts = [s for s in statements if s.lstrip().upper().startswith('INSERT INTO PERMISSOES')]
+        assert len(inserts) == 1
+        assert len(statements) < 10
+    
+    def test_bulk_grant_invalid_type(self, documents, recipients, admin_user):
+        """Invalid permission types are rejected before any write"""
+        with pytest.raises(InvalidPermissionTypeError):
+            PermissionService().bulk_grant_permissions(
+                [documents[0].id], [recipients[0].id], ['ler'], admin_user.id
+            )
+        assert Permissao.query.count() == 0
+    
+    def test_bulk_revoke(self, documents, recipients, admin_user):
+        """Bulk revoke deletes the selected grants and invalidates decisions"""
+        doc_ids = [doc.id for doc in documents[:4]]
+        user_ids = [user.id for user in recipients]
+        service = PermissionService()
+        service.bulk_grant_permissions(doc_ids, user_ids, ['visualizar', 'editar'], admin_user.id,
+                                       send_notification=False)
+        assert service.check_permission(documents[0], recipients[0].id, 'editar')
+        
+        result = service.bulk_revoke_permissions(doc_ids, user_ids, admin_user.id, ['editar'])
+        
+        assert result['revoked'] == 8
+        assert not service.check_permission(documents[0], recipients[0].id, 'editar')
+        assert service.check_permission(documents[0], recipients[0].id, 'visualizar')
+    
+    def test_bulk_revoke_audits_removed_grants_only(self, documents, recipients, admin_user):
+        """Pairs without a matching grant are not written to the audit log"""
+        service = PermissionService()
+        service.bulk_grant_permissions([documents[0].id], [recipients[0].id], ['editar'], admin_user.id,
+                                       send_notification=False)
+        
+        result = service.bulk_revoke_permissions(
+            [doc.id for doc in documents[:2]], [user.id for user in recipients], admin_user.id, ['editar']
+        )
+        
+        assert result['revoked'] == 1
+        logs = LogAuditoria.query.filter_by(acao='revoke_permission').all()
+        assert [(log.registro_id, log.dados['target_user_id']) for log in logs] == [(documents[0].id, recipients[0].id)]
+        assert logs[0].dados['permission_types'] == ['editar']
+        
+        service.bulk_revoke_permissions([documents[0].id], [recipients[0].id], admin_user.id)
+        assert LogAuditoria.query.filter_by(acao='revoke_permission').count() == 1
+    
+    def test_bulk_share_endpoint(self, admin_client, documents, recipients):
+        """The JSON endpoint grants permissions and reports counts"""
+        response = admin_client.post('/documents/bulk-share', json={
+            'documento_ids': [doc.id for doc in documents[:4]],
+            'usuario_ids': [recipients[0].id],
+            'tipos_permissao': ['visualizar'],
+            'notificar': False
+        })
+        
+        assert response.status_code == 200
+        assert response.get_json()['granted'] == 4
+    
+    def test_bulk_share_endpoint_rejects_invalid_expiration(self, admin_client, documents, recipients):
+        """A non-numeric expiration is a client error"""
+        response = admin_client.post('/documents/bulk-share', json={
+            'documento_ids': [documents[0].id],
+            'usuario_ids': [recipients[0].id],
+            'tipos_permissao': ['visualizar'],
+            'expiration_days': 'amanhã'
+        })
+        
+        assert response.status_code == 400
+        assert Permissao.query.count() == 0
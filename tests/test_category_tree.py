@@ -0,0 +1,104 @@
+"""
+Tests for the versioned category tree cache
+"""
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models.document import Categoria
+from app.models.settings import SystemSettings
+from app.services.category_service import CategoryService
+from app.services.search_service import SearchService
+from app.utils.category_tree import category_tree, CategoryTreeCache
+
+
+@pytest.fixture
+def categories(db_session):
+    """Jurídico > Contratos > Aditivos, an inactive root with an active child, and Financeiro"""
+    juridico = Categoria(nome='Jurídico', ordem=1)
+    financeiro = Categoria(nome='Financeiro', ordem=0)
+    antiga = Categoria(nome='Antiga', ativo=False)
+    db_session.session.add_all([juridico, financeiro, antiga])
+    db_session.session.flush()
+    contratos = Categoria(nome='Contratos', categoria_pai_id=juridico.id)
+    orfa = Categoria(nome='Órfã', categoria_pai_id=antiga.id)
+    db_session.session.add_all([contratos, orfa])
+    db_session.session.flush()
+    aditivos = Categoria(nome='Aditivos', categoria_pai_id=contratos.id)
+    db_session.session.add(aditivos)
+    db_session.session.commit()
+    return juridico, contratos, aditivos, financeiro, orfa
+
+
+def _count_category_selects():
+    """Record the SELECTs reading categorias"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM categorias' in statement:
+            statements.append(statement)
+    
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class TestCategoryTree:
+    """Test the cached tree and its invalidation"""
+    
+    def test_tree_paths_depth_and_children(self, categories):
+        """Paths, depth and the child index come from one load"""
+        juridico, contratos, aditivos, financeiro, orfa = categories
+        tree = category_tree.get()
+        
+        assert [node.nome for node in tree.ativas] == ['Aditivos', 'Contratos', 'Financeiro', 'Jurídico', 'Órfã']
+        assert tree.get(aditivos.id).caminho_completo == 'Jurídico > Contratos > Aditivos'
+        assert tree.get(aditivos.id).nivel == 2
+        assert tree.get(orfa.id).caminho_completo == 'Antiga > Órfã'
+        assert [node.nome for node in tree.children(None)] == ['Financeiro', 'Jurídico']
+        assert [node.nome for node in tree.children(juridico.id)] == ['Contratos']
+        
+        suggestions = SearchService().get_category_autocomplete('adit')
+        assert suggestions == [{'id': aditivos.id, 'nome': 'Aditivos', 'caminho': 'Jurídico > Contratos > Aditivos'}]
+    
+    def test_pages_reuse_the_tree(self, app, categories, authenticated_client):
+        """Document list and upload forms do not query categorias once the tree is loaded"""
+        category_tree.get()
+        statements, stop = _count_category_selects()
+        try:
+            assert authenticated_client.get('/documents/').status_code == 200
+            response = authenticated_client.get('/documents/upload')
+        finally:
+            stop()
+        
+        assert response.status_code == 200
+        assert 'Contratos' in response.get_data(as_text=True)
+        assert statements == []
+    
+    def test_local_commit_invalidates(self, db_session, categories):
+        """Categories committed in this process show up on the next read"""
+        assert category_tree.get().search('Novas') == []
+        
+        db_session.session.add(Categoria(nome='Novas'))
+        db_session.session.commit()
+        
+        assert [node.nome for node in category_tree.get().search('Novas')] == ['Novas']
+    
+    def test_version_stamp_reaches_other_workers(self, db_session, categories, admin_user):
+        """Another worker rebuilds its tree once the service bumps the version"""
+        juridico, contratos, aditivos, financeiro, orfa = categories
+        other_worker = CategoryTreeCache(check_interval_seconds=0)
+        assert other_worker.get().get(contratos.id).caminho_completo == 'Jurídico > Contratos'
+        
+        # Renamed behind the worker's back (no local invalidation), then the stamp moves
+        db_session.session.query(Categoria).filter(Categoria.id == juridico.id).update({'nome': 'Legal'})
+        db_session.session.commit()
+        assert other_worker.get().get(contratos.id).caminho_completo == 'Jurídico > Contratos'
+        
+        CategoryService().update_category(financeiro.id, {'nome': 'Finanças'}, admin_user.id)
+        stamp = SystemSettings.query.filter_by(chave=CategoryTreeCache.VERSION_KEY).first()
+        assert stamp is not None and stamp.valor
+        
+        tree = other_worker.get()
+        assert tree.get(contratos.id).caminho_completo == 'Legal > Contratos'
+        assert tree.get(financeiro.id).nome == 'Finanças'
+        assert other_worker.stats()['loads'] == 2
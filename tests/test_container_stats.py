@@ -0,0 +1,130 @@
+"""
+Tests for the maintained document counters of categories and folders
+"""
+import pytest
+from app.models.document import Documento, Categoria, Pasta
+from app.services.category_service import CategoryService, FolderService
+from app.services.container_stats_service import ContainerStatsService
+
+
+def _documento(owner_id, index, tamanho, **containers):
+    return Documento(
+        nome=f'doc{index}.pdf',
+        caminho_arquivo=f'{owner_id}/doc{index}.pdf',
+        nome_arquivo_original=f'doc{index}.pdf',
+        tamanho_bytes=tamanho,
+        tipo_mime='application/pdf',
+        hash_arquivo=f'{index:064d}',
+        usuario_id=owner_id,
+        **containers
+    )
+
+
+def _counters(node):
+    """Reload and return (direct docs, direct bytes, subtree docs, subtree bytes)"""
+    node = type(node).query.get(node.id)
+    return node.total_documentos, node.total_bytes, node.total_documentos_subarvore, node.total_bytes_subarvore
+
+
+@pytest.fixture
+def tree(db_session, test_user):
+    """Categories raiz > filha, outra; folders docs > 2026"""
+    raiz = Categoria(nome='Raiz')
+    outra = Categoria(nome='Outra')
+    docs = Pasta(nome='Docs', usuario_id=test_user.id)
+    db_session.session.add_all([raiz, outra, docs])
+    db_session.session.flush()
+    filha = Categoria(nome='Filha', categoria_pai_id=raiz.id)
+    ano = Pasta(nome='2026', usuario_id=test_user.id, pasta_pai_id=docs.id)
+    db_session.session.add_all([filha, ano])
+    db_session.session.commit()
+    return raiz, filha, outra, docs, ano
+
+
+class TestContainerStats:
+    """Test counters maintained on document and hierarchy changes"""
+    
+    def test_upload_delete_restore_and_move(self, db_session, tree, test_user):
+        """Counters follow documents through their lifecycle"""
+        raiz, filha, outra, docs, ano = tree
+        documentos = [
+            _documento(test_user.id, 1, 100, categoria_id=filha.id, pasta_id=ano.id),
+            _documento(test_user.id, 2, 50, categoria_id=filha.id, pasta_id=ano.id),
+            _documento(test_user.id, 3, 7, categoria_id=raiz.id, pasta_id=docs.id)
+        ]
+        db_session.session.add_all(documentos)
+        db_session.session.commit()
+        
+        assert _counters(filha) == (2, 150, 2, 150)
+        assert _counters(raiz) == (1, 7, 3, 157)
+        assert _counters(docs) == (1, 7, 3, 157)
+        
+        documentos[0].soft_delete()
+        db_session.session.commit()
+        assert _counters(filha) == (1, 50, 1, 50)
+        assert _counters(raiz) == (1, 7, 2, 57)
+        
+        documentos[0].restore()
+        db_session.session.commit()
+        assert _counters(ano) == (2, 150, 2, 150)
+        
+        db_session.session.expire_all()
+        documento = Documento.query.get(documentos[1].id)
+        documento.categoria_id = outra.id
+        documento.pasta_id = None
+        db_session.session.commit()
+        assert _counters(outra) == (1, 50, 1, 50)
+        assert _counters(raiz) == (1, 7, 2, 107)
+        assert _counters(docs) == (1, 7, 2, 107)
+        
+        db_session.session.delete(Documento.query.get(documentos[2].id))
+        db_session.session.commit()
+        assert _counters(raiz) == (0, 0, 1, 100)
+    
+    def test_moving_a_subtree_moves_its_totals(self, db_session, tree, test_user, admin_user):
+        """A category moved to another parent takes its subtree totals along"""
+        raiz, filha, outra, docs, ano = tree
+        db_session.session.add(_documento(test_user.id, 1, 100, categoria_id=filha.id))
+        db_session.session.commit()
+        
+        CategoryService().update_category(filha.id, {'nome': 'Filha', 'categoria_pai_id': outra.id}, admin_user.id)
+        
+        assert _counters(raiz) == (0, 0, 0, 0)
+        assert _counters(outra) == (0, 0, 1, 100)
+        assert _counters(filha) == (1, 100, 1, 100)
+    
+    def test_folder_stats_read_counters(self, db_session, tree, test_user, authenticated_client):
+        """Folder statistics and the folder page show subtree totals"""
+        raiz, filha, outra, docs, ano = tree
+        db_session.session.add(_documento(test_user.id, 1, 2048, pasta_id=ano.id))
+        db_session.session.commit()
+        
+        stats = FolderService().get_folder_stats(docs.id)
+        assert stats['document_count'] == 0
+        assert stats['document_count_total'] == 1
+        assert stats['total_bytes_total'] == 2048
+        
+        response = authenticated_client.get(f'/categories/folders/{docs.id}')
+        assert response.status_code == 200
+        assert 'Total (incluindo subpastas)' in response.get_data(as_text=True)
+    
+    def test_reconcile_repairs_drift(self, db_session, tree, test_user):
+        """Reconciliation recounts documents written behind the counters' back"""
+        raiz, filha, outra, docs, ano = tree
+        db_session.session.add(_documento(test_user.id, 1, 100, categoria_id=filha.id, pasta_id=ano.id))
+        db_session.session.commit()
+        
+        # Bulk statements bypass the session events
+        Documento.query.update({'tamanho_bytes': 300}, synchronize_session=False)
+        db_session.session.commit()
+        
+        service = ContainerStatsService()
+        report = service.reconcile(dry_run=True)
+        assert report['categorias'] == {'verificadas': 3, 'corrigidas': 2}
+        assert _counters(raiz) == (0, 0, 1, 100)
+        
+        report = service.reconcile()
+        assert report['pastas'] == {'verificadas': 2, 'corrigidas': 2}
+        assert _counters(raiz) == (0, 0, 1, 300)
+        assert _counters(ano) == (1, 300, 1, 300)
+        assert service.reconcile()['categorias']['corrigidas'] == 0
@@ -0,0 +1,80 @@
+"""
+Tests for the admin dashboard snapshot
+"""
+import pytest
+from app.models.document import Tag
+from app.models.user import User
+from app.utils.dashboard_snapshot import DashboardSnapshot, Widget, dashboard_snapshot
+
+
+@pytest.fixture
+def snapshot(db_session, monkeypatch):
+    """Global snapshot emptied for one test, invalidated right after writes"""
+    monkeypatch.setattr(dashboard_snapshot, 'min_refresh_seconds', 0)
+    dashboard_snapshot.clear()
+    yield dashboard_snapshot
+    dashboard_snapshot.clear()
+
+
+class TestDashboardSnapshot:
+    """Test widget caching, invalidation and statistics"""
+    
+    def test_widgets_are_served_until_they_expire(self, app):
+        """A fresh widget is not recomputed; an expired one is recomputed on read without the refresher"""
+        calls = []
+        local = DashboardSnapshot(min_refresh_seconds=0)
+        local.register(Widget('fresh', lambda: calls.append('fresh') or len(calls), ttl_seconds=300))
+        local.register(Widget('expired', lambda: calls.append('expired') or len(calls), ttl_seconds=0))
+        
+        with app.app_context():
+            first = local.get_all()
+            second = local.get_all()
+        
+        assert first == {'fresh': 1, 'expired': 2}
+        assert second == {'fresh': 1, 'expired': 3}
+        stats = local.stats()['widgets']
+        assert stats['fresh']['computations'] == 1
+        assert stats['fresh']['hits'] == 1
+        assert stats['expired']['stale_hits'] == 1
+        assert stats['expired']['duration_ms'] >= 0
+    
+    def test_commits_invalidate_listed_tables_only(self, snapshot, db_session, admin_user):
+        """Writing to a table a widget depends on makes it stale; other tables do not"""
+        total = snapshot.get('stats')['total_users']
+        invalidations = snapshot.stats()['widgets']['stats']['invalidations']
+        
+        db_session.session.add(Tag(nome='contratos'))
+        db_session.session.commit()
+        assert snapshot.stats()['widgets']['stats']['invalidations'] == invalidations
+        
+        user = User(nome='Nova', email='nova@example.com', perfil_id=admin_user.perfil_id, ativo=True)
+        user.set_password('Senha@123')
+        db_session.session.add(user)
+        db_session.session.commit()
+        assert snapshot.get('stats')['total_users'] == total + 1
+    
+    def test_failed_refresh_keeps_previous_result(self, app):
+        """A widget whose queries fail keeps serving its last result"""
+        results = iter([{'ok': True}])
+        
+        def compute():
+            return next(results)
+        
+        local = DashboardSnapshot()
+        local.register(Widget('flaky', compute, ttl_seconds=300))
+        with app.app_context():
+            assert local.get('flaky') == {'ok': True}
+            assert local.refresh(force=True) == 0
+            assert local.get('flaky') == {'ok': True}
+        assert local.stats()['widgets']['flaky']['errors'] == 1
+    
+    def test_dashboard_renders_from_snapshot(self, snapshot, admin_client):
+        """The dashboard and its statistics endpoint read the snapshot"""
+        assert admin_client.get('/admin/dashboard').status_code == 200
+        assert admin_client.get('/admin/dashboard').status_code == 200
+        
+        widgets = admin_client.get('/admin/dashboard/snapshot-stats').get_json()['widgets']
+        assert set(widgets) == {'stats', 'upload_stats', 'storage_by_user', 'recent_activity', 'user_stats'}
+        assert widgets['upload_stats']['computations'] == 1
+        assert widgets['upload_stats']['hits'] == 1
+        assert all('duration_ms' in widget for widget in widgets.values())
@@ -0,0 +1,135 @@
+"""
+Tests for group and profile based document sharing
+"""
+import pytest
+from app.models.document import Documento
+from app.models.permission import Permissao
+from app.services.group_service import GroupService
+from app.services.permission_service import PermissionService, PermissionServiceError
+from app.utils.permission_cache import permission_cache
+
+
+@pytest.fixture
+def documento(db_session, admin_user):
+    """Document owned by admin_user"""
+    documento = Documento(
+        nome='politica.pdf',
+        caminho_arquivo='1/politica.pdf',
+        nome_arquivo_original='politica.pdf',
+        tamanho_bytes=10,
+        tipo_mime='application/pdf',
+        hash_arquivo='b' * 64,
+        usuario_id=admin_user.id
+    )
+    db_session.session.add(documento)
+    db_session.session.commit()
+    return documento
+
+
+@pytest.fixture
+def grupo(db_session, admin_user):
+    """Empty group created by admin_user"""
+    return GroupService().create_group('Juridico', admin_user.id)
+
+
+class TestGroupPermissions:
+    """Test group/profile grants and membership expansion"""
+    
+    def test_group_grant_reaches_members(self, documento, grupo, test_user, admin_user):
+        """Members of a group receive the group's grants"""
+        GroupService().add_member(grupo.id, test_user.id, admin_user.id)
+        service = PermissionService()
+        service.grant_group_permission(documento, grupo.id, 'editar', admin_user.id)
+        
+        assert service.check_permission(documento, test_user.id, 'editar')
+        assert service.check_permission(documento, test_user.id, 'visualizar')
+        assert not service.check_permission(documento, test_user.id, 'excluir')
+    
+    def test_membership_changes_need_no_fan_out(self, documento, grupo, test_user, admin_user):
+        """Adding and removing members writes no permission rows and applies immediately"""
+        service = PermissionService()
+        service.grant_group_permission(documento, grupo.id, 'visualizar', admin_user.id)
+        assert not service.check_permission(documento, test_user.id, 'visualizar')
+        
+        GroupService().add_member(grupo.id, test_user.id, admin_user.id)
+        assert Permissao.query.count() == 0
+        assert service.check_permission(documento, test_user.id, 'visualizar')
+        
+        GroupService().remove_member(grupo.id, test_user.id, admin_user.id)
+        assert not service.check_permission(documento, test_user.id, 'visualizar')
+    
+    def test_deactivated_group_stops_granting(self, documento, grupo, test_user, admin_user):
+        """Deactivating a group bumps the membership version and revokes its grants"""
+        GroupService().add_member(grupo.id, test_user.id, admin_user.id)
+        service = PermissionService()
+        service.grant_group_permission(documento, grupo.id, 'visualizar', admin_user.id)
+        assert service.check_permission(documento, test_user.id, 'visualizar')
+        version = permission_cache.stats()['membership_version']
+        
+        GroupService().deactivate_group(grupo.id, admin_user.id)
+        
+        assert permission_cache.stats()['membership_version'] == version + 1
+        assert not service.check_permission(documento, test_user.id, 'visualizar')
+        with pytest.raises(PermissionServiceError):
+            service.grant_group_permission(documento, grupo.id, 'editar', admin_user.id)
+    
+    def test_profile_grant(self, documento, test_user, admin_user):
+        """Profile grants apply to every user of the profile"""
+        service = PermissionService()
+        service.grant_profile_permission(documento, test_user.perfil_id, 'compartilhar', admin_user.id)
+        
+        assert service.check_permission(documento, test_user.id, 'compartilhar')
+        
+        assert service.revoke_group_permission(
+            documento, 'compartilhar', admin_user.id, perfil_id=test_user.perfil_id
+        )
+        assert not service.check_permission(documento, test_user.id, 'visualizar')
+    
+    def test_users_without_profile_match_no_group_grant(self, documento, grupo, admin_user):
+        """A missing profile does not match the group-only grants (perfil_id IS NULL)"""
+        from app.models.permission import PermissaoGrupo
+        from app.utils.permission_cache import group_grant_filter
+        PermissionService().grant_group_permission(documento, grupo.id, 'visualizar', admin_user.id)
+        
+        assert PermissaoGrupo.query.filter(group_grant_filter(set(), None)).count() == 0
+        assert PermissionService().bulk_effective_permissions(999999, [documento.id]).get(documento.id, 0) == 0
+    
+    def test_grant_targets_exactly_one_group_or_profile(self, db_session, documento, grupo, test_user, admin_user):
+        """The check constraint rejects grants with both or neither recipients"""
+        from sqlalchemy.exc import IntegrityError
+        from app.models.permission import PermissaoGrupo
+        for grupo_id, perfil_id in ((None, None), (grupo.id, test_user.perfil_id)):
+            db_session.session.add(PermissaoGrupo(
+                documento_id=documento.id, grupo_id=grupo_id, perfil_id=perfil_id,
+                tipo_permissao='visualizar', concedido_por=admin_user.id
+            ))
+            with pytest.raises(IntegrityError):
+                db_session.session.commit()
+            db_session.session.rollback()
+    
+    def test_bulk_and_list_include_group_grants(self, authenticated_client, documento, grupo,
+                                                test_user, admin_user):
+        """Bulk evaluation and the document list include group-shared documents"""
+        GroupService().add_member(grupo.id, test_user.id, admin_user.id)
+        service = PermissionService()
+        service.grant_group_permission(documento, grupo.id, 'excluir', admin_user.id)
+        
+        masks = service.bulk_effective_permissions(test_user.id, [documento.id])
+        assert masks[documento.id] == 1 | 4
+        
+        response = authenticated_client.get('/documents/')
+        assert response.status_code == 200
+        assert 'politica.pdf' in response.get_data(as_text=True)
+    
+    def test_list_skips_expired_group_grants(self, authenticated_client, db_session, documento, grupo,
+                                             test_user, admin_user):
+        """Expired group grants stop listing documents before the sweep removes them"""
+        from datetime import datetime, timedelta
+        GroupService().add_member(grupo.id, test_user.id, admin_user.id)
+        grant = PermissionService().grant_group_permission(documento, grupo.id, 'visualizar', admin_user.id)
+        grant.data_expiracao = datetime.utcnow() - timedelta(minutes=1)
+        db_session.session.commit()
+        
+        response = authenticated_client.get('/documents/')
+        assert response.status_code == 200
+        assert 'politica.pdf' not in response.get_data(as_text=True)
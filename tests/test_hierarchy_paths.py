@@ -0,0 +1,134 @@
+"""
+Tests for the materialized path of categories and folders
+"""
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models.document import Categoria, Pasta
+from app.repositories.category_repository import CategoryRepository, FolderRepository
+
+
+@pytest.fixture
+def category_tree(db_session):
+    """raiz > a > b > c, plus an unrelated root"""
+    raiz = Categoria(nome='Raiz')
+    db_session.session.add(raiz)
+    db_session.session.flush()
+    a = Categoria(nome='A', categoria_pai_id=raiz.id)
+    db_session.session.add(a)
+    db_session.session.flush()
+    b = Categoria(nome='B', categoria_pai=a)
+    c = Categoria(nome='C', categoria_pai=b)
+    outra = Categoria(nome='Outra')
+    db_session.session.add_all([b, c, outra])
+    db_session.session.commit()
+    return raiz, a, b, c, outra
+
+
+def _count_selects(table):
+    """Record the SELECTs reading a table"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and f'FROM {table}' in statement:
+            statements.append(statement)
+    
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class TestHierarchyPaths:
+    """Test path maintenance and single-query tree reads"""
+    
+    def test_paths_set_on_create(self, category_tree):
+        """New nodes get their ancestors' IDs and depth, in the same flush as their parents"""
+        raiz, a, b, c, outra = category_tree
+        
+        assert raiz.caminho_ids == '/' and raiz.nivel == 0
+        assert a.caminho_ids == f'/{raiz.id}/' and a.nivel == 1
+        assert c.caminho_ids == f'/{raiz.id}/{a.id}/{b.id}/' and c.nivel == 3
+        assert c.caminho_completo == 'Raiz > A > B > C'
+    
+    def test_move_rewrites_subtree(self, db_session, category_tree):
+        """Moving a node rewrites the paths of all its descendants"""
+        raiz, a, b, c, outra = category_tree
+        
+        a.categoria_pai_id = outra.id
+        db_session.session.commit()
+        db_session.session.expire_all()
+        
+        assert Categoria.query.get(b.id).caminho_ids == f'/{outra.id}/{a.id}/'
+        assert Categoria.query.get(c.id).caminho_ids == f'/{outra.id}/{a.id}/{b.id}/'
+        assert Categoria.query.get(c.id).nivel == 3
+        
+        b.categoria_pai_id = None
+        db_session.session.commit()
+        db_session.session.expire_all()
+        assert Categoria.query.get(c.id).caminho_ids == f'/{b.id}/'
+        assert Categoria.query.get(c.id).nivel == 1
+    
+    def test_cycle_rejected(self, db_session, category_tree):
+        """A node cannot be moved below its own descendant"""
+        raiz, a, b, c, outra = category_tree
+        repo = CategoryRepository()
+        
+        assert not repo.can_move_to_parent(a.id, c.id)
+        assert repo.can_move_to_parent(c.id, outra.id)
+        
+        a.categoria_pai_id = c.id
+        with pytest.raises(ValueError):
+            db_session.session.commit()
+        db_session.session.rollback()
+    
+    def test_cycle_check_without_paths(self, db_session, category_tree):
+        """Rows whose path was not backfilled are checked through their parents"""
+        from sqlalchemy import update
+        raiz, a, b, c, outra = category_tree
+        db_session.session.execute(
+            update(Categoria).where(Categoria.id.in_([b.id, c.id])).values(caminho_ids=None),
+            execution_options={'synchronize_session': False}
+        )
+        db_session.session.expire_all()
+        repo = CategoryRepository()
+        
+        assert not repo.can_move_to_parent(a.id, c.id)
+        assert not repo.can_move_to_parent(b.id, c.id)
+        assert repo.can_move_to_parent(c.id, outra.id)
+        assert repo.can_move_to_parent(outra.id, c.id)
+    
+    def test_tree_reads_use_one_query(self, db_session, category_tree, test_user):
+        """Hierarchy, descendants and breadcrumbs read the table once each"""
+        raiz, a, b, c, outra = category_tree
+        b.ativo = False
+        db_session.session.commit()
+        db_session.session.expire_all()
+        repo = CategoryRepository()
+        
+        statements, stop = _count_selects('categorias')
+        try:
+            hierarchy = repo.get_hierarchy()
+            hierarchy_queries = len(statements)
+            path = repo.get_path_to_root(c.id)
+        finally:
+            stop()
+        
+        assert hierarchy_queries == 1
+        assert [node['nome'] for node in hierarchy] == ['Outra', 'Raiz']
+        assert [child['nome'] for child in hierarchy[1]['children']] == ['A']
+        assert hierarchy[1]['children'][0]['children'] == []
+        assert [node.nome for node in path] == ['Raiz', 'A', 'B', 'C']
+        # The node itself is already in the session; its ancestors take one query
+        assert len(statements) == 2
+        
+        # Inactive B hides its subtree
+        assert [node.nome for node in repo.get_all_descendants(raiz.id)] == ['A']
+        
+        folder_root = Pasta(nome='Docs', usuario_id=test_user.id)
+        folder_child = Pasta(nome='2026', usuario_id=test_user.id, pasta_pai=folder_root)
+        db_session.session.add_all([folder_root, folder_child])
+        db_session.session.commit()
+        
+        folders = FolderRepository().get_hierarchy(test_user.id)
+        assert folders[0]['children'][0]['nivel'] == 1
+        assert folder_child.caminho_completo == 'Docs/2026'
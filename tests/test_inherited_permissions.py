@@ -0,0 +1,167 @@
+"""
+Tests for folder/category permissions and the materialized effective ACL
+"""
+import pytest
+from sqlalchemy import event
+from app.models.document import Documento, Pasta, Categoria
+from app.models.permission import PermissaoEfetiva
+from app.services.category_service import FolderService
+from app.services.document_service import DocumentService
+from app.services.permission_service import PermissionService, PermissionDeniedError
+from app.services.storage_service import StorageService
+from app.utils.file_handler import FileHandler
+from app.utils.permission_cache import permission_cache
+
+
+def _documento(owner_id, index, pasta_id=None, categoria_id=None):
+    return Documento(
+        nome=f'doc{index}.pdf',
+        caminho_arquivo=f'{owner_id}/doc{index}.pdf',
+        nome_arquivo_original=f'doc{index}.pdf',
+        tamanho_bytes=10,
+        tipo_mime='application/pdf',
+        hash_arquivo=f'{index:064d}',
+        usuario_id=owner_id,
+        pasta_id=pasta_id,
+        categoria_id=categoria_id
+    )
+
+
+@pytest.fixture
+def folder_tree(db_session, admin_user):
+    """Folder 'raiz' with subfolder 'sub', and a separate folder 'outra', owned by admin_user"""
+    session = db_session.session
+    raiz = Pasta(nome='raiz', usuario_id=admin_user.id)
+    outra = Pasta(nome='outra', usuario_id=admin_user.id)
+    session.add_all([raiz, outra])
+    session.flush()
+    sub = Pasta(nome='sub', usuario_id=admin_user.id, pasta_pai_id=raiz.id)
+    session.add(sub)
+    session.flush()
+    docs = [
+        _documento(admin_user.id, 1, pasta_id=raiz.id),
+        _documento(admin_user.id, 2, pasta_id=sub.id),
+        _documento(admin_user.id, 3, pasta_id=outra.id)
+    ]
+    session.add_all(docs)
+    session.commit()
+    return {'raiz': raiz, 'sub': sub, 'outra': outra, 'docs': docs}
+
+
+class TestInheritedPermissions:
+    """Test grants on folders and categories"""
+    
+    def test_folder_grant_reaches_subfolders(self, folder_tree, test_user, admin_user):
+        """A folder grant applies to documents in the folder and its subfolders only"""
+        service = PermissionService()
+        service.grant_folder_permission(folder_tree['raiz'], test_user.id, 'editar', admin_user.id)
+        
+        in_root, in_sub, elsewhere = folder_tree['docs']
+        assert service.check_permission(in_root, test_user.id, 'editar')
+        assert service.check_permission(in_sub, test_user.id, 'visualizar')
+        assert not service.check_permission(elsewhere, test_user.id, 'visualizar')
+    
+    def test_check_does_not_walk_tree(self, db_session, folder_tree, test_user, admin_user):
+        """Checks read the materialized rows instead of folder ancestors"""
+        service = PermissionService()
+        service.grant_folder_permission(folder_tree['raiz'], test_user.id, 'visualizar', admin_user.id)
+        documento = folder_tree['docs'][1]
+        documento.usuario_id  # load the instance expired by the grant's commit
+        user_id = test_user.id
+        permission_cache.get_memberships(user_id)
+        statements = []
+        
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db_session.engine, 'before_cursor_execute', before_execute)
+        try:
+            assert service.check_permission(documento, user_id, 'visualizar')
+        finally:
+            event.remove(db_session.engine, 'before_cursor_execute', before_execute)
+        
+        assert len(statements) == 1
+        assert 'pastas' not in statements[0]
+    
+    def test_subtree_is_read_without_one_parameter_per_folder(self, db_session, folder_tree, test_user, admin_user):
+        """Large trees stay under the bound parameter limit of SQL Server"""
+        session = db_session.session
+        session.add_all([
+            Pasta(nome=f'filha{i}', usuario_id=admin_user.id, pasta_pai_id=folder_tree['sub'].id)
+            for i in range(50)
+        ])
+        session.commit()
+        parameter_counts = []
+        
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            if 'documentos' in statement and not executemany:
+                parameter_counts.append(len(parameters))
+        
+        event.listen(db_session.engine, 'before_cursor_execute', before_execute)
+        try:
+            ids = PermissionService()._subtree_document_ids('pasta', folder_tree['raiz'].id)
+        finally:
+            event.remove(db_session.engine, 'before_cursor_execute', before_execute)
+        
+        assert sorted(ids) == sorted(doc.id for doc in folder_tree['docs'][:2])
+        assert parameter_counts and max(parameter_counts) < 5
+    
+    def test_revoke_folder_grant(self, folder_tree, test_user, admin_user):
+        """Revoking a folder grant removes the inherited permission"""
+        service = PermissionService()
+        service.grant_folder_permission(folder_tree['raiz'], test_user.id, 'visualizar', admin_user.id)
+        assert service.revoke_folder_permission(folder_tree['raiz'], test_user.id, 'visualizar', admin_user.id)
+        
+        assert not service.check_permission(folder_tree['docs'][1], test_user.id, 'visualizar')
+        assert PermissaoEfetiva.query.count() == 0
+    
+    def test_only_owner_can_share_folder(self, folder_tree, test_user):
+        """Users cannot share folders they do not own"""
+        with pytest.raises(PermissionDeniedError):
+            PermissionService().grant_folder_permission(
+                folder_tree['raiz'], test_user.id, 'visualizar', test_user.id
+            )
+    
+    def test_folder_move_updates_inheritance(self, app, folder_tree, test_user, admin_user):
+        """Moving a folder under a shared folder grants access to its documents"""
+        service = PermissionService()
+        service.grant_folder_permission(folder_tree['raiz'], test_user.id, 'visualizar', admin_user.id)
+        outra = folder_tree['outra']
+        
+        FolderService().update_folder(outra.id, {'nome': outra.nome, 'pasta_pai_id': folder_tree['raiz'].id}, admin_user.id)
+        
+        assert service.check_permission(folder_tree['docs'][2], test_user.id, 'visualizar')
+    
+    def test_document_move_updates_inheritance(self, app, folder_tree, test_user, admin_user):
+        """Moving a document out of a shared folder removes inherited access"""
+        service = PermissionService()
+        service.grant_folder_permission(folder_tree['raiz'], test_user.id, 'visualizar', admin_user.id)
+        documento = folder_tree['docs'][0]
+        document_service = DocumentService(
+            StorageService(app.config['UPLOAD_FOLDER']),
+            FileHandler(app.config['ALLOWED_EXTENSIONS'], app.config['MAX_CONTENT_LENGTH'])
+        )
+        
+        document_service.update_document_metadata(documento.id, admin_user.id, pasta_id=folder_tree['outra'].id)
+        
+        assert not service.check_permission(documento, test_user.id, 'visualizar')
+    
+    def test_category_grant_in_bulk_permissions(self, db_session, test_user, admin_user):
+        """Category grants reach subcategories and show up in bulk evaluation"""
+        session = db_session.session
+        admin_user.perfil.pode_gerenciar_categorias = True
+        pai = Categoria(nome='Contratos', ativo=True)
+        session.add(pai)
+        session.flush()
+        filha = Categoria(nome='Aditivos', ativo=True, categoria_pai_id=pai.id)
+        session.add(filha)
+        session.flush()
+        documento = _documento(admin_user.id, 7, categoria_id=filha.id)
+        session.add(documento)
+        session.commit()
+        
+        service = PermissionService()
+        service.grant_category_permission(pai, test_user.id, 'excluir', admin_user.id)
+        
+        masks = service.bulk_effective_permissions(test_user.id, [documento.id])
+        assert masks[documento.id] == 1 | 4
@@ -0,0 +1,154 @@
+"""
+Tests for the permission decision cache
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app.models.document import Documento
+from app.models.permission import Permissao
+from app.services.permission_service import PermissionService
+from app.utils.permission_cache import permission_cache
+
+
+@pytest.fixture
+def shared_document(db_session, admin_user):
+    """Document owned by admin_user"""
+    documento = Documento(
+        nome='contrato.pdf',
+        caminho_arquivo='1/contrato.pdf',
+        nome_arquivo_original='contrato.pdf',
+        tamanho_bytes=10,
+        tipo_mime='application/pdf',
+        hash_arquivo='a' * 64,
+        usuario_id=admin_user.id
+    )
+    db_session.session.add(documento)
+    db_session.session.commit()
+    return documento
+
+
+@pytest.fixture
+def count_permission_queries(db_session):
+    """Count SELECT statements against the permissoes table"""
+    statements = []
+    
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'permissoes' in statement:
+            statements.append(statement)
+    
+    engine = db_session.engine
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_execute)
+
+
+class TestPermissionCache:
+    """Test request-level and process-level permission caching"""
+    
+    def test_repeated_checks_use_single_query(self, shared_document, test_user, admin_user,
+                                              count_permission_queries):
+        """All permission types for a user/document come from one query"""
+        service = PermissionService()
+        service.grant_permission(shared_document, test_user.id, 'editar', admin_user.id)
+        count_permission_queries.clear()
+        
+        for _ in range(5):
+            assert service.check_permission(shared_document, test_user.id, 'visualizar')
+            assert service.check_permission(shared_document, test_user.id, 'editar')
+            assert not service.check_permission(shared_document, test_user.id, 'excluir')
+        
+        assert len(count_permission_queries) == 1
+    
+    def test_higher_permission_implies_view(self, shared_document, test_user, admin_user):
+        """Edit permission implies view permission"""
+        service = PermissionService()
+        service.grant_permission(shared_document, test_user.id, 'compartilhar', admin_user.id)
+        
+        assert service.check_permission(shared_document, test_user.id, 'visualizar')
+        assert not service.check_permission(shared_document, test_user.id, 'editar')
+    
+    def test_grant_and_revoke_invalidate(self, shared_document, test_user, admin_user):
+        """Granting and revoking permissions is visible immediately"""
+        service = PermissionService()
+        assert not service.check_permission(shared_document, test_user.id, 'visualizar')
+        
+        service.grant_permission(shared_document, test_user.id, 'visualizar', admin_user.id)
+        assert service.check_permission(shared_document, test_user.id, 'visualizar')
+        
+        service.revoke_permission(shared_document, test_user.id, 'visualizar', admin_user.id)
+        assert not service.check_permission(shared_document, test_user.id, 'visualizar')
+    
+    def test_direct_orm_changes_invalidate(self, db_session, shared_document, test_user, admin_user):
+        """Permission rows written outside the service also invalidate decisions"""
+        assert not permission_cache.has_permission(shared_document, test_user.id, 'editar')
+        
+        db_session.session.add(Permissao(
+            documento_id=shared_document.id,
+            usuario_id=test_user.id,
+            tipo_permissao='editar',
+            concedido_por=admin_user.id
+        ))
+        db_session.session.commit()
+        
+        assert permission_cache.has_permission(shared_document, test_user.id, 'editar')
+    
+    def test_changes_from_other_workers_are_picked_up(self, db_session, shared_document, test_user, admin_user):
+        """A version stamp published by another process drops the cached decisions"""
+        from sqlalchemy import delete, update
+        from app.models.settings import SystemSettings
+        
+        PermissionService().grant_permission(shared_document, test_user.id, 'visualizar', admin_user.id)
+        assert permission_cache.has_permission(shared_document, test_user.id, 'visualizar')
+        
+        # Another worker revokes the grant and publishes a new stamp; this process sees no event
+        db_session.session.execute(delete(Permissao).where(Permissao.documento_id == shared_document.id))
+        db_session.session.execute(
+            update(SystemSettings).where(SystemSettings.chave == permission_cache.VERSION_KEY).values(valor='outro')
+        )
+        db_session.session.commit()
+        assert permission_cache.has_permission(shared_document, test_user.id, 'visualizar')
+        
+        # The next request compares the stamp first
+        permission_cache._reset_request_memo()
+        assert not permission_cache.has_permission(shared_document, test_user.id, 'visualizar')
+        assert permission_cache.stats()['version_changes'] == 1
+    
+    def test_expired_permissions_are_ignored(self, shared_document, test_user, admin_user):
+        """Expired permissions grant nothing and cached entries expire with them"""
+        service = PermissionService()
+        service.grant_permission(
+            shared_document, test_user.id, 'visualizar', admin_user.id,
+            expiration_date=datetime.utcnow() - timedelta(minutes=1)
+        )
+        assert not service.check_permission(shared_document, test_user.id, 'visualizar')
+        
+        expiration = datetime.utcnow() + timedelta(seconds=30)
+        service.grant_permission(
+            shared_document, test_user.id, 'visualizar', admin_user.id,
+            expiration_date=expiration
+        )
+        assert service.check_permission(shared_document, test_user.id, 'visualizar')
+        key = (shared_document.id, test_user.id)
+        assert permission_cache._entries[key][1] == expiration
+    
+    def test_owner_bypasses_cache(self, shared_document, admin_user):
+        """Owners have every permission without any lookup"""
+        assert permission_cache.get_mask(shared_document, admin_user.id) == 15
+        assert permission_cache.stats()['lookups'] == 0
+    
+    def test_stats_report_hit_rate(self, shared_document, test_user):
+        """Statistics report lookups and hit rate"""
+        for _ in range(4):
+            permission_cache.has_permission(shared_document, test_user.id, 'visualizar')
+        
+        stats = permission_cache.stats()
+        assert stats['lookups'] == 4
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.75
+    
+    def test_cache_stats_endpoint(self, admin_client, db_session):
+        """Admins can read cache statistics"""
+        response = admin_client.get('/admin/permissions/cache-stats')
+        
+        assert response.status_code == 200
+        assert 'hit_rate' in response.get_json()
@@ -0,0 +1,109 @@
+"""
+Tests for the expired permission sweeper
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.document import Documento
+from app.models.permission import Permissao
+from app.services.permission_service import PermissionService
+from app.utils.permission_cache import permission_cache
+
+
+@pytest.fixture
+def documents(db_session, admin_user):
+    """Five documents owned by admin_user"""
+    docs = [
+        Documento(
+            nome=f'doc{i}.pdf',
+            caminho_arquivo=f'{admin_user.id}/doc{i}.pdf',
+            nome_arquivo_original=f'doc{i}.pdf',
+            tamanho_bytes=10,
+            tipo_mime='application/pdf',
+            hash_arquivo=f'{i:064d}',
+            usuario_id=admin_user.id
+        )
+        for i in range(5)
+    ]
+    db_session.session.add_all(docs)
+    db_session.session.commit()
+    return docs
+
+
+@pytest.fixture
+def grants(db_session, documents, test_user, admin_user):
+    """Four expired grants and one that never expires"""
+    expired = datetime.utcnow() - timedelta(hours=1)
+    rows = [
+        Permissao(documento_id=doc.id, usuario_id=test_user.id, tipo_permissao='visualizar',
+                  concedido_por=admin_user.id, data_expiracao=expired)
+        for doc in documents[:4]
+    ]
+    rows.append(Permissao(documento_id=documents[4].id, usuario_id=test_user.id,
+                          tipo_permissao='visualizar', concedido_por=admin_user.id))
+    db_session.session.add_all(rows)
+    db_session.session.commit()
+    return rows
+
+
+class TestPermissionSweep:
+    """Test batched removal of expired permissions"""
+    
+    def test_sweep_removes_expired_in_batches(self, grants, test_user):
+        """Expired rows are removed in batches and metrics are reported"""
+        metrics = PermissionService().sweep_expired_permissions(batch_size=3, max_batches=0)
+        
+        assert metrics['deleted'] == 4
+        assert metrics['tables']['permissoes'] == 4
+        assert metrics['batches'] == 2
+        assert metrics['users'] == 1
+        assert metrics['documents'] == 4
+        assert metrics['complete']
+        assert Permissao.query.count() == 1
+    
+    def test_sweep_respects_batch_limit(self, grants):
+        """A run stops after max_batches and the next run continues"""
+        service = PermissionService()
+        
+        metrics = service.sweep_expired_permissions(batch_size=3, max_batches=1)
+        assert metrics['deleted'] == 3
+        assert not metrics['complete']
+        
+        metrics = service.sweep_expired_permissions(batch_size=3, max_batches=1)
+        assert metrics['deleted'] == 1
+        assert Permissao.query.count() == 1
+    
+    def test_sweep_invalidates_cached_decisions(self, documents, grants, test_user):
+        """Cached decisions of swept documents are dropped"""
+        permission_cache.has_permission(documents[0], test_user.id, 'visualizar')
+        permission_cache.has_permission(documents[4], test_user.id, 'visualizar')
+        assert (documents[0].id, test_user.id) in permission_cache._entries
+        
+        PermissionService().sweep_expired_permissions(batch_size=10)
+        
+        assert (documents[0].id, test_user.id) not in permission_cache._entries
+        assert (documents[4].id, test_user.id) in permission_cache._entries
+    
+    def test_sweep_publishes_a_version_stamp(self, db_session, grants):
+        """Web workers drop their cached decisions after a sweep run elsewhere"""
+        from app.models.settings import SystemSettings
+        
+        def stamp():
+            return db_session.session.query(SystemSettings.valor).filter_by(
+                chave=permission_cache.VERSION_KEY
+            ).scalar()
+        
+        before = stamp()
+        PermissionService().sweep_expired_permissions(batch_size=10)
+        assert stamp() not in (None, before)
+    
+    def test_expiry_columns_are_indexed(self, db_session):
+        """Every table the sweep scans has an index on data_expiracao"""
+        tables = db_session.metadata.tables
+        for table in ('permissoes', 'permissoes_grupos', 'permissoes_pastas',
+                      'permissoes_categorias', 'permissoes_efetivas'):
+            indexed = [[column.name for column in index.columns] for index in tables[table].indexes]
+            assert ['data_expiracao'] in indexed, table
+    
+    def test_cleanup_expired_permissions_uses_sweep(self, grants):
+        """The legacy cleanup entry point reports removed grants"""
+        assert PermissionService().cleanup_expired_permissions() == 4
@@ -0,0 +1,131 @@
+"""
+Tests for the single-pass report aggregation engine
+"""
+import re
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models.audit import LogAuditoria
+from app.services.audit_service import AuditService
+from app.services.report_aggregation import ReportAggregator, Total, CountBy, Distinct
+from app.services.report_service import ReportService
+
+
+@pytest.fixture
+def activity(db_session, test_user, admin_user):
+    """Logins, failed logins and document accesses over two days"""
+    base = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    logs = [
+        LogAuditoria(usuario_id=test_user.id, acao='login_success', data_hora=base),
+        LogAuditoria(usuario_id=admin_user.id, acao='login_success', data_hora=base + timedelta(hours=1)),
+        LogAuditoria(usuario_id=test_user.id, acao='document_download', tabela='documentos', registro_id=7,
+                     data_hora=base + timedelta(hours=2), ocorrencias=3),
+        LogAuditoria(usuario_id=test_user.id, acao='document_view', tabela='documentos', registro_id=8,
+                     data_hora=base + timedelta(days=1)),
+        LogAuditoria(usuario_id=test_user.id, acao='login', ip_address='10.0.0.1', data_hora=base),
+        LogAuditoria(usuario_id=test_user.id, acao='login_failed', ip_address='10.0.0.9', data_hora=base),
+        LogAuditoria(usuario_id=None, acao='login_failed', ip_address='10.0.0.9', data_hora=base),
+        LogAuditoria(usuario_id=admin_user.id, acao='login_failed', ip_address='10.0.0.2', data_hora=base)
+    ]
+    db_session.session.add_all(logs)
+    db_session.session.commit()
+    return base
+
+
+def _count_audit_scans(app):
+    """Record the SELECTs reading log_auditoria itself (not its rollups or archive index)"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if re.search(r'\bFROM log_auditoria\b', statement):
+            statements.append(statement)
+    
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class TestReportAggregation:
+    """Test metrics folded from one grouped count"""
+    
+    def test_metrics_share_one_grouped_query(self, app, activity, test_user):
+        """Every metric is folded from a single scan of the range"""
+        statements, stop = _count_audit_scans(app)
+        try:
+            result = ReportAggregator().aggregate([
+                Total('total'),
+                Total('downloads', acao='document_download'),
+                CountBy('by_user', 'usuario_id'),
+                Distinct('days', 'dia'),
+                CountBy('failed_by_ip', 'ip_address', acao='login_failed')
+            ], activity - timedelta(hours=1))
+        finally:
+            stop()
+        
+        assert len(statements) == 1
+        assert result['total'] == 10
+        assert result['downloads'] == 3
+        assert result['by_user'][test_user.id] == 7
+        assert result['days'] == 2
+        assert result['failed_by_ip'] == {'10.0.0.9': 2, '10.0.0.2': 1}
+    
+    def test_incomplete_metric_fails_on_creation(self):
+        """A metric without result() is rejected before any report runs"""
+        from app.services.report_aggregation import Metric
+        
+        class OnlyAdds(Metric):
+            def add(self, row, count):
+                pass
+        
+        with pytest.raises(TypeError):
+            OnlyAdds('incomplete')
+    
+    def test_usage_report_figures(self, activity, test_user):
+        """Usage report totals, top users and daily activity come from one aggregation"""
+        report = ReportService().generate_usage_report(activity - timedelta(hours=1), datetime.utcnow())
+        
+        assert report['summary']['total_logins'] == 2
+        assert report['summary']['total_downloads'] == 3
+        assert report['summary']['active_users'] == 2
+        assert report['top_users'][0]['user_id'] == test_user.id
+        assert sum(day['count'] for day in report['daily_activity']) == 10
+    
+    def test_access_report_summary_by_document(self, activity, test_user):
+        """A document filter is counted from raw rows, a user filter from the rollup path"""
+        service = ReportService()
+        inicio = activity - timedelta(hours=1)
+        
+        by_document = service.generate_access_report(inicio, datetime.utcnow(), documento_id=7)
+        assert by_document['summary'] == {'document_download': 3}
+        
+        by_user = service.generate_access_report(inicio, datetime.utcnow(), usuario_id=test_user.id)
+        assert by_user['summary'] == {'document_download': 3, 'document_view': 1}
+        assert len(by_user['access_logs']) == 2
+    
+    def test_audit_reports_use_the_engine(self, app, activity, test_user, admin_user):
+        """Security and user activity reports count login attempts in one pass"""
+        service = AuditService()
+        statements, stop = _count_audit_scans(app)
+        try:
+            security = service.generate_audit_report('security', activity - timedelta(hours=1))
+        finally:
+            stop()
+        
+        assert len(statements) == 1
+        assert security['successful_logins'] == 1
+        assert security['failed_logins'] == 3
+        assert security['success_rate'] == 25
+        assert security['suspicious_ips'][0] == {'ip': '10.0.0.9', 'failed_attempts': 2}
+        assert {user['usuario_id'] for user in security['users_with_failures']} == {test_user.id, admin_user.id}
+        
+        user_report = service.generate_audit_report('user_activity', usuario_id=test_user.id)
+        assert user_report['total_actions'] == 7
+        assert user_report['action_breakdown']['document_download'] == 3
+        assert user_report['recent_logins'] == 1
+        assert user_report['failed_logins'] == 1
+        assert len(user_report['recent_activity']) == 5
+        
+        summary = service.generate_audit_report('summary', activity - timedelta(hours=1))
+        assert summary['total_actions'] == 10
+        assert summary['top_users'][0] == {'usuario_id': test_user.id, 'count': 7}
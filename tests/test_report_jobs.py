@@ -0,0 +1,137 @@
+"""
+Tests for background report jobs
+"""
+import os
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models.report import RelatorioJob
+from app.services.report_job_service import ReportJobService, ReportJobError
+from app.services.report_service import ReportService
+from app.utils.report_jobs import report_job_runner
+
+
+@pytest.fixture
+def report_jobs(app, db_session, tmp_path, monkeypatch):
+    """Report job service writing its results to a temporary directory"""
+    monkeypatch.setitem(app.config, 'REPORT_RESULTS_DIR', str(tmp_path))
+    return ReportJobService()
+
+
+class TestReportJobs:
+    """Test report job submission, reuse and results"""
+    
+    def test_submit_and_download_through_endpoints(self, admin_client, report_jobs):
+        """A submitted report can be polled and downloaded as JSON and CSV"""
+        response = admin_client.post('/admin/reports/jobs', json={'tipo': 'usage', 'data_inicio': '2026-01-01'})
+        assert response.status_code == 202
+        job = response.get_json()
+        assert job['parametros'] == {'data_inicio': '2026-01-01T00:00:00'}
+        assert not job['reused']
+        
+        status = admin_client.get(job['status_url']).get_json()
+        assert status['status'] == 'concluido'
+        assert status['progresso'] == 100
+        assert set(status['download_urls']) == {'json', 'csv'}
+        
+        result = admin_client.get(status['download_urls']['json'])
+        assert result.status_code == 200
+        assert 'summary' in result.get_json()
+        assert admin_client.get(status['download_urls']['csv']).data.decode('utf-8-sig').startswith('Relatório de Uso')
+        
+        assert admin_client.post('/admin/reports/jobs', json={'tipo': 'sales'}).status_code == 400
+        assert admin_client.post('/admin/reports/jobs', json={'tipo': 'audit_user_activity'}).status_code == 400
+        assert admin_client.get('/admin/reports/jobs/desconhecido').status_code == 404
+    
+    def test_identical_requests_share_a_job_until_it_expires(self, report_jobs, admin_user):
+        """Same type and parameters reuse the result; expiry purges it"""
+        job, reused = report_jobs.submit('storage', {}, usuario_id=admin_user.id)
+        assert not reused
+        again, reused = report_jobs.submit('storage', {'data_inicio': '2026-01-01'})
+        assert reused and again.id == job.id
+        
+        other, reused = report_jobs.submit('access', {'usuario_id': str(admin_user.id)})
+        assert not reused and other.id != job.id
+        
+        path = report_jobs.result_path(job, 'csv')
+        job.expira_em = datetime.utcnow() - timedelta(seconds=1)
+        report_jobs.repository.save(job)
+        fresh, reused = report_jobs.submit('storage', {})
+        assert not reused and fresh.id != job.id
+        assert not os.path.exists(path)
+        assert RelatorioJob.query.get(job.id) is None
+    
+    def test_running_job_is_reused_unless_stale(self, app, report_jobs, monkeypatch):
+        """Concurrent identical requests attach to the running job; a silent one is replaced"""
+        monkeypatch.setattr(report_job_runner, 'submit', lambda job_id, target: None)
+        job, _ = report_jobs.submit('audit_security', {'data_fim': '2026-02-01T10:00:00'})
+        assert job.status == 'pendente'
+        
+        same, reused = report_jobs.submit('audit_security', {'data_fim': '2026-02-01T10:00:00.500'})
+        assert reused and same.id == job.id
+        
+        job.data_atualizacao = datetime.utcnow() - timedelta(seconds=app.config['REPORT_JOB_STALE_SECONDS'] + 1)
+        report_jobs.repository.save(job)
+        replacement, reused = report_jobs.submit('audit_security', {'data_fim': '2026-02-01T10:00:00'})
+        assert not reused and replacement.id != job.id
+        assert report_jobs.get_job(job.id).status == 'erro'
+        with pytest.raises(ReportJobError):
+            report_jobs.result_path(replacement)
+    
+    def test_database_arbitrates_identical_submissions(self, report_jobs, monkeypatch):
+        """A submission racing another process attaches to the job that won the insert"""
+        monkeypatch.setattr(report_job_runner, 'submit', lambda job_id, target: None)
+        job, _ = report_jobs.submit('storage', {})
+        
+        # The other process looked before this job existed
+        find_reusable = report_jobs.repository.find_reusable
+        lookups = []
+        monkeypatch.setattr(report_jobs.repository, 'find_reusable',
+                            lambda chave: find_reusable(chave) if lookups.append(chave) or len(lookups) > 1 else None)
+        same, reused = report_jobs.submit('storage', {})
+        
+        assert reused and same.id == job.id
+        assert RelatorioJob.query.count() == 1
+    
+    def test_heartbeat_keeps_long_steps_alive(self, app, report_jobs, monkeypatch):
+        """A step longer than the stale limit does not fail the job while it beats"""
+        monkeypatch.setitem(app.config, 'REPORT_JOB_HEARTBEAT_SECONDS', 0.05)
+        monkeypatch.setitem(app.config, 'REPORT_JOB_STALE_SECONDS', 1)
+        monkeypatch.setattr(report_job_runner, 'submit', lambda job_id, target: None)
+        job, _ = report_jobs.submit('storage', {})
+        
+        def slow(self, progress=None):
+            import time
+            time.sleep(1.5)
+            assert report_jobs.get_job(job.id).status == 'executando'
+            return {'summary': {}}
+        monkeypatch.setattr(ReportService, 'generate_storage_report', slow)
+        monkeypatch.setattr(ReportService, 'export_report_csv', lambda self, dados, tipo: __import__('io').BytesIO(b''))
+        
+        report_jobs.run_job(job.id)
+        assert report_jobs.get_job(job.id).status == 'concluido'
+    
+    def test_worker_pool_records_progress_and_failures(self, app, report_jobs, monkeypatch):
+        """Jobs run in the pool; a failing report is recorded on its job"""
+        monkeypatch.setattr(report_job_runner, 'enabled', True)
+        steps = []
+        original = ReportJobService._set_progress
+        monkeypatch.setattr(ReportJobService, '_set_progress',
+                            lambda self, job, progresso, etapa: steps.append(progresso) or original(self, job, progresso, etapa))
+        
+        job, _ = report_jobs.submit('usage', {})
+        assert report_job_runner.wait(job.id, timeout=30)
+        db.session.expire_all()
+        assert report_jobs.get_job(job.id).status == 'concluido'
+        assert steps == sorted(steps) and len(steps) >= 4
+        
+        def broken(self, progress=None):
+            raise RuntimeError('storage query failed')
+        monkeypatch.setattr(ReportService, 'generate_storage_report', broken)
+        failed, _ = report_jobs.submit('storage', {})
+        assert report_job_runner.wait(failed.id, timeout=30)
+        db.session.expire_all()
+        failed = report_jobs.get_job(failed.id)
+        assert failed.status == 'erro'
+        assert 'storage query failed' in failed.erro
+        report_job_runner.shutdown()
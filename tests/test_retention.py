@@ -0,0 +1,116 @@
+"""
+Tests for the chunked retention executor and the jobs built on it
+"""
+import io
+import os
+from datetime import datetime, timedelta
+import pytest
+from werkzeug.datastructures import FileStorage
+from app.models.audit import LogAuditoria
+from app.models.document import Documento, Favorito
+from app.models.permission import Permissao
+from app.models.version import Versao
+from app.repositories.audit_repository import AuditRepository
+from app.services.document_service import DocumentService
+from app.services.storage_service import StorageService
+from app.utils.file_handler import FileHandler
+from app.utils.retention import RetentionExecutor
+
+
+@pytest.fixture
+def checkpoint_dir(app, tmp_path, monkeypatch):
+    """Point RETENTION_CHECKPOINT_DIR at a temporary directory"""
+    monkeypatch.setitem(app.config, 'RETENTION_CHECKPOINT_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def old_logs(db_session, test_user):
+    """Five logs past retention and two recent ones"""
+    old = datetime.utcnow() - timedelta(days=400)
+    logs = [LogAuditoria(usuario_id=test_user.id, acao='document_view', data_hora=old) for _ in range(5)]
+    logs += [LogAuditoria(usuario_id=test_user.id, acao='document_view', data_hora=datetime.utcnow()) for _ in range(2)]
+    db_session.session.add_all(logs)
+    db_session.session.commit()
+    return logs
+
+
+@pytest.fixture
+def document_service(app, db_session):
+    """Document service backed by the test upload folder"""
+    storage = StorageService(app.config['UPLOAD_FOLDER'])
+    handler = FileHandler(app.config['ALLOWED_EXTENSIONS'], app.config['MAX_CONTENT_LENGTH'])
+    return DocumentService(storage, handler)
+
+
+def _file(content, filename='contrato.pdf'):
+    return FileStorage(stream=io.BytesIO(content), filename=filename)
+
+
+class TestRetentionExecutor:
+    """Test chunked, resumable deletes"""
+    
+    def test_audit_cleanup_deletes_in_chunks(self, app, checkpoint_dir, old_logs, monkeypatch):
+        """Old logs are deleted chunk by chunk with progress after each chunk"""
+        monkeypatch.setitem(app.config, 'RETENTION_CHUNK_SIZE', 2)
+        chunks = []
+        deleted = AuditRepository().cleanup_old_logs(days=365, progress=chunks.append)
+        
+        assert deleted == 5
+        assert [chunk['deleted'] for chunk in chunks] == [2, 4, 5]
+        assert LogAuditoria.query.count() == 2
+        assert not os.listdir(checkpoint_dir)
+    
+    def test_interrupted_run_resumes_from_checkpoint(self, app, checkpoint_dir, old_logs):
+        """A run stopped by max_chunks leaves a checkpoint the next run continues from"""
+        filters = lambda cutoff: [LogAuditoria.data_hora < cutoff]
+        cutoff = datetime.utcnow() - timedelta(days=365)
+        
+        first = RetentionExecutor('audit_logs', LogAuditoria, chunk_size=2, max_chunks=1).run(cutoff, filters)
+        assert first['deleted'] == 2
+        assert not first['complete']
+        assert os.path.exists(checkpoint_dir / 'audit_logs.json')
+        
+        second = RetentionExecutor('audit_logs', LogAuditoria, chunk_size=2).run(datetime.utcnow(), filters)
+        assert second['resumed']
+        assert second['cutoff'] == cutoff
+        assert second['deleted'] == 3
+        assert LogAuditoria.query.count() == 2
+        assert not os.path.exists(checkpoint_dir / 'audit_logs.json')
+
+
+class TestTrashRetention:
+    """Test chunked permanent deletion of expired trash"""
+    
+    def test_expired_trash_is_purged_with_dependents_and_files(
+        self, app, db_session, checkpoint_dir, document_service, test_user, admin_user, monkeypatch
+    ):
+        """Expired documents, their dependent rows and unshared blobs are removed"""
+        expirados = [document_service.upload_document(_file(f'old {i}'.encode()), test_user.id) for i in range(3)]
+        document_service.create_version(expirados[0].id, _file(b'old 0 v2'), test_user.id, 'v2')
+        recente = document_service.upload_document(_file(b'recent'), test_user.id)
+        db_session.session.add(Favorito(usuario_id=test_user.id, documento_id=expirados[0].id))
+        db_session.session.add(Permissao(
+            documento_id=expirados[1].id, usuario_id=admin_user.id,
+            tipo_permissao='visualizar', concedido_por=test_user.id
+        ))
+        for documento in expirados + [recente]:
+            documento.soft_delete()
+        for documento in expirados:
+            documento.data_exclusao = datetime.utcnow() - timedelta(days=40)
+        db_session.session.commit()
+        caminhos = {v.caminho_arquivo for v in Versao.query.filter(Versao.documento_id.in_([d.id for d in expirados]))}
+        
+        monkeypatch.setitem(app.config, 'RETENTION_CHUNK_SIZE', 2)
+        chunks = []
+        deleted = document_service.cleanup_expired_trash(days=30, progress=chunks.append)
+        
+        assert deleted == 3
+        assert len(chunks) == 2
+        assert chunks[-1]['files'] == 4
+        assert [d.id for d in Documento.query.all()] == [recente.id]
+        assert Versao.query.filter(Versao.documento_id != recente.id).count() == 0
+        assert Favorito.query.count() == 0
+        assert Permissao.query.filter_by(usuario_id=admin_user.id).count() == 0
+        assert not any(document_service.storage_service.file_exists(caminho) for caminho in caminhos)
+        assert document_service.storage_service.file_exists(recente.caminho_arquivo)
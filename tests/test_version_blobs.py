@@ -0,0 +1,99 @@
+"""
+Tests for reference-based document versioning
+"""
+import io
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+from app.models.version import Versao
+from app.services.document_service import DocumentService
+from app.services.storage_service import StorageService
+from app.utils.file_handler import FileHandler
+
+
+def _file(content, filename='contrato.pdf'):
+    return FileStorage(stream=io.BytesIO(content), filename=filename)
+
+
+def _stored_files(app, user_id):
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], str(user_id))
+    return set(os.listdir(folder)) if os.path.isdir(folder) else set()
+
+
+@pytest.fixture
+def document_service(app, db_session):
+    """Document service backed by the test upload folder"""
+    storage = StorageService(app.config['UPLOAD_FOLDER'])
+    handler = FileHandler(app.config['ALLOWED_EXTENSIONS'], app.config['MAX_CONTENT_LENGTH'])
+    return DocumentService(storage, handler)
+
+
+class TestVersionBlobs:
+    """Test that versions share immutable blobs instead of copying files"""
+    
+    def test_restore_version_is_metadata_only(self, app, document_service, test_user):
+        """Restoring a version references the old blob without writing files"""
+        documento = document_service.upload_document(_file(b'version one'), test_user.id)
+        document_service.create_version(documento.id, _file(b'version two'), test_user.id, 'v2')
+        files_before = _stored_files(app, test_user.id)
+        
+        document_service.restore_version(documento.id, 1, test_user.id)
+        
+        assert _stored_files(app, test_user.id) == files_before
+        restored = Versao.query.filter_by(documento_id=documento.id, numero_versao=3).first()
+        original = Versao.query.filter_by(documento_id=documento.id, numero_versao=1).first()
+        assert restored.caminho_arquivo == original.caminho_arquivo
+        assert documento.caminho_arquivo == original.caminho_arquivo
+        assert documento.hash_arquivo == original.hash_arquivo
+    
+    def test_restoring_a_version_without_hash_recomputes_it(self, app, document_service, test_user):
+        """Versions stored before blob hashes existed get their hash from the file"""
+        import hashlib
+        from app import db
+        documento = document_service.upload_document(_file(b'legacy content'), test_user.id)
+        document_service.create_version(documento.id, _file(b'newer content'), test_user.id, 'v2')
+        original = Versao.query.filter_by(documento_id=documento.id, numero_versao=1).first()
+        original.hash_arquivo = None
+        db.session.commit()
+        
+        document_service.restore_version(documento.id, 1, test_user.id)
+        
+        expected = hashlib.sha256(b'legacy content').hexdigest()
+        assert documento.hash_arquivo == expected
+        assert original.hash_arquivo == expected
+        assert Versao.query.filter_by(documento_id=documento.id, numero_versao=3).first().hash_arquivo == expected
+    
+    def test_create_version_reuses_identical_blob(self, app, document_service, test_user):
+        """Uploading content identical to an older version reuses its blob"""
+        documento = document_service.upload_document(_file(b'alpha'), test_user.id)
+        document_service.create_version(documento.id, _file(b'beta'), test_user.id, 'v2')
+        files_before = _stored_files(app, test_user.id)
+        
+        versao = document_service.create_version(documento.id, _file(b'alpha'), test_user.id, 'v3')
+        
+        assert _stored_files(app, test_user.id) == files_before
+        original = Versao.query.filter_by(documento_id=documento.id, numero_versao=1).first()
+        assert versao.caminho_arquivo == original.caminho_arquivo
+    
+    def test_pruning_keeps_referenced_blobs(self, app, document_service, test_user):
+        """Versions beyond the limit are pruned; blobs still referenced survive"""
+        app.config['MAX_VERSIONS_PER_DOCUMENT'] = 3
+        try:
+            documento = document_service.upload_document(_file(b'first'), test_user.id)
+            document_service.create_version(documento.id, _file(b'second'), test_user.id, 'v2')
+            document_service.create_version(documento.id, _file(b'third'), test_user.id, 'v3')
+            second_path = Versao.query.filter_by(documento_id=documento.id, numero_versao=2).first().caminho_arquivo
+            
+            # Restoring v1 makes v4 reference the first blob, then v1 is pruned
+            document_service.restore_version(documento.id, 1, test_user.id)
+            # v5 prunes v2, whose blob is no longer referenced
+            document_service.create_version(documento.id, _file(b'fifth'), test_user.id, 'v5')
+            
+            numbers = [v.numero_versao for v in Versao.query.filter_by(documento_id=documento.id).order_by(Versao.numero_versao)]
+            assert numbers == [3, 4, 5]
+            
+            v4 = Versao.query.filter_by(documento_id=documento.id, numero_versao=4).first()
+            assert document_service.storage_service.file_exists(v4.caminho_arquivo)
+            assert not document_service.storage_service.file_exists(second_path)
+        finally:
+            app.config['MAX_VERSIONS_PER_DOCUMENT'] = 10
@@ -0,0 +1,124 @@
+"""
+Tests for the normalized stage approvers and compiled definitions of workflows
+"""
+import pytest
+from app.models.document import Documento
+from app.models.workflow import WorkflowEstagioAprovador
+from app.services.workflow_service import WorkflowService, UnauthorizedApproverError
+
+
+def _documento(owner_id, index):
+    return Documento(
+        nome=f'contrato{index}.pdf',
+        caminho_arquivo=f'{owner_id}/contrato{index}.pdf',
+        nome_arquivo_original=f'contrato{index}.pdf',
+        tamanho_bytes=10,
+        tipo_mime='application/pdf',
+        hash_arquivo=f'{index:064d}',
+        usuario_id=owner_id
+    )
+
+
+@pytest.fixture
+def two_stage_workflow(app, db_session, test_user, admin_user):
+    """Stage 1 approved by test_user, stage 2 by admin_user"""
+    return WorkflowService().create_workflow(
+        nome='Contratos',
+        descricao='Revisão e diretoria',
+        configuracao={'stages': [
+            {'name': 'Revisão', 'approvers': [test_user.id, 999999]},
+            {'name': 'Diretoria', 'approvers': [admin_user.id]}
+        ]},
+        criado_por=admin_user.id
+    )
+
+
+class TestWorkflowStageApprovers:
+    """Test inbox, authorization, notifications and stage rules"""
+    
+    def test_configuration_is_normalized(self, db_session, two_stage_workflow, test_user, admin_user):
+        """Stage approvers follow the configuration; unknown users are skipped"""
+        service = WorkflowService()
+        rows = {
+            (row.estagio, row.usuario_id)
+            for row in WorkflowEstagioAprovador.query.filter_by(workflow_id=two_stage_workflow.id)
+        }
+        assert rows == {(1, test_user.id), (2, admin_user.id)}
+        
+        service.update_workflow(two_stage_workflow.id, configuracao={'stages': [
+            {'name': 'Única', 'approvers': [admin_user.id, test_user.id]}
+        ]})
+        assert service.workflow_repo.get_stage_approver_ids(two_stage_workflow.id, 1) == [admin_user.id, test_user.id]
+        assert service.workflow_repo.get_stage_approver_ids(two_stage_workflow.id, 2) == []
+    
+    def test_inbox_follows_the_current_stage(self, db_session, two_stage_workflow, test_user, admin_user):
+        """An approval moves from the first stage inbox to the second"""
+        documento = _documento(test_user.id, 1)
+        db_session.session.add(documento)
+        db_session.session.commit()
+        service = WorkflowService()
+        
+        aprovacao = service.submit_for_approval(documento.id, two_stage_workflow.id, test_user.id)
+        assert service.get_pending_approvals_for_user(test_user.id) == [aprovacao]
+        assert service.get_pending_approvals_for_user(admin_user.id) == []
+        with pytest.raises(UnauthorizedApproverError):
+            service.approve_document(aprovacao.id, admin_user.id, 'ok')
+        
+        service.approve_document(aprovacao.id, test_user.id, 'revisado')
+        assert service.get_pending_approvals_for_user(test_user.id) == []
+        assert service.get_pending_approvals_for_user(admin_user.id) == [aprovacao]
+        
+        service.approve_document(aprovacao.id, admin_user.id, 'aprovado')
+        assert aprovacao.status == 'aprovado'
+        assert service.get_pending_approvals_for_user(admin_user.id) == []
+    
+    def test_notifies_current_stage_approvers(self, db_session, two_stage_workflow, test_user, monkeypatch):
+        """Submission notifies the first stage approvers from the index"""
+        notified = []
+        service = WorkflowService()
+        monkeypatch.setattr(
+            service.notification_service, 'notify_workflow_submission',
+            lambda **kwargs: notified.append(kwargs['approver_id'])
+        )
+        documento = _documento(test_user.id, 2)
+        db_session.session.add(documento)
+        db_session.session.commit()
+        
+        service.submit_for_approval(documento.id, two_stage_workflow.id, test_user.id)
+        
+        assert notified == [test_user.id]
+    
+    def test_definition_is_compiled_once_per_version(self, db_session, two_stage_workflow, admin_user):
+        """The parsed configuration is reused until the workflow changes"""
+        from app.utils.workflow_definitions import workflow_definitions
+        
+        definition = two_stage_workflow.definicao
+        assert two_stage_workflow.definicao is definition
+        assert definition.total_estagios == 2
+        assert definition.stage(2).approvers == frozenset({admin_user.id})
+        assert definition.stage(3) is None
+        
+        WorkflowService().update_workflow(two_stage_workflow.id, configuracao={'stages': [
+            {'name': 'Conselho', 'approvers': [admin_user.id], 'require_all': True}
+        ]})
+        updated = two_stage_workflow.definicao
+        assert two_stage_workflow.versao == 2
+        assert updated is not definition
+        assert updated.stages[0].name == 'Conselho'
+        assert updated.stages[0].require_all
+        assert workflow_definitions.stats()['entries'] == 1
+    
+    def test_concurrent_edits_get_distinct_versions(self, db_session, two_stage_workflow, admin_user):
+        """The version is incremented in SQL, not from the value this process read"""
+        from sqlalchemy import update
+        from app.models.workflow import Workflow
+        
+        # Another process changed the configuration after this one loaded the workflow
+        db_session.session.execute(
+            update(Workflow).where(Workflow.id == two_stage_workflow.id).values(versao=Workflow.versao + 1),
+            execution_options={'synchronize_session': False}
+        )
+        two_stage_workflow.configuracao = {'stages': [{'name': 'Única', 'approvers': [admin_user.id]}]}
+        db_session.session.commit()
+        
+        assert two_stage_workflow.versao == 3
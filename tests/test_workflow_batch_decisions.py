@@ -0,0 +1,161 @@
+"""
+Tests for approving and rejecting pending approvals in batch
+"""
+import json
+import pytest
+from app.models.document import Documento
+from app.models.workflow import AprovacaoDocumento, HistoricoAprovacao
+from app.models.audit import LogAuditoria
+from app.services.workflow_service import WorkflowService, WorkflowServiceError
+
+
+@pytest.fixture
+def queue(app, db_session, test_user, admin_user):
+    """Approvals waiting for test_user in single-stage, two-stage and require_all workflows"""
+    service = WorkflowService()
+    workflows = {
+        'simples': service.create_workflow('Simples', '', {'stages': [
+            {'name': 'Revisão', 'approvers': [test_user.id]}
+        ]}, admin_user.id),
+        'duas': service.create_workflow('Duas etapas', '', {'stages': [
+            {'name': 'Revisão', 'approvers': [test_user.id]},
+            {'name': 'Diretoria', 'approvers': [admin_user.id]}
+        ]}, admin_user.id),
+        'todos': service.create_workflow('Todos', '', {'stages': [
+            {'name': 'Comitê', 'approvers': [test_user.id, admin_user.id], 'require_all': True}
+        ]}, admin_user.id)
+    }
+    aprovacoes = {}
+    for index, (nome, workflow) in enumerate(sorted(workflows.items())):
+        for copia in range(2):
+            documento = Documento(
+                nome=f'{nome}{copia}.pdf',
+                caminho_arquivo=f'{admin_user.id}/{nome}{copia}.pdf',
+                nome_arquivo_original=f'{nome}{copia}.pdf',
+                tamanho_bytes=10,
+                tipo_mime='application/pdf',
+                hash_arquivo=f'{index * 10 + copia:064d}',
+                usuario_id=admin_user.id
+            )
+            db_session.session.add(documento)
+            db_session.session.flush()
+            aprovacao = AprovacaoDocumento(
+                documento_id=documento.id,
+                workflow_id=workflow.id,
+                submetido_por=admin_user.id
+            )
+            db_session.session.add(aprovacao)
+            aprovacoes.setdefault(nome, []).append(aprovacao)
+    db_session.session.commit()
+    return aprovacoes
+
+
+class TestBatchDecisions:
+    """Test set-based recording, stage advancement and consolidated notifications"""
+    
+    def test_batch_approval_advances_and_completes(self, db_session, queue, test_user, admin_user, monkeypatch):
+        """Each approval advances, completes or waits as its stage requires"""
+        service = WorkflowService()
+        requests, decisions = [], []
+        monkeypatch.setattr(service.notification_service, 'notify_workflow_submission_bulk',
+                            lambda aprovacoes, approver_id: requests.append((approver_id, len(aprovacoes))))
+        monkeypatch.setattr(service.notification_service, 'notify_workflow_decisions_bulk',
+                            lambda aprovacoes, approver_id, submitter_id, status, comment:
+                            decisions.append((submitter_id, len(aprovacoes), status)))
+        ids = [aprovacao.id for nome in ('simples', 'duas', 'todos') for aprovacao in queue[nome]]
+        
+        result = service.decide_approvals_bulk(ids, test_user.id, 'aprovado', 'lote revisado')
+        
+        assert result == {
+            'decided': 6, 'advanced': 2, 'completed': 2,
+            'unauthorized': [], 'not_pending': [], 'not_found': []
+        }
+        assert {a.status for a in queue['simples']} == {'aprovado'}
+        assert {(a.status, a.estagio_atual) for a in queue['duas']} == {('pendente', 2)}
+        assert {(a.status, a.estagio_atual) for a in queue['todos']} == {('pendente', 1)}
+        assert HistoricoAprovacao.query.count() == 6
+        assert LogAuditoria.query.filter_by(acao='workflow_approve').count() == 6
+        
+        # One message per recipient
+        assert requests == [(admin_user.id, 2)]
+        assert decisions == [(admin_user.id, 2, 'aprovado')]
+        # Stages that require everyone stay in the inbox of every member
+        assert service.get_pending_approvals_for_user(test_user.id) == queue['todos']
+        
+        # The last committee member completes the require_all stage
+        result = service.decide_approvals_bulk([a.id for a in queue['todos']], admin_user.id, 'aprovado', 'ok')
+        assert result['completed'] == 2
+        assert {a.status for a in queue['todos']} == {'aprovado'}
+    
+    def test_batch_rejection_skips_what_the_user_cannot_decide(self, db_session, queue, test_user, admin_user):
+        """Rejection ends workflows; other approvals are reported"""
+        service = WorkflowService()
+        service.decide_approvals_bulk([queue['simples'][0].id], test_user.id, 'aprovado', 'ok')
+        
+        result = service.decide_approvals_bulk(
+            [queue['simples'][0].id, queue['simples'][1].id, queue['duas'][0].id, 999999],
+            admin_user.id,
+            'rejeitado',
+            'fora do padrão'
+        )
+        
+        assert result['decided'] == 0
+        assert result['not_pending'] == [queue['simples'][0].id]
+        assert result['unauthorized'] == [queue['simples'][1].id, queue['duas'][0].id]
+        assert result['not_found'] == [999999]
+        
+        result = service.decide_approvals_bulk([a.id for a in queue['duas']], test_user.id, 'rejeitado', 'incompleto')
+        assert result['completed'] == 2
+        assert {(a.status, a.estagio_atual) for a in queue['duas']} == {('rejeitado', 1)}
+        
+        with pytest.raises(WorkflowServiceError):
+            service.decide_approvals_bulk([queue['simples'][1].id], test_user.id, 'rejeitado', ' ')
+    
+    def test_concurrent_decisions_are_not_applied_twice(self, db_session, queue, test_user, monkeypatch):
+        """Approvals decided after they were loaded are reported, not advanced again"""
+        from sqlalchemy import update
+        service = WorkflowService()
+        duas = queue['duas']
+        get_authorized_ids = service.aprovacao_repo.get_authorized_ids
+        
+        def decided_meanwhile(aprovacao_ids, user_id):
+            authorized = get_authorized_ids(aprovacao_ids, user_id)
+            # Another approver advances the first approval between the checks and the update
+            db_session.session.execute(
+                update(AprovacaoDocumento).where(AprovacaoDocumento.id == duas[0].id).values(estagio_atual=2),
+                execution_options={'synchronize_session': False}
+            )
+            return authorized
+        
+        monkeypatch.setattr(service.aprovacao_repo, 'get_authorized_ids', decided_meanwhile)
+        result = service.decide_approvals_bulk([a.id for a in duas], test_user.id, 'aprovado', 'ok')
+        
+        assert result['decided'] == 1
+        assert result['advanced'] == 1
+        assert result['not_pending'] == [duas[0].id]
+        assert {(a.status, a.estagio_atual) for a in duas} == {('pendente', 2)}
+        assert HistoricoAprovacao.query.filter_by(aprovacao_id=duas[0].id).count() == 0
+    
+    def test_batch_route(self, authenticated_client, queue, admin_user):
+        """The JSON endpoint reports skipped approvals"""
+        response = authenticated_client.post(
+            '/workflows/approvals/batch',
+            data=json.dumps({
+                'aprovacao_ids': [queue['simples'][0].id, 999999],
+                'acao': 'aprovar',
+                'comentario': 'ok'
+            }),
+            content_type='application/json'
+        )
+        
+        assert response.status_code == 207
+        data = response.get_json()
+        assert data['completed'] == 1
+        assert data['not_found'] == [999999]
+        
+        response = authenticated_client.post(
+            '/workflows/approvals/batch',
+            data=json.dumps({'aprovacao_ids': [queue['simples'][1].id], 'acao': 'aprovar'}),
+            content_type='application/json'
+        )
+        assert response.status_code == 400